@@ -2,6 +2,7 @@
 Configuration settings for the conversational AI agent.
 """
 import os
+import tempfile
 from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
@@ -17,6 +18,8 @@ API_DEBUG = os.getenv("API_DEBUG", "False").lower() == "true"
 # UI settings
 UI_HOST = os.getenv("UI_HOST", "0.0.0.0")
 UI_PORT = int(os.getenv("UI_PORT", "7860"))
+UI_HTTP_TIMEOUT_SECONDS = float(os.getenv("UI_HTTP_TIMEOUT_SECONDS", "10"))
+UI_HTTP_MAX_CONNECTIONS = int(os.getenv("UI_HTTP_MAX_CONNECTIONS", "20"))
 
 # LLM settings
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
@@ -25,7 +28,99 @@ LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
 
 # Conversation settings
 MAX_HISTORY_LENGTH = int(os.getenv("MAX_HISTORY_LENGTH", "10"))
+# Token counting for LLM prompts: "estimate" (no dependency) or "tiktoken" (downloads the encoding on first use)
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "estimate")
 SESSION_EXPIRY_HOURS = int(os.getenv("SESSION_EXPIRY_HOURS", "24"))
+SKIP_KEYWORD = os.getenv("SKIP_KEYWORD", "スキップ")
+# JSON file mapping control intents (skip / defer / quit) to phrases; empty uses the built-in table
+CONTROL_PHRASES_FILE = os.getenv("CONTROL_PHRASES_FILE", "")
+
+# /chat settings: the graph runs on a bounded thread pool; requests beyond CHAT_MAX_PENDING get a 503
+# The fixed-question graph is pure Python and holds the GIL, so extra workers add little throughput
+# and take GIL time away from the event loop; raise this once nodes wait on I/O (e.g. LLM calls)
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "1"))
+CHAT_MAX_PENDING = int(os.getenv("CHAT_MAX_PENDING", "64"))
+
+# Directory for state that must survive restarts (the OS temp directory may be cleared on reboot)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# Background jobs (completion analysis) persisted to a local SQLite file so they survive restarts.
+# uvicorn workers on one host may share the file: jobs are claimed with a lease, and a running job is only
+# picked up by another worker once its lease has expired
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_CAPACITY = int(os.getenv("JOB_QUEUE_CAPACITY", "10000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "0.5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+
+# Outbox delivering completed interviews to a downstream system (disabled when OUTBOX_URL is empty)
+OUTBOX_URL = os.getenv("OUTBOX_URL", "")
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", os.path.join(tempfile.gettempdir(), "ai_agent_outbox.sqlite3"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "1"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "300"))
+OUTBOX_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_TIMEOUT_SECONDS", "10"))
+OUTBOX_MAX_CONNECTIONS = int(os.getenv("OUTBOX_MAX_CONNECTIONS", "10"))
+# Delivered events are kept this long (duplicates of the same session are dropped while they are kept).
+# Completed sessions are re-published when they are recovered from the event log, so keep this at least
+# SESSION_EXPIRY_HOURS to avoid delivering a completion twice
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "168"))
+# Workers sharing OUTBOX_DB_PATH claim batches with a lease; keep it longer than OUTBOX_TIMEOUT_SECONDS
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+
+# Admission control: in-flight caps per route and in total (0 disables); requests that wait longer than
+# the route's queue budget get a 503. Answers from users mid-interview (/interview/answer, /chat) are
+# dispatched before new /interview/start requests and may wait longer
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_ANSWER_LIMIT = int(os.getenv("ADMISSION_ANSWER_LIMIT", "64"))
+ADMISSION_START_LIMIT = int(os.getenv("ADMISSION_START_LIMIT", "16"))
+ADMISSION_ANSWER_QUEUE_MS = int(os.getenv("ADMISSION_ANSWER_QUEUE_MS", "2000"))
+ADMISSION_START_QUEUE_MS = int(os.getenv("ADMISSION_START_QUEUE_MS", "250"))
+
+# Requests for the same session are serialized on one of SESSION_LOCK_STRIPES asyncio locks (per process)
+SESSION_LOCK_STRIPES = int(os.getenv("SESSION_LOCK_STRIPES", "1024"))
+
+# Session store settings ("memory" for a single worker, "shared" to share sessions between uvicorn workers).
+# Only /interview state is shared; /chat state (the conversation graph's checkpointer) stays per worker,
+# and so do the answer statistics and cohort index (/interview/stats, /cohorts and /export return 501)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TABLE_PATH = os.getenv(
+    "SESSION_TABLE_PATH", os.path.join(tempfile.gettempdir(), "ai_agent_sessions.tbl")
+)
+SESSION_TABLE_CAPACITY = int(os.getenv("SESSION_TABLE_CAPACITY", "100000"))
+SESSION_TEXT_BYTES = int(os.getenv("SESSION_TEXT_BYTES", "1024"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+SESSION_SWEEP_SLICE = int(os.getenv("SESSION_SWEEP_SLICE", "200"))
+# The shared table has no activity order, so each sweep slice scans this many slots instead
+SESSION_SWEEP_SCAN_SLOTS = int(os.getenv("SESSION_SWEEP_SCAN_SLOTS", "4096"))
+# Memory budget for in-memory sessions (0 keeps every session in memory); colder sessions spill to SQLite
+# The budget applies to an estimate of the session records; the user/activity indexes (~260 bytes
+# per session, hot or cold) come on top of it, so leave headroom when sizing the process
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "0"))
+SESSION_COLD_PATH = os.getenv(
+    "SESSION_COLD_PATH", os.path.join(tempfile.gettempdir(), "ai_agent_sessions_cold.db")
+)
+
+# Cluster settings (routing is disabled when CLUSTER_NODES is empty)
+# NODE_URL must match this node's entry in CLUSTER_NODES
+CLUSTER_NODES = [node for node in os.getenv("CLUSTER_NODES", "").split(",") if node]
+NODE_URL = os.getenv("NODE_URL", f"http://127.0.0.1:{API_PORT}")
+HASH_RING_VNODES = int(os.getenv("HASH_RING_VNODES", "128"))
+ROUTING_MODE = os.getenv("ROUTING_MODE", "forward")
+
+# Event log settings (the log is disabled when EVENT_LOG_DIR is empty)
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "")
+EVENT_LOG_SEGMENT_MB = int(os.getenv("EVENT_LOG_SEGMENT_MB", "64"))
+EVENT_LOG_SNAPSHOT_SECONDS = int(os.getenv("EVENT_LOG_SNAPSHOT_SECONDS", "300"))
+EVENT_LOG_FSYNC = os.getenv("EVENT_LOG_FSYNC", "False").lower() == "true"
+
+# Stats settings
+STATS_BUCKET_SECONDS = int(os.getenv("STATS_BUCKET_SECONDS", "60"))
+STATS_RETENTION_HOURS = int(os.getenv("STATS_RETENTION_HOURS", "24"))
 
 # Define the questions to be asked - can be moved to a JSON file later
 QUESTIONS: List[Dict[str, Optional[object]]] = [
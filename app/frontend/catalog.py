@@ -0,0 +1,165 @@
+"""
+Client-side cache of the interview question catalog.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+class QuestionCatalog:
+    """
+    Cached copy of the versioned question catalog served by the API.
+
+    The catalog is fetched once and revalidated with If-None-Match, so an
+    unchanged catalog costs a 304 with no body. It lets the UI render the
+    next question and its options without waiting for the API.
+    """
+
+    def __init__(self, url: str) -> None:
+        """
+        Initialize an empty catalog.
+
+        Args:
+            url: URL of the catalog endpoint (/interview/questions)
+        """
+        self.url = url
+        self.version: Optional[str] = None
+        self.questions: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._order: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def load(self, payload: Dict[str, Any]) -> None:
+        """
+        Replace the cached catalog with a response payload.
+
+        Args:
+            payload: Body of the catalog endpoint
+        """
+        self.version = payload.get("version")
+        self.questions = payload.get("questions", [])
+        self._by_id = {q["question_id"]: q for q in self.questions}
+        self._order = {q["question_id"]: i for i, q in enumerate(self.questions)}
+
+    async def refresh(self, client: httpx.AsyncClient) -> bool:
+        """
+        Fetch the catalog, revalidating the cached version if there is one.
+
+        Args:
+            client: The HTTP client to use
+
+        Returns:
+            bool: True if the catalog changed
+
+        Raises:
+            httpx.HTTPError: If the request fails
+        """
+        headers = {"If-None-Match": f'"{self.version}"'} if self.version else {}
+        response = await client.get(self.url, headers=headers)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        self.load(response.json())
+        return True
+
+    def get(self, question_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Get a question by its ID.
+
+        Args:
+            question_id: The question ID
+
+        Returns:
+            Optional[Dict[str, Any]]: The question or None if not found
+        """
+        if question_id is None:
+            return None
+        return self._by_id.get(question_id)
+
+    def first(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the first question.
+
+        Returns:
+            Optional[Dict[str, Any]]: The first question or None if the catalog is empty
+        """
+        return self.questions[0] if self.questions else None
+
+    def next_of(self, question_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the question that follows the given one.
+
+        Args:
+            question_id: The current question ID
+
+        Returns:
+            Optional[Dict[str, Any]]: The next question or None after the last one
+        """
+        index = self._order.get(question_id)
+        if index is None or index + 1 >= len(self.questions):
+            return None
+        return self.questions[index + 1]
+
+    def find_by_options(self, options: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        """
+        Find the question that offers exactly the given options.
+
+        Args:
+            options: Options returned by the API
+
+        Returns:
+            Optional[Dict[str, Any]]: The matching question or None
+        """
+        if not options:
+            return None
+        for question in self.questions:
+            if question.get("options") == options:
+                return question
+        return None
+
+    def progress(self, question_id: Optional[str]) -> Dict[str, int]:
+        """
+        Progress when the given question is the current one.
+
+        Args:
+            question_id: The current question ID, or None once all are answered
+
+        Returns:
+            Dict[str, int]: Progress information with current and total counts
+        """
+        total = len(self.questions)
+        current = self._order.get(question_id, total) if question_id else total
+        return {"current": current, "total": total}
+
+    def reaction(self, question_id: str, option: str) -> Optional[str]:
+        """
+        Get the fixed reaction for an option.
+
+        Args:
+            question_id: The question ID
+            option: The selected option
+
+        Returns:
+            Optional[str]: The reaction message or None
+        """
+        question = self._by_id.get(question_id) or {}
+        return (question.get("reactions") or {}).get(option)
+
+    @staticmethod
+    def render(question: Dict[str, Any]) -> str:
+        """
+        Render a question the same way the conversation graph does.
+
+        Args:
+            question: The question
+
+        Returns:
+            str: The question text followed by its options
+        """
+        options = question.get("options") or []
+        return f"{question['question_text']}\n\n" + "\n".join(
+            f"- {option}" for option in options
+        )
@@ -1,282 +1,440 @@
 """
 Gradio UI for the conversational AI agent.
 """
+import asyncio
+import json
 import uuid
-from typing import Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import gradio as gr
-import requests
+import httpx
+
+from app.config.settings import UI_HTTP_MAX_CONNECTIONS, UI_HTTP_TIMEOUT_SECONDS
+from app.frontend.catalog import QuestionCatalog
 
 # API endpoint
 API_URL = "http://localhost:8000/chat"
+STREAM_URL = "http://localhost:8000/chat/stream"
+CATALOG_URL = "http://localhost:8000/interview/questions"
+
+WELCOME_MESSAGE = "こんにちは！求人応募のための追加情報を教えてください。いつでもスキップと入力すると質問をスキップできます。"
+COMPLETION_MESSAGE = "すべての質問に回答いただき、ありがとうございました。"
+
+# Number of option buttons created up front
+MAX_OPTIONS = 5
+
+# Shared HTTP client (created lazily on the event loop that Gradio runs handlers on)
+_client: Optional[httpx.AsyncClient] = None
+
+# Question catalog shared by all sessions (it is static and small)
+catalog = QuestionCatalog(CATALOG_URL)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client, creating it on first use.
+
+    The client keeps connections to the API alive between turns, so a turn
+    does not pay for a new TCP handshake.
+
+    Returns:
+        httpx.AsyncClient: The pooled HTTP client
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(UI_HTTP_TIMEOUT_SECONDS, connect=min(3.0, UI_HTTP_TIMEOUT_SECONDS)),
+            limits=httpx.Limits(
+                max_connections=UI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=UI_HTTP_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
 
 
 def format_progress(progress: Optional[Dict[str, int]]) -> str:
     """
     Format the progress indicator.
-    
+
     Args:
         progress: Dictionary containing current and total progress
-        
+
     Returns:
         str: Formatted progress string
     """
     if not progress:
         return ""
-    
+
     current = progress.get("current", 0)
     total = progress.get("total", 0)
-    
+
     return f"進捗: {current}/{total} 質問"
 
 
+async def send_message(message: str, session: str) -> Dict[str, Any]:
+    """
+    Send a message to the API.
+
+    Args:
+        message: The message to send
+        session: The session ID
+
+    Returns:
+        Dict: The API response
+
+    Raises:
+        httpx.HTTPError: If the request fails or times out
+    """
+    # Ensure session_id is a string
+    session_str = str(session) if session is not None else str(uuid.uuid4())
+
+    response = await get_client().post(
+        API_URL,
+        json={"session_id": session_str, "message": message}
+    )
+    response.raise_for_status()
+    data: Dict[str, Any] = response.json()
+    return data
+
+
+async def stream_message(message: str, session: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Send a message to the streaming API and yield its events as they arrive.
+
+    The API sends a "turn" event with the next question first, then "delta"
+    events with the reply text, then "done".
+
+    Args:
+        message: The message to send
+        session: The session ID
+
+    Yields:
+        Dict: One decoded event per line
+
+    Raises:
+        httpx.HTTPError: If the request fails or times out
+        ValueError: If a line is not valid JSON
+    """
+    session_str = str(session) if session is not None else str(uuid.uuid4())
+
+    async with get_client().stream(
+        "POST", STREAM_URL, json={"session_id": session_str, "message": message}
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def option_updates(options: Optional[List[str]]) -> List[Any]:
+    """
+    Build updates for the option row and buttons.
+
+    The buttons are created and wired once; only their labels and
+    visibility change between turns.
+
+    Args:
+        options: List of option strings
+
+    Returns:
+        List: An update for the option row followed by one update per button
+    """
+    options = (options or [])[:MAX_OPTIONS]
+    updates: List[Any] = [gr.update(visible=bool(options))]
+    for i in range(MAX_OPTIONS):
+        if i < len(options):
+            updates.append(gr.update(value=options[i], visible=True))
+        else:
+            updates.append(gr.update(visible=False))
+    return updates
+
+
+def unchanged_options() -> List[Any]:
+    """
+    Build no-op updates for the option row and buttons.
+
+    Returns:
+        List: Updates that leave the row and buttons as they are
+    """
+    return [gr.update() for _ in range(MAX_OPTIONS + 1)]
+
+
+def response_question_id(response: Dict[str, Any]) -> Optional[str]:
+    """
+    Work out which question the API is asking next.
+
+    Args:
+        response: The API response
+
+    Returns:
+        Optional[str]: The question ID, or None if the interview is complete
+        or the question is not in the catalog
+    """
+    if response.get("completed"):
+        return None
+    if response.get("question_id"):
+        question_id: str = response["question_id"]
+        return question_id
+    question = catalog.find_by_options(response.get("options"))
+    return question["question_id"] if question else None
+
+
+async def handle_message(
+    message: str, history: Optional[List[Dict[str, str]]], session: str,
+    question_id: Optional[str] = None
+) -> AsyncIterator[Tuple[Any, ...]]:
+    """
+    Process a free-text user message, streaming the reply into the chat.
+
+    The option buttons are updated as soon as the API reports the next
+    question; the reply text is appended as it arrives.
+
+    Args:
+        message: The message to process
+        history: The current chat history
+        session: The session ID
+        question_id: The question currently shown
+
+    Yields:
+        Tuple: Updated chat history, empty message, progress indicator,
+        current question ID, and updates for the option row and buttons
+    """
+    history = list(history or [])
+
+    # Skip if message is empty
+    if not message:
+        yield (history, "", gr.update(), question_id, *unchanged_options())
+        return
+
+    history.append({"role": "user", "content": message})
+    progress: Any = gr.update()
+    current_id = question_id
+    turn_seen = False
+    reply_started = False
+    try:
+        async for event in stream_message(message, session):
+            if event.get("type") == "turn":
+                turn_seen = True
+                progress = format_progress(event.get("progress"))
+                current_id = response_question_id(event)
+                # After "やめる" the options are hidden; typing anything resumes the same question
+                options = [] if event.get("intent") == "quit" else event.get("options")
+                yield (list(history), "", progress, current_id, *option_updates(options))
+            elif event.get("type") == "delta" and turn_seen:
+                if reply_started:
+                    history[-1] = {"role": "assistant", "content": history[-1]["content"] + event["text"]}
+                else:
+                    history.append({"role": "assistant", "content": event["text"]})
+                    reply_started = True
+                yield (list(history), "", progress, current_id, *unchanged_options())
+    except (httpx.HTTPError, ValueError) as e:
+        error = {"role": "assistant", "content": f"エラーが発生しました: {str(e)}。もう一度お試しください。"}
+        if reply_started:
+            history[-1] = error
+        else:
+            history.append(error)
+        yield (history, "", progress, current_id, *unchanged_options())
+        return
+
+    if not turn_seen:
+        history.append({"role": "assistant", "content": "エラーが発生しました。もう一度お試しください。"})
+        yield (history, "", progress, current_id, *unchanged_options())
+
+
+async def handle_option(
+    option: str, history: Optional[List[Dict[str, str]]], session: str,
+    question_id: Optional[str]
+) -> AsyncIterator[Tuple[Any, ...]]:
+    """
+    Process an option click.
+
+    The reaction and the next question are rendered from the cached catalog
+    immediately, while the answer is submitted in the background. If the API
+    ends up somewhere else than predicted, its response replaces the
+    optimistic render.
+
+    Args:
+        option: The label of the clicked option
+        history: The current chat history
+        session: The session ID
+        question_id: The question currently shown
+
+    Yields:
+        Tuple: Updated chat history, empty message, progress indicator,
+        current question ID, and updates for the option row and buttons
+    """
+    question = catalog.get(question_id)
+    if (
+        question_id is None
+        or question is None
+        or option not in (question.get("options") or [])
+    ):
+        # The catalog cannot predict this turn, so stream it from the API
+        async for update in handle_message(option, history, session, question_id):
+            yield update
+        return
+
+    request = asyncio.create_task(send_message(option, session))
+
+    predicted = catalog.next_of(question_id)
+    predicted_id = predicted["question_id"] if predicted else None
+    parts = [catalog.reaction(question_id, option) or "ご回答ありがとうございます。"]
+    parts.append(catalog.render(predicted) if predicted else COMPLETION_MESSAGE)
+
+    history = list(history or [])
+    history.append({"role": "user", "content": option})
+    history.append({"role": "assistant", "content": "\n\n".join(parts)})
+    yield (
+        history, "", format_progress(catalog.progress(predicted_id)), predicted_id,
+        *option_updates(predicted.get("options") if predicted else [])
+    )
+
+    try:
+        response = await request
+    except (httpx.HTTPError, ValueError) as e:
+        # Roll back to the question that was answered
+        history[-1] = {"role": "assistant", "content": f"エラーが発生しました: {str(e)}。もう一度お試しください。"}
+        yield (
+            history, "", format_progress(catalog.progress(question_id)), question_id,
+            *option_updates(question.get("options"))
+        )
+        return
+
+    if not isinstance(response, dict) or "message" not in response:
+        return
+    server_id = response_question_id(response)
+    if server_id == predicted_id and (server_id is not None or response.get("completed")):
+        return
+
+    # The API disagrees with the prediction, so show what it actually returned
+    history[-1] = {"role": "assistant", "content": response["message"]}
+    yield (
+        history, "", format_progress(response.get("progress")), server_id,
+        *option_updates(response.get("options"))
+    )
+
+
+async def start_conversation() -> Tuple[Any, ...]:
+    """
+    Show the welcome message and the first question from the catalog.
+
+    Returns:
+        Tuple: Chat history, progress indicator, current question ID,
+        and updates for the option row and buttons
+    """
+    history = [{"role": "assistant", "content": WELCOME_MESSAGE}]
+    try:
+        await catalog.refresh(get_client())
+    except httpx.HTTPError:
+        # Without a catalog the UI falls back to free-text turns
+        pass
+
+    first = catalog.first()
+    if first is None:
+        return (history, "", None, *option_updates([]))
+
+    history.append({"role": "assistant", "content": catalog.render(first)})
+    return (
+        history, format_progress(catalog.progress(first["question_id"])), first["question_id"],
+        *option_updates(first.get("options"))
+    )
+
+
+async def restart_conversation() -> Tuple[Any, ...]:
+    """
+    Restart the conversation.
+
+    Returns:
+        Tuple: New session ID, and the welcome state from start_conversation
+    """
+    new_session = str(uuid.uuid4())
+    return (new_session, *(await start_conversation()))
+
+
 def create_chat_interface() -> gr.Blocks:
-    import sys
-    print("create_chat_interface: 開始", file=sys.stderr)
-    sys.stderr.flush()
     """
     Create the Gradio chat interface.
-    
+
     Returns:
         gr.Blocks: The Gradio interface
     """
-    print("create_chat_interface: gr.Blocks作成前", file=sys.stderr)
+    import sys
+    print("create_chat_interface: 開始", file=sys.stderr)
     sys.stderr.flush()
     with gr.Blocks(title="求人情報収集エージェント") as demo:
-        print("create_chat_interface: gr.Blocks作成後", file=sys.stderr)
-        sys.stderr.flush()
         # Session ID for the conversation
-        print("create_chat_interface: gr.State作成前", file=sys.stderr)
-        sys.stderr.flush()
         session_id = gr.State(lambda: str(uuid.uuid4()))
-        print("create_chat_interface: gr.State作成後", file=sys.stderr)
-        sys.stderr.flush()
-        
+
+        # ID of the question currently shown
+        question_state = gr.State(None)
+
         # Chat history
-        print("create_chat_interface: gr.Chatbot作成前", file=sys.stderr)
-        sys.stderr.flush()
         chatbot = gr.Chatbot(
             label="会話",
             height=400,
             type="messages",  # Use messages format instead of deprecated tuples format
         )
-        
+
         # Progress indicator
-        print("create_chat_interface: gr.Chatbot作成後, gr.Markdown作成前", file=sys.stderr)
-        sys.stderr.flush()
         progress_indicator = gr.Markdown(
             value="",
             label="進捗状況"
         )
-        
+
         # Message input
-        print("create_chat_interface: gr.Markdown作成後, gr.Textbox作成前", file=sys.stderr)
-        sys.stderr.flush()
         msg = gr.Textbox(
             placeholder="メッセージを入力してください...",
             label="メッセージ",
             scale=4
         )
-        
-        # Option buttons container
-        print("create_chat_interface: gr.Textbox作成後, gr.Row作成前", file=sys.stderr)
-        sys.stderr.flush()
-        option_container = gr.Row(visible=False)
-        option_buttons: List[gr.Button] = []
-        
-        # Function to handle option button clicks
-        def option_click(option: str, session: str) -> Tuple[List, str, str]:
-            """
-            Handle option button clicks.
-            
-            Args:
-                option: The selected option
-                session: The session ID
-                
-            Returns:
-                Tuple: Updated chatbot, empty message, and progress
-            """
-            # Send the option to the API
-            response = send_message(option, session)
-            
-            # Update the chatbot
-            history = chatbot.value.copy() if chatbot.value else []
-            history.append((option, response["message"]))
-            
-            # Update progress
-            progress = format_progress(response.get("progress"))
-            
-            # Update options
-            update_options(response.get("options", []))
-            
-            return history, "", progress
-
-        # Create option buttons (pre-create 5 buttons)
-        with option_container:
-            for i in range(5):
-                btn = gr.Button(f"Option {i+1}", visible=False)
-                option_buttons.append(btn)
-        
-        def update_options(options: List[str]) -> None:
-            """
-            Update the option buttons based on available options.
-            
-            Args:
-                options: List of option strings
-            """
-            # Hide all buttons first
-            for btn in option_buttons:
-                btn.visible = False
-            
-            # Show and update buttons for available options
-            if options:
-                option_container.visible = True
-                for i, option in enumerate(options[:5]):  # Limit to 5 options
-                    option_buttons[i].visible = True
-                    option_buttons[i].value = option
-                    
-                    # Update the click handler
-                    option_buttons[i].click(
-                        option_click,
-                        inputs=[gr.State(option), session_id],
-                        outputs=[chatbot, msg, progress_indicator]
-                    )
-            else:
-                option_container.visible = False
-
-        def send_message(message: str, session: str) -> Dict:
-            """
-            Send a message to the API.
-            
-            Args:
-                message: The message to send
-                session: The session ID
-                
-            Returns:
-                Dict: The API response
-            """
-            # Debug: Print session ID type and value
-            print(f"Debug - Session ID type: {type(session)}, value: {session}")
-            
-            # Ensure session_id is a string
-            session_str = str(session) if session is not None else str(uuid.uuid4())
-            
-            # Send the message to the API
-            payload = {"session_id": session_str, "message": message}
-            print(f"Debug - Payload: {payload}")
-            
-            response = requests.post(
-                API_URL,
-                json=payload
-            )
-            
-            # Debug: Print response status and content
-            print(f"Debug - Response status: {response.status_code}")
-            
-            # Return the response
-            return response.json()
-
-        def user_message(message: str, session: str) -> Tuple[List, str, str]:
-            """
-            Process a user message.
-            
-            Args:
-                message: The message to process
-                session: The session ID
-                
-            Returns:
-                Tuple: Updated chat history, empty message, and progress indicator
-            """
-            # Skip if message is empty
-            if not message:
-                return chatbot.value, "", progress_indicator.value
-            
-            # Send the message to the API
-            try:
-                response = send_message(message, session)
-                
-                # Debug: Print response
-                print(f"Debug - API Response: {response}")
-                
-                # Ensure response has a message key
-                if not isinstance(response, dict) or "message" not in response:
-                    print(f"Debug - Invalid response format: {response}")
-                    response = {"message": "エラーが発生しました。もう一度お試しください。"}
-                
-                # Update the chatbot (using messages format)
-                history = chatbot.value.copy() if chatbot.value else []
-                
-                # Add user message
-                history.append({"role": "user", "content": message})
-                
-                # Add assistant message
-                history.append({"role": "assistant", "content": response["message"]})
-                
-                # Update progress
-                progress = format_progress(response.get("progress"))
-                
-                # Update options
-                update_options(response.get("options", []))
-                
-                return history, "", progress
-            except Exception as e:
-                # Debug: Print exception
-                print(f"Debug - Exception in user_message: {str(e)}")
-                
-                # Update the chatbot with error message
-                history = chatbot.value.copy() if chatbot.value else []
-                history.append({"role": "user", "content": message})
-                history.append({"role": "assistant", "content": f"エラーが発生しました: {str(e)}。もう一度お試しください。"})
-                
-                return history, "", progress_indicator.value
+
+        # Option buttons (created once; labels are updated per turn)
+        with gr.Row(visible=False) as option_container:
+            option_buttons = [
+                gr.Button(f"Option {i+1}", visible=False) for i in range(MAX_OPTIONS)
+            ]
+
+        turn_outputs = [
+            chatbot, msg, progress_indicator, question_state, option_container, *option_buttons
+        ]
+        start_outputs = [
+            chatbot, progress_indicator, question_state, option_container, *option_buttons
+        ]
 
         # Set up the message submission
         msg.submit(
-            user_message,
-            inputs=[msg, session_id],
-            outputs=[chatbot, msg, progress_indicator]
+            handle_message,
+            inputs=[msg, chatbot, session_id, question_state],
+            outputs=turn_outputs
         )
-        
-        # Welcome message
-        gr.on(
-            triggers=[demo.load],
-            fn=lambda session: (
-                [
-                    {"role": "assistant", "content": "こんにちは！求人応募のための追加情報を教えてください。いつでもスキップと入力すると質問をスキップできます。"}
-                ],
-                format_progress({"current": 0, "total": 5})
-            ),
-            inputs=[session_id],
-            outputs=[chatbot, progress_indicator]
-        )
-        
+
+        # Each button sends its current label, so one handler per button is enough
+        for btn in option_buttons:
+            btn.click(
+                handle_option,
+                inputs=[btn, chatbot, session_id, question_state],
+                outputs=turn_outputs
+            )
+
+        # Welcome message and first question
+        demo.load(start_conversation, inputs=[], outputs=start_outputs)
+
         # Add a skip button
         skip_btn = gr.Button("この質問をスキップ")
         skip_btn.click(
-            user_message,
-            inputs=[gr.State("スキップ"), session_id],
-            outputs=[chatbot, msg, progress_indicator]
+            handle_message,
+            inputs=[gr.State("スキップ"), chatbot, session_id, question_state],
+            outputs=turn_outputs
         )
-        
+
         # Add a restart button
         restart_btn = gr.Button("会話をリスタート")
-        
-        def restart_conversation() -> Tuple[str, List, str]:
-            """
-            Restart the conversation.
-            
-            Returns:
-                Tuple: New session ID, empty chatbot, and empty progress
-            """
-            new_session = str(uuid.uuid4())
-            return new_session, [], ""
-        
         restart_btn.click(
             restart_conversation,
             inputs=[],
-            outputs=[session_id, chatbot, progress_indicator]
+            outputs=[session_id, *start_outputs]
         )
-        
+
     print("create_chat_interface: 終了", file=sys.stderr)
     sys.stderr.flush()
     return demo
@@ -295,7 +453,7 @@ def launch_ui() -> None:
         sys.stderr.flush()
         # 詳細なデバッグ情報を有効にして起動
         demo.launch(
-            server_name="0.0.0.0", 
+            server_name="0.0.0.0",
             server_port=7860,
             debug=True,
             quiet=False,
@@ -0,0 +1,106 @@
+"""
+セッション単位で削除できるチェックポインター
+
+LangGraph の MemorySaver.delete_thread は、書き込みとチャネル値のキーを全件走査して
+対象スレッドのものを探すため、セッション数に比例した時間がかかります。
+ここでは MemorySaver のコンストラクタの factory 引数で、キーをスレッドIDごとに索引する
+辞書を保存先として渡し、delete_thread では1セッション分のキーだけを削除します。
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set, Tuple, Union
+
+from langgraph.checkpoint.memory import MemorySaver
+
+# チェックポイントはスレッドID、書き込みとチャネル値は (スレッドID, ...) をキーとする
+CheckpointKey = Union[str, Tuple[Any, ...]]
+
+
+def thread_of(key: CheckpointKey) -> str:
+    """
+    キーのスレッドIDを返します。
+
+    Args:
+        key: 保存先のキー
+
+    Returns:
+        str: スレッドID
+    """
+    if isinstance(key, str):
+        return key
+    thread_id: str = key[0]
+    return thread_id
+
+
+class ThreadKeyedDict(defaultdict):
+    """
+    MemorySaver の保存先の辞書で、スレッドIDごとのキーの集合を合わせて保持するクラス
+    """
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.keys_by_thread: Dict[str, Set[CheckpointKey]] = defaultdict(set)
+
+    # MemorySaver は defaultdict 以外の factory の保存先をコンテキストマネージャとして扱う
+    def __enter__(self) -> "ThreadKeyedDict":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> Optional[bool]:
+        return None
+
+    def __setitem__(self, key: CheckpointKey, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.keys_by_thread[thread_of(key)].add(key)
+
+    def __delitem__(self, key: CheckpointKey) -> None:
+        super().__delitem__(key)
+        thread_id = thread_of(key)
+        keys = self.keys_by_thread.get(thread_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_thread[thread_id]
+
+    def delete_thread(self, thread_id: str) -> int:
+        """
+        スレッドのキーをすべて削除します。
+
+        Args:
+            thread_id: スレッドID
+
+        Returns:
+            int: 削除したキーの数
+        """
+        keys = self.keys_by_thread.pop(thread_id, set())
+        for key in keys:
+            super().__delitem__(key)
+        return len(keys)
+
+
+class ThreadIndexedMemorySaver(MemorySaver):
+    """
+    スレッドIDの索引を持つ MemorySaver（delete_thread がそのスレッドのキー数に比例する）
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        kwargs.setdefault("factory", ThreadKeyedDict)
+        super().__init__(**kwargs)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        スレッドのチェックポイント、書き込み、チャネル値を削除します。
+
+        Args:
+            thread_id: スレッドID
+        """
+        containers = [
+            container
+            for container in (self.storage, self.writes, self.blobs)
+            if isinstance(container, ThreadKeyedDict)
+        ]
+        if len(containers) < 3:
+            # 別の factory が渡された場合は MemorySaver の全件走査で削除する
+            super().delete_thread(thread_id)
+            return
+        for container in containers:
+            container.delete_thread(thread_id)
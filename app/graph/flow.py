@@ -1,14 +1,36 @@
 """
 固定質問フローの定義ファイル
 """
-from typing import Any, Dict
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
 from langgraph.graph.graph import END
-from langgraph.checkpoint.memory import MemorySaver
 
 # スキーマをインポート
+from app.config.settings import CONTROL_PHRASES_FILE, SKIP_KEYWORD
 from app.models.schemas import ConversationState, FixedQuestion
+from app.graph.checkpoint import ThreadIndexedMemorySaver
+from app.graph.prompt import BuiltPrompt, PromptBuilder
+from app.graph.transcript import (
+    KIND_NOTICE,
+    NOTICE_ANSWER_NOT_RECORDED,
+    NOTICE_COMPLETED,
+    NOTICE_DEFERRED,
+    NOTICE_INVALID_ANSWER,
+    NOTICE_QUESTION_NOT_FOUND,
+    NOTICE_QUIT,
+    NOTICE_SKIPPED,
+    TranscriptCatalog,
+    TranscriptEntry,
+    TranscriptRef,
+    get_catalog,
+    register_catalog,
+)
+from app.utils.intent_detector import INTENT_DEFER, INTENT_SKIP, IntentDetector, load_phrases
 
 # 固定質問リスト
 QUESTIONS = [
@@ -21,6 +43,12 @@ QUESTIONS = [
             "自営業": "自分のビジネスを経営されているのですね。次の質問に進みましょう。",
             "学生": "学業との両立、頑張ってくださいね。次の質問に進みましょう。",
             "その他": "承知しました。次の質問に進みましょう。"
+        },
+        aliases={
+            "会社員": ["かいしゃいん", "サラリーマン", "会社勤め", "正社員", "OL"],
+            "自営業": ["じえいぎょう", "個人事業主", "フリーランス", "経営者"],
+            "学生": ["がくせい", "大学生", "大学院生", "専門学校生"],
+            "その他": ["そのた", "無職", "主婦", "主夫"]
         }
     ),
     FixedQuestion(
@@ -32,6 +60,12 @@ QUESTIONS = [
             "マネジメント能力": "人をまとめる力は貴重なスキルです。最後の質問に進みましょう。",
             "起業・独立": "自分のビジョンを形にするのは素晴らしいことです。最後の質問に進みましょう。",
             "ワークライフバランス": "充実した人生のために大切な視点ですね。最後の質問に進みましょう。"
+        },
+        aliases={
+            "技術スキル向上": ["技術", "スキルアップ", "ぎじゅつ", "エンジニアリング"],
+            "マネジメント能力": ["マネジメント", "管理職", "まねじめんと", "リーダーシップ"],
+            "起業・独立": ["起業", "独立", "きぎょう", "どくりつ"],
+            "ワークライフバランス": ["ワークライフ", "わーくらいふばらんす", "仕事と生活の両立"]
         }
     ),
     FixedQuestion(
@@ -43,10 +77,19 @@ QUESTIONS = [
             "スキルトレーニング": "実践的なスキルを身につけることは重要です。ご回答ありがとうございました。",
             "ネットワーキング": "人脈は大切な資産になりますね。ご回答ありがとうございました。",
             "キャリアカウンセリング": "専門家のアドバイスで道が開けることもあります。ご回答ありがとうございました。"
+        },
+        aliases={
+            "メンタリング": ["メンター", "めんたりんぐ"],
+            "スキルトレーニング": ["トレーニング", "研修", "すきるとれーにんぐ"],
+            "ネットワーキング": ["人脈", "ねっとわーきんぐ", "交流会"],
+            "キャリアカウンセリング": ["カウンセリング", "キャリア相談", "きゃりあかうんせりんぐ"]
         }
     )
 ]
 
+# 同じセッションのメッセージを1つずつ処理するスレッドロックの数（API の SESSION_LOCK_STRIPES とは別）
+GRAPH_LOCK_STRIPES = 64
+
 
 class ConversationGraph:
     """
@@ -60,121 +103,137 @@ class ConversationGraph:
         # 質問リストの設定
         self.questions = QUESTIONS
         
+        # スキップ・あとで・やめるの制御フレーズはワークフローを実行せずに処理する
+        self.intents = IntentDetector(load_phrases(CONTROL_PHRASES_FILE))
+        
+        # LLM ノードに渡すプロンプトの組み立て（固定の接頭辞と、古い履歴の要約）
+        self.prompts = PromptBuilder()
+        
+        # 会話履歴の参照を解決するカタログ（新しいセッションはこのバージョンに固定される）
+        self.catalog = register_catalog(TranscriptCatalog(self.questions))
+        
         # ノード関数の定義
         self.workflow = self._create_workflow()
         
         # チェックポインターを設定
-        self.memory_saver = MemorySaver()
+        self.memory_saver = ThreadIndexedMemorySaver()
         
         # グラフをコンパイル
         self.compiled_workflow = self.workflow.compile(checkpointer=self.memory_saver)
+        
+        # process_batch で各ターンを実行するワークフロー（チェックポイントはセッションごとにまとめて書き込む）
+        self.batch_workflow = self.workflow.compile()
+        
+        # process_message はスレッドプールから呼ばれるため、セッションごとに直列化する
+        self._locks = [threading.Lock() for _ in range(GRAPH_LOCK_STRIPES)]
+    
+    def delete_session(self, session_id: str) -> None:
+        """
+        セッションのチェックポイントを削除します（期限切れのセッションの後始末用）。
+        
+        Args:
+            session_id: セッションID。
+        """
+        self.memory_saver.delete_thread(session_id)
+    
+    def _catalog_for(self, state: ConversationState) -> TranscriptCatalog:
+        """
+        セッションに固定されたバージョンのカタログを返します。
+        """
+        if state.catalog_version:
+            return get_catalog(state.catalog_version)
+        return self.catalog
     
     def _ask_question_node(self, state: ConversationState) -> Dict[str, Any]:
         """
         質問リストから現在の質問を取得します。
         """
-        current_question_id = state.current_question_id
-        current_question = None
-        
-        for question in self.questions:
-            if question.id == current_question_id:
-                current_question = question
-                break
-        
-        if not current_question:
-            return {
-                "messages": [
-                    {
-                        "role": "assistant",
-                        "content": "質問が見つかりませんでした。"
-                    }
-                ]
-            }
+        catalog = self._catalog_for(state)
         
+        # 質問文と選択肢はカタログへの参照として履歴に追加する
         return {
-            "messages": [
-                {
-                    "role": "assistant", 
-                    "content": f"{current_question.question}\n\n" + "\n".join([f"- {option}" for option in current_question.options])
-                }
-            ]
+            "messages": state.messages + [catalog.question_ref(state.current_question_id)],
+            "catalog_version": catalog.version
         }
     
+    def _last_user_entry(self, state: ConversationState) -> Optional[TranscriptEntry]:
+        """
+        履歴から最新のユーザーメッセージを返します。
+        """
+        catalog = self._catalog_for(state)
+        for entry in reversed(state.messages):
+            if catalog.role(entry) == "user":
+                return entry
+        return None
+    
+    def _answer_ref(self, catalog: TranscriptCatalog, state: ConversationState,
+                    entry: TranscriptEntry) -> Optional[TranscriptRef]:
+        """
+        最新のユーザーのメッセージが回答した選択肢の参照を返します。
+        選択肢と一致した回答は履歴の参照、対応付けた自由記述の回答は状態の matched_answer です。
+        """
+        if isinstance(entry, tuple) and catalog.is_answer(entry):
+            return entry
+        return state.matched_answer
+    
     def _record_answer_node(self, state: ConversationState) -> Dict[str, Any]:
         """
         ユーザーの回答を記録します。LLMは使用しません。
+        現在の質問の選択肢と一致する回答、または選択肢に対応付けた回答のみ記録し、それ以外の場合は同じ質問に留まります。
         """
-        messages = state.messages
-        last_user_msg = None
-        
-        # 最新のユーザーメッセージを見つける
-        for msg in reversed(messages):
-            if msg["role"] == "user":
-                last_user_msg = msg["content"]
-                break
-        
-        if not last_user_msg:
-            return {"messages": messages}
-        
-        # 回答を記録
-        state.answers[state.current_question_id] = last_user_msg
-        
-        # 次の質問のIDを設定するか、完了フラグをセット
-        next_question_id = None
-        
-        # 単純な順序で次の質問を選択
-        if state.current_question_id == "q1":
-            next_question_id = "q2"
-        elif state.current_question_id == "q2":
-            next_question_id = "q3"
+        catalog = self._catalog_for(state)
+        entry = self._last_user_entry(state)
+        if entry is None or state.completed:
+            return {}
+        
+        answers = state.answers
+        answer = self._answer_ref(catalog, state, entry)
+        if catalog.text(entry) == SKIP_KEYWORD:
+            # スキップの場合は回答を記録せずに次の質問へ進む
+            pass
+        elif answer is not None:
+            answers = {**state.answers, state.current_question_id: catalog.text(answer)}
         else:
-            # q3が最後の質問
-            state.completed = True
-        
-        if next_question_id:
-            state.current_question_id = next_question_id
+            return {}
         
-        return {"messages": messages}
+        update = {"answers": answers, **self._next_question(catalog, state)}
+        # 呼び出し元の状態にも反映する（ノードを直接呼ぶテストや後続の処理が参照する）
+        for key, value in update.items():
+            setattr(state, key, value)
+        return update
+    
+    def _next_question(self, catalog: TranscriptCatalog, state: ConversationState) -> Dict[str, Any]:
+        """
+        カタログの順序で次の質問を選択し、最後の質問の場合は完了フラグをセットする更新を返します。
+        """
+        index = catalog.question_index(state.current_question_id)
+        if index is not None and index + 1 < len(catalog.questions):
+            return {"current_question_id": catalog.questions[index + 1].id}
+        return {"completed": True}
     
     def _fixed_reaction_node(self, state: ConversationState) -> Dict[str, Any]:
         """
         選択内容に紐付く固定メッセージを返します。
         """
-        current_question_id = state.current_question_id
-        last_question_id = state.current_question_id
+        catalog = self._catalog_for(state)
+        entry = self._last_user_entry(state)
+        answer = self._answer_ref(catalog, state, entry) if entry is not None else None
+        
+        if entry is None:
+            reactions = [catalog.ref(KIND_NOTICE, NOTICE_ANSWER_NOT_RECORDED)]
+        elif catalog.text(entry) == SKIP_KEYWORD:
+            reactions = [catalog.ref(KIND_NOTICE, NOTICE_SKIPPED)]
+        elif answer is None:
+            # 選択肢にない回答は記録せず、同じ質問を聞き直す
+            reactions = [catalog.ref(KIND_NOTICE, NOTICE_INVALID_ANSWER)]
+        else:
+            # 反応メッセージはカタログへの参照として履歴に追加する
+            question = catalog.questions[answer[1]]
+            reactions = [catalog.reaction_ref(question.id, catalog.text(answer))]
         
-        # 完了している場合は最後の質問IDを取得
         if state.completed:
-            # 最後に回答された質問のIDを取得
-            last_question_keys = list(state.answers.keys())
-            if last_question_keys:
-                last_question_id = last_question_keys[-1]
-        
-        # 該当する質問を取得
-        question = None
-        for q in self.questions:
-            if q.id == last_question_id:
-                question = q
-                break
-        
-        if not question:
-            return {
-                "messages": state.messages + [{"role": "assistant", "content": "質問が見つかりませんでした。"}]
-            }
-        
-        # 回答を取得
-        answer = state.answers.get(last_question_id)
-        if not answer:
-            return {
-                "messages": state.messages + [{"role": "assistant", "content": "回答が記録されていません。"}]
-            }
-        
-        # 反応メッセージを取得
-        reaction = question.reactions.get(answer, "ご回答ありがとうございます。")
-        
-        return {
-            "messages": state.messages + [{"role": "assistant", "content": reaction}]
-        }
+            reactions.append(catalog.ref(KIND_NOTICE, NOTICE_COMPLETED))
+        return {"messages": state.messages + reactions}
     
     # 拡張フェーズIで追加予定の深堀り質問判定ノード
     def _decide_deep_dive_node(self, state: ConversationState) -> ConversationState:
@@ -234,7 +293,7 @@ class ConversationGraph:
         # 現在は深堀りなしにする
         return state
 
-    def _create_workflow(self):
+    def _create_workflow(self) -> StateGraph:
         """
         固定質問フローのワークフローを作成します。
         """
@@ -249,12 +308,12 @@ class ConversationGraph:
         # builder.add_node("deep_dive_trigger", self._decide_deep_dive_node)
         # builder.add_node("ask_follow_up", self._ask_follow_up_node)
         
-        # 開始ノードの設定
-        builder.set_entry_point("ask_question")
+        # 開始ノードの設定（1回の実行でユーザーのメッセージ1件を処理する）
+        builder.set_entry_point("record_answer")
         
         # エッジの追加
-        builder.add_edge("ask_question", "record_answer")
         builder.add_edge("record_answer", "fixed_reaction")
+        builder.add_edge("ask_question", END)
         
         # 拡張フェーズIで変更予定の条件分岐設定
         # builder.remove_edge("record_answer", "fixed_reaction")
@@ -283,49 +342,243 @@ class ConversationGraph:
         
         return builder
     
-    def process_message(self, session_id: str, message: str) -> Dict[str, Any]:
+    def _config(self, session_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": session_id}}
+    
+    def get_state(self, session_id: str) -> Optional[ConversationState]:
+        """
+        チェックポイントからセッションの最新の会話状態を返します。
+        
+        Args:
+            session_id: セッションID。
+            
+        Returns:
+            会話状態。セッションが存在しない場合はNone。
+        """
+        values = self.compiled_workflow.get_state(self._config(session_id)).values
+        if not values:
+            return None
+        state = ConversationState(**values)
+        # チェックポイントの直列化で参照のタプルはリストになり、検証で新しいタプルになるため、共有の参照に戻す
+        catalog = self._catalog_for(state)
+        state.messages = [
+            catalog.ref(*entry) if isinstance(entry, tuple) else entry for entry in state.messages
+        ]
+        return state
+    
+    def _new_state(self) -> ConversationState:
+        """
+        新しいセッションの会話状態を、最初の質問を提示済みの状態で作成します。
+        """
+        first_question_id = self.questions[0].id
+        return ConversationState(
+            current_question_id=first_question_id,
+            messages=[self.catalog.question_ref(first_question_id)],
+            answers={},
+            completed=False,
+            catalog_version=self.catalog.version
+        )
+    
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        return self._locks[zlib.crc32(session_id.encode("utf-8")) % GRAPH_LOCK_STRIPES]
+    
+    def _run_turn(self, workflow: Any, state: ConversationState, message: str,
+                  config: Optional[RunnableConfig] = None) -> Tuple[ConversationState, Dict[str, Any]]:
+        """
+        メッセージ1件分のワークフローを実行し、更新後の会話状態と応答を返します。
+        """
+        catalog = self._catalog_for(state)
+        if state.completed:
+            return state, self._response(catalog, state, [catalog.ref(KIND_NOTICE, NOTICE_COMPLETED)], None)
+        
+        intent = self.intents.detect(message)
+        if intent is not None:
+            state, response = self._control_turn(catalog, state, message, intent)
+            if config is not None:
+                self.compiled_workflow.update_state(config, state.model_dump(), as_node="ask_question")
+            return state, response
+        
+        # ユーザーのメッセージをステートに追加（選択肢と一致する場合はカタログへの参照）
+        entry = catalog.user_entry(state.current_question_id, message)
+        messages = state.messages + [entry]
+        # 選択肢と一致しないメッセージは入力のまま履歴に残し、対応付けた選択肢は状態に持つ
+        matched = catalog.match_answer(state.current_question_id, message) if isinstance(entry, str) else None
+        
+        # ワークフロー実行
+        result = ConversationState(**workflow.invoke({
+            "messages": messages,
+            "current_question_id": state.current_question_id,
+            "answers": state.answers,
+            "completed": state.completed,
+            "catalog_version": catalog.version,
+            "matched_answer": matched
+        }, config))
+        
+        answered = state.current_question_id if result.current_question_id != state.current_question_id \
+            or result.completed else None
+        return result, self._response(catalog, result, result.messages[len(messages):], answered)
+    
+    def _control_turn(self, catalog: TranscriptCatalog, state: ConversationState, message: str,
+                      intent: str) -> Tuple[ConversationState, Dict[str, Any]]:
+        """
+        制御フレーズのメッセージを処理します（ワークフローは実行しません）。
+        スキップは回答を記録せずに次の質問へ進め、あとで・やめるは状態を変えずに定型メッセージを返します。
+        やめた場合も、次のメッセージから同じ質問を再開できます。
+        """
+        messages = state.messages + [message]
+        answered = None
+        if intent == INTENT_SKIP:
+            answered = state.current_question_id
+            update = self._next_question(catalog, state)
+            entries = [catalog.ref(KIND_NOTICE, NOTICE_SKIPPED)]
+            if update.get("completed"):
+                entries.append(catalog.ref(KIND_NOTICE, NOTICE_COMPLETED))
+            else:
+                entries.append(catalog.question_ref(update["current_question_id"]))
+        else:
+            update = {}
+            entries = [catalog.ref(KIND_NOTICE, NOTICE_DEFERRED if intent == INTENT_DEFER else NOTICE_QUIT)]
+        
+        result = state.model_copy(update={**update, "messages": messages + entries})
+        return result, self._response(catalog, result, entries, answered, intent)
+    
+    def detect_intent(self, message: str) -> Optional[str]:
+        """
+        メッセージが制御フレーズ（スキップ・あとで・やめる）かどうかを判定します。
+        
+        Args:
+            message: ユーザーからのメッセージ内容。
+            
+        Returns:
+            意図（skip / defer / quit）。制御フレーズでない場合はNone。
+        """
+        return self.intents.detect(message)
+    
+    def process_message(self, session_id: str, message: str,
+                        check: Optional[Callable[[ConversationState], None]] = None) -> Dict[str, Any]:
         """
         ユーザーからのメッセージを処理し、固定質問フローの応答を返します。
+        同じセッションのメッセージは1つずつ処理するため、複数のスレッドから呼び出せます。
 
         Args:
             session_id: セッションID。
             message: ユーザーからのメッセージ内容。
+            check: ターンを実行する前の会話状態を受け取る関数。例外を送出した場合はターンを実行せず、
+                チェックポイントも変更しません（呼び出し元の状態との食い違いの確認用）。
 
         Returns:
-            固定質問フローの応答メッセージを含む辞書。
-        """
-        # 既存のセッション状態を取得するか、新しいセッションを初期化
-        state = self.memory_saver.get(session_id, None)
-        
-        if state is None:
-            # 新しいセッションの場合は初期状態を設定
-            state = ConversationState(
-                current_question_id="q1",
-                messages=[],
-                answers={},
-                completed=False
+            固定質問フローの応答を含む辞書（message, completed, question_id, options, progress,
+            制御フレーズの場合はその intent と、このメッセージで回答またはスキップした質問の answered_question_id）。
+        """
+        with self._lock_for(session_id):
+            # 既存のセッション状態を取得するか、新しいセッションを初期化
+            state = self.get_state(session_id) or self._new_state()
+            if check is not None:
+                check(state)
+            _, response = self._run_turn(self.compiled_workflow, state, message, self._config(session_id))
+        return response
+    
+    def restore_state(self, session_id: str, state: ConversationState) -> None:
+        """
+        セッションの会話状態を、ターンを実行する前の状態に戻します（ターンの結果を呼び出し元で記録できなかった場合用）。
+        
+        Args:
+            session_id: セッションID。
+            state: process_message の check に渡された、ターンを実行する前の会話状態。
+        """
+        with self._lock_for(session_id):
+            self.compiled_workflow.update_state(self._config(session_id), state.model_dump(), as_node="ask_question")
+    
+    def build_prompt(self, session_id: str, message: Optional[str] = None) -> Optional[BuiltPrompt]:
+        """
+        セッションの LLM 用のプロンプトを組み立て、要約とトークン数の累計をチェックポイントに書き込みます。
+        
+        Args:
+            session_id: セッションID。
+            message: 今回のユーザーのメッセージ（履歴に追加済みの場合は省略）。
+            
+        Returns:
+            プロンプトとトークン数の内訳。セッションが存在しない場合はNone。
+        """
+        with self._lock_for(session_id):
+            state = self.get_state(session_id)
+            if state is None:
+                return None
+            prompt, update = self.prompts.build(self._catalog_for(state), state, message)
+            update["prompt_tokens"] = state.prompt_tokens + prompt.total_tokens
+            self.compiled_workflow.update_state(self._config(session_id), update, as_node="ask_question")
+        return prompt
+    
+    def _process_session(self, session_id: str, messages: List[str]) -> List[Dict[str, Any]]:
+        """
+        1セッション分のメッセージを順に処理し、最後の状態だけをチェックポイントに書き込みます。
+        """
+        with self._lock_for(session_id):
+            state = self.get_state(session_id) or self._new_state()
+            responses = []
+            for message in messages:
+                state, response = self._run_turn(self.batch_workflow, state, message)
+                responses.append(response)
+            # 各ターンの実行は ask_question（または END）で終わるため、そのノードの出力として書き込む
+            self.compiled_workflow.update_state(
+                self._config(session_id), state.model_dump(), as_node="ask_question"
             )
+        return responses
+    
+    def process_batch(self, items: Sequence[Tuple[str, str]], max_workers: int = 4) -> List[Dict[str, Any]]:
+        """
+        多数の (セッションID, メッセージ) をまとめて処理します（会話の再生や回帰テストなどのオフライン処理用）。
         
-        # ユーザーのメッセージをステートに追加
-        state.messages.append({"role": "user", "content": message})
+        メッセージはセッションごとにまとめ、入力の順に処理します。セッションの状態の読み込みと
+        チェックポイントへの書き込みはセッションごとに1回だけ行い、各ターンはチェックポインターを
+        持たないワークフローで実行します。異なるセッションはスレッドプールで並行に処理します。
         
-        # ワークフロー実行
-        result = self.compiled_workflow.invoke({
-            "messages": state.messages,
-            "current_question_id": state.current_question_id,
-            "answers": state.answers,
-            "completed": state.completed
-        }, {"configurable": {"session_id": session_id}})
+        Args:
+            items: (セッションID, メッセージ) のリスト。
+            max_workers: 並行に処理するセッション数の上限。1の場合は呼び出し元のスレッドで処理します。
+            
+        Returns:
+            process_message と同じ形式の応答のリスト（入力と同じ順序）。
+        """
+        positions: Dict[str, List[int]] = {}
+        for position, (session_id, _) in enumerate(items):
+            positions.setdefault(session_id, []).append(position)
+        
+        def run(session_id: str) -> List[Dict[str, Any]]:
+            return self._process_session(session_id, [items[p][1] for p in positions[session_id]])
         
-        # 最後のアシスタントのメッセージを取得
-        last_message = ""
-        if result["messages"]:
-            for msg in reversed(result["messages"]):
-                if msg["role"] == "assistant":
-                    last_message = msg["content"]
-                    break
+        session_results: Iterable[List[Dict[str, Any]]]
+        if max_workers <= 1 or len(positions) <= 1:
+            session_results = map(run, positions)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                session_results = list(pool.map(run, positions))
+        results: Dict[int, Dict[str, Any]] = {}
+        for session_id, responses in zip(positions, session_results):
+            for position, response in zip(positions[session_id], responses):
+                results[position] = response
+        return [results[position] for position in range(len(items))]
+    
+    def _response(self, catalog: TranscriptCatalog, state: ConversationState, entries: list,
+                  answered_question_id: Optional[str], intent: Optional[str] = None) -> Dict[str, Any]:
+        """
+        このターンに追加されたアシスタントのメッセージと、現在の質問から応答を作成します。
+        """
+        total = len(catalog.questions)
+        if state.completed:
+            question_id, options, current = None, [], total
+        else:
+            question_id = state.current_question_id
+            index = catalog.question_index(question_id)
+            options = list(catalog.questions[index].options) if index is not None else []
+            current = index if index is not None else total
         
         return {
-            "message": last_message,
-            "completed": result["completed"]
+            "message": "\n\n".join(catalog.text(entry) for entry in entries if catalog.role(entry) == "assistant"),
+            "completed": state.completed,
+            "question_id": question_id,
+            "options": options,
+            "progress": {"current": current, "total": total},
+            "intent": intent,
+            "answered_question_id": answered_question_id
         }
@@ -0,0 +1,284 @@
+"""
+LLM ノードに渡すプロンプトの組み立て
+
+会話履歴をすべて毎ターン送ると、トークン数とレイテンシがセッションの長さに比例して増えます。
+PromptBuilder はプロンプトを次の順に組み立てます。
+
+    1. 固定の接頭辞: システムプロンプトと質問カタログ（カタログのバージョンごとに一度だけ作成し、
+       以降は同じ文字列を使うため、プロバイダー側のプロンプトキャッシュが効く）
+    2. 要約: MAX_HISTORY_LENGTH より古い履歴を要約したもの
+    3. 直近の履歴: 最大 MAX_HISTORY_LENGTH 件
+    4. 今回のユーザーのメッセージ
+
+古い履歴は1件ずつではなく max_history の半分ずつまとめて要約に移すため、要約（とその後ろの履歴の
+先頭）が変わるのは数ターンに1回です。要約は前回の要約と新しく移す履歴だけから作り直します。
+要約と要約済みの件数は会話状態（ConversationState）に保持します。
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.config.settings import LLM_MODEL, MAX_HISTORY_LENGTH, PROMPT_TOKENIZER
+from app.graph.transcript import TranscriptCatalog
+from app.models.schemas import ConversationState
+
+SYSTEM_PROMPT = (
+    "あなたはキャリアに関するインタビューを行うアシスタントです。"
+    "以下の質問カタログの順に質問し、ユーザーの回答を選択肢に沿って受け止めてください。"
+    "回答を誘導したり、カタログにない質問をしたりしないでください。"
+)
+
+# 要約の最大文字数（超えた場合は古い行から削る）
+SUMMARY_MAX_CHARS = 600
+
+# 要約に残す1件あたりの最大文字数
+SUMMARY_LINE_CHARS = 80
+
+# 1メッセージあたりの書式のトークン数（OpenAI の Chat Completions の目安）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 要約の1行（同じ行が続いた回数の表記を含む）
+_REPEATED = re.compile(r"(.*?)(?:（×(\d+)）)?")
+
+# 会話の1件: (role, content)
+Turn = Tuple[str, str]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数を見積もります（ASCII は約4文字で1トークン、それ以外は1文字1トークン）。
+
+    Args:
+        text: 文字列
+
+    Returns:
+        int: 推定トークン数
+    """
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+
+def create_token_counter(
+    tokenizer: str = PROMPT_TOKENIZER, model: str = LLM_MODEL
+) -> Callable[[str], int]:
+    """
+    トークン数を数える関数を返します。
+
+    Args:
+        tokenizer: "tiktoken"（モデルのエンコーディングで数える）または "estimate"（見積もり）
+        model: tiktoken のエンコーディングを選ぶモデル名
+
+    Returns:
+        Callable[[str], int]: トークン数を返す関数
+
+    Raises:
+        ValueError: 不明な tokenizer が指定された場合
+    """
+    if tokenizer == "estimate":
+        return estimate_tokens
+    if tokenizer == "tiktoken":
+        # tiktoken は任意依存（初回はエンコーディングのダウンロードが必要）
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text))
+    raise ValueError(f"不明なトークナイザーです: {tokenizer}")
+
+
+def extractive_summary(previous: str, turns: Sequence[Turn]) -> str:
+    """
+    前回の要約に、要約に移すユーザーのメッセージを1行ずつ追記します（LLM を使わない既定の要約）。
+    固定フローのアシスタントのメッセージは接頭辞のカタログから再現できるため残さず、
+    同じメッセージが続く場合は回数だけを残します。
+
+    Args:
+        previous: 前回の要約
+        turns: 要約に移す履歴
+
+    Returns:
+        str: 新しい要約（SUMMARY_MAX_CHARS を超えた分は古い行から削る）
+    """
+    lines = previous.split("\n") if previous else []
+    for role, content in turns:
+        if role != "user":
+            continue
+        first_line = content.strip().split("\n", 1)[0]
+        line = f"ユーザー: {first_line[:SUMMARY_LINE_CHARS]}"
+        match = _REPEATED.fullmatch(lines[-1]) if lines else None
+        if match and match.group(1) == line:
+            lines[-1] = f"{line}（×{int(match.group(2) or 1) + 1}）"
+        else:
+            lines.append(line)
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class BuiltPrompt(NamedTuple):
+    """
+    組み立てたプロンプトとトークン数の内訳
+    """
+
+    messages: List[Dict[str, str]]
+    prefix_tokens: int
+    summary_tokens: int
+    history_tokens: int
+    message_tokens: int
+    prefix_hash: str
+
+    @property
+    def total_tokens(self) -> int:
+        return (
+            self.prefix_tokens
+            + self.summary_tokens
+            + self.history_tokens
+            + self.message_tokens
+        )
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        トークン数の内訳を返します（prefix はプロンプトキャッシュの対象）。
+        """
+        return {
+            "prefix_tokens": self.prefix_tokens,
+            "summary_tokens": self.summary_tokens,
+            "history_tokens": self.history_tokens,
+            "message_tokens": self.message_tokens,
+            "total_tokens": self.total_tokens,
+            "prefix_hash": self.prefix_hash,
+        }
+
+
+class PromptBuilder:
+    """
+    固定の接頭辞・要約・直近の履歴からプロンプトを組み立てるクラス
+    """
+
+    def __init__(
+        self,
+        system_prompt: str = SYSTEM_PROMPT,
+        max_history: int = MAX_HISTORY_LENGTH,
+        summarize: Callable[[str, Sequence[Turn]], str] = extractive_summary,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        """
+        プロンプトの組み立てを作成します。
+
+        Args:
+            system_prompt: システムプロンプト
+            max_history: 要約せずに送る履歴の最大件数
+            summarize: (前回の要約, 要約に移す履歴) から新しい要約を作る関数
+            count_tokens: トークン数を数える関数（省略時は PROMPT_TOKENIZER の設定に従う）
+        """
+        self.system_prompt = system_prompt
+        self.max_history = max(1, max_history)
+        self.summarize = summarize
+        # 質問文やリアクションは何度も現れるため、トークン数をキャッシュする
+        self._count = lru_cache(maxsize=4096)(count_tokens or create_token_counter())
+        # カタログのバージョンごとの (接頭辞, トークン数, ハッシュ)
+        self._prefixes: Dict[str, Tuple[str, int, str]] = {}
+
+    def _prefix(self, catalog: TranscriptCatalog) -> Tuple[str, int, str]:
+        """
+        システムプロンプトと質問カタログの接頭辞を返します（カタログのバージョンごとに一度だけ作成）。
+        """
+        cached = self._prefixes.get(catalog.version)
+        if cached is not None:
+            return cached
+        lines = [
+            self.system_prompt,
+            "",
+            f"# 質問カタログ（バージョン {catalog.version}）",
+        ]
+        for question in catalog.questions:
+            lines.append(
+                f"- {question.id}: {question.question}（選択肢: {' / '.join(question.options)}）"
+            )
+        text = "\n".join(lines)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        cached = (text, self._count(text) + MESSAGE_OVERHEAD_TOKENS, digest)
+        self._prefixes[catalog.version] = cached
+        return cached
+
+    def _turns(self, catalog: TranscriptCatalog, entries: Sequence[Any]) -> List[Turn]:
+        return [(catalog.role(entry), catalog.text(entry)) for entry in entries]
+
+    def fold(
+        self, catalog: TranscriptCatalog, state: ConversationState
+    ) -> Dict[str, Any]:
+        """
+        max_history を超えた古い履歴を要約に移す、会話状態の更新を返します。
+
+        Args:
+            catalog: セッションのカタログ
+            state: 会話状態
+
+        Returns:
+            Dict[str, Any]: summary と summarized_messages の更新（移す履歴がない場合は空）
+        """
+        start = min(state.summarized_messages, len(state.messages))
+        overflow = len(state.messages) - start - self.max_history
+        if overflow <= 0:
+            return {}
+        # 毎ターン要約を変えないように、max_history の半分ずつまとめて移す
+        chunk = max(1, self.max_history // 2)
+        end = start + -(-overflow // chunk) * chunk
+        summary = self.summarize(
+            state.summary, self._turns(catalog, state.messages[start:end])
+        )
+        return {"summary": summary, "summarized_messages": end}
+
+    def build(
+        self,
+        catalog: TranscriptCatalog,
+        state: ConversationState,
+        message: Optional[str] = None,
+    ) -> Tuple[BuiltPrompt, Dict[str, Any]]:
+        """
+        プロンプトを組み立てます。
+
+        Args:
+            catalog: セッションのカタログ
+            state: 会話状態
+            message: 今回のユーザーのメッセージ（履歴に追加済みの場合は省略）
+
+        Returns:
+            Tuple[BuiltPrompt, Dict[str, Any]]: プロンプトと、会話状態の更新（要約と要約済みの件数）
+        """
+        update = self.fold(catalog, state)
+        summary = update.get("summary", state.summary)
+        start = update.get("summarized_messages", state.summarized_messages)
+
+        prefix, prefix_tokens, prefix_hash = self._prefix(catalog)
+        messages = [{"role": "system", "content": prefix}]
+
+        summary_tokens = 0
+        if summary:
+            content = f"これまでの会話の要約:\n{summary}"
+            messages.append({"role": "system", "content": content})
+            summary_tokens = self._count(content) + MESSAGE_OVERHEAD_TOKENS
+
+        history_tokens = 0
+        for role, content in self._turns(catalog, state.messages[start:]):
+            messages.append({"role": role, "content": content})
+            history_tokens += self._count(content) + MESSAGE_OVERHEAD_TOKENS
+
+        message_tokens = 0
+        if message is not None:
+            messages.append({"role": "user", "content": message})
+            message_tokens = self._count(message) + MESSAGE_OVERHEAD_TOKENS
+
+        prompt = BuiltPrompt(
+            messages,
+            prefix_tokens,
+            summary_tokens,
+            history_tokens,
+            message_tokens,
+            prefix_hash,
+        )
+        return prompt, update
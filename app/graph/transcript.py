@@ -0,0 +1,255 @@
+"""
+会話履歴をカタログへの参照として保持するための定義
+
+アシスタントのメッセージ（質問文と選択肢、選択肢ごとのリアクション）はカタログの文字列と
+同じ内容のため、セッションごとに文字列を複製せず、(種別, 質問インデックス, 選択肢インデックス)
+の参照として保持します。参照のタプルはカタログごとに共有されるため、履歴1件あたりの
+コストはリストの要素1つ分だけです。ユーザーの自由記述のみ文字列のまま保持します。
+
+参照はセッションに固定されたバージョンのカタログで、表示時に文字列へ解決します。
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Sequence
+
+from app.models.schemas import FixedQuestion, TranscriptEntry, TranscriptRef
+from app.utils.option_matcher import OptionMatcher
+
+# 参照の種別
+KIND_QUESTION = 0  # 質問文と選択肢（アシスタント）
+KIND_REACTION = 1  # 選択肢ごとのリアクション（アシスタント）
+KIND_ANSWER = 2  # 選択肢による回答（ユーザー）
+KIND_NOTICE = 3  # 定型メッセージ（アシスタント）
+
+# 定型メッセージ（参照の質問インデックスの位置に番号を入れる）
+NOTICE_QUESTION_NOT_FOUND = 0
+NOTICE_ANSWER_NOT_RECORDED = 1
+NOTICE_DEFAULT_REACTION = 2
+NOTICE_INVALID_ANSWER = 3
+NOTICE_SKIPPED = 4
+NOTICE_COMPLETED = 5
+NOTICE_DEFERRED = 6
+NOTICE_QUIT = 7
+# 既存の履歴の参照が変わらないように、新しいメッセージは末尾に追加する
+NOTICES = [
+    "質問が見つかりませんでした。",
+    "回答が記録されていません。",
+    "ご回答ありがとうございます。",
+    "選択肢の中から選んでください。",
+    "この質問をスキップしました。",
+    "すべての質問に回答いただき、ありがとうございました。",
+    "承知しました。続きはいつでもこの質問から再開できます。",
+    "インタビューを中断しました。ご協力ありがとうございました。",
+]
+
+# 履歴の1件: カタログへの参照、またはユーザーの自由記述（型は app.models.schemas で定義）
+
+
+class TranscriptCatalog:
+    """
+    固定質問リストの1バージョンと、その参照の解決を扱うクラス
+    """
+
+    def __init__(self, questions: Sequence[FixedQuestion]) -> None:
+        """
+        カタログを作成します。
+
+        Args:
+            questions: 固定質問リスト
+        """
+        self.questions: List[FixedQuestion] = list(questions)
+        self.version = hashlib.sha256(
+            json.dumps(
+                [q.model_dump() for q in self.questions],
+                ensure_ascii=False,
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()[:16]
+        self._question_index: Dict[str, int] = {
+            q.id: i for i, q in enumerate(self.questions)
+        }
+        self._option_index: List[Dict[str, int]] = [
+            {option: i for i, option in enumerate(q.options)} for q in self.questions
+        ]
+        self._refs: Dict[TranscriptRef, TranscriptRef] = {}
+        # 自由記述の回答を選択肢に対応付けるマッチャー（カタログのバージョンごとに一度だけ作成する）
+        self.matcher = OptionMatcher(self.questions)
+
+    def question_index(self, question_id: str) -> Optional[int]:
+        return self._question_index.get(question_id)
+
+    def option_index(self, question_index: int, option: str) -> Optional[int]:
+        return self._option_index[question_index].get(option)
+
+    def ref(
+        self, kind: int, question_index: int = -1, option_index: int = -1
+    ) -> TranscriptRef:
+        """
+        参照を返します。同じ参照には常に同じタプルを返すため、セッション間で共有されます。
+
+        Args:
+            kind: 参照の種別
+            question_index: 質問インデックス（定型メッセージの場合はメッセージ番号）
+            option_index: 選択肢インデックス
+
+        Returns:
+            TranscriptRef: 共有される参照のタプル
+        """
+        key = (kind, question_index, option_index)
+        return self._refs.setdefault(key, key)
+
+    def question_ref(self, question_id: str) -> TranscriptRef:
+        index = self.question_index(question_id)
+        if index is None:
+            return self.ref(KIND_NOTICE, NOTICE_QUESTION_NOT_FOUND)
+        return self.ref(KIND_QUESTION, index)
+
+    def reaction_ref(self, question_id: str, answer: str) -> TranscriptRef:
+        index = self.question_index(question_id)
+        if index is None:
+            return self.ref(KIND_NOTICE, NOTICE_QUESTION_NOT_FOUND)
+        option_index = self.option_index(index, answer)
+        if option_index is None or answer not in self.questions[index].reactions:
+            return self.ref(KIND_NOTICE, NOTICE_DEFAULT_REACTION)
+        return self.ref(KIND_REACTION, index, option_index)
+
+    def user_entry(self, question_id: str, message: str) -> TranscriptEntry:
+        """
+        ユーザーのメッセージを履歴の1件に変換します。
+        現在の質問の選択肢と完全に一致する場合はその選択肢の参照、それ以外は文字列のまま返します
+        （「会社員です」のように対応付けた回答も、ユーザーの入力のまま残す。match_answer を参照）。
+
+        Args:
+            question_id: 現在の質問ID
+            message: ユーザーのメッセージ
+
+        Returns:
+            TranscriptEntry: 履歴の1件
+        """
+        index = self.question_index(question_id)
+        if index is not None:
+            option_index = self.option_index(index, message)
+            if option_index is not None:
+                return self.ref(KIND_ANSWER, index, option_index)
+        return message
+
+    def match_answer(self, question_id: str, message: str) -> Optional[TranscriptRef]:
+        """
+        選択肢と一致しないメッセージを、「会社員です」のように対応付けられる選択肢の参照に変換します。
+
+        Args:
+            question_id: 現在の質問ID
+            message: ユーザーのメッセージ
+
+        Returns:
+            Optional[TranscriptRef]: 選択肢による回答の参照。対応付けられない場合はNone
+        """
+        index = self.question_index(question_id)
+        if index is None:
+            return None
+        option = self.matcher.match(question_id, message).option
+        option_index = self.option_index(index, option) if option is not None else None
+        return (
+            self.ref(KIND_ANSWER, index, option_index)
+            if option_index is not None
+            else None
+        )
+
+    def text(self, entry: TranscriptEntry) -> str:
+        """
+        履歴の1件を文字列に解決します。
+
+        Args:
+            entry: 履歴の1件
+
+        Returns:
+            str: メッセージの本文
+        """
+        if isinstance(entry, str):
+            return entry
+        if isinstance(entry, dict):
+            return entry.get("content", "")
+        kind, question_index, option_index = entry
+        if kind == KIND_NOTICE:
+            return NOTICES[question_index]
+        question = self.questions[question_index]
+        if kind == KIND_QUESTION:
+            return f"{question.question}\n\n" + "\n".join(
+                [f"- {option}" for option in question.options]
+            )
+        option = question.options[option_index]
+        if kind == KIND_REACTION:
+            return question.reactions[option]
+        return option
+
+    @staticmethod
+    def is_answer(entry: TranscriptEntry) -> bool:
+        """
+        履歴の1件が選択肢による回答（KIND_ANSWER の参照）かどうかを返します。
+        """
+        return not isinstance(entry, (str, dict)) and entry[0] == KIND_ANSWER
+
+    @staticmethod
+    def role(entry: TranscriptEntry) -> str:
+        """
+        履歴の1件の話者を返します。
+
+        Args:
+            entry: 履歴の1件
+
+        Returns:
+            str: "user" または "assistant"
+        """
+        if isinstance(entry, str):
+            return "user"
+        if isinstance(entry, dict):
+            return entry.get("role", "user")
+        return "user" if entry[0] == KIND_ANSWER else "assistant"
+
+    def render(self, entries: Sequence[TranscriptEntry]) -> List[Dict[str, str]]:
+        """
+        履歴をメッセージの辞書のリストに解決します。
+
+        Args:
+            entries: 履歴
+
+        Returns:
+            List[Dict[str, str]]: role と content を持つメッセージのリスト
+        """
+        return [
+            {"role": self.role(entry), "content": self.text(entry)} for entry in entries
+        ]
+
+
+# バージョンごとのカタログ（セッションに固定されたバージョンで履歴を解決するため）
+_catalogs: Dict[str, TranscriptCatalog] = {}
+
+
+def register_catalog(catalog: TranscriptCatalog) -> TranscriptCatalog:
+    """
+    カタログを登録し、同じバージョンが登録済みならそれを返します。
+
+    Args:
+        catalog: カタログ
+
+    Returns:
+        TranscriptCatalog: 登録されたカタログ
+    """
+    return _catalogs.setdefault(catalog.version, catalog)
+
+
+def get_catalog(version: str) -> TranscriptCatalog:
+    """
+    バージョンからカタログを返します。
+
+    Args:
+        version: カタログのバージョン
+
+    Returns:
+        TranscriptCatalog: カタログ
+
+    Raises:
+        KeyError: 登録されていないバージョンの場合
+    """
+    return _catalogs[version]
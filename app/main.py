@@ -1,19 +1,99 @@
 """
 Main FastAPI application entry point for the interview system.
 """
-from typing import Dict, List, Optional, Any
-from fastapi import FastAPI, HTTPException
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+import asyncio
+import hashlib
+import httpx
+import json
+import os
 import uuid
 
-from app.graph.flow import QUESTIONS
+from app.config.settings import (
+    ADMISSION_ANSWER_LIMIT,
+    ADMISSION_ANSWER_QUEUE_MS,
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_START_LIMIT,
+    ADMISSION_START_QUEUE_MS,
+    CHAT_MAX_PENDING,
+    CHAT_WORKERS,
+    CLUSTER_NODES,
+    EVENT_LOG_DIR,
+    EVENT_LOG_FSYNC,
+    EVENT_LOG_SEGMENT_MB,
+    EVENT_LOG_SNAPSHOT_SECONDS,
+    HASH_RING_VNODES,
+    JOB_DB_PATH,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_SECONDS,
+    JOB_QUEUE_CAPACITY,
+    JOB_RETENTION_HOURS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_WORKERS,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_DB_PATH,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_MAX_CONNECTIONS,
+    OUTBOX_RETENTION_HOURS,
+    OUTBOX_RETRY_BASE_SECONDS,
+    OUTBOX_RETRY_MAX_SECONDS,
+    OUTBOX_TIMEOUT_SECONDS,
+    OUTBOX_URL,
+    NODE_URL,
+    ROUTING_MODE,
+    SESSION_COLD_PATH,
+    SESSION_EXPIRY_HOURS,
+    SESSION_LOCK_STRIPES,
+    SESSION_MEMORY_BUDGET_MB,
+    SESSION_STORE,
+    SESSION_SWEEP_INTERVAL_SECONDS,
+    SESSION_SWEEP_SCAN_SLOTS,
+    SESSION_SWEEP_SLICE,
+    SESSION_TABLE_CAPACITY,
+    SESSION_TABLE_PATH,
+    SESSION_TEXT_BYTES,
+    SKIP_KEYWORD,
+    STATS_BUCKET_SECONDS,
+    STATS_RETENTION_HOURS,
+)
+from app.graph.flow import QUESTIONS, ConversationGraph
 from app.models.schemas import (
+    ChatRequest,
+    ChatResponse,
+    ClusterNodesRequest,
+    CohortQueryRequest,
+    CohortQueryResponse,
     InterviewAnswerRequest,
     InterviewAnswerResponse,
     NextQuestion,
     ConversationState,
-    InterviewQuestion
+    HandoffRequest,
+    InterviewQuestion,
+    StalledSession,
+    StalledSessionsResponse
 )
+from app.models.session_record import CatalogIndex, SessionRecord
+from app.utils.admission import AdmissionController, RoutePolicy
+from app.utils.analysis import analyze_completion
+from app.utils.bitmap_index import CohortIndex
+from app.utils.cluster import ROUTED_HEADER, ClusterRouter
+from app.utils.event_log import EventLog
+from app.utils.expiry import SessionSweeper
+from app.utils.export import EXPORT_FORMATS, MEDIA_TYPES, iter_session_chunks, stream_export
+from app.utils.intent_detector import INTENT_SKIP
+from app.utils.job_queue import FINISHED_STATUSES, JobQueue
+from app.utils.option_matcher import OptionMatcher
+from app.utils.outbox import Outbox
+from app.utils.session_locks import SessionLockTable
+from app.utils.session_store import SharedSessionStore, create_session_store
+from app.utils.stats import AnswerStats
 
 # 質問データをInterviewQuestionモデルに変換
 # 今後はSQliteなどで管理する予定
@@ -27,7 +107,69 @@ INTERVIEW_QUESTIONS: Dict[str, InterviewQuestion] = {
     ) for q in QUESTIONS
 }
 
-app = FastAPI(title="AI面接システム", description="選択式質問による面接システム", version="0.1.0")
+# クライアントがキャッシュできるよう、カタログの内容からバージョンを決める
+CATALOG_QUESTIONS: List[Dict[str, Any]] = [
+    {
+        "question_id": question.question_id,
+        "question_type": question.question_type,
+        "question_text": question.question_text,
+        "options": question.options,
+        "reactions": question.reactions
+    } for question in INTERVIEW_QUESTIONS.values()
+]
+CATALOG_VERSION = hashlib.sha256(
+    json.dumps(CATALOG_QUESTIONS, ensure_ascii=False, sort_keys=True).encode("utf-8")
+).hexdigest()[:16]
+CATALOG_PAYLOAD: Dict[str, Any] = {"version": CATALOG_VERSION, "questions": CATALOG_QUESTIONS}
+
+# セッションの内部表現で使う、質問・選択肢とインデックスの対応
+CATALOG_INDEX = CatalogIndex(list(INTERVIEW_QUESTIONS.values()))
+
+# 「会社員です」のような自由記述の回答を選択肢に対応付けるマッチャー（選択肢の別名も使う）
+OPTION_MATCHER = OptionMatcher(QUESTIONS)
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    起動時にイベントログからセッションを復元し、スナップショットの定期作成と
+    期限切れセッションの削除、ジョブキューのワーカー、アウトボックスの配信をバックグラウンドで開始します。
+    """
+    global job_queue
+    created_job_queue = job_queue is None
+    if job_queue is None:
+        job_queue = create_job_queue()
+    await job_queue.start()
+    if outbox is not None:
+        await outbox.start()
+    tasks = []
+    if event_log is not None:
+        recover_sessions()
+        tasks.append(asyncio.create_task(snapshot_loop()))
+    if session_sweeper is not None:
+        tasks.append(asyncio.create_task(session_sweeper.run(SESSION_SWEEP_INTERVAL_SECONDS)))
+    yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await job_queue.stop()
+    if created_job_queue:
+        job_queue.close()
+        job_queue = None
+    if outbox is not None:
+        await outbox.stop()
+    if event_log is not None:
+        event_log.close()
+
+
+app = FastAPI(
+    title="AI面接システム", description="選択式質問による面接システム", version="0.1.0", lifespan=lifespan
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,8 +179,236 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 会話状態を保存するディクショナリ
-session_states: Dict[str, ConversationState] = {}
+# 会話状態の保存先
+# 内部ではコンパクトな SessionRecord で保持し、APIの境界で ConversationState に変換する
+# SESSION_STORE=shared の場合は同じホストの全ワーカーで共有する表に保存する
+# SESSION_MEMORY_BUDGET_MB を設定すると、上限を超えた分の操作のないセッションを SQLite へ移す
+session_states = create_session_store(
+    SESSION_STORE,
+    CATALOG_INDEX,
+    path=SESSION_TABLE_PATH,
+    capacity=SESSION_TABLE_CAPACITY,
+    text_bytes=SESSION_TEXT_BYTES,
+    memory_budget_bytes=int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+    cold_path=SESSION_COLD_PATH,
+)
+
+# セッションの変更を追記するイベントログ（EVENT_LOG_DIR が未設定の場合は記録しない）
+# 1プロセスが1つのディレクトリに書く前提のため、共有セッション表とは併用できない
+if EVENT_LOG_DIR and SESSION_STORE != "memory":
+    raise ValueError("EVENT_LOG_DIR は SESSION_STORE=memory の場合のみ使用できます")
+event_log: Optional[EventLog] = (
+    EventLog(EVENT_LOG_DIR, segment_bytes=EVENT_LOG_SEGMENT_MB * 1024 * 1024, fsync=EVENT_LOG_FSYNC)
+    if EVENT_LOG_DIR else None
+)
+
+# 同じセッションへの回答を到着順に1つずつ処理するためのロック（異なるセッションは並行に処理する）
+session_locks = SessionLockTable(SESSION_LOCK_STRIPES)
+
+# 会話グラフ（セッションごとのチェックポイントを保持する）
+conversation_graph = ConversationGraph()
+
+# /chat のグラフ実行に使うスレッドプール（同期的なグラフの実行でイベントループを止めないため）
+chat_executor: Executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
+
+# 実行中・待機中の /chat の数（イベントループのスレッドだけが更新する）
+chat_pending = 0
+
+# 回答分布の集計カウンター（セッションを走査せずに集計を返すため）
+answer_stats = AnswerStats(
+    bucket_seconds=STATS_BUCKET_SECONDS,
+    retention_seconds=STATS_RETENTION_HOURS * 60 * 60,
+)
+
+# 完了時の分析のジョブの種別（キーはセッションID）
+ANALYSIS_JOB = "completion_analysis"
+
+
+def run_completion_analysis(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    完了時の分析のジョブ（ジョブキューのワーカーのスレッドで実行する）。
+    """
+    return analyze_completion(payload["answers"], list(INTERVIEW_QUESTIONS), answer_stats.snapshot())
+
+
+# 時間のかかる処理をリクエストの外で実行するジョブキュー
+# lifespan で作成してワーカーを起動する（lifespan の外では None で、分析のジョブは登録しない）
+job_queue: Optional[JobQueue] = None
+
+
+def create_job_queue() -> JobQueue:
+    """
+    JOB_DB_PATH のファイルでジョブキューを作成します（ディレクトリがない場合は作成します）。
+    
+    Returns:
+        JobQueue: ジョブキュー
+    """
+    os.makedirs(os.path.dirname(JOB_DB_PATH) or ".", exist_ok=True)
+    return JobQueue(
+        JOB_DB_PATH,
+        {ANALYSIS_JOB: run_completion_analysis},
+        workers=JOB_WORKERS,
+        capacity=JOB_QUEUE_CAPACITY,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        retry_base_seconds=JOB_RETRY_BASE_SECONDS,
+        lease_seconds=JOB_LEASE_SECONDS,
+        poll_seconds=JOB_POLL_SECONDS,
+        retention_seconds=JOB_RETENTION_HOURS * 60 * 60,
+    )
+
+# 完了したインタビューを下流システム（ATS など）へ配信するアウトボックス（OUTBOX_URL が空の場合は無効）
+OUTBOX_COMPLETED_EVENT = "interview.completed"
+outbox = Outbox(
+    OUTBOX_DB_PATH,
+    OUTBOX_URL,
+    batch_size=OUTBOX_BATCH_SIZE,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    retry_base_seconds=OUTBOX_RETRY_BASE_SECONDS,
+    retry_max_seconds=OUTBOX_RETRY_MAX_SECONDS,
+    timeout=OUTBOX_TIMEOUT_SECONDS,
+    max_connections=OUTBOX_MAX_CONNECTIONS,
+    retention_seconds=OUTBOX_RETENTION_HOURS * 60 * 60,
+    lease_seconds=OUTBOX_LEASE_SECONDS,
+) if OUTBOX_URL else None
+
+# (質問ID, 選択肢) ごとのビットマップインデックス（コホート検索用）
+cohort_index = CohortIndex()
+
+# 複数選択の回答の区切り文字
+MULTIPLE_CHOICE_SEPARATOR = ","
+
+
+
+def expire_session(session_id: str) -> None:
+    """
+    期限切れのセッションを、保存先・インデックス・イベントログ・グラフのチェックポイントから削除します。
+    
+    Args:
+        session_id: セッションID
+    """
+    session_states.delete(session_id)
+    cohort_index.remove_session(session_id)
+    conversation_graph.delete_session(session_id)
+    if event_log is not None:
+        event_log.log_delete(session_id)
+
+
+# 期限切れセッションの削除（shared の場合は各ワーカーが同じ表を掃除し、削除済みのセッションは読み飛ばす）
+session_sweeper: Optional[SessionSweeper] = (
+    SessionSweeper(
+        session_states,
+        ttl_seconds=SESSION_EXPIRY_HOURS * 60 * 60,
+        expire=expire_session,
+        slice_size=SESSION_SWEEP_SLICE,
+        scan_slots=SESSION_SWEEP_SCAN_SLOTS,
+    )
+    if SESSION_EXPIRY_HOURS > 0 else None
+)
+
+# 複数ノード構成でのセッションのルーター（CLUSTER_NODES が未設定の場合は単一ノード）
+cluster_router: Optional[ClusterRouter] = (
+    ClusterRouter(NODE_URL, CLUSTER_NODES, vnodes=HASH_RING_VNODES, mode=ROUTING_MODE)
+    if CLUSTER_NODES else None
+)
+
+
+async def routed_session_id(request: Request) -> Optional[str]:
+    """
+    ルーティングの対象となるセッションIDをリクエストから取り出します。
+    
+    Args:
+        request: リクエスト
+        
+    Returns:
+        Optional[str]: セッションID。セッションに紐付かないリクエストの場合はNone
+    """
+    path = request.url.path
+    if path.startswith("/interview/resume/by-user/"):
+        # ユーザーIDでの検索は各ノードのローカルのセッションが対象
+        return None
+    if path.startswith("/interview/resume/"):
+        return path.rsplit("/", 1)[-1]
+    if request.method == "POST" and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            return None
+        session_id = payload.get("session_id") if isinstance(payload, dict) else None
+        return session_id if isinstance(session_id, str) else None
+    return None
+
+
+@app.middleware("http")
+async def route_to_owner(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """
+    担当外のセッションへのリクエストを、担当ノードへ転送またはリダイレクトします。
+    """
+    if (
+        cluster_router is None
+        or request.headers.get(ROUTED_HEADER)
+        or request.url.path.startswith("/cluster/")
+    ):
+        return await call_next(request)
+    
+    session_id = await routed_session_id(request)
+    if session_id is None or cluster_router.is_local(session_id):
+        return await call_next(request)
+    
+    owner = cluster_router.owner(session_id)
+    query = request.url.query
+    if cluster_router.mode == "redirect":
+        # 307 はメソッドとボディを保ったまま再送させる
+        return RedirectResponse(f"{owner}{request.url.path}" + (f"?{query}" if query else ""), status_code=307)
+    
+    try:
+        response = await cluster_router.forward(
+            owner, request.method, request.url.path, query, dict(request.headers), await request.body()
+        )
+    except httpx.HTTPError:
+        return JSONResponse(status_code=503, content={"detail": "担当ノードに接続できません"})
+    # ヘッダーを引き継ぎ、ボディは受け取りながら中継する
+    forwarded = StreamingResponse(cluster_router.relay_body(response), status_code=response.status_code)
+    forwarded.raw_headers.extend(cluster_router.response_headers(response))
+    return forwarded
+
+
+# 急増時に処理中のリクエストが一斉に遅くなるのを防ぐアドミッション制御
+# 回答中のユーザーのリクエストを新しい面接の開始より先に処理し、長く待たせる前に503で断る
+_answer_policy = RoutePolicy(ADMISSION_ANSWER_LIMIT, 0, ADMISSION_ANSWER_QUEUE_MS / 1000)
+admission: Optional[AdmissionController] = AdmissionController(
+    ADMISSION_MAX_IN_FLIGHT,
+    {
+        "/interview/answer": _answer_policy,
+        "/chat": _answer_policy,
+        "/chat/stream": _answer_policy,
+        "/interview/start": RoutePolicy(ADMISSION_START_LIMIT, 1, ADMISSION_START_QUEUE_MS / 1000),
+    },
+) if ADMISSION_MAX_IN_FLIGHT > 0 else None
+
+
+@app.middleware("http")
+async def admission_control(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """
+    対象のルートの同時実行数を制限し、待ち時間の上限を超えたリクエストを503で拒否します。
+    （担当ノードへの転送より先に判定するため、route_to_owner の後に登録する）
+    """
+    route = request.url.path
+    if admission is None or request.method != "POST" or not admission.manages(route):
+        return await call_next(request)
+    if not await admission.acquire(route):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "混雑しています。しばらくしてから再度お試しください"},
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(route)
 
 
 @app.post("/interview/start")
@@ -51,20 +421,32 @@ async def start_interview(user_id: Optional[str] = None) -> Dict[str, Any]:
     
     Returns:
         Dict: セッションIDと最初の質問を含む辞書
+        
+    Raises:
+        HTTPException: ユーザーIDが長すぎる場合、またはセッションを保存できない場合
     """
-    # 新しいセッションIDを生成
-    session_id = str(uuid.uuid4())
+    # 新しいセッションIDを生成（複数ノード構成では自ノードが担当するID）
+    session_id = cluster_router.new_session_id() if cluster_router else str(uuid.uuid4())
     
     # 最初の質問を取得
     first_question = INTERVIEW_QUESTIONS["q1"]
     
     # セッション状態を初期化
-    session_states[session_id] = ConversationState(
-        user_id=user_id,
-        current_question_id="q1",
-        answers={},
-        completed=False
-    )
+    try:
+        record = SessionRecord(
+            len(CATALOG_INDEX),
+            user_id=user_id,
+            current=CATALOG_INDEX.question_index("q1")
+        )
+        session_states.create(session_id, record)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if event_log is not None:
+        event_log.log_start(session_id, record)
+    answer_stats.record_start()
+    cohort_index.add_session(session_id)
     
     return {
         "session_id": session_id,
@@ -96,33 +478,32 @@ async def process_answer(request: InterviewAnswerRequest) -> InterviewAnswerResp
         question_id = request.question_id
         answer = request.answer
         
-        # セッションが存在するか確認
-        if session_id not in session_states:
-            raise HTTPException(status_code=404, detail="セッションが見つかりません")
-        
-        state = session_states[session_id]
-        
-        # 質問が存在するか確認
-        if question_id not in INTERVIEW_QUESTIONS:
-            raise HTTPException(status_code=404, detail="質問が見つかりません")
-        
-        current_question = INTERVIEW_QUESTIONS[question_id]
-        
-        # 回答が有効か確認（選択式の場合）
-        if current_question.question_type == "choice" and answer not in current_question.options:
-            raise HTTPException(status_code=400, detail="無効な回答です")
-        
-        # 回答を記録
-        state.answers[question_id] = answer
-        
-        # 次の質問を決定
-        next_question_id = get_next_question_id(question_id)
+        # 同じセッションへの回答は到着順に1つずつ処理する（ダブルクリックや再送の対策）
+        async with session_locks.hold(session_id):
+            # セッションをロックして取得し、正常に処理できた場合のみ更新を書き戻す
+            with session_states.edit(session_id) as record:
+                # セッションが存在するか確認
+                if record is None:
+                    raise HTTPException(status_code=404, detail="セッションが見つかりません")
+                
+                # 質問が存在するか確認
+                if question_id not in INTERVIEW_QUESTIONS:
+                    raise HTTPException(status_code=404, detail="質問が見つかりません")
+                
+                # 現在の質問以外への回答（回答済みの質問への再送など）は記録しない
+                if record.completed or CATALOG_INDEX.question_index(question_id) != record.current:
+                    raise HTTPException(status_code=409, detail="この質問はすでに回答済みです")
+                
+                # 回答を記録して次の質問を決定（無効な回答の場合は ValueError）
+                next_question_id = apply_answer(session_id, record, question_id, answer)
+            
+            if next_question_id is None:
+                # 完了の配信と分析は、セッションの状態（共有セッション表・イベントログ）を保存した後に登録する
+                publish_completion(session_id, record)
         
         if next_question_id:
             # 次の質問がある場合
             next_question = INTERVIEW_QUESTIONS[next_question_id]
-            state.current_question_id = next_question_id
-            
             return InterviewAnswerResponse(
                 status="ok",
                 next_question=NextQuestion(
@@ -134,40 +515,503 @@ async def process_answer(request: InterviewAnswerRequest) -> InterviewAnswerResp
             )
         else:
             # 全質問完了
-            state.completed = True
-            
             # 回答の分析や集計を行う場合はここで実装
             # この例では単純な完了メッセージを返す
+            analysis = job_queue.find(ANALYSIS_JOB, session_id) if job_queue is not None else None
             return InterviewAnswerResponse(
                 status="completed",
                 completion_message="すべての質問に回答いただき、ありがとうございました。結果を分析中です。"
+                if analysis is not None else "すべての質問に回答いただき、ありがとうございました。",
+                analysis_url=f"/interview/analysis/{session_id}" if analysis is not None else None
             )
-            
+        
     except HTTPException as he:
         raise he
+    except ValueError as e:
+        # 無効な回答、または回答が共有セッション表のスロットに収まらない場合
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error in interview answer processing: {e}")
         raise HTTPException(status_code=500, detail=f"内部サーバーエラー: {str(e)}")
 
 
+def apply_answer(session_id: str, record: SessionRecord, question_id: str, answer: str) -> Optional[str]:
+    """
+    回答をセッションに記録し、集計・インデックス・イベントログを更新して次の質問へ進めます。
+    
+    Args:
+        session_id: セッションID
+        record: 編集中のセッション
+        question_id: 回答した質問ID
+        answer: 回答（SKIP_KEYWORD、または選択式の質問でスキップの制御フレーズの場合はスキップ）
+        
+    Returns:
+        Optional[str]: 次の質問ID。全質問に回答した場合はNone（書き戻しの後に publish_completion を呼び出す）
+        
+    Raises:
+        ValueError: 選択式の質問に選択肢にない回答をした場合
+    """
+    current_question = INTERVIEW_QUESTIONS[question_id]
+    
+    # 回答を記録した質問のインデックス（スキップの場合はNone）
+    answered_index = None
+    
+    if answer == SKIP_KEYWORD or current_question.question_type != "text" \
+            and conversation_graph.detect_intent(answer) == INTENT_SKIP:
+        # スキップの場合は回答を記録せずに次の質問へ進む
+        answer_stats.record_skip(question_id)
+    else:
+        answer = resolve_answer(current_question, answer)
+        selected = split_answer(current_question, answer)
+        
+        # 回答が有効か確認（選択式の場合）
+        if current_question.question_type in ("choice", "multiple_choice") and (
+            not selected or any(option not in (current_question.options or []) for option in selected)
+        ):
+            raise ValueError("無効な回答です")
+        
+        # 回答を記録
+        answered_index = CATALOG_INDEX.question_index(question_id)
+        record.set_answer(CATALOG_INDEX, answered_index, answer)
+        if current_question.question_type != "text":
+            for option in selected:
+                answer_stats.record_answer(question_id, option)
+            cohort_index.record_answer(session_id, question_id, selected)
+    
+    next_question_id = get_next_question_id(question_id)
+    if next_question_id:
+        record.current = CATALOG_INDEX.question_index(next_question_id)
+    else:
+        record.completed = True
+        answer_stats.record_completion()
+        cohort_index.mark_completed(session_id)
+    if event_log is not None:
+        event_log.log_step(session_id, record, answered_index)
+    return next_question_id
+
+
+def publish_completion(session_id: str, record: SessionRecord) -> None:
+    """
+    完了したセッションを下流システムへの配信と分析のジョブに登録します。
+    セッションの書き戻しとイベントログへの記録の後に呼び出し、保存されていない完了を配信しないようにします。
+    
+    Args:
+        session_id: セッションID
+        record: 完了したセッション
+    """
+    answers = record.to_state(CATALOG_INDEX).answers
+    if outbox is not None:
+        # 下流システムへの配信は応答の前にアウトボックスへ書き込むだけにする
+        outbox.add(OUTBOX_COMPLETED_EVENT, session_id, {
+            "session_id": session_id,
+            "user_id": record.user_id,
+            "catalog_version": CATALOG_VERSION,
+            "answers": answers,
+        })
+    if job_queue is None:
+        return
+    try:
+        # 分析はジョブとして登録し、応答の送信後にワーカーが実行する
+        job_queue.enqueue(ANALYSIS_JOB, session_id, {"answers": answers})
+    except RuntimeError as e:
+        print(f"Completion analysis was not scheduled for {session_id}: {e}")
+
+
+async def run_chat_turn(request: ChatRequest) -> Dict[str, Any]:
+    """
+    会話グラフでメッセージを処理し、回答を面接APIのセッションにも記録します（/chat と /chat/stream で共通）。
+    グラフはスレッドプールで実行し、待ちが CHAT_MAX_PENDING を超えた場合は503を返します。
+    スキップ・あとで・やめるの制御フレーズはグラフを実行せずに処理するため、スレッドプールを待たずに応答します。
+    面接APIのセッションと会話グラフの質問が食い違う場合と、記録先のスロットを確保できない場合はグラフを進めず、
+    グラフを実行した後に回答を記録できなかった場合はグラフをターンの前の状態に戻します。
+    
+    Args:
+        request: チャットリクエスト
+        
+    Returns:
+        Dict: ChatResponse の各フィールド
+        
+    Raises:
+        HTTPException: 混雑している場合、面接APIのセッションが会話グラフと異なる質問にある場合、
+            または回答を記録できない場合
+    """
+    global chat_pending
+    intent = conversation_graph.detect_intent(request.message)
+    if intent is None and chat_pending >= CHAT_MAX_PENDING:
+        raise HTTPException(
+            status_code=503, detail="混雑しています。しばらくしてから再度お試しください", headers={"Retry-After": "1"}
+        )
+    
+    # グラフの実行と面接APIのセッションへの記録を、同じセッションのリクエストの到着順に行う
+    async with session_locks.hold(request.session_id):
+        try:
+            # 記録先のスロットはグラフを実行する前に確保する（満杯やIDが長すぎる場合にグラフを進めないため）
+            current = session_states.get(request.session_id)
+            if current is None:
+                current = SessionRecord(len(CATALOG_INDEX), current=CATALOG_INDEX.question_index("q1"))
+                session_states.create(request.session_id, current)
+                if event_log is not None:
+                    event_log.log_start(request.session_id, current)
+                answer_stats.record_start()
+                cohort_index.add_session(request.session_id)
+        except ValueError as e:
+            # セッションIDが共有セッション表のスロットに収まらない場合
+            raise HTTPException(status_code=400, detail=str(e))
+        except RuntimeError as e:
+            # 共有セッション表が満杯の場合
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        before: List[ConversationState] = []
+        
+        def check(state: ConversationState) -> None:
+            # イベントログからの復元後や /interview/answer との併用で会話グラフと食い違った場合は、
+            # 別の質問の上書きや完了の重複（集計・アウトボックス・分析ジョブ）を避けるためグラフを進めない
+            graph_current = None if state.completed else CATALOG_INDEX.question_index(state.current_question_id)
+            if graph_current != (None if current.completed else current.current):
+                raise HTTPException(status_code=409, detail="この質問はすでに回答済みです")
+            before.append(state)
+        
+        loop = asyncio.get_running_loop()
+        if intent is not None:
+            # 制御フレーズはグラフのワークフローを実行しないため、グラフのスレッドプールの待ちに並ばせない
+            # （会話グラフのセッションごとのスレッドロックを取るため、イベントループでは実行しない）
+            result = await loop.run_in_executor(
+                None, conversation_graph.process_message, request.session_id, request.message, check
+            )
+        else:
+            chat_pending += 1
+            try:
+                result = await loop.run_in_executor(
+                    chat_executor, conversation_graph.process_message, request.session_id, request.message, check
+                )
+            finally:
+                chat_pending -= 1
+        
+        # 回答は面接APIのセッションにも記録する（集計・再開・期限切れの削除の対象にするため）
+        answered_question_id = result.pop("answered_question_id")
+        completed = False
+        try:
+            with session_states.edit(request.session_id) as record:
+                if record is not None and answered_question_id is not None:
+                    # グラフの実行中に他のワーカーが同じセッションを進めた場合も記録しない
+                    if record.completed or CATALOG_INDEX.question_index(answered_question_id) != record.current:
+                        raise HTTPException(status_code=409, detail="この質問はすでに回答済みです")
+                    answer = SKIP_KEYWORD if intent == INTENT_SKIP else request.message
+                    completed = apply_answer(request.session_id, record, answered_question_id, answer) is None
+        except (HTTPException, ValueError) as e:
+            # 記録できなかったターンは会話グラフからも取り消す
+            await loop.run_in_executor(None, conversation_graph.restore_state, request.session_id, before[0])
+            if isinstance(e, HTTPException):
+                raise
+            # 無効な回答、または回答が共有セッション表のスロットに収まらない場合
+            raise HTTPException(status_code=400, detail=str(e))
+        if completed and record is not None:
+            publish_completion(request.session_id, record)
+    
+    return result
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest) -> ChatResponse:
+    """
+    会話グラフでメッセージを処理し、リアクションと次の質問を返します（Gradio UI 用）。
+    
+    Args:
+        request: チャットリクエスト
+        
+    Returns:
+        ChatResponse: アシスタントのメッセージ、進捗、次の質問の選択肢
+        
+    Raises:
+        HTTPException: 混雑している場合、または回答を記録できない場合
+    """
+    return ChatResponse(**await run_chat_turn(request))
+
+
+def iter_chat_events(result: Dict[str, Any]) -> Iterator[str]:
+    """
+    チャットの応答を NDJSON のイベントに分けて返します。
+    
+    最初に次の質問（選択肢・進捗・完了フラグ）を送り、クライアントがメッセージの本文を待たずに
+    選択肢を表示できるようにします。本文はリアクションと質問文の段落ごとに "delta" で送り、
+    delta の text をつなげると /chat の message と同じになります。
+    
+    Args:
+        result: run_chat_turn の結果
+        
+    Yields:
+        str: 1行の JSON（type が turn / delta / done のイベント）
+    """
+    turn = {key: value for key, value in result.items() if key != "message"}
+    yield json.dumps({"type": "turn", **turn}, ensure_ascii=False) + "\n"
+    for i, paragraph in enumerate(result["message"].split("\n\n")):
+        text = paragraph if i == 0 else "\n\n" + paragraph
+        yield json.dumps({"type": "delta", "text": text}, ensure_ascii=False) + "\n"
+    yield json.dumps({"type": "done"}) + "\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+    /chat と同じ処理を行い、応答を NDJSON のストリームで返します（Gradio UI の逐次表示用）。
+    混雑している場合はストリームを開始する前に503を返します。
+    
+    Args:
+        request: チャットリクエスト
+        
+    Returns:
+        StreamingResponse: application/x-ndjson のレスポンス（turn → delta → done）
+        
+    Raises:
+        HTTPException: 混雑している場合、または回答を記録できない場合
+    """
+    result = await run_chat_turn(request)
+    return StreamingResponse(
+        iter_chat_events(ChatResponse(**result).model_dump()),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @app.get("/interview/questions")
-async def list_questions() -> Dict[str, List[Dict[str, Any]]]:
+async def list_questions(request: Request, response: Response) -> Any:
     """
     利用可能な質問のリストを返します。
     
+    カタログはバージョン（内容のハッシュ）をETagとして返し、
+    If-None-Match が一致する場合は本文なしの304を返します。
+    
+    Args:
+        request: リクエスト（If-None-Match ヘッダーの参照用）
+        response: レスポンス（ETag ヘッダーの設定用）
+    
     Returns:
-        Dict: 質問リストを含む辞書
+        Dict: カタログのバージョンと質問リストを含む辞書
     """
-    questions = []
-    for q_id, question in INTERVIEW_QUESTIONS.items():
-        questions.append({
-            "question_id": question.question_id,
-            "question_type": question.question_type,
-            "question_text": question.question_text,
-            "options": question.options
-        })
+    etag = f'"{CATALOG_VERSION}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return CATALOG_PAYLOAD
+
+
+def require_process_aggregates() -> None:
+    """
+    回答の集計とコホートのインデックスが全セッションを含むことを確認します。
+    どちらもワーカーごとに保持するため、SESSION_STORE=shared では他のワーカーのセッションが含まれません。
     
-    return {"questions": questions}
+    Raises:
+        HTTPException: セッションをワーカー間で共有している場合（501）
+    """
+    if isinstance(session_states, SharedSessionStore):
+        raise HTTPException(
+            status_code=501,
+            detail="SESSION_STORE=shared では集計・コホート検索・エクスポートに対応していません",
+        )
+
+
+@app.get("/interview/stats")
+async def interview_stats(window: Optional[int] = None) -> Dict[str, Any]:
+    """
+    質問・選択肢ごとの回答分布と、開始・完了・スキップ数を返します。
+    個々のセッションは参照せず、回答時に更新される集計カウンターから読み出します。
+    
+    Args:
+        window: 直近何秒を集計するか。指定しない場合は累計
+        
+    Returns:
+        Dict: 回答分布の集計結果
+        
+    Raises:
+        HTTPException: 保持期間を超える時間窓が指定された場合、セッションをワーカー間で共有している場合
+    """
+    require_process_aggregates()
+    try:
+        return answer_stats.snapshot(window_seconds=window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/interview/cohorts", response_model=CohortQueryResponse)
+async def query_cohort(request: CohortQueryRequest) -> CohortQueryResponse:
+    """
+    回答の組み合わせでセッションを絞り込み、件数とセッションIDのページを返します。
+    
+    Args:
+        request: 検索式とページング条件
+        
+    Returns:
+        CohortQueryResponse: 一致件数とセッションIDのページ
+        
+    Raises:
+        HTTPException: 検索式が不正な場合、セッションをワーカー間で共有している場合
+    """
+    require_process_aggregates()
+    try:
+        count, session_ids, next_cursor = cohort_index.page(
+            request.query, limit=request.limit, cursor=request.cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return CohortQueryResponse(count=count, session_ids=session_ids, next_cursor=next_cursor)
+
+
+@app.get("/interview/export")
+async def export_results(format: str = "csv", chunk_size: int = 1000) -> StreamingResponse:
+    """
+    完了済みセッションの回答をチャンク単位でストリーミング出力します。
+    
+    Args:
+        format: 出力形式（csv / ndjson / arrow）
+        chunk_size: 1チャンクあたりのセッション数
+        
+    Returns:
+        StreamingResponse: 出力形式に応じたストリーミングレスポンス
+        
+    Raises:
+        HTTPException: 未対応の形式やチャンクサイズが指定された場合、セッションをワーカー間で共有している場合
+    """
+    require_process_aggregates()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format は {', '.join(EXPORT_FORMATS)} のいずれかを指定してください")
+    if not 1 <= chunk_size <= 100000:
+        raise HTTPException(status_code=400, detail="chunk_size は 1〜100000 の範囲で指定してください")
+    
+    columns = [
+        (question.question_id, question.options if question.question_type == "choice" else None)
+        for question in INTERVIEW_QUESTIONS.values()
+    ]
+    
+    def page(limit: int, cursor: int) -> Tuple[List[str], Optional[int]]:
+        _, session_ids, next_cursor = cohort_index.page({"completed": True}, limit=limit, cursor=cursor)
+        return session_ids, next_cursor
+    
+    def lookup(session_id: str) -> Optional[ConversationState]:
+        record = session_states.get(session_id)
+        return record.to_state(CATALOG_INDEX) if record is not None else None
+    
+    chunks = iter_session_chunks(page, lookup, chunk_size=chunk_size)
+    try:
+        content = stream_export(format, chunks, columns)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    # 同期イテレーターはワーカースレッドで消費されるため、イベントループをブロックしない
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="interview_results.{format}"'}
+    )
+
+
+def index_session(session_id: str, record: SessionRecord) -> None:
+    """
+    既存のセッションをコホート検索のインデックスに登録します（引き継ぎや復元の後）。
+    
+    Args:
+        session_id: セッションID
+        record: セッション
+    """
+    cohort_index.add_session(session_id)
+    for i, question in enumerate(CATALOG_INDEX.questions):
+        answer = record.answer(CATALOG_INDEX, i)
+        if question.question_type == "text" or answer is None:
+            continue
+        selected = split_answer(question, answer)
+        cohort_index.record_answer(session_id, question.question_id, selected)
+    if record.completed:
+        cohort_index.mark_completed(session_id)
+
+
+def recover_sessions() -> Dict[str, float]:
+    """
+    イベントログからセッションを復元し、コホート検索のインデックスを作り直します。
+    状態の保存とアウトボックスへの書き込みの間で落ちた完了を失わないよう、完了したセッションを登録し直します
+    （アウトボックスとジョブキューは種類とキーで重複を除くため、登録済みの完了は配信し直しません）。
+    
+    Returns:
+        Dict[str, float]: スナップショットのセッション数・再生したイベント数・所要秒数
+    
+    Raises:
+        RuntimeError: イベントログが無効（EVENT_LOG_DIR が未設定）の場合
+    """
+    log = event_log
+    if log is None:
+        raise RuntimeError("イベントログが無効です（EVENT_LOG_DIR が未設定）")
+    sessions, result = log.recover(len(CATALOG_INDEX))
+    for session_id, record in sessions.items():
+        session_states.create(session_id, record)
+        index_session(session_id, record)
+        if record.completed:
+            publish_completion(session_id, record)
+    print(
+        f"イベントログから {len(sessions):,} セッションを復元しました"
+        f"（再生 {result['replayed_events']:,} 件, {result['seconds']:.2f} 秒）"
+    )
+    return result
+
+
+async def snapshot_loop() -> None:
+    """
+    一定間隔でスナップショットを書き出し、不要になった古いセグメントを削除します。
+    """
+    log = event_log
+    if log is None:
+        return
+    while True:
+        await asyncio.sleep(EVENT_LOG_SNAPSHOT_SECONDS)
+        if log.bytes_since_snapshot == 0:
+            continue
+        # 新しいセグメントに切り替えてから、それまでの状態をワーカースレッドで書き出す
+        seq = log.roll()
+        items = (
+            (session_id, record) for session_id in session_states
+            if (record := session_states.get(session_id)) is not None
+        )
+        await asyncio.to_thread(log.write_snapshot, seq, items)
+        await asyncio.to_thread(log.compact, seq)
+
+
+def split_answer(question: InterviewQuestion, answer: str) -> List[str]:
+    """
+    回答を選択肢のリストに分解します。複数選択の場合は区切り文字で分割します。
+    
+    Args:
+        question: 回答対象の質問
+        answer: 回答
+        
+    Returns:
+        List[str]: 選択された選択肢のリスト
+    """
+    if question.question_type == "multiple_choice":
+        return [option.strip() for option in answer.split(MULTIPLE_CHOICE_SEPARATOR) if option.strip()]
+    return [answer]
+
+
+def resolve_answer(question: InterviewQuestion, answer: str) -> str:
+    """
+    選択肢と完全には一致しない回答を、対応付けられる選択肢に置き換えます。
+    
+    Args:
+        question: 回答対象の質問
+        answer: 回答
+        
+    Returns:
+        str: 選択肢に置き換えた回答（対応付けられない部分はそのまま）
+    """
+    if question.question_type not in ("choice", "multiple_choice") or not question.options:
+        return answer
+    selected = split_answer(question, answer)
+    if all(option in question.options for option in selected):
+        return answer
+    resolved = [
+        option if option in question.options
+        else OPTION_MATCHER.match(question.question_id, option).option or option
+        for option in selected
+    ]
+    return MULTIPLE_CHOICE_SEPARATOR.join(resolved)
 
 
 def get_next_question_id(current_id: str) -> Optional[str]:
@@ -207,12 +1051,181 @@ async def resume_interview(session_id: str) -> Dict[str, Any]:
     Raises:
         HTTPException: セッションが存在しない場合
     """
-    # セッションが存在するか確認
-    if session_id not in session_states:
+    # セッションが存在するか確認（操作のないセッションはメモリへ読み戻す）
+    record = session_states.load(session_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="セッションが見つかりません")
     
+    return resume_payload(session_id, record)
+
+
+@app.get("/interview/resume/by-user/{user_id}")
+async def resume_interview_by_user(user_id: str) -> Dict[str, Any]:
+    """
+    ユーザーの最も最近操作されたセッションを再開します。
+    
+    Args:
+        user_id: ユーザーID
+        
+    Returns:
+        Dict: セッションIDと現在の質問情報を含む辞書
+        
+    Raises:
+        HTTPException: ユーザーのセッションが存在しない場合
+    """
+    try:
+        session_id = session_states.latest_for_user(user_id)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    record = session_states.load(session_id) if session_id else None
+    if session_id is None or record is None:
+        raise HTTPException(status_code=404, detail="ユーザーのセッションが見つかりません")
+    
+    return resume_payload(session_id, record)
+
+
+# 分析の状態のストリームで、状態が変わらない間に送るハートビートの間隔（秒）
+ANALYSIS_HEARTBEAT_SECONDS = 15.0
+
+
+@app.get("/interview/analysis/{session_id}")
+async def get_analysis(session_id: str) -> Dict[str, Any]:
+    """
+    完了したセッションの分析の状態と結果を返します（ポーリング用）。
+    
+    Args:
+        session_id: セッションID
+        
+    Returns:
+        Dict: ジョブの状態（pending / running / succeeded / failed）、試行回数、結果、エラー
+        
+    Raises:
+        HTTPException: 分析が登録されていない場合
+    """
+    job = job_queue.find(ANALYSIS_JOB, session_id) if job_queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="分析が見つかりません")
+    return job
+
+
+@app.get("/interview/analysis/{session_id}/stream")
+async def stream_analysis(session_id: str) -> StreamingResponse:
+    """
+    分析の状態が変わるたびに Server-Sent Events で送ります。完了または失敗で終了します。
+    
+    Args:
+        session_id: セッションID
+        
+    Returns:
+        StreamingResponse: text/event-stream のレスポンス
+        
+    Raises:
+        HTTPException: 分析が登録されていない場合
+    """
+    queue = job_queue
+    job = queue.find(ANALYSIS_JOB, session_id) if queue is not None else None
+    if queue is None or job is None:
+        raise HTTPException(status_code=404, detail="分析が見つかりません")
+
+    async def events() -> AsyncIterator[str]:
+        current = job
+        yield f"event: status\ndata: {json.dumps(current, ensure_ascii=False)}\n\n"
+        while current["status"] not in FINISHED_STATUSES:
+            await queue.wait_for_change(current["job_id"], ANALYSIS_HEARTBEAT_SECONDS)
+            # 待ち始める前に変わっていた場合もあるため、通知の有無ではなく状態と試行回数で比べる
+            latest = queue.get(current["job_id"])
+            if latest is None:
+                # 保存期間を過ぎて削除された
+                return
+            if (latest["status"], latest["attempts"]) == (current["status"], current["attempts"]):
+                # プロキシに接続を切られないようにコメント行を送る
+                yield ": heartbeat\n\n"
+                continue
+            current = latest
+            yield f"event: status\ndata: {json.dumps(current, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/interview/sessions/stalled", response_model=StalledSessionsResponse)
+async def stalled_sessions(
+    idle_minutes: float = 30, limit: int = 100, cursor: Optional[str] = None
+) -> StalledSessionsResponse:
+    """
+    一定時間操作のないセッションを、最終アクティビティの古い順にページングして返します（再エンゲージ用）。
+    
+    Args:
+        idle_minutes: 操作のない時間（分）
+        limit: 1ページあたりの件数
+        cursor: 前のページの next_cursor
+        
+    Returns:
+        StalledSessionsResponse: セッションのリストと次ページのカーソル
+        
+    Raises:
+        HTTPException: パラメーターが不正な場合
+    """
+    if idle_minutes < 0 or not 1 <= limit <= 10000:
+        raise HTTPException(status_code=400, detail="idle_minutes は0以上、limit は 1〜10000 の範囲で指定してください")
+    
+    parsed_cursor = None
+    if cursor:
+        try:
+            timestamp, session_id = cursor.split(":", 1)
+            parsed_cursor = (float(timestamp), session_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="cursor が不正です")
+    
+    try:
+        if isinstance(session_states, SharedSessionStore):
+            # 共有する表は全体を走査するため、イベントループを止めないようにワーカースレッドで実行する
+            page, next_cursor = await asyncio.get_running_loop().run_in_executor(
+                None, session_states.idle_sessions, idle_minutes * 60, limit, parsed_cursor
+            )
+        else:
+            page, next_cursor = session_states.idle_sessions(idle_minutes * 60, limit, parsed_cursor)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    sessions = []
+    for last_activity, session_id in page:
+        record = session_states.get(session_id)
+        if record is None:
+            continue
+        sessions.append(StalledSession(
+            session_id=session_id,
+            user_id=record.user_id,
+            current_question_id=record.current_question_id(CATALOG_INDEX),
+            last_activity=last_activity
+        ))
+    
+    return StalledSessionsResponse(
+        sessions=sessions,
+        next_cursor=f"{next_cursor[0]!r}:{next_cursor[1]}" if next_cursor else None
+    )
+
+
+def resume_payload(session_id: str, record: SessionRecord) -> Dict[str, Any]:
+    """
+    セッションの再開レスポンスを作成します。
+    
+    Args:
+        session_id: セッションID
+        record: セッション
+        
+    Returns:
+        Dict: セッションIDと現在の質問情報を含む辞書
+        
+    Raises:
+        HTTPException: 現在の質問がカタログに存在しない場合
+    """
     # セッション状態を取得
-    state = session_states[session_id]
+    state = record.to_state(CATALOG_INDEX)
     
     # 既に完了している場合
     if state.completed:
@@ -245,6 +1258,152 @@ async def resume_interview(session_id: str) -> Dict[str, Any]:
     }
 
 
+@app.get("/cluster/nodes")
+async def cluster_nodes() -> Dict[str, Any]:
+    """
+    自ノードとクラスターのノードを返します。
+    
+    Returns:
+        Dict: 自ノードのURLと全ノードのURL
+    """
+    if cluster_router is None:
+        return {"node": None, "nodes": []}
+    return {"node": cluster_router.node_url, "nodes": cluster_router.ring.nodes}
+
+
+@app.put("/cluster/nodes")
+async def update_cluster_nodes(request: ClusterNodesRequest) -> Dict[str, Any]:
+    """
+    クラスターのノードを置き換え、担当でなくなったセッションを新しい担当ノードへ引き継ぎます。
+    自ノードを含まないリストを送るとノードの離脱になり、全セッションが引き継がれます。
+    
+    Args:
+        request: クラスター構成の変更リクエスト
+        
+    Returns:
+        Dict: 新しいノードのリストと、引き継ぎ先ごとのセッション数
+        
+    Raises:
+        HTTPException: 単一ノード構成の場合、または引き継ぎ先に接続できない場合
+    """
+    if cluster_router is None:
+        raise HTTPException(status_code=409, detail="CLUSTER_NODES が設定されていません")
+    
+    cluster_router.set_nodes(request.nodes)
+    
+    moved = []
+    for session_id in session_states:
+        if cluster_router.is_local(session_id):
+            continue
+        record = session_states.get(session_id)
+        if record is not None:
+            moved.append((session_id, record.to_state(CATALOG_INDEX).model_dump()))
+    
+    try:
+        handed_off = await cluster_router.handoff(moved)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"セッションの引き継ぎに失敗しました: {str(e)}")
+    
+    # 引き継ぎ先が受け取った後でローカルから削除する（その間のリクエストは新しい担当ノードへ転送される）
+    for session_id, _ in moved:
+        session_states.delete(session_id)
+        cohort_index.remove_session(session_id)
+        if event_log is not None:
+            event_log.log_delete(session_id)
+    
+    return {"nodes": cluster_router.ring.nodes, "handed_off": handed_off}
+
+
+@app.post("/cluster/handoff")
+async def receive_handoff(request: HandoffRequest) -> Dict[str, Any]:
+    """
+    他のノードから引き継いだセッションを保存します。
+    
+    Args:
+        request: セッション引き継ぎリクエスト
+        
+    Returns:
+        Dict: 受け取ったセッション数
+        
+    Raises:
+        HTTPException: 会話状態が不正な場合
+    """
+    try:
+        for item in request.sessions:
+            record = SessionRecord.from_state(item.state, CATALOG_INDEX)
+            session_states.create(item.session_id, record)
+            index_session(item.session_id, record)
+            if event_log is not None:
+                event_log.log_put(item.session_id, record)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"不正な会話状態です: {str(e)}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return {"received": len(request.sessions)}
+
+
+@app.get("/outbox/dead-letters")
+async def outbox_dead_letters(limit: int = 100) -> Dict[str, Any]:
+    """
+    下流システムへの配信をあきらめたイベントを古い順に返します。
+    
+    Args:
+        limit: 返す最大件数
+        
+    Returns:
+        Dict: イベントの一覧と件数
+        
+    Raises:
+        HTTPException: アウトボックスが無効な場合
+    """
+    if outbox is None:
+        raise HTTPException(status_code=404, detail="アウトボックスは無効です")
+    events = outbox.dead_letters(limit)
+    return {"events": events, "count": len(events)}
+
+
+@app.post("/outbox/dead-letters/requeue")
+async def requeue_outbox_dead_letters() -> Dict[str, Any]:
+    """
+    配信をあきらめたイベントを再送します（下流システムの復旧後に使う）。
+    
+    Returns:
+        Dict: 再送するイベントの件数
+        
+    Raises:
+        HTTPException: アウトボックスが無効な場合
+    """
+    if outbox is None:
+        raise HTTPException(status_code=404, detail="アウトボックスは無効です")
+    return {"requeued": outbox.requeue_dead()}
+
+
+@app.get("/metrics")
+async def metrics() -> Dict[str, Any]:
+    """
+    セッションの保存先、期限切れセッションの削除、セッションごとのロック、アドミッション制御、
+    ジョブキュー、アウトボックスのメトリクスを返します。
+    
+    Returns:
+        Dict: セッション数、層ごとのサイズ（メモリ上限がある場合）、削除の統計、ロックの獲得数と待ちの数、
+        ルートごとの処理中・待機中のリクエスト数と拒否の累計、未完了のジョブ数と完了・再試行・失敗の累計、
+        未配信のイベント数と配信のスループット
+    """
+    store_metrics = (
+        session_states.metrics() if hasattr(session_states, "metrics")
+        else {"hot_sessions": len(session_states)}
+    )
+    return {
+        "sessions": store_metrics,
+        "expiry": session_sweeper.metrics() if session_sweeper is not None else None,
+        "session_locks": session_locks.metrics(),
+        "admission": admission.metrics() if admission is not None else None,
+        "jobs": job_queue.metrics() if job_queue is not None else None,
+        "outbox": outbox.metrics() if outbox is not None else None,
+    }
+
+
 @app.get("/")
 async def root():
     """
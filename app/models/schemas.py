@@ -1,9 +1,10 @@
 """
 Pydantic models for the conversational AI agent.
 """
-from typing import Dict, List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal, Tuple, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidatorFunctionWrapHandler, WrapValidator
+from typing_extensions import Annotated
 
 
 class InterviewOption(BaseModel):
@@ -52,6 +53,60 @@ class InterviewAnswerResponse(BaseModel):
     status: str = Field(description="回答状態")
     next_question: Optional[NextQuestion] = Field(default=None, description="次の質問")
     completion_message: Optional[str] = Field(default=None, description="完了メッセージ")
+    analysis_url: Optional[str] = Field(default=None, description="完了時の分析の状態を取得するURL")
+
+
+class ChatRequest(BaseModel):
+    """
+    チャットリクエストモデル
+    """
+    session_id: str = Field(description="セッションID")
+    message: str = Field(description="ユーザーのメッセージ（選択肢、自由記述、またはスキップ）")
+
+
+class ChatResponse(BaseModel):
+    """
+    チャットレスポンスモデル
+    """
+    message: str = Field(description="アシスタントのメッセージ（リアクションと次の質問）")
+    progress: Dict[str, int] = Field(description="進捗（current: 現在の質問の位置, total: 質問数）")
+    options: List[str] = Field(default_factory=list, description="現在の質問の選択肢")
+    question_id: Optional[str] = Field(default=None, description="現在の質問ID（完了後はNone）")
+    completed: bool = Field(default=False, description="会話完了フラグ")
+    intent: Optional[str] = Field(default=None, description="制御フレーズの意図（skip / defer / quit）")
+
+
+class CohortQueryRequest(BaseModel):
+    """
+    コホート検索リクエストモデル
+    """
+    query: Dict[str, Any] = Field(description="検索式（and / or / not と、質問ID・選択肢・完了フラグの条件）")
+    limit: int = Field(default=100, ge=1, le=10000, description="1ページあたりの件数")
+    cursor: int = Field(default=0, ge=0, description="ページングカーソル")
+
+
+class CohortQueryResponse(BaseModel):
+    """
+    コホート検索レスポンスモデル
+    """
+    count: int = Field(description="条件に一致するセッション数")
+    session_ids: List[str] = Field(description="セッションIDのリスト")
+    next_cursor: Optional[int] = Field(default=None, description="次ページのカーソル")
+
+
+def _keep_shared_ref(value: Any, handler: ValidatorFunctionWrapHandler) -> Any:
+    """
+    参照の形（3つの整数）を検証し、タプルの場合は同じオブジェクトを返します。
+    参照のタプルはカタログでセッション間に共有されるため、検証でコピーしないようにします。
+    """
+    validated = handler(value)
+    return value if isinstance(value, tuple) else validated
+
+
+# 会話履歴の1件: カタログへの参照 (種別, 質問インデックス, 選択肢インデックス)、ユーザーの自由記述、
+# または旧形式のメッセージの辞書（app.graph.transcript を参照）
+TranscriptRef = Annotated[Tuple[int, int, int], WrapValidator(_keep_shared_ref)]
+TranscriptEntry = Union[str, TranscriptRef, Dict[str, str]]
 
 
 class ConversationState(BaseModel):
@@ -62,7 +117,17 @@ class ConversationState(BaseModel):
     current_question_id: str = Field(default="", description="現在の質問 ID")
     answers: Dict[str, str] = Field(default_factory=dict, description="回答履歴 (質問ID: 選択肢)")
     completed: bool = Field(default=False, description="会話完了フラグ")
-    messages: List[Dict[str, str]] = Field(default_factory=list, description="会話履歴")
+    # 会話履歴はカタログへの参照とユーザーの自由記述の並び（参照のタプルは検証後も共有されたまま）
+    messages: List[TranscriptEntry] = Field(default_factory=list, description="会話履歴")
+    catalog_version: Optional[str] = Field(default=None, description="会話履歴の解決に使うカタログのバージョン")
+    # 「会社員です」のように選択肢に対応付けた回答は、履歴には入力のまま残し、選択肢の参照をここに持つ
+    matched_answer: Optional[TranscriptRef] = Field(
+        default=None, description="最新のユーザーのメッセージを対応付けた選択肢の参照（自由記述の回答の場合）"
+    )
+    # LLM に送るプロンプトでは、古い履歴を要約に置き換える（app.graph.prompt を参照）
+    summary: str = Field(default="", description="要約済みの会話履歴の要約")
+    summarized_messages: int = Field(default=0, description="要約に移した会話履歴の件数（先頭からの件数）")
+    prompt_tokens: int = Field(default=0, description="このセッションで組み立てたプロンプトのトークン数の累計")
     # 拡張フェーズⅠ用フィールド（現在は未使用）
     # needs_deep_dive: bool = Field(default=False, description="深堀り質問が必要かどうか")
     # follow_up_asked: bool = Field(default=False, description="すでに深堀り質問を届けたかどうか")
@@ -77,6 +142,49 @@ class FixedQuestion(BaseModel):
     question: str = Field(description="質問文")
     options: List[str] = Field(description="選択肢リスト")
     reactions: Dict[str, str] = Field(description="選択肢ごとのリアクション")
+    aliases: Dict[str, List[str]] = Field(
+        default_factory=dict, description="選択肢ごとの別名（読み・言い換え。自由記述の回答の対応付けに使う）"
+    )
     # 拡張フェーズⅠ用フィールド（現在は未使用）
     # deep_dive_triggers: Dict[str, bool] = Field(default_factory=dict, description="どの回答が深堀りをトリガーするか")
     # follow_up_questions: Dict[str, str] = Field(default_factory=dict, description="選択肢ごとの深堀り質問")
+
+
+class ClusterNodesRequest(BaseModel):
+    """
+    クラスター構成の変更リクエストモデル
+    """
+    nodes: List[str] = Field(description="クラスターの全ノードのURL")
+
+
+class HandoffSession(BaseModel):
+    """
+    担当ノードの移動で引き継ぐセッション
+    """
+    session_id: str = Field(description="セッションID")
+    state: ConversationState = Field(description="会話状態")
+
+
+class HandoffRequest(BaseModel):
+    """
+    セッション引き継ぎリクエストモデル
+    """
+    sessions: List[HandoffSession] = Field(description="引き継ぐセッションのリスト")
+
+
+class StalledSession(BaseModel):
+    """
+    一定時間操作のないセッション
+    """
+    session_id: str = Field(description="セッションID")
+    user_id: Optional[str] = Field(default=None, description="ユーザーID")
+    current_question_id: str = Field(description="現在の質問ID")
+    last_activity: float = Field(description="最終アクティビティ時刻（UNIX時刻）")
+
+
+class StalledSessionsResponse(BaseModel):
+    """
+    操作のないセッションの検索レスポンスモデル
+    """
+    sessions: List[StalledSession] = Field(description="最終アクティビティの古い順のセッション")
+    next_cursor: Optional[str] = Field(default=None, description="次ページのカーソル")
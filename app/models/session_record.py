@@ -0,0 +1,284 @@
+"""
+セッションの内部表現（コンパクトな会話状態）
+
+APIの入出力には ConversationState を使いますが、サーバー内では質問と選択肢を
+カタログ上のインデックス（小さな整数）で保持する SessionRecord を使います。
+回答文字列をセッションごとに複製しないため、大量のセッションを保持しても
+メモリ使用量が抑えられます。
+"""
+
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.models.schemas import ConversationState, InterviewQuestion
+
+# 未回答を表す選択肢インデックス
+NO_OPTION = 0xFF
+
+# バイト列表現: ユーザーIDの長さ, 現在の質問, 完了フラグ, 回答済みビットセット, 質問数, 自由記述の件数
+_RECORD_HEAD = struct.Struct("<HHBQBH")
+_TEXT_HEAD = struct.Struct("<HI")
+# ユーザーIDが None であることを表す長さ
+_NO_USER_ID = 0xFFFF
+
+# 回答済みビットセット（Q）で表せる質問数の上限
+MAX_QUESTIONS = 64
+
+# ユーザーIDの最大バイト数（UTF-8。長さを H で保持し、0xFFFF は None を表す）
+MAX_USER_ID_BYTES = _NO_USER_ID - 1
+
+
+class CatalogIndex:
+    """
+    質問IDと選択肢を、カタログ上のインデックスと相互に変換するクラス
+    """
+
+    def __init__(self, questions: Sequence[InterviewQuestion]) -> None:
+        """
+        カタログのインデックスを作成します。
+
+        Args:
+            questions: 質問の並び（この順序がインデックスになる）
+        """
+        self.questions: List[InterviewQuestion] = list(questions)
+        self.question_ids: List[str] = [q.question_id for q in self.questions]
+        self._question_index: Dict[str, int] = {
+            question_id: i for i, question_id in enumerate(self.question_ids)
+        }
+        self.options: List[List[str]] = [list(q.options or []) for q in self.questions]
+        self._option_index: List[Dict[str, int]] = [
+            {option: i for i, option in enumerate(options)} for options in self.options
+        ]
+        if len(self.questions) > MAX_QUESTIONS:
+            raise ValueError(f"質問は{MAX_QUESTIONS}個以下にしてください")
+        if any(len(options) >= NO_OPTION for options in self.options):
+            raise ValueError(f"1つの質問の選択肢は{NO_OPTION}個未満にしてください")
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def question_index(self, question_id: str) -> int:
+        """
+        質問IDからインデックスを返します。
+
+        Args:
+            question_id: 質問ID
+
+        Returns:
+            int: 質問のインデックス
+
+        Raises:
+            KeyError: 質問が存在しない場合
+        """
+        return self._question_index[question_id]
+
+    def option_index(self, question_index: int, option: str) -> Optional[int]:
+        """
+        選択肢のインデックスを返します。
+
+        Args:
+            question_index: 質問のインデックス
+            option: 選択肢
+
+        Returns:
+            Optional[int]: 選択肢のインデックス。選択肢にない場合はNone
+        """
+        return self._option_index[question_index].get(option)
+
+
+class SessionRecord:
+    """
+    1セッション分の会話状態のコンパクトな内部表現
+
+    回答は質問ごとの選択肢インデックスを bytearray に、回答済みの質問をビットセット（int）に
+    保持します。選択肢にない回答（自由記述・複数選択）のみ文字列として保持します。
+    """
+
+    __slots__ = ("user_id", "current", "completed", "choices", "answered", "texts")
+
+    def __init__(
+        self, size: int, user_id: Optional[str] = None, current: int = 0
+    ) -> None:
+        """
+        セッションを初期化します。
+
+        Args:
+            size: カタログの質問数
+            user_id: ユーザーID（UTF-8 で MAX_USER_ID_BYTES バイト以下）
+            current: 現在の質問のインデックス
+
+        Raises:
+            ValueError: ユーザーIDが長すぎる場合
+        """
+        if user_id is not None and len(user_id.encode("utf-8")) > MAX_USER_ID_BYTES:
+            raise ValueError(f"ユーザーIDは{MAX_USER_ID_BYTES}バイト以下にしてください")
+        self.user_id = user_id
+        self.current = current
+        self.completed = False
+        self.choices = bytearray([NO_OPTION]) * size
+        self.answered = 0
+        self.texts: Optional[Dict[int, str]] = None
+
+    def set_answer(
+        self, catalog: CatalogIndex, question_index: int, answer: str
+    ) -> None:
+        """
+        回答を記録します。
+
+        Args:
+            catalog: カタログのインデックス
+            question_index: 質問のインデックス
+            answer: 回答
+        """
+        option_index = catalog.option_index(question_index, answer)
+        if option_index is None:
+            if self.texts is None:
+                self.texts = {}
+            self.texts[question_index] = answer
+            self.choices[question_index] = NO_OPTION
+        else:
+            if self.texts is not None:
+                self.texts.pop(question_index, None)
+            self.choices[question_index] = option_index
+        self.answered |= 1 << question_index
+
+    def is_answered(self, question_index: int) -> bool:
+        return bool(self.answered >> question_index & 1)
+
+    def answer(self, catalog: CatalogIndex, question_index: int) -> Optional[str]:
+        """
+        回答を文字列で返します。
+
+        Args:
+            catalog: カタログのインデックス
+            question_index: 質問のインデックス
+
+        Returns:
+            Optional[str]: 回答。未回答の場合はNone
+        """
+        if not self.is_answered(question_index):
+            return None
+        option_index = self.choices[question_index]
+        if option_index == NO_OPTION:
+            return self.texts.get(question_index) if self.texts else None
+        return catalog.options[question_index][option_index]
+
+    @property
+    def answered_count(self) -> int:
+        return self.answered.bit_count()
+
+    def current_question_id(self, catalog: CatalogIndex) -> str:
+        return catalog.question_ids[self.current]
+
+    def to_state(self, catalog: CatalogIndex) -> ConversationState:
+        """
+        公開用の ConversationState に変換します。
+
+        Args:
+            catalog: カタログのインデックス
+
+        Returns:
+            ConversationState: 会話状態
+        """
+        return ConversationState(
+            user_id=self.user_id,
+            current_question_id=self.current_question_id(catalog),
+            answers={
+                question_id: answer
+                for i, question_id in enumerate(catalog.question_ids)
+                if (answer := self.answer(catalog, i)) is not None
+            },
+            completed=self.completed,
+        )
+
+    @classmethod
+    def from_state(
+        cls, state: ConversationState, catalog: CatalogIndex
+    ) -> "SessionRecord":
+        """
+        ConversationState から内部表現を作成します。
+
+        Args:
+            state: 会話状態
+            catalog: カタログのインデックス
+
+        Returns:
+            SessionRecord: 内部表現
+        """
+        current = (
+            catalog.question_index(state.current_question_id)
+            if state.current_question_id
+            else 0
+        )
+        record = cls(len(catalog), user_id=state.user_id, current=current)
+        for question_id, answer in state.answers.items():
+            record.set_answer(catalog, catalog.question_index(question_id), answer)
+        record.completed = state.completed
+        return record
+
+    def to_bytes(self) -> bytes:
+        """
+        ログやスナップショットに書き出すためのバイト列に変換します。
+
+        Returns:
+            bytes: セッションのバイト列表現
+        """
+        user = b"" if self.user_id is None else self.user_id.encode("utf-8")
+        # 並行して更新される場合に備え、自由記述は一度に複製してから書き出す
+        texts = list(self.texts.items()) if self.texts else []
+        parts = [
+            _RECORD_HEAD.pack(
+                _NO_USER_ID if self.user_id is None else len(user),
+                self.current,
+                self.completed,
+                self.answered,
+                len(self.choices),
+                len(texts),
+            ),
+            user,
+            bytes(self.choices),
+        ]
+        for question_index, text in texts:
+            encoded = text.encode("utf-8")
+            parts.append(_TEXT_HEAD.pack(question_index, len(encoded)))
+            parts.append(encoded)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> Tuple["SessionRecord", int]:
+        """
+        to_bytes のバイト列からセッションを復元します。
+
+        Args:
+            data: バイト列
+            offset: 読み出しを始める位置
+
+        Returns:
+            Tuple[SessionRecord, int]: 復元したセッションと、読み終えた位置
+        """
+        user_len, current, completed, answered, size, text_count = (
+            _RECORD_HEAD.unpack_from(data, offset)
+        )
+        offset += _RECORD_HEAD.size
+        record = cls.__new__(cls)
+        if user_len == _NO_USER_ID:
+            record.user_id = None
+        else:
+            record.user_id = data[offset : offset + user_len].decode("utf-8")
+            offset += user_len
+        record.current = current
+        record.completed = bool(completed)
+        record.answered = answered
+        record.choices = bytearray(data[offset : offset + size])
+        offset += size
+        record.texts = None
+        if text_count:
+            record.texts = {}
+            for _ in range(text_count):
+                question_index, length = _TEXT_HEAD.unpack_from(data, offset)
+                offset += _TEXT_HEAD.size
+                record.texts[question_index] = data[offset : offset + length].decode(
+                    "utf-8"
+                )
+                offset += length
+        return record, offset
@@ -0,0 +1,201 @@
+"""
+固定質問アンケートの回答シートを一括で取り込むコマンド
+
+紙のアンケートやパートナー企業から受け取った回答を、対話なしで FixedQuestionFlow と同じ
+ノード処理（選択肢の検証・回答の記録）に通して answers テーブルへ保存します。
+
+入力ファイルの形式:
+    CSV   : user_id,回答1,回答2,回答3（ヘッダー行は user_id で始まる場合のみ読み飛ばす）
+    JSONL : {"user_id": "...", "answers": ["...", "...", "..."]}
+回答は選択肢の文字列または1始まりの番号で指定します。
+読み込めない行（不正な JSON、user_id や answers のない行）は読み飛ばし、行番号とともに報告します。
+
+    python -m app.sample.bulk_ingest answers.csv --db answers.db --workers 4
+"""
+
+import argparse
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.sample.langgraph_fixed_questions import (
+    AnswerStore,
+    FixedQuestionFlow,
+    InvalidAnswerError,
+    answer_rows,
+)
+
+Record = Tuple[str, List[str]]
+Row = Tuple[str, int, str, str, str]
+
+# ワーカープロセスごとのフロー（保存は親プロセスがまとめて行う）
+_worker_flow: Optional[FixedQuestionFlow] = None
+
+
+def read_records(
+    path: str, rejected: Optional[List[Dict[str, str]]] = None
+) -> Iterator[Record]:
+    """入力ファイルから (user_id, 回答リスト) を順に読み出す
+
+    読み込めない行は読み飛ばし、rejected が指定されていれば行番号と理由を追加する。
+    """
+
+    def skip(line_number: int, reason: str) -> None:
+        if rejected is not None:
+            rejected.append({"user_id": "", "line": str(line_number), "reason": reason})
+
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    skip(line_number, f"JSON として読み込めません: {e}")
+                    continue
+                if not isinstance(record, dict) or record.get("user_id") in (None, ""):
+                    skip(line_number, "user_id がありません")
+                    continue
+                if not isinstance(record.get("answers"), list):
+                    skip(line_number, "answers（回答のリスト）がありません")
+                    continue
+                yield str(record["user_id"]), [str(a) for a in record["answers"]]
+        else:
+            reader = csv.reader(f)
+            for row in reader:
+                if not row or row[0] == "user_id":
+                    continue
+                if not row[0]:
+                    skip(reader.line_num, "user_id がありません")
+                    continue
+                yield row[0], row[1:]
+
+
+def chunked(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    """レコードを size 件ずつのリストに分割"""
+    iterator = iter(records)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def process_chunk(chunk: List[Record]) -> Tuple[List[Row], List[Dict[str, str]]]:
+    """レコードのチャンクをフローに通し、保存する行と不正なレコードを返す"""
+    global _worker_flow
+    if _worker_flow is None:
+        _worker_flow = FixedQuestionFlow(db_path=None)
+
+    rows: List[Row] = []
+    rejected = []
+    for user_id, answers in chunk:
+        try:
+            state = _worker_flow.run_offline(user_id, answers)
+        except InvalidAnswerError as e:
+            rejected.append({"user_id": user_id, "reason": str(e)})
+            continue
+        rows.extend(answer_rows(state))
+    return rows, rejected
+
+
+def bounded_map(
+    pool: Executor, chunks: Iterable[List[Record]], window: int
+) -> Iterator[Tuple[List[Row], List[Dict[str, str]]]]:
+    """Executor.map と同じく入力順に結果を返すが、実行中のチャンクを window 個までに抑える
+
+    Executor.map は入力を最初にすべて投入するため、大きなファイルではメモリが入力サイズに比例する。
+    """
+    pending: deque = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(process_chunk, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def ingest(
+    records: Iterable[Record],
+    db_path: str,
+    workers: int = 0,
+    chunk_size: int = 10000,
+    batch_size: int = 100000,
+) -> Dict[str, Any]:
+    """レコードを検証して answers テーブルに一括保存
+
+    workers が1以上の場合は検証をプロセスプールで並列に行い、
+    書き込みは親プロセスの1接続から大きなトランザクションで行う（SQLiteの書き込みは1本のため）。
+    """
+    store = AnswerStore(db_path, batch_size=batch_size)
+    started = time.perf_counter()
+    rows_written = 0
+    rejected: List[Dict[str, str]] = []
+
+    def consume(results: Iterable[Tuple[List[Row], List[Dict[str, str]]]]) -> None:
+        nonlocal rows_written
+        for rows, chunk_rejected in results:
+            store.add_many(rows)
+            rows_written += len(rows)
+            rejected.extend(chunk_rejected)
+
+    try:
+        chunks = chunked(records, chunk_size)
+        if workers > 0:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                consume(bounded_map(pool, chunks, window=workers * 2))
+        else:
+            consume(map(process_chunk, chunks))
+    finally:
+        store.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows_written,
+        "rejected": rejected,
+        "seconds": elapsed,
+        "rows_per_second": rows_written / elapsed if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="回答シートを answers テーブルへ一括で取り込みます"
+    )
+    parser.add_argument("path", help="入力ファイル（.csv または .jsonl）")
+    parser.add_argument("--db", default="answers.db", help="保存先のSQLiteファイル")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="検証に使うプロセス数（0は単一プロセス）"
+    )
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument(
+        "--batch-size", type=int, default=100000, help="1トランザクションあたりの行数"
+    )
+    args = parser.parse_args()
+
+    skipped: List[Dict[str, str]] = []
+    result = ingest(
+        read_records(args.path, skipped),
+        args.db,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+    )
+    print(
+        f"取り込み完了: {result['rows']:,} 行 "
+        f"({result['seconds']:.1f} 秒, {result['rows_per_second']:,.0f} 行/秒)"
+    )
+    rejected = skipped + result["rejected"]
+    if rejected:
+        print(
+            f"不正なレコード: {len(rejected):,} 件（読み込めない行 {len(skipped):,} 件）"
+        )
+        for item in rejected[:10]:
+            where = f"{item['line']}行目" if item.get("line") else item["user_id"]
+            print(f"  {where}: {item['reason']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import json
 import sqlite3
-from typing import Dict, Any, List
-from datetime import datetime
+import threading
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
 from langgraph.graph import Graph, END
 from pydantic import BaseModel
 
@@ -14,6 +15,24 @@ class QuestionState(BaseModel):
     current_answer: str = ""
     reaction_message: str = ""
     is_complete: bool = False
+    # 非対話モード用: 質問順の回答（選択肢の文字列または1始まりの番号）
+    pending_answers: List[str] = []
+    interactive: bool = True
+
+
+class InvalidAnswerError(ValueError):
+    """非対話モードで回答が不足している、または選択肢にない場合のエラー"""
+
+
+def resolve_option(question: Dict[str, Any], raw: str) -> Optional[str]:
+    """回答を選択肢に解決（選択肢の文字列そのもの、または1始まりの番号）"""
+    raw = raw.strip()
+    if raw in question['options']:
+        return raw
+    if raw.isdigit() and 1 <= int(raw) <= len(question['options']):
+        option: str = question['options'][int(raw) - 1]
+        return option
+    return None
 
 # 事前定義された質問リスト（JSON形式）
 QUESTION_LIST = [
@@ -53,40 +72,152 @@ QUESTION_LIST = [
     }
 ]
 
-class FixedQuestionFlow:
-    def __init__(self, db_path: str = "answers.db"):
+# 回答の永続化（長寿命の接続とバッチ書き込み）
+class AnswerStore:
+    def __init__(self, db_path: str = "answers.db", batch_size: int = 1000):
         self.db_path = db_path
+        self.batch_size = batch_size
+        self._buffer: List[Tuple[str, int, str, str, str]] = []
+        self._lock = threading.Lock()
+        # 接続は使い回し、WALモードで読み込みと書き込みを並行できるようにする
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.setup_database()
-        self.graph = self.create_graph()
     
     def setup_database(self):
         """データベースの初期化"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS answers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                question_id INTEGER NOT NULL,
-                question TEXT NOT NULL,
-                answer TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self._lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # 回答履歴の取得（user_id で絞り込み、timestamp 順）をインデックスで処理する
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_answers_user_timestamp
+                ON answers (user_id, timestamp)
+            ''')
+    
+    def add(self, user_id: str, question_id: int, question: str, answer: str,
+            timestamp: Optional[str] = None) -> None:
+        """回答をバッファに追加し、バッチサイズに達したらまとめて書き込む"""
+        self.add_many([(user_id, question_id, question, answer, timestamp or current_timestamp())])
+    
+    def add_many(self, rows: List[Tuple[str, int, str, str, str]]) -> None:
+        """複数の回答をバッファに追加する (user_id, question_id, question, answer, timestamp)"""
+        with self._lock:
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+    
+    def flush(self) -> None:
+        """バッファの回答を1トランザクションで書き込む"""
+        with self._lock:
+            self._flush_locked()
+    
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO answers (user_id, question_id, question, answer, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', self._buffer)
+        self._buffer = []
+    
+    def get_user_answers_page(self, user_id: str, page_size: int = 100,
+                              after: Optional[Tuple[str, int]] = None
+                              ) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """特定ユーザーの回答履歴を1ページ分取得（(timestamp, id) によるキーセットページング）"""
+        self.flush()
+        with self._lock:
+            if after is None:
+                cursor = self.conn.execute('''
+                    SELECT id, question_id, question, answer, timestamp
+                    FROM answers
+                    WHERE user_id = ?
+                    ORDER BY timestamp, id
+                    LIMIT ?
+                ''', (user_id, page_size))
+            else:
+                cursor = self.conn.execute('''
+                    SELECT id, question_id, question, answer, timestamp
+                    FROM answers
+                    WHERE user_id = ? AND (timestamp, id) > (?, ?)
+                    ORDER BY timestamp, id
+                    LIMIT ?
+                ''', (user_id, after[0], after[1], page_size))
+            rows = cursor.fetchall()
+        
+        records = [
+            {
+                "question_id": row[1],
+                "question": row[2],
+                "answer": row[3],
+                "timestamp": row[4]
+            }
+            for row in rows
+        ]
+        next_after = (rows[-1][4], rows[-1][0]) if len(rows) == page_size else None
+        return records, next_after
+    
+    def iter_user_answers(self, user_id: str, page_size: int = 100) -> Iterator[Dict]:
+        """特定ユーザーの回答履歴をページ単位で読みながら順に返す"""
+        records, after = self.get_user_answers_page(user_id, page_size)
+        yield from records
+        while after is not None:
+            records, after = self.get_user_answers_page(user_id, page_size, after)
+            yield from records
+    
+    def close(self) -> None:
+        """バッファを書き込んで接続を閉じる"""
+        self.flush()
+        self.conn.close()
+
+
+def answer_rows(state: QuestionState) -> List[Tuple[str, int, str, str, str]]:
+    """状態の回答履歴を answers テーブルの行に変換"""
+    return [
+        (state.user_id, a["question_id"], a["question"], a["answer"], a["timestamp"])
+        for a in state.answers
+    ]
+
+
+def current_timestamp() -> str:
+    """CURRENT_TIMESTAMP と同じ並び順になるUTCのタイムスタンプ（マイクロ秒付き）"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class FixedQuestionFlow:
+    def __init__(self, db_path: Optional[str] = "answers.db"):
+        self.db_path = db_path
+        # db_path が None の場合は保存せず、回答は状態の履歴にのみ残す
+        self.store = AnswerStore(db_path) if db_path else None
+        self.graph = self.create_graph()
     
     def ask_question_list(self, state: QuestionState) -> QuestionState:
         """質問リストから現在の質問を取得"""
-        print(f"\n=== 質問 {state.current_question_index + 1}/{len(QUESTION_LIST)} ===")
-        
-        if state.current_question_index >= len(QUESTION_LIST):
-            state.is_complete = True
-            return state
-        
         current_q = QUESTION_LIST[state.current_question_index]
         state.current_question = current_q
         
+        # 非対話モードでは事前に与えられた回答を順に使う
+        if not state.interactive:
+            if not state.pending_answers:
+                raise InvalidAnswerError(f"質問 {current_q['id']} の回答がありません")
+            raw = state.pending_answers.pop(0)
+            answer = resolve_option(current_q, raw)
+            if answer is None:
+                raise InvalidAnswerError(f"質問 {current_q['id']} の回答が選択肢にありません: {raw}")
+            state.current_answer = answer
+            return state
+        
+        print(f"\n=== 質問 {state.current_question_index + 1}/{len(QUESTION_LIST)} ===")
         print(f"質問: {current_q['question']}")
         print("選択肢:")
         for i, option in enumerate(current_q['options'], 1):
@@ -94,46 +225,43 @@ class FixedQuestionFlow:
         
         # ユーザーからの入力を受け取る
         while True:
-            try:
-                choice = input("\n番号を選択してください: ")
-                choice_idx = int(choice) - 1
-                if 0 <= choice_idx < len(current_q['options']):
-                    state.current_answer = current_q['options'][choice_idx]
-                    break
-                else:
-                    print("無効な選択です。もう一度選択してください。")
-            except ValueError:
+            choice = input("\n番号を選択してください: ")
+            if not choice.strip().isdigit():
                 print("数字を入力してください。")
+                continue
+            answer = resolve_option(current_q, choice)
+            if answer is not None:
+                state.current_answer = answer
+                break
+            print("無効な選択です。もう一度選択してください。")
         
         return state
     
     def record_answer(self, state: QuestionState) -> QuestionState:
         """回答をデータベースに保存（LLM呼び出しなし）"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO answers (user_id, question_id, question, answer)
-            VALUES (?, ?, ?, ?)
-        ''', (
-            state.user_id,
-            state.current_question['id'],
-            state.current_question['question'],
-            state.current_answer
-        ))
-        
-        conn.commit()
-        conn.close()
+        timestamp = current_timestamp()
+        
+        # 書き込みはバッファリングされ、まとめて1トランザクションで保存される
+        # 非対話モードでは全回答の検証が済んでから run_batch がまとめて保存する
+        if self.store is not None and state.interactive:
+            self.store.add(
+                state.user_id,
+                state.current_question['id'],
+                state.current_question['question'],
+                state.current_answer,
+                timestamp
+            )
         
         # 回答を履歴に追加
         state.answers.append({
             "question_id": state.current_question['id'],
             "question": state.current_question['question'],
             "answer": state.current_answer,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
-        print(f"✓ 回答を保存しました: {state.current_answer}")
+        if state.interactive:
+            print(f"✓ 回答を保存しました: {state.current_answer}")
         return state
     
     def fixed_reaction(self, state: QuestionState) -> QuestionState:
@@ -142,10 +270,13 @@ class FixedQuestionFlow:
         reaction = reactions.get(state.current_answer, "ご回答ありがとうございます。")
         
         state.reaction_message = reaction
-        print(f"\n💬 {reaction}")
+        if state.interactive:
+            print(f"\n💬 {reaction}")
         
         # 次の質問へ
         state.current_question_index += 1
+        if state.current_question_index >= len(QUESTION_LIST):
+            state.is_complete = True
         return state
     
     def should_continue(self, state: QuestionState) -> str:
@@ -178,6 +309,46 @@ class FixedQuestionFlow:
         
         return workflow.compile()
     
+    def run_offline(self, user_id: str, answers: List[str]) -> QuestionState:
+        """非対話モードで1ユーザー分の回答を処理
+        
+        グラフと同じノードと条件分岐を同じ順序で直接呼び出す。
+        一括取り込みではLangGraphの実行オーバーヘッドがユーザー数に比例して効くため。
+        """
+        state = QuestionState(user_id=user_id, pending_answers=list(answers), interactive=False)
+        while True:
+            state = self.ask_question_list(state)
+            state = self.record_answer(state)
+            state = self.fixed_reaction(state)
+            if self.should_continue(state) == END:
+                break
+        if state.pending_answers:
+            # 質問数より回答が多いレコードは列のずれなどの可能性があるため取り込まない
+            raise InvalidAnswerError(
+                f"回答が質問数より {len(state.pending_answers)} 件多いです: {state.pending_answers}"
+            )
+        return state
+    
+    def run_batch(self, records: Iterable[Tuple[str, List[str]]]) -> Dict[str, Any]:
+        """(user_id, 回答リスト) のレコードを非対話モードで一括処理して保存
+        
+        不正なレコードはスキップし、理由を結果に含める。
+        """
+        users = 0
+        rejected = []
+        for user_id, answers in records:
+            try:
+                state = self.run_offline(user_id, answers)
+            except InvalidAnswerError as e:
+                rejected.append({"user_id": user_id, "reason": str(e)})
+                continue
+            users += 1
+            if self.store is not None:
+                self.store.add_many(answer_rows(state))
+        if self.store is not None:
+            self.store.flush()
+        return {"users": users, "rejected": rejected}
+    
     def run_survey(self, user_id: str):
         """アンケート実行"""
         print("=== 固定質問アンケート開始 ===")
@@ -186,6 +357,8 @@ class FixedQuestionFlow:
         
         # ワークフロー実行
         final_state = self.graph.invoke(initial_state)
+        if self.store is not None:
+            self.store.flush()
         
         print("\n=== アンケート完了 ===")
         print("ご協力ありがとうございました！")
@@ -200,30 +373,13 @@ class FixedQuestionFlow:
         return final_state
 
 # データベースから回答履歴を取得する関数
-def get_user_answers(db_path: str, user_id: str) -> List[Dict]:
-    """特定ユーザーの回答履歴を取得"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT question_id, question, answer, timestamp
-        FROM answers
-        WHERE user_id = ?
-        ORDER BY timestamp
-    ''', (user_id,))
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {
-            "question_id": row[0],
-            "question": row[1],
-            "answer": row[2],
-            "timestamp": row[3]
-        }
-        for row in results
-    ]
+def get_user_answers(db_path: str, user_id: str, page_size: int = 100) -> Iterator[Dict]:
+    """特定ユーザーの回答履歴をページ単位で順に取得"""
+    store = AnswerStore(db_path)
+    try:
+        yield from store.iter_user_answers(user_id, page_size)
+    finally:
+        store.close()
 
 # 使用例
 if __name__ == "__main__":
@@ -237,10 +393,10 @@ if __name__ == "__main__":
     # 過去の回答履歴確認（オプション）
     print("\n=== 過去の回答履歴確認 ===")
     check_history = input("過去の回答履歴を確認しますか？ (y/n): ")
-    if check_history.lower() == 'y':
-        history = get_user_answers("answers.db", user_id)
-        if history:
-            for record in history:
-                print(f"[{record['timestamp']}] {record['question']} → {record['answer']}")
-        else:
+    if check_history.lower() == 'y' and flow.store is not None:
+        found = False
+        for record in flow.store.iter_user_answers(user_id):
+            found = True
+            print(f"[{record['timestamp']}] {record['question']} → {record['answer']}")
+        if not found:
             print("履歴がありません。")
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""
+アドミッション制御（同時実行数の上限と、待ち時間の上限を超えたリクエストの拒否）
+
+キャンペーンの一斉配信などでリクエストが急増すると、処理中のリクエストがすべて同じように遅くなり、
+最後にはどれもタイムアウトします。AdmissionController は処理中のリクエスト数をルートごとと全体で
+制限し、上限に達したリクエストはルートごとのキューで待たせます。空きができたら優先度の高い
+ルート（回答中のユーザーの /interview/answer など）のキューから順に処理を始めます。
+キューで待った時間がルートごとの上限を超えたリクエストは処理せずに拒否し、呼び出し元が
+503 と Retry-After を返します。処理できない分を早く断ることで、受け付けたリクエストの
+レイテンシを保ちます。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, NamedTuple
+
+
+class RoutePolicy(NamedTuple):
+    """
+    ルートごとのアドミッション制御の設定
+    """
+
+    # 同時に処理するリクエスト数の上限
+    limit: int
+    # 優先度（小さいほど先に処理する）
+    priority: int
+    # キューで待つ時間の上限（秒）。0 の場合は待たずに拒否する
+    queue_budget_seconds: float
+
+
+class _RouteState:
+    def __init__(self, policy: RoutePolicy) -> None:
+        self.policy = policy
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.rejected_total = 0
+        self.max_queue_seconds = 0.0
+
+
+class AdmissionController:
+    """
+    ルートごとの同時実行数の上限と優先度付きのキューで、リクエストの処理開始を制御するクラス
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        policies: Dict[str, RoutePolicy],
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """
+        アドミッション制御を作成します。
+
+        Args:
+            capacity: 全ルートの合計の同時実行数の上限
+            policies: ルート（パス）ごとの設定
+            clock: 待ち時間の計測に使う関数
+        """
+        self.capacity = capacity
+        self.in_flight = 0
+        self._routes = {
+            route: _RouteState(policy) for route, policy in policies.items()
+        }
+        # 空きができたときにキューを調べる順序（優先度の高い順）
+        self._by_priority = sorted(
+            self._routes.values(), key=lambda state: state.policy.priority
+        )
+        self._clock = clock
+
+    def manages(self, route: str) -> bool:
+        return route in self._routes
+
+    def _has_room(self, state: _RouteState) -> bool:
+        return self.in_flight < self.capacity and state.in_flight < state.policy.limit
+
+    def _start(self, state: _RouteState) -> None:
+        self.in_flight += 1
+        state.in_flight += 1
+        state.admitted_total += 1
+
+    def _waiting_ahead(self, state: _RouteState) -> bool:
+        """
+        このルート以上の優先度のキューに待っているリクエストがあるかどうかを返します（追い越し防止）。
+        """
+        return any(
+            other.waiters
+            for other in self._by_priority
+            if other.policy.priority <= state.policy.priority
+            and (other is state or self._has_room(other))
+        )
+
+    async def acquire(self, route: str) -> bool:
+        """
+        リクエストの処理を始められるまで待ちます。
+
+        Args:
+            route: ルート（パス）
+
+        Returns:
+            bool: 処理を始める場合はTrue（release を呼ぶこと）、待ち時間の上限を超えて拒否した場合はFalse
+        """
+        state = self._routes[route]
+        if self._has_room(state) and not self._waiting_ahead(state):
+            self._start(state)
+            return True
+        if state.policy.queue_budget_seconds <= 0:
+            state.rejected_total += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        state.queued_total += 1
+        started = self._clock()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(waiter), state.policy.queue_budget_seconds
+            )
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # クライアントの切断などで待つのをやめた場合は、割り当て済みの枠を返す
+            if waiter.done():
+                self.release(route)
+            else:
+                self._abandon(state, waiter)
+            raise
+        finally:
+            state.max_queue_seconds = max(
+                state.max_queue_seconds, self._clock() - started
+            )
+        if waiter.done():
+            # release で処理の開始が決まっている（タイムアウトと同時の場合も含む）
+            return True
+        self._abandon(state, waiter)
+        state.rejected_total += 1
+        return False
+
+    def _abandon(self, state: _RouteState, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        state.waiters.remove(waiter)
+
+    def release(self, route: str) -> None:
+        """
+        リクエストの処理の終了を記録し、空きができた分だけ待っているリクエストの処理を始めます。
+
+        Args:
+            route: ルート（パス）
+        """
+        state = self._routes[route]
+        self.in_flight -= 1
+        state.in_flight -= 1
+        for candidate in self._by_priority:
+            while candidate.waiters and self._has_room(candidate):
+                waiter = candidate.waiters.popleft()
+                if waiter.done():
+                    continue
+                self._start(candidate)
+                waiter.set_result(None)
+            if self.in_flight >= self.capacity:
+                return
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        ルートごとの処理中・待機中のリクエスト数と、受け付け・待機・拒否の累計を返します。
+
+        Returns:
+            Dict[str, Dict[str, float]]: ルートごとのメトリクス
+        """
+        return {
+            name: {
+                "in_flight": state.in_flight,
+                "waiting": len(state.waiters),
+                "admitted_total": state.admitted_total,
+                "queued_total": state.queued_total,
+                "rejected_total": state.rejected_total,
+                "max_queue_seconds": state.max_queue_seconds,
+            }
+            for name, state in self._routes.items()
+        }
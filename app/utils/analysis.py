@@ -0,0 +1,48 @@
+"""
+面接の完了時の分析
+
+回答をほかの回答者の分布と比べ、各回答がどのくらい一般的かをまとめます。
+ジョブキュー（app.utils.job_queue）のワーカーのスレッドで実行するため、集計カウンターの
+スナップショット以外の共有の状態は参照しません。
+"""
+
+from typing import Any, Dict, List
+
+# この割合未満の回答者しか選んでいない回答を「少数派」とする
+MINORITY_SHARE = 0.2
+
+
+def analyze_completion(
+    answers: Dict[str, str], question_ids: List[str], stats: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    完了したセッションの回答を分析します。
+
+    Args:
+        answers: 質問IDごとの回答
+        question_ids: カタログの質問ID（順序どおり）
+        stats: AnswerStats.snapshot() の結果
+
+    Returns:
+        Dict[str, Any]: 回答数・スキップした質問・回答ごとの選択率と少数派の回答
+    """
+    questions = stats.get("questions", {})
+    peer_share: Dict[str, float] = {}
+    for question_id, answer in answers.items():
+        shares = questions.get(question_id, {}).get("shares", {})
+        if shares:
+            peer_share[question_id] = shares.get(answer, 0.0)
+    minority = [
+        question_id
+        for question_id, share in peer_share.items()
+        if share < MINORITY_SHARE
+    ]
+    return {
+        "answered": len(answers),
+        "skipped": [
+            question_id for question_id in question_ids if question_id not in answers
+        ],
+        "peer_share": peer_share,
+        "minority_answers": minority,
+        "respondents": stats.get("completed", 0),
+    }
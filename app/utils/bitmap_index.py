@@ -0,0 +1,287 @@
+"""
+回答のビットマップインデックスとコホート検索
+"""
+
+import heapq
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 1チャンクあたりのビット数（上位ビットでチャンクを選び、下位12ビットをチャンク内で扱う）
+# チャンクを小さく保つことで、1ビットの更新で複製される整数のサイズを抑える
+CHUNK_BITS = 12
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# 検索式の入れ子の深さの上限（深すぎる式で再帰の上限に達しないように）
+MAX_QUERY_DEPTH = 32
+
+
+class Bitmap:
+    """
+    チャンク分割された圧縮ビットマップ（Roaring方式の簡易版）
+
+    値の上位ビットごとにチャンクを分け、各チャンクを整数のビット列で保持します。
+    空のチャンクは保持しないため、疎な集合でもメモリを消費しません。
+    集合演算はチャンク単位の整数演算で行います。
+    """
+
+    __slots__ = ("_chunks",)
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._chunks: Dict[int, int] = {}
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def _from_chunks(cls, chunks: Dict[int, int]) -> "Bitmap":
+        bitmap = cls()
+        bitmap._chunks = {high: bits for high, bits in chunks.items() if bits}
+        return bitmap
+
+    def add(self, value: int) -> None:
+        high = value >> CHUNK_BITS
+        self._chunks[high] = self._chunks.get(high, 0) | (1 << (value & CHUNK_MASK))
+
+    def discard(self, value: int) -> None:
+        high = value >> CHUNK_BITS
+        bits = self._chunks.get(high)
+        if bits is None:
+            return
+        bits &= ~(1 << (value & CHUNK_MASK))
+        if bits:
+            self._chunks[high] = bits
+        else:
+            del self._chunks[high]
+
+    def __contains__(self, value: int) -> bool:
+        bits = self._chunks.get(value >> CHUNK_BITS, 0)
+        return bool(bits >> (value & CHUNK_MASK) & 1)
+
+    def __len__(self) -> int:
+        return sum(bits.bit_count() for bits in self._chunks.values())
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        small, large = sorted((self._chunks, other._chunks), key=len)
+        return Bitmap._from_chunks(
+            {high: bits & large[high] for high, bits in small.items() if high in large}
+        )
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self._chunks)
+        for high, bits in other._chunks.items():
+            chunks[high] = chunks.get(high, 0) | bits
+        return Bitmap._from_chunks(chunks)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap._from_chunks(
+            {
+                high: bits & ~other._chunks.get(high, 0)
+                for high, bits in self._chunks.items()
+            }
+        )
+
+    def copy(self) -> "Bitmap":
+        return Bitmap._from_chunks(self._chunks)
+
+    def iter_from(self, start: int = 0) -> Iterator[int]:
+        """
+        start 以上の値を昇順に返します。
+
+        Args:
+            start: 返す値の下限
+
+        Returns:
+            Iterator[int]: 昇順の値
+        """
+        start_high = start >> CHUNK_BITS
+        for high in sorted(self._chunks):
+            if high < start_high:
+                continue
+            bits = self._chunks[high]
+            if high == start_high:
+                bits &= ~((1 << (start & CHUNK_MASK)) - 1)
+            base = high << CHUNK_BITS
+            while bits:
+                lowest = bits & -bits
+                yield base + lowest.bit_length() - 1
+                bits ^= lowest
+
+    def __iter__(self) -> Iterator[int]:
+        return self.iter_from(0)
+
+
+class CohortIndex:
+    """
+    (質問ID, 選択肢) ごとのビットマップを回答到着時に更新し、
+    それらの論理演算でコホートを検索するインデックス
+
+    セッションIDには序数を割り当て、ビットマップにはその序数を格納します。削除したセッションの
+    序数は次に登録するセッションに再利用するため、ビットマップの幅は同時に存在するセッション数で
+    頭打ちになります（ページングの途中で登録されたセッションは、カーソルより前の序数を再利用した
+    場合はそのページングでは返しません）。
+    複数選択の質問では1セッションが同じ質問の複数のビットマップに属します。
+
+    検索式は次の形の辞書で表します。
+        {"question_id": "q1", "option": "会社員"}
+        {"completed": true}
+        {"and": [式, ...]} / {"or": [式, ...]} / {"not": 式}
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ordinals: Dict[str, int] = {}
+        self._session_ids: List[Optional[str]] = []
+        # 削除したセッションの序数（小さい順に再利用する）
+        self._free: List[int] = []
+        self._all = Bitmap()
+        self._completed = Bitmap()
+        self._options: Dict[str, Dict[str, Bitmap]] = {}
+
+    def add_session(self, session_id: str) -> int:
+        """
+        セッションを登録し、序数を返します。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            int: セッションの序数
+        """
+        with self._lock:
+            ordinal = self._ordinals.get(session_id)
+            if ordinal is None:
+                if self._free:
+                    ordinal = heapq.heappop(self._free)
+                    self._session_ids[ordinal] = session_id
+                else:
+                    ordinal = len(self._session_ids)
+                    self._session_ids.append(session_id)
+                self._ordinals[session_id] = ordinal
+                self._all.add(ordinal)
+            return ordinal
+
+    def remove_session(self, session_id: str) -> None:
+        """
+        セッションをインデックスから取り除きます。
+
+        Args:
+            session_id: セッションID
+        """
+        with self._lock:
+            ordinal = self._ordinals.pop(session_id, None)
+            if ordinal is None:
+                return
+            self._session_ids[ordinal] = None
+            self._all.discard(ordinal)
+            self._completed.discard(ordinal)
+            for bitmaps in self._options.values():
+                for bitmap in bitmaps.values():
+                    bitmap.discard(ordinal)
+            heapq.heappush(self._free, ordinal)
+
+    def record_answer(
+        self, session_id: str, question_id: str, options: Iterable[str]
+    ) -> None:
+        """
+        回答を記録します。同じ質問への以前の回答は置き換えられます。
+
+        Args:
+            session_id: セッションID
+            question_id: 質問ID
+            options: 選択された選択肢（単一選択の場合は1要素）
+        """
+        ordinal = self.add_session(session_id)
+        with self._lock:
+            bitmaps = self._options.setdefault(question_id, {})
+            for bitmap in bitmaps.values():
+                bitmap.discard(ordinal)
+            for option in options:
+                bitmaps.setdefault(option, Bitmap()).add(ordinal)
+
+    def mark_completed(self, session_id: str) -> None:
+        """
+        セッションを完了済みとして記録します。
+
+        Args:
+            session_id: セッションID
+        """
+        ordinal = self.add_session(session_id)
+        with self._lock:
+            self._completed.add(ordinal)
+
+    def _evaluate(self, expr: Dict[str, Any], depth: int = 0) -> Bitmap:
+        if depth > MAX_QUERY_DEPTH:
+            raise ValueError(f"検索式の入れ子は {MAX_QUERY_DEPTH} 段までです")
+        if not isinstance(expr, dict):
+            raise ValueError(f"検索式が不正です: {expr!r}")
+        if "and" in expr or "or" in expr:
+            operator = "and" if "and" in expr else "or"
+            operands = expr[operator]
+            if not isinstance(operands, list) or not operands:
+                raise ValueError(
+                    f"{operator} には1つ以上の式のリストを指定してください"
+                )
+            result = self._evaluate(operands[0], depth + 1)
+            for operand in operands[1:]:
+                if operator == "and":
+                    result = result & self._evaluate(operand, depth + 1)
+                else:
+                    result = result | self._evaluate(operand, depth + 1)
+            return result
+        if "not" in expr:
+            return self._all - self._evaluate(expr["not"], depth + 1)
+        if "completed" in expr:
+            if expr["completed"]:
+                return self._completed.copy()
+            return self._all - self._completed
+        if "question_id" in expr and "option" in expr:
+            bitmap = self._options.get(expr["question_id"], {}).get(expr["option"])
+            return bitmap.copy() if bitmap is not None else Bitmap()
+        raise ValueError(f"検索式が不正です: {expr!r}")
+
+    def count(self, expr: Dict[str, Any]) -> int:
+        """
+        検索式に一致するセッション数を返します。
+
+        Args:
+            expr: 検索式
+
+        Returns:
+            int: 一致するセッション数
+
+        Raises:
+            ValueError: 検索式が不正な場合
+        """
+        with self._lock:
+            return len(self._evaluate(expr))
+
+    def page(
+        self, expr: Dict[str, Any], limit: int = 100, cursor: int = 0
+    ) -> Tuple[int, List[str], Optional[int]]:
+        """
+        検索式に一致するセッションIDを序数順にページ単位で返します。
+
+        Args:
+            expr: 検索式
+            limit: 1ページあたりの件数
+            cursor: 前のページが返した続きの位置（最初のページは0）
+
+        Returns:
+            Tuple: 一致件数、セッションIDのリスト、次ページのカーソル（最後のページはNone）
+
+        Raises:
+            ValueError: 検索式が不正な場合、または limit が1未満の場合
+        """
+        if limit < 1:
+            raise ValueError("limit は1以上を指定してください")
+        with self._lock:
+            bitmap = self._evaluate(expr)
+            session_ids: List[str] = []
+            next_cursor: Optional[int] = None
+            for ordinal in bitmap.iter_from(cursor):
+                if len(session_ids) == limit:
+                    next_cursor = ordinal
+                    break
+                session_id = self._session_ids[ordinal]
+                if session_id is not None:
+                    session_ids.append(session_id)
+            return len(bitmap), session_ids, next_cursor
@@ -0,0 +1,300 @@
+"""
+複数ノード構成でのセッションのルーティング
+
+各ノードはコンシステントハッシュ（仮想ノード付き）で決まるセッションの一部を担当します。
+担当ノードは自分のセッションをメモリ上で処理し、担当外のリクエストは担当ノードへ転送するか、
+クライアントを担当ノードへリダイレクトします。ノードの追加・削除で担当が変わるのは、
+リング上で隣接する区間のセッションだけです。
+
+    CLUSTER_NODES=http://127.0.0.1:8001,http://127.0.0.1:8002 NODE_URL=http://127.0.0.1:8001 \\
+        uvicorn app.main:app --port 8001
+"""
+
+import bisect
+import hashlib
+import uuid
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+# 転送したリクエストに付けるヘッダー（受け取ったノードは再転送しない）
+ROUTED_HEADER = "X-Routed-By"
+
+# 転送時に引き継がないヘッダー
+HOP_BY_HOP_HEADERS = {
+    "host",
+    "content-length",
+    "connection",
+    "keep-alive",
+    "transfer-encoding",
+}
+
+# 担当ノードのレスポンスから引き継がないヘッダー（ボディは展開済みのバイト列で中継するため、
+# content-encoding も引き継がない）
+RESPONSE_SKIPPED_HEADERS = HOP_BY_HOP_HEADERS | {"content-encoding"}
+
+ROUTING_MODES = ("forward", "redirect")
+
+
+def ring_hash(value: str) -> int:
+    """
+    リング上の位置を返します（プロセスやノードによらず同じ値になるハッシュ）。
+    """
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """
+    仮想ノード付きのコンシステントハッシュのリング
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128) -> None:
+        """
+        リングを作成します。
+
+        Args:
+            nodes: ノードのURL
+            vnodes: 1ノードあたりの仮想ノード数
+        """
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def add_node(self, node: str) -> None:
+        """
+        ノードを追加します。既に含まれている場合は何もしません。
+
+        Args:
+            node: ノードのURL
+        """
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for i in range(self.vnodes):
+            point = ring_hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node: str) -> None:
+        """
+        ノードを削除します。含まれていない場合は何もしません。
+
+        Args:
+            node: ノードのURL
+        """
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        kept = [
+            (point, owner)
+            for point, owner in zip(self._points, self._owners)
+            if owner != node
+        ]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        キーを担当するノードを返します。
+
+        Args:
+            key: セッションID
+
+        Returns:
+            Optional[str]: 担当ノードのURL。ノードがない場合はNone
+        """
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, ring_hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class ClusterRouter:
+    """
+    自ノードの担当判定と、担当ノードへの転送・リダイレクトを扱うクラス
+    """
+
+    def __init__(
+        self,
+        node_url: str,
+        nodes: Iterable[str],
+        vnodes: int = 128,
+        mode: str = "forward",
+        timeout: float = 10.0,
+    ) -> None:
+        """
+        ルーターを作成します。
+
+        Args:
+            node_url: 自ノードのURL（CLUSTER_NODES の表記と一致させる）
+            nodes: クラスターの全ノードのURL
+            vnodes: 1ノードあたりの仮想ノード数
+            mode: 担当外のリクエストの扱い（forward / redirect）
+            timeout: 転送のタイムアウト（秒）
+
+        Raises:
+            ValueError: 未対応のモードが指定された場合
+        """
+        if mode not in ROUTING_MODES:
+            raise ValueError(
+                f"ROUTING_MODE は {', '.join(ROUTING_MODES)} のいずれかを指定してください"
+            )
+        self.node_url = node_url.rstrip("/")
+        self.ring = HashRing([node.rstrip("/") for node in nodes], vnodes=vnodes)
+        self.mode = mode
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def owner(self, session_id: str) -> str:
+        return self.ring.owner(session_id) or self.node_url
+
+    def is_local(self, session_id: str) -> bool:
+        return self.owner(session_id) == self.node_url
+
+    def new_session_id(self) -> str:
+        """
+        自ノードが担当するセッションIDを生成します（開始したノードでそのまま処理できるように）。
+
+        Returns:
+            str: セッションID
+        """
+        if self.node_url not in self.ring:
+            return str(uuid.uuid4())
+        while True:
+            session_id = str(uuid.uuid4())
+            if self.is_local(session_id):
+                return session_id
+
+    def set_nodes(self, nodes: Iterable[str]) -> None:
+        """
+        クラスターのノードを置き換えます。
+
+        Args:
+            nodes: クラスターの全ノードのURL
+        """
+        nodes = [node.rstrip("/") for node in nodes]
+        for node in self.ring.nodes:
+            if node not in nodes:
+                self.ring.remove_node(node)
+        for node in nodes:
+            self.ring.add_node(node)
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def forward(
+        self,
+        owner: str,
+        method: str,
+        path: str,
+        query: str,
+        headers: Dict[str, str],
+        body: bytes,
+    ) -> httpx.Response:
+        """
+        リクエストを担当ノードへ転送します。レスポンスのボディは読み込まずに返すため、
+        relay_body で中継して閉じてください。
+
+        Args:
+            owner: 担当ノードのURL
+            method: HTTPメソッド
+            path: パス
+            query: クエリ文字列
+            headers: リクエストヘッダー
+            body: リクエストボディ
+
+        Returns:
+            httpx.Response: 担当ノードのレスポンス（ボディは未読み込み）
+
+        Raises:
+            httpx.HTTPError: 担当ノードに接続できない場合
+        """
+        forwarded = {
+            k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+        }
+        forwarded[ROUTED_HEADER] = self.node_url
+        url = f"{owner}{path}" + (f"?{query}" if query else "")
+        client = self.client()
+        request = client.build_request(method, url, headers=forwarded, content=body)
+        return await client.send(request, stream=True)
+
+    @staticmethod
+    def response_headers(response: httpx.Response) -> List[Tuple[bytes, bytes]]:
+        """
+        担当ノードのレスポンスのヘッダーのうち、クライアントへ引き継ぐものを返します
+        （Retry-After や ETag などを含み、同じ名前のヘッダーも1つずつ残す）。
+
+        Args:
+            response: 担当ノードのレスポンス
+
+        Returns:
+            List[Tuple[bytes, bytes]]: (名前, 値) のリスト
+        """
+        return [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in response.headers.multi_items()
+            if name.lower() not in RESPONSE_SKIPPED_HEADERS
+        ]
+
+    @staticmethod
+    async def relay_body(response: httpx.Response) -> AsyncIterator[bytes]:
+        """
+        担当ノードのレスポンスのボディを、受け取った順にそのまま返します（/chat/stream を溜め込まない）。
+        最後まで読み終えたとき、またはクライアントが切断したときにレスポンスを閉じます。
+
+        Args:
+            response: 担当ノードのレスポンス
+
+        Yields:
+            bytes: ボディの断片
+        """
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def handoff(self, sessions: List[Tuple[str, dict]]) -> Dict[str, int]:
+        """
+        担当が変わったセッションを新しい担当ノードへ送ります。
+
+        Args:
+            sessions: (セッションID, 会話状態の辞書) のリスト
+
+        Returns:
+            Dict[str, int]: 送信先ノードごとのセッション数
+
+        Raises:
+            httpx.HTTPError: 送信先ノードに接続できない場合
+        """
+        by_owner: Dict[str, List[dict]] = {}
+        for session_id, state in sessions:
+            by_owner.setdefault(self.owner(session_id), []).append(
+                {"session_id": session_id, "state": state}
+            )
+        for owner, items in by_owner.items():
+            response = await self.client().post(
+                f"{owner}/cluster/handoff",
+                json={"sessions": items},
+                headers={ROUTED_HEADER: self.node_url},
+            )
+            response.raise_for_status()
+        return {owner: len(items) for owner, items in by_owner.items()}
@@ -0,0 +1,425 @@
+"""
+セッションの変更を追記するイベントログとスナップショット
+
+セッション全体を書き直す代わりに、開始・回答などの変更ごとに小さなレコードを
+セグメントファイルへ追記します。定期的に全セッションのスナップショットを書き出し、
+起動時は最新のスナップショットを読み込んでから、それ以降のセグメントだけを再生します。
+スナップショットより古いセグメントはバックグラウンドで削除（コンパクション）します。
+
+ディレクトリの構成:
+    segment-00000001.log  イベントのセグメント（番号順に追記）
+    snapshot-00000003.snap  セグメント3より前のイベントを反映したスナップショット
+
+スナップショットはリクエストの処理と並行して書き出すため、セグメント3のイベントの一部を
+既に含むことがあります。イベントはすべて値をそのまま設定する（差分ではない）ため、
+スナップショットにセグメント3以降を再生し直しても同じ状態になります。
+"""
+
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.models.session_record import NO_OPTION, SessionRecord
+
+# イベントの種類
+EV_START = 1  # セッションの開始
+EV_STEP = 2  # 回答（またはスキップ）と、次の質問・完了フラグ
+EV_PUT = 3  # セッション全体の置き換え（他ノードからの引き継ぎなど）
+EV_DELETE = 4  # セッションの削除
+
+# スキップ（回答を記録しない）を表す質問インデックス
+NO_QUESTION = 0xFFFF
+# ユーザーIDが None であることを表す長さ
+NO_USER_ID = 0xFFFF
+
+# レコードの枠: ペイロード長, CRC32
+FRAME = struct.Struct("<II")
+# ペイロードの先頭: 種類, セッションIDの長さ
+EVENT_HEAD = struct.Struct("<BB")
+START_BODY = struct.Struct("<HH")
+STEP_BODY = struct.Struct("<HBHBI")
+
+SNAPSHOT_MAGIC = b"SNAP"
+SNAPSHOT_HEAD = struct.Struct("<4sIQ")
+SNAPSHOT_VERSION = 1
+
+SEGMENT_PATTERN = re.compile(r"segment-(\d{8})\.log$")
+SNAPSHOT_PATTERN = re.compile(r"snapshot-(\d{8})\.snap$")
+
+
+def _session_key(session_id: str) -> bytes:
+    key = session_id.encode("utf-8")
+    if len(key) > 0xFF:
+        raise ValueError("セッションIDは255バイト以下にしてください")
+    return key
+
+
+def _event(kind: int, session_id: str, body: bytes = b"") -> bytes:
+    key = _session_key(session_id)
+    payload = EVENT_HEAD.pack(kind, len(key)) + key + body
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[bytes, int]]:
+    """
+    セグメントのバイト列からペイロードを順に取り出します。
+    書き込み途中で停止した末尾のレコード（長さ不足・CRC不一致）の手前で止まります。
+
+    Args:
+        data: セグメントの内容
+
+    Yields:
+        Tuple[bytes, int]: ペイロードと、そのレコードの終端位置
+    """
+    offset = 0
+    end = len(data)
+    while offset + FRAME.size <= end:
+        length, crc = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        if start + length > end:
+            return
+        payload = data[start : start + length]
+        if zlib.crc32(payload) != crc:
+            return
+        offset = start + length
+        yield payload, offset
+
+
+def apply_event(
+    sessions: Dict[str, SessionRecord], payload: bytes, catalog_size: int
+) -> None:
+    """
+    イベントを1件セッションの辞書に反映します。
+
+    Args:
+        sessions: セッションIDからセッションへの辞書
+        payload: イベントのペイロード
+        catalog_size: カタログの質問数
+    """
+    kind, key_len = EVENT_HEAD.unpack_from(payload, 0)
+    offset = EVENT_HEAD.size
+    session_id = payload[offset : offset + key_len].decode("utf-8")
+    offset += key_len
+
+    if kind == EV_START:
+        if session_id in sessions:
+            # スナップショットに既に含まれている
+            return
+        user_len, current = START_BODY.unpack_from(payload, offset)
+        offset += START_BODY.size
+        user_id = (
+            None
+            if user_len == NO_USER_ID
+            else payload[offset : offset + user_len].decode("utf-8")
+        )
+        sessions[session_id] = SessionRecord(
+            catalog_size, user_id=user_id, current=current
+        )
+    elif kind == EV_STEP:
+        record = sessions.get(session_id)
+        if record is None:
+            # 削除済みのセッション
+            return
+        question_index, option, current, completed, text_len = STEP_BODY.unpack_from(
+            payload, offset
+        )
+        offset += STEP_BODY.size
+        if question_index != NO_QUESTION:
+            record.choices[question_index] = option
+            if option == NO_OPTION:
+                if record.texts is None:
+                    record.texts = {}
+                record.texts[question_index] = payload[
+                    offset : offset + text_len
+                ].decode("utf-8")
+            elif record.texts is not None:
+                record.texts.pop(question_index, None)
+            record.answered |= 1 << question_index
+        record.current = current
+        record.completed = bool(completed)
+    elif kind == EV_PUT:
+        sessions[session_id], _ = SessionRecord.from_bytes(payload, offset)
+    elif kind == EV_DELETE:
+        sessions.pop(session_id, None)
+
+
+class EventLog:
+    """
+    セグメント化された追記専用のイベントログ
+
+    追記は O_APPEND のファイルへの1回の write で行うため、プロセスが異常終了しても
+    書き込み済みのイベントは失われません（fsync=True の場合はOSの停止にも耐えます）。
+    """
+
+    def __init__(
+        self, directory: str, segment_bytes: int = 64 * 1024 * 1024, fsync: bool = False
+    ) -> None:
+        """
+        ログを開きます。既存のセグメントがある場合は最後のセグメントに追記します。
+
+        Args:
+            directory: ログのディレクトリ
+            segment_bytes: セグメントを切り替えるサイズ（バイト）
+            fsync: 追記ごとに fsync するかどうか
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        segments = self.segments()
+        self._seq = segments[-1] if segments else 1
+        self._fd = self._open_segment(self._seq)
+        self._size = os.fstat(self._fd).st_size
+        self.bytes_since_snapshot = 0
+
+    def _path(self, kind: str, seq: int) -> str:
+        suffix = "log" if kind == "segment" else "snap"
+        return os.path.join(self.directory, f"{kind}-{seq:08d}.{suffix}")
+
+    def _open_segment(self, seq: int) -> int:
+        return os.open(
+            self._path("segment", seq), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+        )
+
+    def _numbers(self, pattern: "re.Pattern") -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def segments(self) -> List[int]:
+        return self._numbers(SEGMENT_PATTERN)
+
+    def snapshots(self) -> List[int]:
+        return self._numbers(SNAPSHOT_PATTERN)
+
+    def close(self) -> None:
+        with self._lock:
+            os.close(self._fd)
+
+    def _append(self, data: bytes) -> None:
+        with self._lock:
+            if self._size and self._size + len(data) > self.segment_bytes:
+                self._roll_locked()
+            os.write(self._fd, data)
+            if self.fsync:
+                os.fsync(self._fd)
+            self._size += len(data)
+            self.bytes_since_snapshot += len(data)
+
+    def _roll_locked(self) -> int:
+        os.close(self._fd)
+        self._seq += 1
+        self._fd = self._open_segment(self._seq)
+        self._size = 0
+        return self._seq
+
+    def roll(self) -> int:
+        """
+        新しいセグメントに切り替えます。
+
+        Returns:
+            int: 新しいセグメントの番号（以降のイベントはこのセグメントに書かれる）
+        """
+        with self._lock:
+            self.bytes_since_snapshot = 0
+            return self._roll_locked()
+
+    def log_start(self, session_id: str, record: SessionRecord) -> None:
+        """
+        セッションの開始を記録します。
+
+        Args:
+            session_id: セッションID
+            record: 開始時のセッション
+        """
+        user = b"" if record.user_id is None else record.user_id.encode("utf-8")
+        user_len = NO_USER_ID if record.user_id is None else len(user)
+        self._append(
+            _event(
+                EV_START, session_id, START_BODY.pack(user_len, record.current) + user
+            )
+        )
+
+    def log_step(
+        self, session_id: str, record: SessionRecord, question_index: Optional[int]
+    ) -> None:
+        """
+        回答後のセッションの変更を記録します。
+
+        Args:
+            session_id: セッションID
+            record: 回答を反映した後のセッション
+            question_index: 回答した質問のインデックス（スキップの場合はNone）
+        """
+        text = b""
+        if question_index is None:
+            question_index, option = NO_QUESTION, NO_OPTION
+        else:
+            option = record.choices[question_index]
+            if option == NO_OPTION and record.texts:
+                text = record.texts.get(question_index, "").encode("utf-8")
+        body = (
+            STEP_BODY.pack(
+                question_index, option, record.current, record.completed, len(text)
+            )
+            + text
+        )
+        self._append(_event(EV_STEP, session_id, body))
+
+    def log_put(self, session_id: str, record: SessionRecord) -> None:
+        """
+        セッション全体の置き換えを記録します。
+
+        Args:
+            session_id: セッションID
+            record: セッション
+        """
+        self._append(_event(EV_PUT, session_id, record.to_bytes()))
+
+    def log_delete(self, session_id: str) -> None:
+        """
+        セッションの削除を記録します。
+
+        Args:
+            session_id: セッションID
+        """
+        self._append(_event(EV_DELETE, session_id))
+
+    def write_snapshot(
+        self, seq: int, sessions: Iterable[Tuple[str, SessionRecord]]
+    ) -> str:
+        """
+        セグメント seq より前のイベントを反映したスナップショットを書き出します。
+        一時ファイルに書いてから置き換えるため、途中で停止しても前のスナップショットは残ります。
+
+        Args:
+            seq: roll が返したセグメントの番号
+            sessions: (セッションID, セッション) の並び
+
+        Returns:
+            str: スナップショットのパス
+        """
+        path = self._path("snapshot", seq)
+        tmp_path = path + ".tmp"
+        count = 0
+        crc = 0
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_HEAD.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0))
+            buffer: List[bytes] = []
+            for session_id, record in sessions:
+                key = _session_key(session_id)
+                buffer.append(bytes((len(key),)) + key + record.to_bytes())
+                count += 1
+                if len(buffer) >= 10000:
+                    chunk = b"".join(buffer)
+                    crc = zlib.crc32(chunk, crc)
+                    f.write(chunk)
+                    buffer.clear()
+            chunk = b"".join(buffer)
+            crc = zlib.crc32(chunk, crc)
+            f.write(chunk)
+            f.write(struct.pack("<I", crc))
+            f.seek(0)
+            f.write(SNAPSHOT_HEAD.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, count))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def compact(self, seq: int) -> int:
+        """
+        スナップショット seq で不要になった古いセグメントとスナップショットを削除します。
+
+        Args:
+            seq: 書き出し済みのスナップショットの番号
+
+        Returns:
+            int: 削除したファイル数
+        """
+        removed = 0
+        for number in self.segments():
+            if number < seq:
+                os.remove(self._path("segment", number))
+                removed += 1
+        for number in self.snapshots():
+            if number < seq:
+                os.remove(self._path("snapshot", number))
+                removed += 1
+        return removed
+
+    def _load_snapshot(self, seq: int) -> Dict[str, SessionRecord]:
+        with open(self._path("snapshot", seq), "rb") as f:
+            data = f.read()
+        magic, version, count = SNAPSHOT_HEAD.unpack_from(data, 0)
+        body = data[SNAPSHOT_HEAD.size : -4]
+        if (
+            magic != SNAPSHOT_MAGIC
+            or version != SNAPSHOT_VERSION
+            or zlib.crc32(body) != struct.unpack("<I", data[-4:])[0]
+        ):
+            raise ValueError(f"スナップショット {seq} が壊れています")
+        sessions: Dict[str, SessionRecord] = {}
+        offset = SNAPSHOT_HEAD.size
+        from_bytes = SessionRecord.from_bytes
+        for _ in range(count):
+            key_len = data[offset]
+            session_id = data[offset + 1 : offset + 1 + key_len].decode("utf-8")
+            sessions[session_id], offset = from_bytes(data, offset + 1 + key_len)
+        return sessions
+
+    def recover(
+        self, catalog_size: int
+    ) -> Tuple[Dict[str, SessionRecord], Dict[str, float]]:
+        """
+        最新のスナップショットと、それ以降のセグメントからセッションを復元します。
+
+        Args:
+            catalog_size: カタログの質問数
+
+        Returns:
+            Tuple[Dict[str, SessionRecord], Dict[str, float]]: 復元したセッションと、
+            スナップショットのセッション数・再生したイベント数・所要秒数
+        """
+        started = time.perf_counter()
+        sessions: Dict[str, SessionRecord] = {}
+        snapshot_seq = 0
+        for seq in reversed(self.snapshots()):
+            try:
+                sessions = self._load_snapshot(seq)
+            except (ValueError, struct.error):
+                # 壊れたスナップショットは飛ばし、1つ前のものから再生する
+                continue
+            snapshot_seq = seq
+            break
+        snapshot_sessions = len(sessions)
+
+        events = 0
+        for seq in self.segments():
+            if seq < snapshot_seq:
+                continue
+            path = self._path("segment", seq)
+            with open(path, "rb") as f:
+                data = f.read()
+            end = 0
+            for payload, end in iter_frames(data):
+                apply_event(sessions, payload, catalog_size)
+                events += 1
+            if end < len(data) and seq == self._seq:
+                # 書き込み途中で停止した末尾を切り詰め、以降の追記が読めるようにする
+                with self._lock:
+                    os.truncate(path, end)
+                    self._size = end
+
+        return sessions, {
+            "snapshot_sessions": snapshot_sessions,
+            "replayed_events": events,
+            "seconds": time.perf_counter() - started,
+        }
@@ -0,0 +1,123 @@
+"""
+期限切れセッションの削除
+
+すべてのセッションの有効期間は同じ（最終アクティビティから SESSION_EXPIRY_HOURS）ため、
+期限の順序は最終アクティビティの順序と一致します。SessionIndex が最終アクティビティ順の
+リストを保持しているので、タイマーホイールやヒープを別に持たず、その先頭から期限切れの
+セッションを取り出します。1回の処理は slice_size 件までに抑え、処理時間に比例した間隔を空けて
+イベントループへ制御を返すため、大量のセッションが同時に期限切れになっても、リクエストが
+待たされるのは1回分の処理時間までです。
+
+SharedSessionStore はワーカー間で共有できる最終アクティビティ順のインデックスを持たないため、
+1回の処理で scan_slots 個のスロットを走査し、表の最後まで走査したら1周の削除を終えます。
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, Union
+
+from app.utils.session_store import LocalSessionStore, SharedSessionStore
+
+
+class SessionSweeper:
+    """
+    期限切れのセッションを少しずつ削除するクラス
+    """
+
+    def __init__(
+        self,
+        store: Union[LocalSessionStore, SharedSessionStore],
+        ttl_seconds: float,
+        expire: Callable[[str], None],
+        slice_size: int = 200,
+        scan_slots: int = 4096,
+        pause_ratio: float = 1.0,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """
+        削除処理を作成します。
+
+        Args:
+            store: セッションの保存先
+            ttl_seconds: 最終アクティビティからの有効期間（秒）
+            expire: 1セッションを削除する関数（保存先・インデックス・チェックポイントの削除）
+            slice_size: 1回の処理で削除する最大件数
+            scan_slots: SharedSessionStore の場合に1回の処理で走査するスロット数
+            pause_ratio: 1回の処理時間に対する、次の処理までの待ち時間の比率
+                （1.0 の場合、削除に使うのはイベントループの時間の半分まで）
+            clock: 処理時間の計測に使う関数
+        """
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.expire = expire
+        self.slice_size = slice_size
+        self.scan_slots = scan_slots
+        self.pause_ratio = pause_ratio
+        self._clock = clock
+        self.expired_total = 0
+        self.slices_total = 0
+        self.max_slice_seconds = 0.0
+        # SharedSessionStore の次に走査するスロットと、1周の走査が終わったかどうか
+        self._next_slot = 0
+        self._pass_done = False
+
+    def sweep_slice(self) -> int:
+        """
+        期限切れのセッションを最大 slice_size 件（SharedSessionStore の場合は scan_slots 個のスロットの分）削除します。
+
+        Returns:
+            int: 削除した件数
+        """
+        started = self._clock()
+        if isinstance(self.store, SharedSessionStore):
+            session_ids, self._next_slot = self.store.idle_in_slots(
+                self.ttl_seconds, self._next_slot, self.scan_slots
+            )
+            self._pass_done = self._next_slot == 0
+        else:
+            page, _ = self.store.idle_sessions(self.ttl_seconds, self.slice_size)
+            session_ids = [session_id for _, session_id in page]
+            self._pass_done = len(page) < self.slice_size
+        for session_id in session_ids:
+            self.expire(session_id)
+        if session_ids:
+            self.expired_total += len(session_ids)
+            self.slices_total += 1
+            self.max_slice_seconds = max(
+                self.max_slice_seconds, self._clock() - started
+            )
+        return len(session_ids)
+
+    async def sweep(self) -> int:
+        """
+        期限切れのセッションがなくなるまで、1回ごとにイベントループへ制御を返しながら削除します。
+
+        Returns:
+            int: 削除した件数
+        """
+        expired = 0
+        while True:
+            started = self._clock()
+            expired += self.sweep_slice()
+            if self._pass_done:
+                return expired
+            # 処理時間に比例して待ち、その間にリクエストを処理させる
+            await asyncio.sleep((self._clock() - started) * self.pause_ratio)
+
+    async def run(self, interval_seconds: float) -> None:
+        """
+        一定間隔で期限切れのセッションを削除し続けます（lifespan のバックグラウンドタスク）。
+
+        Args:
+            interval_seconds: 削除処理の間隔（秒）
+        """
+        while True:
+            await self.sweep()
+            await asyncio.sleep(interval_seconds)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "expired_total": self.expired_total,
+            "slices_total": self.slices_total,
+            "max_slice_seconds": self.max_slice_seconds,
+        }
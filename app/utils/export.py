@@ -0,0 +1,350 @@
+"""
+完了済み面接結果のストリーミングエクスポート
+
+完了済みセッションをチャンク単位で読み出し、CSV / NDJSON / Arrow IPC ストリームとして
+逐次出力します。選択式の回答は質問ごとの選択肢を辞書とした辞書エンコード列になります。
+メモリ使用量はチャンクサイズにのみ依存し、エクスポート件数には依存しません。
+
+コマンドとして実行すると、APIのエクスポートエンドポイントからストリームを受け取り、
+ファイル（CSV / NDJSON / Arrow / Parquet）へ書き出します。
+
+    python -m app.utils.export --format parquet --output results.parquet
+"""
+
+import argparse
+import csv
+import io
+import json
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from app.models.schemas import ConversationState
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow は任意依存
+    pa = None
+
+if TYPE_CHECKING:
+    from typing_extensions import Buffer
+
+# エクスポート対象の列: (質問ID, 選択肢リスト。自由記述の場合はNone)
+ExportColumn = Tuple[str, Optional[List[str]]]
+# (セッションID, 会話状態) のチャンク
+SessionChunk = List[Tuple[str, ConversationState]]
+
+EXPORT_FORMATS = ("csv", "ndjson", "arrow")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def iter_session_chunks(
+    page: Callable[[int, int], Tuple[List[str], Optional[int]]],
+    lookup: Callable[[str], Optional[ConversationState]],
+    chunk_size: int = 1000,
+) -> Iterator[SessionChunk]:
+    """
+    ページ取得関数を使って、セッションをチャンク単位で読み出します。
+
+    Args:
+        page: (件数, カーソル) を受け取り (セッションIDのリスト, 次のカーソル) を返す関数
+        lookup: セッションIDから会話状態を取得する関数
+        chunk_size: 1チャンクあたりのセッション数
+
+    Returns:
+        Iterator[SessionChunk]: (セッションID, 会話状態) のチャンク
+    """
+    cursor: Optional[int] = 0
+    while cursor is not None:
+        session_ids, cursor = page(chunk_size, cursor)
+        chunk = []
+        for session_id in session_ids:
+            state = lookup(session_id)
+            if state is not None:
+                chunk.append((session_id, state))
+        if chunk:
+            yield chunk
+
+
+def _header(columns: Sequence[ExportColumn]) -> List[str]:
+    return ["session_id", "user_id"] + [question_id for question_id, _ in columns]
+
+
+def stream_csv(
+    chunks: Iterable[SessionChunk], columns: Sequence[ExportColumn]
+) -> Iterator[str]:
+    """
+    チャンクをCSVテキストとして逐次出力します。
+
+    Args:
+        chunks: セッションのチャンク
+        columns: エクスポート対象の列
+
+    Returns:
+        Iterator[str]: ヘッダー行と、チャンクごとのCSVテキスト
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_header(columns))
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        for session_id, state in chunk:
+            writer.writerow(
+                [session_id, state.user_id or ""]
+                + [state.answers.get(question_id, "") for question_id, _ in columns]
+            )
+        yield buffer.getvalue()
+
+
+def stream_ndjson(
+    chunks: Iterable[SessionChunk], columns: Sequence[ExportColumn]
+) -> Iterator[str]:
+    """
+    チャンクを1行1セッションのNDJSONとして逐次出力します。
+
+    Args:
+        chunks: セッションのチャンク
+        columns: エクスポート対象の列
+
+    Returns:
+        Iterator[str]: チャンクごとのNDJSONテキスト
+    """
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(
+                {
+                    "session_id": session_id,
+                    "user_id": state.user_id,
+                    "answers": {
+                        question_id: state.answers[question_id]
+                        for question_id, _ in columns
+                        if question_id in state.answers
+                    },
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+            for session_id, state in chunk
+        )
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError(
+            "Arrow / Parquet 形式の出力には pyarrow のインストールが必要です"
+        )
+
+
+def arrow_schema(columns: Sequence[ExportColumn]) -> "pa.Schema":
+    """
+    エクスポート対象の列から Arrow スキーマを作成します。
+    選択式の列は int16 インデックスの辞書エンコード列になります。
+
+    Args:
+        columns: エクスポート対象の列
+
+    Returns:
+        pa.Schema: Arrow スキーマ
+    """
+    _require_pyarrow()
+    fields = [pa.field("session_id", pa.string()), pa.field("user_id", pa.string())]
+    for question_id, options in columns:
+        if options:
+            fields.append(pa.field(question_id, pa.dictionary(pa.int16(), pa.string())))
+        else:
+            fields.append(pa.field(question_id, pa.string()))
+    return pa.schema(fields)
+
+
+def to_record_batch(
+    chunk: SessionChunk, columns: Sequence[ExportColumn]
+) -> "pa.RecordBatch":
+    """
+    チャンクを Arrow の RecordBatch に変換します。
+
+    選択式の列は質問の選択肢リストを辞書として共有するため、
+    ストリームの全バッチで同じ辞書が使われ、辞書は一度だけ書き出されます。
+    選択肢にない回答（複数選択など）は null になります。
+
+    Args:
+        chunk: セッションのチャンク
+        columns: エクスポート対象の列
+
+    Returns:
+        pa.RecordBatch: 変換されたバッチ
+    """
+    _require_pyarrow()
+    arrays = [
+        pa.array([session_id for session_id, _ in chunk], pa.string()),
+        pa.array([state.user_id for _, state in chunk], pa.string()),
+    ]
+    for question_id, options in columns:
+        values = [state.answers.get(question_id) for _, state in chunk]
+        if options:
+            positions: Dict[Optional[str], int] = {
+                option: index for index, option in enumerate(options)
+            }
+            indices = pa.array([positions.get(value) for value in values], pa.int16())
+            arrays.append(
+                pa.DictionaryArray.from_arrays(indices, pa.array(options, pa.string()))
+            )
+        else:
+            arrays.append(pa.array(values, pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema(columns))
+
+
+def stream_arrow(
+    chunks: Iterable[SessionChunk], columns: Sequence[ExportColumn]
+) -> Iterator[bytes]:
+    """
+    チャンクを Arrow IPC ストリーム形式で逐次出力します。
+
+    Args:
+        chunks: セッションのチャンク
+        columns: エクスポート対象の列
+
+    Returns:
+        Iterator[bytes]: スキーマと、チャンクごとのバッチのバイト列
+    """
+    _require_pyarrow()
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, arrow_schema(columns)) as writer:
+        for chunk in chunks:
+            writer.write_batch(to_record_batch(chunk, columns))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def stream_export(
+    export_format: str, chunks: Iterable[SessionChunk], columns: Sequence[ExportColumn]
+) -> Union[Iterator[str], Iterator[bytes]]:
+    """
+    指定された形式のストリームを返します。
+
+    Args:
+        export_format: 出力形式（csv / ndjson / arrow）
+        chunks: セッションのチャンク
+        columns: エクスポート対象の列
+
+    Returns:
+        Iterator: 出力データの断片
+
+    Raises:
+        ValueError: 未対応の形式が指定された場合
+        RuntimeError: arrow 形式で pyarrow がない場合
+    """
+    if export_format == "csv":
+        return stream_csv(chunks, columns)
+    if export_format == "ndjson":
+        return stream_ndjson(chunks, columns)
+    if export_format == "arrow":
+        _require_pyarrow()
+        return stream_arrow(chunks, columns)
+    raise ValueError(f"未対応の形式です: {export_format}")
+
+
+def download(url: str, export_format: str, output: str, chunk_size: int = 1000) -> int:
+    """
+    エクスポートエンドポイントからストリームを受け取り、ファイルに書き出します。
+    parquet 形式の場合は Arrow ストリームをバッチごとに行グループとして書き出します。
+
+    Args:
+        url: APIのベースURL
+        export_format: 出力形式（csv / ndjson / arrow / parquet）
+        output: 出力先のファイルパス
+        chunk_size: サーバー側のチャンクサイズ
+
+    Returns:
+        int: 書き出したバイト数（parquet の場合は行数）
+    """
+    import httpx
+
+    stream_format = "arrow" if export_format == "parquet" else export_format
+    params: Dict[str, Union[str, int]] = {
+        "format": stream_format,
+        "chunk_size": chunk_size,
+    }
+    with httpx.stream(
+        "GET", f"{url}/interview/export", params=params, timeout=None
+    ) as response:
+        response.raise_for_status()
+        if export_format != "parquet":
+            written = 0
+            with open(output, "wb") as f:
+                for data in response.iter_bytes():
+                    written += f.write(data)
+            return written
+
+        _require_pyarrow()
+        reader = pa.ipc.open_stream(_ResponseReader(response.iter_bytes()))
+        rows = 0
+        with pq.ParquetWriter(output, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        return rows
+
+
+class _ResponseReader(io.RawIOBase):
+    """
+    HTTPレスポンスのバイト列イテレーターをファイルライクに読めるようにするラッパー
+    """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: "Buffer") -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        view = memoryview(b).cast("B")
+        size = min(len(view), len(self._buffer))
+        view[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="完了済み面接結果をファイルにエクスポートします"
+    )
+    parser.add_argument("--url", default="http://localhost:8000", help="APIのベースURL")
+    parser.add_argument(
+        "--format", choices=EXPORT_FORMATS + ("parquet",), default="csv"
+    )
+    parser.add_argument("--output", required=True, help="出力先のファイルパス")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    written = download(args.url, args.format, args.output, args.chunk_size)
+    unit = "rows" if args.format == "parquet" else "bytes"
+    print(f"{args.output}: {written} {unit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+制御フレーズ（スキップ・あとで・やめる）の検出
+
+メッセージが会話グラフに届く前に、フレーズ表から作った Aho-Corasick オートマトンで
+1回の走査で分類します。フレーズが増えてもメッセージごとの処理は文字数に比例するだけです。
+フレーズとメッセージは、選択肢のマッチャーと同じ normalize で揃えてから比較します。
+メッセージ全体がフレーズと、決まった前置き・言い回し（「もう」「します」「でお願いします」など）
+だけでできている場合のみ検出し、「スキップしないで」「会社を辞める予定」のような否定や文中の
+フレーズは対象外とします。
+"""
+
+import json
+from collections import deque
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from app.utils.option_matcher import normalize
+
+# 意図の種類
+INTENT_SKIP = "skip"
+INTENT_DEFER = "defer"
+INTENT_QUIT = "quit"
+
+# 既定のフレーズ表（CONTROL_PHRASES_FILE で置き換えられる）
+DEFAULT_PHRASES: Dict[str, List[str]] = {
+    INTENT_SKIP: ["スキップ", "skip", "とばす", "とばして", "飛ばす", "飛ばして"],
+    INTENT_DEFER: ["あとで", "後で", "また今度", "あとにする", "later", "保留"],
+    INTENT_QUIT: [
+        "やめる",
+        "やめます",
+        "辞める",
+        "止める",
+        "終了",
+        "中止",
+        "おわり",
+        "終わり",
+        "quit",
+        "exit",
+    ],
+}
+
+# フレーズの前後に許す言い回し（これ以外の文字が付いたメッセージは制御フレーズとして扱わない）
+ALLOWED_PREFIXES = ["", "もう", "一旦", "いったん", "とりあえず", "ちょっと"]
+ALLOWED_SUFFIXES = [
+    "",
+    "します",
+    "しましょう",
+    "して",
+    "で",
+    "でお願いします",
+    "お願いします",
+    "してください",
+    "ください",
+    "にします",
+    "にしてください",
+    "やります",
+]
+
+
+def load_phrases(path: str) -> Dict[str, List[str]]:
+    """
+    フレーズ表を読み込みます（{意図: [フレーズ, ...]} の JSON）。パスが空の場合は既定の表を返します。
+
+    Args:
+        path: フレーズ表のファイルパス
+
+    Returns:
+        Dict[str, List[str]]: 意図ごとのフレーズ
+    """
+    if not path:
+        return DEFAULT_PHRASES
+    with open(path, encoding="utf-8") as f:
+        phrases: Dict[str, List[str]] = json.load(f)
+    return phrases
+
+
+class IntentDetector:
+    """
+    フレーズ表から作った Aho-Corasick オートマトンでメッセージの意図を検出するクラス
+    """
+
+    def __init__(
+        self,
+        phrases: Mapping[str, Sequence[str]],
+        prefixes: Sequence[str] = ALLOWED_PREFIXES,
+        suffixes: Sequence[str] = ALLOWED_SUFFIXES,
+    ) -> None:
+        """
+        オートマトンを作成します。
+
+        Args:
+            phrases: 意図ごとのフレーズ
+            prefixes: フレーズの前に許す言い回し
+            suffixes: フレーズの後に許す言い回し
+        """
+        self.prefixes = frozenset(normalize(prefix) for prefix in prefixes)
+        self.suffixes = frozenset(normalize(suffix) for suffix in suffixes)
+        # 状態ごとの遷移・失敗遷移・出力（(フレーズの長さ, 意図) のリスト）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str]]] = [[]]
+        for intent, intent_phrases in phrases.items():
+            for phrase in intent_phrases:
+                self._add(normalize(phrase), intent)
+        self._build_failure_links()
+
+    def _add(self, phrase: str, intent: str) -> None:
+        if not phrase:
+            return
+        state = 0
+        for ch in phrase:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state].append((len(phrase), intent))
+
+    def _build_failure_links(self) -> None:
+        """
+        幅優先で失敗遷移を求め、失敗先の出力を引き継ぎます。
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._output[next_state] = (
+                    self._output[next_state] + self._output[self._fail[next_state]]
+                )
+                queue.append(next_state)
+
+    def matches(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        メッセージに含まれるフレーズをすべて返します（1回の走査）。
+
+        Args:
+            text: 揃えた後のメッセージ
+
+        Returns:
+            List[Tuple[int, int, str]]: (終了位置, フレーズの長さ, 意図) のリスト
+        """
+        found = []
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, intent in output[state]:
+                found.append((position + 1, length, intent))
+        return found
+
+    def detect(self, message: str) -> Optional[str]:
+        """
+        メッセージの意図を返します。最も長いフレーズの意図を採用し、フレーズの前後が
+        許した言い回しでないメッセージ（否定や、文中にたまたま含まれる場合）は対象外とします。
+
+        Args:
+            message: ユーザーのメッセージ
+
+        Returns:
+            Optional[str]: 意図。制御フレーズでない場合はNone
+        """
+        text = normalize(message)
+        best = None
+        for end, length, intent in self.matches(text):
+            if (
+                text[: end - length] in self.prefixes
+                and text[end:] in self.suffixes
+                and (best is None or length > best[0])
+            ):
+                best = (length, intent)
+        return best[1] if best else None
@@ -0,0 +1,453 @@
+"""
+バックグラウンドジョブのキュー（SQLite に永続化し、再起動後も続きから実行する）
+
+面接の完了時の分析のように時間のかかる処理は、リクエストの中では実行せずにジョブとして登録し、
+ワーカーが応答の送信後に実行します。ジョブは登録時に SQLite のファイルへ書き込むため、
+処理中にプロセスが止まっても、次の起動時に未完了のジョブから再開します。
+
+    pending → running → succeeded
+                      ↘ pending（失敗: retry_base_seconds × 2^(試行回数-1) 秒後に再試行）
+                      ↘ failed（max_attempts 回失敗）
+
+ジョブの処理関数は同期関数で、ワーカーごとのスレッドで実行します（イベントループを止めないため）。
+ジョブは (種別, キー) で一意で、同じキーで登録した場合は既存のジョブを返します。
+
+複数の uvicorn ワーカーが同じファイルを共有できます。ジョブは1つの書き込みトランザクションの
+UPDATE … RETURNING で所有者（プロセスごとのID）とリース期限を付けて取り出すため、同じジョブを
+2つのプロセスが同時に実行することはありません。実行中はリースを延長し、リースの切れた running の
+ジョブ（プロセスが止まった場合）だけを別のプロセスが取り直します。他のプロセスが登録したジョブは
+poll_seconds ごとの確認で取り出します。完了・失敗したジョブは retention_seconds 後に削除します。
+他のプロセスの書き込み中に SQLite がエラー（database is locked）を返した場合は、ワーカーを止めずに
+poll_seconds 待ってから取り出し直します。
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# ジョブの状態
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# ジョブの処理関数: ペイロードを受け取り、結果（JSON に変換できる辞書）を返す
+JobHandler = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+_COLUMNS = "id, kind, key, status, attempts, result, error, created_at, updated_at"
+
+# 完了・失敗したジョブを削除する間隔（秒）
+PURGE_INTERVAL_SECONDS = 60.0
+
+
+class JobQueue:
+    """
+    SQLite に永続化する、ワーカー数と未完了のジョブ数に上限のあるジョブキュー
+    """
+
+    def __init__(
+        self,
+        path: str,
+        handlers: Dict[str, JobHandler],
+        workers: int = 2,
+        capacity: int = 10000,
+        max_attempts: int = 3,
+        retry_base_seconds: float = 0.5,
+        lease_seconds: float = 60.0,
+        poll_seconds: float = 1.0,
+        retention_seconds: float = 7 * 24 * 60 * 60,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        ジョブキューを作成します（既存のファイルのジョブは start で再開します）。
+
+        Args:
+            path: SQLite のファイルパス
+            handlers: ジョブの種別ごとの処理関数
+            workers: 同時に実行するジョブ数
+            capacity: 未完了（pending と running）のジョブ数の上限
+            max_attempts: 1つのジョブの最大試行回数
+            retry_base_seconds: 再試行までの待ち時間の基準（試行のたびに2倍にする）
+            lease_seconds: 実行中のジョブのリースの長さ（実行中は lease_seconds / 3 ごとに延長する）
+            poll_seconds: 他のプロセスが登録したジョブを確認する間隔
+            retention_seconds: 完了・失敗したジョブを残す期間
+            clock: 現在時刻を返す関数
+        """
+        self.path = path
+        self.handlers = handlers
+        self.workers = workers
+        self.capacity = capacity
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._clock = clock
+        # ジョブの所有者（同じファイルを共有するプロセスごとに異なる）
+        self.owner = uuid.uuid4().hex
+        # 書き込みはイベントループのスレッドからのみ行う
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, UNIQUE (kind, key))"
+        )
+        # 所有者・リース期限・次に実行できる時刻（リース導入前のファイルには列を追加する）
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, definition in (
+            ("owner", "TEXT"),
+            ("lease_until", "REAL"),
+            ("run_at", "REAL NOT NULL DEFAULT 0"),
+        ):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._watchers: Dict[str, List[asyncio.Future]] = {}
+        self._next_purge = 0.0
+        self.succeeded_total = 0
+        self.failed_total = 0
+        self.retried_total = 0
+        self.rejected_total = 0
+        self.reclaimed_total = 0
+        self.purged_total = 0
+        self.database_errors_total = 0
+        self.last_error: Optional[str] = None
+
+    def close(self) -> None:
+        self._db.close()
+
+    async def start(self) -> None:
+        """
+        ワーカーを起動します（lifespan から呼ぶ）。前回の起動で完了しなかったジョブは、
+        pending のものはすぐに、running のものはリースが切れてから再開します。
+        """
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="job"
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        ワーカーを止めます。このプロセスが実行中のジョブは pending に戻し、他のプロセスか次の起動時に再実行します。
+        """
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._wakeup = None
+        self._db.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, run_at = ? WHERE status = ? AND owner = ?",
+            (JOB_PENDING, self._clock(), JOB_RUNNING, self.owner),
+        )
+
+    def unfinished(self) -> int:
+        """
+        未完了（pending と running）のジョブ数を返します（ファイルを共有する全プロセスの合計）。
+        """
+        row = self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+            (JOB_PENDING, JOB_RUNNING),
+        ).fetchone()
+        return int(row[0])
+
+    def enqueue(self, kind: str, key: str, payload: Dict[str, Any]) -> str:
+        """
+        ジョブを登録します。同じ種別とキーのジョブがある場合はそのジョブIDを返します。
+
+        Args:
+            kind: ジョブの種別（handlers のキー）
+            key: 種別の中で一意なキー（セッションIDなど）
+            payload: 処理関数に渡す値（JSON に変換できる辞書）
+
+        Returns:
+            str: ジョブID
+
+        Raises:
+            ValueError: 種別の処理関数がない場合
+            RuntimeError: 未完了のジョブ数が上限に達している場合
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"不明なジョブの種別です: {kind}")
+        row = self._db.execute(
+            "SELECT id FROM jobs WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        if row is not None:
+            return str(row[0])
+        if self.unfinished() >= self.capacity:
+            self.rejected_total += 1
+            raise RuntimeError("ジョブキューが満杯です")
+        job_id = uuid.uuid4().hex
+        now = self._clock()
+        self._db.execute(
+            "INSERT INTO jobs (id, kind, key, payload, status, created_at, updated_at, run_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                kind,
+                key,
+                json.dumps(payload, ensure_ascii=False),
+                JOB_PENDING,
+                now,
+                now,
+                now,
+            ),
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _row_to_status(self, row: tuple) -> Dict[str, Any]:
+        job_id, kind, key, status, attempts, result, error, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "key": key,
+            "status": status,
+            "attempts": attempts,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ジョブの状態を返します。
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            Optional[Dict[str, Any]]: 状態・試行回数・結果・エラー。存在しない場合はNone
+        """
+        row = self._db.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return None if row is None else self._row_to_status(row)
+
+    def find(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        種別とキーでジョブの状態を返します。
+
+        Args:
+            kind: ジョブの種別
+            key: 種別の中で一意なキー
+
+        Returns:
+            Optional[Dict[str, Any]]: ジョブの状態。存在しない場合はNone
+        """
+        row = self._db.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        return None if row is None else self._row_to_status(row)
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> bool:
+        """
+        ジョブの状態が変わるまで待ちます（状態のストリーミング用）。
+        通知されるのはこのプロセスでの変更のみのため、呼び出し元はタイムアウト後に状態を読み直してください。
+
+        Args:
+            job_id: ジョブID
+            timeout: 待つ時間の上限（秒）
+
+        Returns:
+            bool: 状態が変わった場合はTrue、タイムアウトした場合はFalse
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._watchers.setdefault(job_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None and waiter in watchers:
+                watchers.remove(waiter)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        for waiter in self._watchers.pop(job_id, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _set_status(self, job_id: str, status: str, **columns: Any) -> bool:
+        """
+        このプロセスが所有するジョブの状態を更新します。
+
+        Returns:
+            bool: 更新した場合はTrue（リースが切れて他のプロセスに取り直された場合はFalse）
+        """
+        assignments = "".join(f", {column} = ?" for column in columns)
+        updated = self._db.execute(
+            f"UPDATE jobs SET status = ?, updated_at = ?{assignments} WHERE id = ? AND owner = ?",
+            (status, self._clock(), *columns.values(), job_id, self.owner),
+        ).rowcount
+        self._notify(job_id)
+        return updated > 0
+
+    def _claim(self) -> Optional[tuple]:
+        """
+        実行できるジョブ（pending で実行時刻を過ぎたもの、またはリースの切れた running のもの）を
+        1つ取り出し、このプロセスを所有者にしてリースを付けます。
+
+        Returns:
+            Optional[tuple]: (ジョブID, 種別, ペイロード, 試行回数, 取り直したかどうか)。ない場合はNone
+        """
+        now = self._clock()
+        # 書き込みロックを先に取り、他のプロセスと同じジョブを取り出さないようにする
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT id, status FROM jobs WHERE status = ? AND run_at <= ? OR status = ? AND lease_until < ?"
+                " ORDER BY created_at LIMIT 1",
+                (JOB_PENDING, now, JOB_RUNNING, now),
+            ).fetchone()
+            claimed = None
+            if row is not None:
+                job_id, status = row
+                kind, payload, attempts = self._db.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?"
+                    " WHERE id = ? RETURNING kind, payload, attempts",
+                    (JOB_RUNNING, self.owner, now + self.lease_seconds, now, job_id),
+                ).fetchall()[0]
+                claimed = (job_id, kind, payload, attempts, status == JOB_RUNNING)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def purge_finished(self) -> int:
+        """
+        retention_seconds より前に完了・失敗したジョブを削除します。
+
+        Returns:
+            int: 削除した件数
+        """
+        purged = self._db.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (*FINISHED_STATUSES, self._clock() - self.retention_seconds),
+        ).rowcount
+        self.purged_total += purged
+        return purged
+
+    async def _worker(self) -> None:
+        wakeup = self._wakeup
+        assert wakeup is not None
+        while True:
+            try:
+                claimed = self._claim()
+                if claimed is not None:
+                    await self._run(*claimed)
+                    continue
+                if self._clock() >= self._next_purge:
+                    self.purge_finished()
+                    self._next_purge = self._clock() + PURGE_INTERVAL_SECONDS
+            except sqlite3.OperationalError as e:
+                # 他のプロセスの書き込み中（database is locked）などでワーカーを止めず、待ってから取り出し直す
+                # 実行中だったジョブはリースが切れた後に取り直す
+                self.database_errors_total += 1
+                self.last_error = str(e)
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            # このプロセスでの登録・再試行の時刻で起こされるか、他のプロセスの登録を確認する間隔まで待つ
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(
+        self, job_id: str, kind: str, payload: str, attempts: int, reclaimed: bool
+    ) -> None:
+        """
+        取り出したジョブを1回実行し、結果に応じて完了・再試行・失敗にします。
+        """
+        self._notify(job_id)
+        if reclaimed:
+            self.reclaimed_total += 1
+        if attempts > self.max_attempts:
+            # 実行中にプロセスが止まり続ける場合（リースの切れ）も試行回数に数える
+            self.failed_total += 1
+            self._set_status(job_id, JOB_FAILED, error="リースの期限が切れました")
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, self.handlers[kind], json.loads(payload)
+        )
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=self.lease_seconds / 3)
+            if done:
+                break
+            # 実行中はリースを延長し、他のプロセスに取り直されないようにする
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ?",
+                    (self._clock() + self.lease_seconds, job_id, self.owner),
+                )
+            except sqlite3.OperationalError as e:
+                # 次の延長で取り直す（リースは lease_seconds / 3 ごとに延長するため、まだ切れていない）
+                self.database_errors_total += 1
+                self.last_error = str(e)
+        try:
+            result = future.result()
+        except Exception as e:
+            if attempts < self.max_attempts:
+                self.retried_total += 1
+                delay = self.retry_base_seconds * 2 ** (attempts - 1)
+                self._set_status(
+                    job_id,
+                    JOB_PENDING,
+                    error=str(e),
+                    owner=None,
+                    lease_until=None,
+                    run_at=self._clock() + delay,
+                )
+                if self._wakeup is not None:
+                    loop.call_later(delay, self._wakeup.set)
+            else:
+                self.failed_total += 1
+                self._set_status(job_id, JOB_FAILED, error=str(e))
+            return
+        if self._set_status(
+            job_id,
+            JOB_SUCCEEDED,
+            result=json.dumps(result, ensure_ascii=False),
+            error=None,
+        ):
+            self.succeeded_total += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "unfinished": self.unfinished(),
+            "capacity": self.capacity,
+            "succeeded_total": self.succeeded_total,
+            "failed_total": self.failed_total,
+            "retried_total": self.retried_total,
+            "rejected_total": self.rejected_total,
+            "reclaimed_total": self.reclaimed_total,
+            "purged_total": self.purged_total,
+            "database_errors_total": self.database_errors_total,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,262 @@
+"""
+自由記述の回答を選択肢に対応付けるマッチャー
+
+「会社員です」「ｶｲｼｬｲﾝ」のようにボタンを押さずに入力された回答を、カタログの選択肢に
+対応付けます。入力と選択肢（と別名）を同じ規則で正規化し、文字バイグラムの転置インデックスで
+候補を絞ってから類似度を計算します。インデックスはカタログごとに一度だけ作成します。
+
+正規化:
+    NFKC（全角英数字・半角カナの統一）、小文字化、カタカナをひらがなに統一、異体字の統一、
+    空白と記号の除去、文末の「です」などの除去
+
+類似度:
+    正規化後に一致すれば 1.0、一方が他方を含めば 0.75〜1.0、それ以外はバイグラムの Dice 係数です。
+    最も高い選択肢が threshold 以上で、2番目との差が margin 以上の場合のみ対応付けます。
+    曖昧な入力は対応付けず（None）、呼び出し元の遅い経路（聞き直しや LLM）に任せます。
+    「会社員ではありません」のように否定で終わる回答は、選択肢を含んでいても対応付けません。
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from app.models.schemas import FixedQuestion
+
+# カタカナ（ァ〜ヶ）をひらがなに変換する表
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+# 異体字・旧字体を常用の字形に揃える表
+_KANJI_VARIANTS = str.maketrans(
+    {
+        "髙": "高",
+        "﨑": "崎",
+        "嶋": "島",
+        "邊": "辺",
+        "邉": "辺",
+        "齋": "斎",
+        "齊": "斉",
+        "國": "国",
+        "學": "学",
+        "會": "会",
+        "營": "営",
+        "與": "与",
+        "藝": "芸",
+        "經": "経",
+    }
+)
+
+# 空白と記号（文字・数字・長音以外）
+_NOISE = re.compile(r"[\W_]+")
+
+# 文末の言い回し（長いものから順に試す）
+_SUFFIXES = sorted(
+    [
+        "です",
+        "でした",
+        "ですね",
+        "ですよ",
+        "でございます",
+        "だよ",
+        "だね",
+        "だ",
+        "かな",
+        "かも",
+        "がいい",
+        "がいいです",
+        "が欲しい",
+        "が欲しいです",
+        "がほしい",
+        "がほしいです",
+        "に関心がある",
+        "に関心があります",
+        "に興味がある",
+        "に興味があります",
+        "をしている",
+        "をしています",
+        "してる",
+        "してます",
+        "しています",
+        "やってます",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+# 否定の文末（正規化後の表記。「ではない」「じゃありません」なども含む）
+_NEGATIONS = (
+    "ない",
+    "ません",
+    "なかった",
+    "なく",
+    "なくて",
+    "違う",
+    "違います",
+    "ちがう",
+    "ちがいます",
+    "以外",
+)
+
+
+def is_negated(normalized: str) -> bool:
+    """
+    正規化した回答が否定で終わるかどうかを返します。
+    """
+    return normalized.endswith(_NEGATIONS)
+
+
+def normalize(text: str) -> str:
+    """
+    回答を比較用に正規化します。
+
+    Args:
+        text: 回答
+
+    Returns:
+        str: 正規化した文字列
+    """
+    text = unicodedata.normalize("NFKC", text).lower().translate(_KANJI_VARIANTS)
+    text = _NOISE.sub("", text.translate(_KATAKANA_TO_HIRAGANA))
+    for suffix in _SUFFIXES:
+        if text.endswith(suffix) and len(text) > len(suffix):
+            return text[: -len(suffix)]
+    return text
+
+
+def bigrams(text: str) -> Set[str]:
+    """
+    文字バイグラムの集合を返します（1文字の場合はその文字）。
+    """
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+class OptionMatch(NamedTuple):
+    """
+    対応付けの結果
+    """
+
+    option: Optional[str]
+    score: float
+    ambiguous: bool
+
+
+class _QuestionIndex:
+    """
+    1つの質問の選択肢と別名の、バイグラムの転置インデックス
+    """
+
+    def __init__(self, options: Sequence[str], aliases: Dict[str, List[str]]) -> None:
+        # 別名ごとの (選択肢, 正規化した文字列, バイグラム数)
+        self.terms: List[Tuple[str, str, int]] = []
+        self.exact: Dict[str, str] = {}
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for option in options:
+            for term in [option, *aliases.get(option, [])]:
+                normalized = normalize(term)
+                if not normalized or normalized in self.exact:
+                    continue
+                self.exact[normalized] = option
+                grams = bigrams(normalized)
+                for gram in grams:
+                    self.postings[gram].append(len(self.terms))
+                self.terms.append((option, normalized, len(grams)))
+        self.postings = dict(self.postings)
+
+
+class OptionMatcher:
+    """
+    カタログの選択肢に自由記述の回答を対応付けるクラス（カタログごとに一度だけ作成する）
+    """
+
+    def __init__(
+        self,
+        questions: Sequence[FixedQuestion],
+        threshold: float = 0.6,
+        margin: float = 0.15,
+    ) -> None:
+        """
+        選択肢と別名からインデックスを作成します。
+
+        Args:
+            questions: 固定質問リスト
+            threshold: 対応付ける類似度の下限
+            margin: 最も高い選択肢と2番目の選択肢の類似度の差の下限（これ未満は曖昧とする）
+        """
+        self.threshold = threshold
+        self.margin = margin
+        self._indexes: Dict[str, _QuestionIndex] = {
+            q.id: _QuestionIndex(q.options, q.aliases) for q in questions
+        }
+
+    def score(self, question_id: str, text: str) -> Dict[str, float]:
+        """
+        回答と各選択肢の類似度を返します（類似度が0の選択肢は含みません）。
+        否定で終わる回答は、選択肢や別名と完全に一致する場合を除いて空の辞書を返します。
+
+        Args:
+            question_id: 質問ID
+            text: 回答
+
+        Returns:
+            Dict[str, float]: 選択肢ごとの類似度
+        """
+        index = self._indexes.get(question_id)
+        normalized = normalize(text)
+        if index is None or not normalized:
+            return {}
+        option = index.exact.get(normalized)
+        if option is not None:
+            return {option: 1.0}
+        if is_negated(normalized):
+            # 選択肢を含んでいても、その選択肢を否定している（遅い経路に任せる）
+            return {}
+
+        grams = bigrams(normalized)
+        overlaps: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for term_id in index.postings.get(gram, ()):
+                overlaps[term_id] += 1
+
+        scores: Dict[str, float] = {}
+        for term_id, overlap in overlaps.items():
+            option, term, term_grams = index.terms[term_id]
+            if (
+                len(term) >= 2
+                and term in normalized
+                or len(normalized) >= 2
+                and normalized in term
+            ):
+                # 一方が他方を含む場合（「大学生」と「学生」など）は長さの比で加点する
+                shorter, longer = sorted((len(term), len(normalized)))
+                score = 0.75 + 0.25 * shorter / longer
+            else:
+                score = 2 * overlap / (len(grams) + term_grams)
+            if score > scores.get(option, 0.0):
+                scores[option] = score
+        return scores
+
+    def match(self, question_id: str, text: str) -> OptionMatch:
+        """
+        回答を最も近い選択肢に対応付けます。
+
+        Args:
+            question_id: 質問ID
+            text: 回答
+
+        Returns:
+            OptionMatch: 対応付けた選択肢（しきい値未満または曖昧な場合は None）と類似度
+        """
+        scores = sorted(
+            self.score(question_id, text).items(),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        if not scores or scores[0][1] < self.threshold:
+            return OptionMatch(None, scores[0][1] if scores else 0.0, False)
+        best, best_score = scores[0]
+        if len(scores) > 1 and best_score - scores[1][1] < self.margin:
+            return OptionMatch(None, best_score, True)
+        return OptionMatch(best, best_score, False)
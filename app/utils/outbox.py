@@ -0,0 +1,480 @@
+"""
+下流システム（ATS など）への完了イベントの配信（アウトボックス）
+
+完了したセッションを下流システムへリクエストの中で送ると、こちらのレイテンシが相手の
+レイテンシと可用性に左右されます。Outbox はイベントを応答の前にローカルの SQLite へ書き込み、
+バックグラウンドの配信タスクがまとめて POST します。
+
+    pending → delivered（2xx の応答。retention_seconds 後に削除する）
+            ↘ pending（失敗: retry_base_seconds × 2^(試行回数-1) 秒後、最大 retry_max_seconds 秒後に再送）
+            ↘ dead（max_attempts 回失敗、または1件で送って 4xx の応答。dead_letters で確認し、
+                    requeue_dead で再送できる）
+
+配信は batch_size 件ずつ {"events": [...]} の JSON で送り、接続は keep-alive で使い回します。
+配信タスクは送るイベントを BEGIN IMMEDIATE のトランザクションの中で所有者とリース（lease_seconds）を
+付けて取得するため、同じファイルを使う複数のワーカーが同じイベントを送ることはありません
+（リースが切れたイベントは、送ったワーカーが落ちたものとみなして他のワーカーが送り直します）。
+バッチが 400・413・422 で拒否された場合は、不正なイベントを特定するためにバッチを半分ずつに
+分けて送り直し、受け付けられなかったイベントだけを dead にします（どのイベントも受け付けられなかった
+場合と、その他の 4xx・5xx・接続エラーの場合は、バッチの失敗として再送します）。
+受信側はイベントIDで重複を除いてください（応答の前に接続が切れた場合は同じイベントを再送します）。
+イベントは、セッションの状態を保存した後に書き込んでください（保存されていない完了を配信しないため）。
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import httpx
+
+# イベントの状態
+OUTBOX_PENDING = "pending"
+OUTBOX_DELIVERED = "delivered"
+OUTBOX_DEAD = "dead"
+
+# 配信のスループットを計算する直近の期間（秒）
+THROUGHPUT_WINDOW_SECONDS = 60.0
+
+# 配信済みのイベントを削除する間隔（秒）
+PRUNE_INTERVAL_SECONDS = 60.0
+
+# イベントの内容を受け付けられない応答（バッチを分けて不正なイベントを特定する）
+REJECTED_STATUSES = {400, 413, 422}
+
+
+class Outbox:
+    """
+    SQLite に書き込んだイベントを、下流システムへまとめて配信するクラス
+    """
+
+    def __init__(
+        self,
+        path: str,
+        url: str,
+        batch_size: int = 100,
+        max_attempts: int = 8,
+        retry_base_seconds: float = 1.0,
+        retry_max_seconds: float = 300.0,
+        poll_seconds: float = 1.0,
+        timeout: float = 10.0,
+        max_connections: int = 10,
+        retention_seconds: float = 7 * 24 * 60 * 60,
+        lease_seconds: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        アウトボックスを作成します（配信は start で開始します）。
+
+        Args:
+            path: SQLite のファイルパス
+            url: イベントを POST する下流システムのURL
+            batch_size: 1回の POST で送る最大件数
+            max_attempts: 1つのイベントの最大試行回数（超えたら dead にする）
+            retry_base_seconds: 再送までの待ち時間の基準（試行のたびに2倍にする）
+            retry_max_seconds: 再送までの待ち時間の上限
+            poll_seconds: 送るイベントがないときに再確認する間隔
+            timeout: 1回の POST のタイムアウト（秒）
+            max_connections: 下流システムへの接続数の上限
+            retention_seconds: 配信済みのイベントを残す期間（同じキーのイベントの重複を除く期間）
+            lease_seconds: 送信中のイベントを他のワーカーが送らない期間（timeout より長くする）
+            clock: 現在時刻を返す関数
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.poll_seconds = poll_seconds
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = uuid4().hex
+        self._clock = clock
+        # 書き込みはイベントループのスレッドからのみ行う
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+            " error TEXT, created_at REAL NOT NULL, UNIQUE (type, key))"
+        )
+        # 配信した時刻と送信中のワーカー・リースの期限（列を追加する前のファイルには追加する）
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(outbox)")}
+        for column, column_type in (
+            ("delivered_at", "REAL"),
+            ("owner", "TEXT"),
+            ("lease_until", "REAL"),
+        ):
+            if column not in columns:
+                self._db.execute(
+                    f"ALTER TABLE outbox ADD COLUMN {column} {column_type}"
+                )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)"
+        )
+        self._next_prune = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        # 直近の配信の (時刻, 件数)
+        self._recent: Deque[Tuple[float, int]] = deque()
+        self.delivered_total = 0
+        self.batches_total = 0
+        self.failed_batches_total = 0
+        self.dead_total = 0
+        self.rejected_total = 0
+        self.pruned_total = 0
+        self.last_error: Optional[str] = None
+
+    def close(self) -> None:
+        self._db.close()
+
+    async def start(self) -> None:
+        """
+        配信タスクを起動します（lifespan から呼ぶ）。前回の起動で送れなかったイベントも送ります。
+        """
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        """
+        配信タスクを止めます。送信中のバッチは pending のまま残し、リースを外して他のワーカーか次の起動時に再送します。
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._db.execute(
+            "UPDATE outbox SET owner = NULL, lease_until = NULL WHERE owner = ? AND status = ?",
+            (self.owner, OUTBOX_PENDING),
+        )
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._wake = None
+
+    def add(self, event_type: str, key: str, payload: Dict[str, Any]) -> bool:
+        """
+        イベントを書き込みます。同じ種類とキーのイベントがある場合は書き込みません。
+
+        Args:
+            event_type: イベントの種類
+            key: 種類の中で一意なキー（セッションIDなど）
+            payload: イベントの内容（JSON に変換できる辞書）
+
+        Returns:
+            bool: 書き込んだ場合はTrue、既にある場合はFalse
+        """
+        now = self._clock()
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO outbox (type, key, payload, status, next_attempt_at, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                event_type,
+                key,
+                json.dumps(payload, ensure_ascii=False),
+                OUTBOX_PENDING,
+                now,
+                now,
+            ),
+        )
+        if cursor.rowcount and self._wake is not None:
+            self._wake.set()
+        return cursor.rowcount > 0
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(
+            self.retry_max_seconds, self.retry_base_seconds * 2.0 ** (attempts - 1)
+        )
+
+    async def dispatch_once(self) -> int:
+        """
+        送る時刻になったイベントを最大 batch_size 件まとめて送ります。
+
+        Returns:
+            int: 配信できた件数（送るイベントがない場合と失敗した場合は0）
+        """
+        rows = self._claim()
+        if not rows:
+            return 0
+        rejected: List[Tuple[tuple, str]] = []
+        delivered = await self._send(rows, rejected)
+        if rejected:
+            if delivered:
+                for row, error in rejected:
+                    self._reject(row, error)
+            else:
+                # どのイベントも受け付けられなかった場合は、イベントではなく下流システムの問題とみなして再送する
+                self._fail([row for row, _ in rejected], rejected[-1][1])
+        return delivered
+
+    def _claim(self) -> List[tuple]:
+        """
+        送る時刻になり、リースが付いていない（または期限が切れた）イベントを取得し、このワーカーのリースを付けます。
+
+        Returns:
+            List[tuple]: (イベントID, 種類, キー, 内容, 試行回数, 作成時刻) のリスト
+        """
+        now = self._clock()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute(
+                "SELECT id, type, key, payload, attempts, created_at FROM outbox"
+                " WHERE status = ? AND next_attempt_at <= ? AND (lease_until IS NULL OR lease_until < ?)"
+                " ORDER BY id LIMIT ?",
+                (OUTBOX_PENDING, now, now, self.batch_size),
+            ).fetchall()
+            self._lease(rows, now)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _lease(self, rows: List[tuple], now: float) -> None:
+        if rows:
+            self._db.execute(
+                f"UPDATE outbox SET owner = ?, lease_until = ? WHERE id IN ({', '.join('?' * len(rows))})",
+                (self.owner, now + self.lease_seconds, *(row[0] for row in rows)),
+            )
+
+    async def _send(self, rows: List[tuple], rejected: List[Tuple[tuple, str]]) -> int:
+        """
+        イベントを1回の POST で送ります。内容を受け付けられない応答の場合は半分ずつに分けて送り直し、
+        1件で送っても受け付けられなかったイベントを rejected に追加します。
+
+        Returns:
+            int: 配信できた件数
+        """
+        client = self._client
+        assert client is not None, "start を呼んでから配信してください"
+        events = [
+            {
+                "id": row[0],
+                "type": row[1],
+                "key": row[2],
+                "payload": json.loads(row[3]),
+                "created_at": row[5],
+            }
+            for row in rows
+        ]
+        self.batches_total += 1
+        try:
+            response = await client.post(self.url, json={"events": events})
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in REJECTED_STATUSES:
+                self._fail(rows, str(e))
+                return 0
+            if len(rows) == 1:
+                rejected.append((rows[0], str(e)))
+                return 0
+            # 1件の不正なイベントでバッチ全体を dead にしないよう、分けて送り直して特定する
+            delivered = 0
+            middle = len(rows) // 2
+            for half in (rows[:middle], rows[middle:]):
+                # 送り直している間に他のワーカーが送らないよう、リースを延ばす
+                self._lease(half, self._clock())
+                delivered += await self._send(half, rejected)
+            return delivered
+        except httpx.HTTPError as e:
+            self._fail(rows, str(e) or type(e).__name__)
+            return 0
+
+        ids = [row[0] for row in rows]
+        now = self._clock()
+        self._db.execute(
+            "UPDATE outbox SET status = ?, error = NULL, delivered_at = ?, owner = NULL, lease_until = NULL"
+            f" WHERE id IN ({', '.join('?' * len(ids))}) AND owner = ?",
+            (OUTBOX_DELIVERED, now, *ids, self.owner),
+        )
+        self.delivered_total += len(rows)
+        self._recent.append((now, len(rows)))
+        while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._recent.popleft()
+        return len(rows)
+
+    def _reject(self, row: tuple, error: str) -> None:
+        """
+        下流システムが受け付けないイベント（1件で送って 400・413・422 の応答）を、再送せずに dead にします。
+        """
+        self.rejected_total += 1
+        self.dead_total += 1
+        self.last_error = error
+        self._db.execute(
+            "UPDATE outbox SET status = ?, attempts = ?, error = ?, owner = NULL, lease_until = NULL"
+            " WHERE id = ? AND owner = ?",
+            (OUTBOX_DEAD, row[4] + 1, error, row[0], self.owner),
+        )
+
+    def prune_delivered(self) -> int:
+        """
+        retention_seconds より前に配信したイベントを削除します。
+
+        Returns:
+            int: 削除した件数
+        """
+        pruned = self._db.execute(
+            "DELETE FROM outbox WHERE status = ? AND delivered_at < ?",
+            (OUTBOX_DELIVERED, self._clock() - self.retention_seconds),
+        ).rowcount
+        self.pruned_total += pruned
+        return pruned
+
+    def _fail(self, rows: List[tuple], error: str) -> None:
+        """
+        バッチの送信の失敗を記録し、再送の時刻を決めるか dead にします。
+        """
+        self.failed_batches_total += 1
+        self.last_error = error
+        now = self._clock()
+        retries, dead = [], []
+        for event_id, _, _, _, attempts, _ in rows:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                dead.append((OUTBOX_DEAD, attempts, error, event_id, self.owner))
+            else:
+                retries.append(
+                    (
+                        attempts,
+                        now + self._retry_delay(attempts),
+                        error,
+                        event_id,
+                        self.owner,
+                    )
+                )
+        self._db.executemany(
+            "UPDATE outbox SET attempts = ?, next_attempt_at = ?, error = ?, owner = NULL, lease_until = NULL"
+            " WHERE id = ? AND owner = ?",
+            retries,
+        )
+        self._db.executemany(
+            "UPDATE outbox SET status = ?, attempts = ?, error = ?, owner = NULL, lease_until = NULL"
+            " WHERE id = ? AND owner = ?",
+            dead,
+        )
+        self.dead_total += len(dead)
+
+    def _seconds_until_due(self) -> float:
+        row = self._db.execute(
+            # 他のワーカーがリースを持つイベントは、リースが切れるまで送らない
+            "SELECT MIN(MAX(next_attempt_at, COALESCE(lease_until, 0))) FROM outbox WHERE status = ?",
+            (OUTBOX_PENDING,),
+        ).fetchone()
+        if row[0] is None:
+            return self.poll_seconds
+        return min(self.poll_seconds, max(0.0, float(row[0]) - self._clock()))
+
+    async def _dispatch_loop(self) -> None:
+        wake = self._wake
+        assert wake is not None
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+                if self._clock() >= self._next_prune:
+                    self.prune_delivered()
+                    self._next_prune = self._clock() + PRUNE_INTERVAL_SECONDS
+            except Exception as e:
+                # SQLite のエラー（他のワーカーの書き込み中の database is locked など）で配信タスクを止めない
+                self.last_error = str(e)
+                delivered = 0
+            if delivered == self.batch_size:
+                # まだ送るイベントが残っている可能性がある
+                continue
+            wake.clear()
+            try:
+                await asyncio.wait_for(wake.wait(), self._seconds_until_due())
+            except asyncio.TimeoutError:
+                pass
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        配信をあきらめたイベントを古い順に返します。
+
+        Args:
+            limit: 返す最大件数
+
+        Returns:
+            List[Dict[str, Any]]: イベントID・種類・キー・内容・試行回数・最後のエラー
+        """
+        rows = self._db.execute(
+            "SELECT id, type, key, payload, attempts, error, created_at FROM outbox"
+            " WHERE status = ? ORDER BY id LIMIT ?",
+            (OUTBOX_DEAD, limit),
+        ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "type": row[1],
+                "key": row[2],
+                "payload": json.loads(row[3]),
+                "attempts": row[4],
+                "error": row[5],
+                "created_at": row[6],
+            }
+            for row in rows
+        ]
+
+    def requeue_dead(self) -> int:
+        """
+        配信をあきらめたイベントを、試行回数を0に戻して再送します（下流システムの復旧後に使う）。
+
+        Returns:
+            int: 再送するイベントの件数
+        """
+        cursor = self._db.execute(
+            "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?",
+            (OUTBOX_PENDING, self._clock(), OUTBOX_DEAD),
+        )
+        if cursor.rowcount and self._wake is not None:
+            self._wake.set()
+        return cursor.rowcount
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        未配信のイベント数（バックログ）と最も古い未配信のイベントの経過時間、配信のスループットを返します。
+
+        Returns:
+            Dict[str, Any]: バックログ・dead の件数・配信とバッチ・拒否・削除の累計・直近の1秒あたりの配信件数・
+                最後のエラー
+        """
+        counts = dict(
+            self._db.execute(
+                "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+            ).fetchall()
+        )
+        oldest = self._db.execute(
+            "SELECT MIN(created_at) FROM outbox WHERE status = ?", (OUTBOX_PENDING,)
+        ).fetchone()[0]
+        now = self._clock()
+        recent = sum(
+            count for at, count in self._recent if at >= now - THROUGHPUT_WINDOW_SECONDS
+        )
+        return {
+            "backlog": counts.get(OUTBOX_PENDING, 0),
+            "dead": counts.get(OUTBOX_DEAD, 0),
+            "oldest_pending_seconds": now - oldest if oldest is not None else 0.0,
+            "delivered_total": self.delivered_total,
+            "batches_total": self.batches_total,
+            "failed_batches_total": self.failed_batches_total,
+            "dead_total": self.dead_total,
+            "rejected_total": self.rejected_total,
+            "pruned_total": self.pruned_total,
+            "delivered_per_second": recent / THROUGHPUT_WINDOW_SECONDS,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,202 @@
+"""
+セッションの二次インデックス（ユーザーIDと最終アクティビティ時刻）
+
+全セッションを走査せずに「ユーザーの最新のセッション」や「一定時間操作のないセッション」を
+引けるようにします。最終アクティビティの順序は期限切れの判定にも使います。
+"""
+
+import bisect
+import math
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# ページングのカーソル（最終アクティビティ時刻, セッションID）
+ActivityCursor = Tuple[float, str]
+
+
+class SessionIndex:
+    """
+    ユーザーIDごとのセッションと、最終アクティビティ時刻の順序を保持するクラス
+
+    最終アクティビティは (時刻, セッションID) を追記するだけのリストで保持します。
+    時刻は狭義単調に増やすため、リストは常に時刻順に並び、二分探索でページの開始位置を求められます。
+    更新前のエントリは残したまま読み飛ばし、古いエントリが増えたらまとめて詰めます（償却O(1)）。
+    ほとんどのユーザーはセッションを1つしか持たないため、ユーザーごとのセッションは
+    1つの間はセッションIDをそのまま保持し、2つ目ができたときに OrderedDict にします。
+    """
+
+    def __init__(self) -> None:
+        self._activity: Dict[str, float] = {}
+        self._log: List[ActivityCursor] = []
+        self._head = 0
+        self._last = 0.0
+        self._user_of: Dict[str, str] = {}
+        self._by_user: Dict[str, Union[str, "OrderedDict[str, None]"]] = {}
+
+    def __len__(self) -> int:
+        return len(self._activity)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._activity
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._activity)
+
+    def touch(
+        self, session_id: str, now: float, user_id: Optional[str] = None
+    ) -> float:
+        """
+        セッションの最終アクティビティを更新します（未登録の場合は登録します）。
+
+        Args:
+            session_id: セッションID
+            now: 現在時刻
+            user_id: ユーザーID（登録時のみ使用）
+
+        Returns:
+            float: 記録した最終アクティビティ時刻
+        """
+        # 時計が戻っても順序が崩れないように、時刻は狭義単調に増やす（同時刻のエントリを作らない）
+        timestamp = now if now > self._last else math.nextafter(self._last, math.inf)
+        self._last = timestamp
+        self._activity[session_id] = timestamp
+        self._log.append((timestamp, session_id))
+
+        if user_id is not None and session_id not in self._user_of:
+            self._user_of[session_id] = user_id
+            sessions = self._by_user.get(user_id)
+            if sessions is None:
+                self._by_user[user_id] = session_id
+            else:
+                if isinstance(sessions, str):
+                    sessions = self._by_user[user_id] = OrderedDict([(sessions, None)])
+                sessions[session_id] = None
+        user = self._user_of.get(session_id)
+        if user is not None:
+            sessions = self._by_user[user]
+            if not isinstance(sessions, str):
+                sessions.move_to_end(session_id)
+
+        self._maybe_compact()
+        return timestamp
+
+    def remove(self, session_id: str) -> None:
+        """
+        セッションをインデックスから削除します。
+
+        Args:
+            session_id: セッションID
+        """
+        if self._activity.pop(session_id, None) is None:
+            return
+        user = self._user_of.pop(session_id, None)
+        if user is not None:
+            sessions = self._by_user[user]
+            if isinstance(sessions, str):
+                del self._by_user[user]
+            else:
+                del sessions[session_id]
+                if not sessions:
+                    del self._by_user[user]
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        # 古いエントリが生きているエントリの2倍を超えたら詰める（償却O(1)）
+        if len(self._log) > 2 * len(self._activity) + 1024:
+            self._compact()
+
+    def _compact(self) -> None:
+        """
+        更新・削除済みの古いエントリを取り除きます。
+        """
+        self._log = [entry for entry in self._log[self._head :] if self._is_live(entry)]
+        self._head = 0
+
+    def _is_live(self, entry: ActivityCursor) -> bool:
+        return self._activity.get(entry[1]) == entry[0]
+
+    def last_activity(self, session_id: str) -> Optional[float]:
+        return self._activity.get(session_id)
+
+    def latest_for_user(self, user_id: str) -> Optional[str]:
+        """
+        ユーザーの最も最近操作されたセッションを返します。O(1)
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            Optional[str]: セッションID。セッションがない場合はNone
+        """
+        sessions = self._by_user.get(user_id)
+        if sessions is None or isinstance(sessions, str):
+            return sessions
+        return next(reversed(sessions)) if sessions else None
+
+    def sessions_for_user(self, user_id: str) -> List[str]:
+        """
+        ユーザーのセッションを、最近操作された順に返します。
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            List[str]: セッションIDのリスト
+        """
+        sessions = self._by_user.get(user_id, ())
+        return [sessions] if isinstance(sessions, str) else list(reversed(sessions))
+
+    def iter_oldest(self) -> Iterator[ActivityCursor]:
+        """
+        最終アクティビティの古い順に (時刻, セッションID) を返します。
+        先頭の古いエントリは読み飛ばすたびに取り除くため、繰り返し呼んでも先頭の走査は償却O(1)です。
+
+        Yields:
+            ActivityCursor: (最終アクティビティ時刻, セッションID)
+        """
+        index = self._head
+        while index < len(self._log):
+            entry = self._log[index]
+            if self._is_live(entry):
+                yield entry
+            elif index == self._head:
+                self._head += 1
+            index += 1
+
+    def idle_before(
+        self, cutoff: float, limit: int, cursor: Optional[ActivityCursor] = None
+    ) -> Tuple[List[ActivityCursor], Optional[ActivityCursor]]:
+        """
+        最終アクティビティが cutoff より前のセッションを古い順にページングして返します。
+        開始位置は二分探索で求めるため、1ページあたり O(log n + limit) です（古いエントリの読み飛ばしを除く）。
+
+        Args:
+            cutoff: この時刻より前に最後に操作されたセッションを返す
+            limit: 1ページあたりの件数
+            cursor: 前のページの next_cursor
+
+        Returns:
+            Tuple[List[ActivityCursor], Optional[ActivityCursor]]: (時刻, セッションID) のリストと次ページのカーソル
+        """
+        start = self._head
+        if cursor is not None:
+            start = bisect.bisect_right(self._log, cursor, lo=self._head)
+        page: List[ActivityCursor] = []
+        index = start
+        while index < len(self._log) and len(page) < limit:
+            entry = self._log[index]
+            if entry[0] >= cutoff:
+                return page, None
+            if self._is_live(entry):
+                page.append(entry)
+            elif index == self._head:
+                # 先頭の古いエントリは次回から読み飛ばさずに済むように取り除く
+                self._head += 1
+            index += 1
+        if (
+            len(page) < limit
+            or index >= len(self._log)
+            or self._log[index][0] >= cutoff
+        ):
+            return page, None
+        return page, page[-1]
@@ -0,0 +1,67 @@
+"""
+セッションごとの排他制御（ストライプ化した asyncio のロック）
+
+同じセッションへの回答（ダブルクリックやクライアントの再送）は到着順に1つずつ処理し、
+異なるセッションのリクエストは並行に処理します。セッションごとにロックを作ると
+セッション数だけロックが増えて後始末も必要になるため、固定数のロックの表を使い、
+セッションIDのハッシュでロックを選びます（別のセッションが同じロックを共有するのは
+ハッシュが衝突した場合だけです）。asyncio.Lock は待っている順に獲得されるため、
+同じセッションのリクエストは到着順に処理されます。
+
+このロックは1プロセス内の排他制御です。複数のワーカープロセス間の排他制御は
+共有セッション表（SharedSessionStore）のスロットのロックが担います。
+"""
+
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+
+class SessionLockTable:
+    """
+    セッションIDのハッシュで選ぶ、固定数の asyncio.Lock の表
+    """
+
+    def __init__(self, stripes: int = 1024) -> None:
+        """
+        ロックの表を作成します。
+
+        Args:
+            stripes: ロックの数
+        """
+        self.stripes = stripes
+        self._locks: List[asyncio.Lock] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.acquired_total = 0
+        self.contended_total = 0
+
+    def _lock_for(self, session_id: str) -> asyncio.Lock:
+        # asyncio.Lock はイベントループに結び付くため、ループが変わったら作り直す（テストのクライアントごとなど）
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._locks = [asyncio.Lock() for _ in range(self.stripes)]
+        return self._locks[zlib.crc32(session_id.encode("utf-8")) % self.stripes]
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        """
+        セッションのロックを獲得するコンテキストマネージャ。
+
+        Args:
+            session_id: セッションID
+        """
+        lock = self._lock_for(session_id)
+        self.acquired_total += 1
+        if lock.locked():
+            self.contended_total += 1
+        async with lock:
+            yield
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "stripes": self.stripes,
+            "acquired_total": self.acquired_total,
+            "contended_total": self.contended_total,
+        }
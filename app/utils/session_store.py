@@ -0,0 +1,674 @@
+"""
+セッションの保存先
+
+uvicorn を複数ワーカーで起動すると、プロセスごとの辞書ではリクエストが別のワーカーに
+振り分けられたときにセッションが見つかりません。SharedSessionStore は同じホストの
+全ワーカーが mmap で共有する固定長レコードの表にセッションを保存し、
+外部サービスなしでワーカー間のセッションを共有します。
+
+表の構造:
+    ヘッダー（HEADER_SIZE バイト）に続いて、capacity 個の固定長スロットが並びます。
+    スロットはセッションIDの CRC32 を起点とするオープンアドレス法（線形探索）で決まり、
+    削除したスロットは墓標として残します（探索の連鎖を切らないため）。直後が空きスロットの墓標は
+    どの連鎖の途中にもないため、削除時に空きに戻します。探索は MAX_PROBE スロットまでに抑え、
+    それより先にしか空きがない場合は満杯として扱います（見つからない場合の探索の上限）。
+    スロットごとに fcntl のバイト範囲ロックを取り、別のスロットの読み書きは並行して行えます。
+    スロットの状態を変える追加・削除だけは、ヘッダーのロックで全ワーカーを通して直列化し、
+    同じロックの中でヘッダーのセッション数を更新します（len は表を走査せずにヘッダーから読む）。
+
+期限切れ:
+    スロットに最終アクティビティ時刻を持ちます。最終アクティビティ順のインデックスはワーカー間で
+    共有できないため、SessionSweeper は idle_in_slots でスロットの範囲ごとに走査し、1回の処理を
+    一定のスロット数に抑えます。表のファイルはワーカーの再起動後も残るため、古いセッションも
+    同じ期限で削除されます。
+
+共有するのは /interview の回答の状態のみです。/chat の会話状態（ConversationGraph の
+MemorySaver）はワーカーごとに保持されるため、/chat を複数ワーカーで使う場合は
+同じセッションのリクエストを同じワーカーに振り分けてください。
+"""
+
+import fcntl
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.models.session_record import CatalogIndex, SessionRecord
+from app.utils.session_index import ActivityCursor, SessionIndex
+
+# ヘッダー: マジック, レイアウトのバージョン, スロット数, 質問数, 自由記述の領域のバイト数, スロットのバイト数
+HEADER = struct.Struct("<4sHIHII")
+HEADER_SIZE = 64
+MAGIC = b"SESS"
+LAYOUT_VERSION = 3
+# ヘッダー内のセッション数（使用中のスロット数）
+COUNT = struct.Struct("<Q")
+COUNT_OFFSET = 32
+
+# スロットの状態
+SLOT_EMPTY = 0
+SLOT_USED = 1
+SLOT_DELETED = 2
+
+# キーとユーザーIDの最大バイト数
+KEY_BYTES = 64
+USER_ID_BYTES = 128
+# ユーザーIDが None であることを表す長さ
+NO_USER_ID = 0xFFFF
+
+# 回答済みの質問は64ビットのビットセットで保持する
+MAX_QUESTIONS = 64
+
+# プロセス内のスレッド間の排他に使うロックの数（fcntl のロックはプロセス単位のため）
+THREAD_LOCK_STRIPES = 64
+
+# 1つのキーの探索で調べる最大スロット数
+MAX_PROBE = 256
+
+# スロット内の最終アクティビティ時刻（状態・キーの長さ・キーの後ろ）
+ACTIVITY = struct.Struct("<d")
+ACTIVITY_OFFSET = 2 + KEY_BYTES
+
+
+class LocalSessionStore:
+    """
+    プロセス内の辞書にセッションを保存するクラス（単一ワーカー用）
+
+    ユーザーIDと最終アクティビティ時刻の二次インデックスを合わせて保持し、
+    作成・更新・削除のたびに更新します。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        """
+        空の保存先を作成します。
+
+        Args:
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+        """
+        self._records: Dict[str, SessionRecord] = {}
+        self._clock = clock
+        self.index = SessionIndex()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._records))
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        return self._records.get(session_id)
+
+    def create(self, session_id: str, record: SessionRecord) -> None:
+        self._records[session_id] = record
+        self.index.touch(session_id, self._clock(), user_id=record.user_id)
+
+    def delete(self, session_id: str) -> bool:
+        self.index.remove(session_id)
+        return self._records.pop(session_id, None) is not None
+
+    def touch(self, session_id: str) -> None:
+        """
+        セッションの最終アクティビティを現在時刻に更新します（再開時など、内容を変更しない操作用）。
+
+        Args:
+            session_id: セッションID
+        """
+        if session_id in self._records:
+            self.index.touch(session_id, self._clock())
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        再開するセッションを返し、最終アクティビティを更新します。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        record = self._records.get(session_id)
+        if record is not None:
+            self.index.touch(session_id, self._clock())
+        return record
+
+    def latest_for_user(self, user_id: str) -> Optional[str]:
+        """
+        ユーザーの最も最近操作されたセッションIDを返します。
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            Optional[str]: セッションID。セッションがない場合はNone
+        """
+        return self.index.latest_for_user(user_id)
+
+    def idle_sessions(
+        self, idle_seconds: float, limit: int, cursor: Optional[ActivityCursor] = None
+    ) -> Tuple[List[ActivityCursor], Optional[ActivityCursor]]:
+        """
+        idle_seconds 以上操作のないセッションを、最終アクティビティの古い順にページングして返します。
+
+        Args:
+            idle_seconds: 操作のない時間（秒）
+            limit: 1ページあたりの件数
+            cursor: 前のページの next_cursor
+
+        Returns:
+            Tuple: (最終アクティビティ時刻, セッションID) のリストと次ページのカーソル
+        """
+        return self.index.idle_before(self._clock() - idle_seconds, limit, cursor)
+
+    @contextmanager
+    def edit(self, session_id: str) -> Iterator[Optional[SessionRecord]]:
+        """
+        セッションを更新するためのコンテキストマネージャ。
+        辞書のレコードをそのまま渡すため、書き戻しは不要です。
+
+        Args:
+            session_id: セッションID
+
+        Yields:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        record = self._records.get(session_id)
+        yield record
+        if record is not None:
+            self.index.touch(session_id, self._clock())
+
+
+class SharedSessionStore:
+    """
+    mmap した固定長レコードの表にセッションを保存するクラス（複数ワーカー用）
+
+    同じファイルを開いた全プロセスが同じ表を読み書きします。get は表から復元したコピーを返し、
+    更新は edit でスロットをロックしたまま読み出し・書き戻しを行います。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        catalog: CatalogIndex,
+        capacity: int = 100000,
+        text_bytes: int = 1024,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        表を開きます。ファイルが空の場合は作成します。
+
+        Args:
+            path: 表のファイルパス
+            catalog: カタログのインデックス
+            capacity: スロット数（保持できるセッション数の上限）
+            text_bytes: 1セッションあたりの自由記述の回答の領域（バイト）
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+
+        Raises:
+            ValueError: 既存のファイルのレイアウトが設定と異なる場合
+        """
+        if len(catalog) > MAX_QUESTIONS:
+            raise ValueError(
+                f"共有セッション表の質問数は{MAX_QUESTIONS}以下にしてください"
+            )
+        self.path = path
+        self.catalog = catalog
+        self.capacity = capacity
+        self.text_bytes = text_bytes
+        self._clock = clock
+        self._slot = struct.Struct(
+            f"<BB{KEY_BYTES}sdH{USER_ID_BYTES}sHBQ{len(catalog)}sH{text_bytes}s"
+        )
+        self.slot_size = self._slot.size
+        self._max_probe = min(capacity, MAX_PROBE)
+        self._thread_locks = [threading.Lock() for _ in range(THREAD_LOCK_STRIPES)]
+        self._structure_lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER_SIZE + capacity * self.slot_size
+        # ヘッダーをロックして、最初に開いたワーカーだけが表を作成する
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(
+                    self._fd,
+                    HEADER.pack(
+                        MAGIC,
+                        LAYOUT_VERSION,
+                        capacity,
+                        len(catalog),
+                        text_bytes,
+                        self.slot_size,
+                    ),
+                    0,
+                )
+            else:
+                header = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+                expected = (
+                    MAGIC,
+                    LAYOUT_VERSION,
+                    capacity,
+                    len(catalog),
+                    text_bytes,
+                    self.slot_size,
+                )
+                if header != expected:
+                    raise ValueError(
+                        f"共有セッション表 {path} のレイアウトが設定と異なります。"
+                        "ワーカーを停止してファイルを削除してください"
+                    )
+        except BaseException:
+            os.close(self._fd)
+            raise
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+        self._mm = mmap.mmap(self._fd, size)
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    def _offset(self, slot: int) -> int:
+        return HEADER_SIZE + slot * self.slot_size
+
+    @contextmanager
+    def _locked(self, slot: int) -> Iterator[None]:
+        """
+        スロットを排他ロックします（他のプロセスとは fcntl、同じプロセスのスレッドとはストライプロック）。
+        """
+        with self._thread_locks[slot % THREAD_LOCK_STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, self._offset(slot))
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, self._offset(slot))
+
+    @contextmanager
+    def _structure_locked(self) -> Iterator[None]:
+        """
+        スロットの状態を変える操作（追加・削除）を全ワーカーを通して直列化します。
+        """
+        with self._structure_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    def _add_count(self, delta: int) -> None:
+        """
+        ヘッダーのセッション数を更新します（追加・削除のロック中に呼び出す）。
+        """
+        (count,) = COUNT.unpack_from(self._mm, COUNT_OFFSET)
+        COUNT.pack_into(self._mm, COUNT_OFFSET, count + delta)
+
+    def _used_slots(self, start: int, end: int) -> Iterator[int]:
+        """
+        start から end の手前までのスロットのうち、使用中のスロットを返します。
+        状態のバイトだけをまとめて読み出し、空きと墓標のスロットを読み飛ばします。
+        """
+        states = self._mm[self._offset(start) : self._offset(end) : self.slot_size]
+        slot = states.find(SLOT_USED)
+        while slot != -1:
+            yield start + slot
+            slot = states.find(SLOT_USED, slot + 1)
+
+    def _state_and_key(self, slot: int) -> Tuple[int, bytes]:
+        offset = self._offset(slot)
+        key_len = self._mm[offset + 1]
+        return self._mm[offset], self._mm[offset + 2 : offset + 2 + key_len]
+
+    def _probe(self, key: bytes) -> Iterator[int]:
+        start = zlib.crc32(key) % self.capacity
+        for i in range(self._max_probe):
+            yield (start + i) % self.capacity
+
+    @staticmethod
+    def _key(session_id: str) -> bytes:
+        key = session_id.encode("utf-8")
+        if len(key) > KEY_BYTES:
+            raise ValueError(f"セッションIDは{KEY_BYTES}バイト以下にしてください")
+        return key
+
+    def _encode(self, key: bytes, record: SessionRecord, last_activity: float) -> bytes:
+        if record.user_id is None:
+            user, user_len = b"", NO_USER_ID
+        else:
+            user = record.user_id.encode("utf-8")
+            user_len = len(user)
+            if user_len > USER_ID_BYTES:
+                raise ValueError(f"ユーザーIDは{USER_ID_BYTES}バイト以下にしてください")
+        texts = b""
+        if record.texts:
+            texts = json.dumps(record.texts, ensure_ascii=False).encode("utf-8")
+            if len(texts) > self.text_bytes:
+                raise ValueError("自由記述の回答が長すぎます")
+        return self._slot.pack(
+            SLOT_USED,
+            len(key),
+            key,
+            last_activity,
+            user_len,
+            user,
+            record.current,
+            record.completed,
+            record.answered,
+            bytes(record.choices),
+            len(texts),
+            texts,
+        )
+
+    def _decode(self, slot: int) -> SessionRecord:
+        (
+            _,
+            _,
+            _,
+            _,
+            user_len,
+            user,
+            current,
+            completed,
+            answered,
+            choices,
+            texts_len,
+            texts,
+        ) = self._slot.unpack_from(self._mm, self._offset(slot))
+        record = SessionRecord(
+            len(self.catalog),
+            user_id=None if user_len == NO_USER_ID else user[:user_len].decode("utf-8"),
+            current=current,
+        )
+        record.completed = bool(completed)
+        record.answered = answered
+        record.choices[:] = choices
+        if texts_len:
+            record.texts = {
+                int(k): v
+                for k, v in json.loads(texts[:texts_len].decode("utf-8")).items()
+            }
+        return record
+
+    @contextmanager
+    def _slot_of(self, session_id: str) -> Iterator[Optional[int]]:
+        """
+        セッションのスロットを探し、見つかった場合はロックしたまま渡します。
+        探索はロックせずに行い、キーが一致したスロットだけをロックして確認し直します。
+        """
+        key = self._key(session_id)
+        for slot in self._probe(key):
+            state, slot_key = self._state_and_key(slot)
+            if state == SLOT_EMPTY:
+                break
+            if state == SLOT_USED and slot_key == key:
+                with self._locked(slot):
+                    state, slot_key = self._state_and_key(slot)
+                    if state == SLOT_USED and slot_key == key:
+                        yield slot
+                        return
+                break
+        yield None
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._slot_of(session_id) as slot:
+            return slot is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for slot in self._used_slots(0, self.capacity):
+            state, key = self._state_and_key(slot)
+            if state == SLOT_USED:
+                yield key.decode("utf-8")
+
+    def __len__(self) -> int:
+        (count,) = COUNT.unpack_from(self._mm, COUNT_OFFSET)
+        return int(count)
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        セッションを表から復元して返します。返すのはコピーのため、更新には edit を使ってください。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        with self._slot_of(session_id) as slot:
+            return None if slot is None else self._decode(slot)
+
+    def create(self, session_id: str, record: SessionRecord) -> None:
+        """
+        新しいセッションを表に追加します。同じIDのセッションがある場合は置き換えます。
+
+        Args:
+            session_id: セッションID
+            record: セッション
+
+        Raises:
+            ValueError: IDや回答がスロットに収まらない場合
+            RuntimeError: 表が満杯の場合
+        """
+        key = self._key(session_id)
+        data = self._encode(key, record, self._clock())
+        with self._structure_locked():
+            # 同じキーが連鎖の後ろにないことを確かめてから、最初の空き（墓標を含む）に書き込む
+            target = None
+            for slot in self._probe(key):
+                state, slot_key = self._state_and_key(slot)
+                if state == SLOT_USED and slot_key == key:
+                    target = slot
+                    break
+                if state != SLOT_USED and target is None:
+                    target = slot
+                if state == SLOT_EMPTY:
+                    break
+            if target is None:
+                raise RuntimeError("共有セッション表が満杯です")
+            with self._locked(target):
+                offset = self._offset(target)
+                added = self._mm[offset] != SLOT_USED
+                self._mm[offset : offset + self.slot_size] = data
+            if added:
+                self._add_count(1)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        セッションを削除します。スロットは墓標として残し、新しいセッションで再利用します。
+        直後が空きスロットの場合は、前に続く墓標とともに空きに戻します。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            bool: 削除した場合はTrue
+        """
+        with self._structure_locked():
+            with self._slot_of(session_id) as slot:
+                if slot is None:
+                    return False
+                self._mm[self._offset(slot)] = SLOT_DELETED
+            self._add_count(-1)
+            self._compact(slot)
+            return True
+
+    def _compact(self, slot: int) -> None:
+        """
+        直後が空きスロットの墓標を、前へ順に空きに戻します（追加・削除のロック中に呼び出す）。
+        直後が空きの墓標を通る探索の連鎖はないため、空きに戻しても連鎖は切れません。
+        """
+        if self._mm[self._offset((slot + 1) % self.capacity)] != SLOT_EMPTY:
+            return
+        for _ in range(self.capacity):
+            if self._mm[self._offset(slot)] != SLOT_DELETED:
+                return
+            with self._locked(slot):
+                self._mm[self._offset(slot)] = SLOT_EMPTY
+            slot = (slot - 1) % self.capacity
+
+    def touch(self, session_id: str) -> None:
+        """
+        セッションの最終アクティビティを現在時刻に更新します（再開時など、内容を変更しない操作用）。
+
+        Args:
+            session_id: セッションID
+        """
+        with self._slot_of(session_id) as slot:
+            if slot is not None:
+                ACTIVITY.pack_into(
+                    self._mm, self._offset(slot) + ACTIVITY_OFFSET, self._clock()
+                )
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        再開するセッションを返し、最終アクティビティを更新します。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        with self._slot_of(session_id) as slot:
+            if slot is None:
+                return None
+            ACTIVITY.pack_into(
+                self._mm, self._offset(slot) + ACTIVITY_OFFSET, self._clock()
+            )
+            return self._decode(slot)
+
+    def latest_for_user(self, user_id: str) -> Optional[str]:
+        raise NotImplementedError(
+            "共有セッション表ではユーザーIDでの検索に対応していません"
+        )
+
+    def idle_sessions(
+        self, idle_seconds: float, limit: int, cursor: Optional[ActivityCursor] = None
+    ) -> Tuple[List[ActivityCursor], Optional[ActivityCursor]]:
+        """
+        idle_seconds 以上操作のないセッションを、最終アクティビティの古い順にページングして返します。
+        最終アクティビティ順のインデックスは持たないため、1ページごとに表全体を走査します
+        （操作のないセッションの検索のみで使う。イベントループの外で呼び出してください）。
+
+        Args:
+            idle_seconds: 操作のない時間（秒）
+            limit: 1ページあたりの件数
+            cursor: 前のページの next_cursor
+
+        Returns:
+            Tuple: (最終アクティビティ時刻, セッションID) のリストと次ページのカーソル
+        """
+        cutoff = self._clock() - idle_seconds
+        entries: List[ActivityCursor] = []
+        for slot in self._used_slots(0, self.capacity):
+            offset = self._offset(slot)
+            (last_activity,) = ACTIVITY.unpack_from(self._mm, offset + ACTIVITY_OFFSET)
+            if last_activity >= cutoff:
+                continue
+            entry = (last_activity, self._state_and_key(slot)[1].decode("utf-8"))
+            if cursor is None or entry > cursor:
+                entries.append(entry)
+        page = heapq.nsmallest(limit + 1, entries)
+        if len(page) > limit:
+            return page[:limit], page[limit - 1]
+        return page, None
+
+    def idle_in_slots(
+        self, idle_seconds: float, start: int, slots: int
+    ) -> Tuple[List[str], int]:
+        """
+        start から slots 個のスロットを走査し、idle_seconds 以上操作のないセッションを返します
+        （期限切れの削除用。表全体を走査せず、1回の処理時間を slots に比例する時間に抑える）。
+
+        Args:
+            idle_seconds: 操作のない時間（秒）
+            start: 走査を始めるスロット
+            slots: 走査するスロット数
+
+        Returns:
+            Tuple[List[str], int]: セッションIDのリストと次に走査を始めるスロット（表の最後まで走査した場合は0）
+        """
+        cutoff = self._clock() - idle_seconds
+        end = min(start + slots, self.capacity)
+        session_ids = []
+        for slot in self._used_slots(start, end):
+            offset = self._offset(slot)
+            (last_activity,) = ACTIVITY.unpack_from(self._mm, offset + ACTIVITY_OFFSET)
+            if last_activity < cutoff:
+                session_ids.append(self._state_and_key(slot)[1].decode("utf-8"))
+        return session_ids, end if end < self.capacity else 0
+
+    @contextmanager
+    def edit(self, session_id: str) -> Iterator[Optional[SessionRecord]]:
+        """
+        セッションを更新するためのコンテキストマネージャ。
+        スロットをロックしたまま復元したレコードを渡し、例外なく抜けた場合に書き戻します。
+
+        Args:
+            session_id: セッションID
+
+        Yields:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+
+        Raises:
+            ValueError: 更新後の回答がスロットに収まらない場合
+        """
+        with self._slot_of(session_id) as slot:
+            if slot is None:
+                yield None
+                return
+            key = self._key(session_id)
+            record = self._decode(slot)
+            yield record
+            offset = self._offset(slot)
+            self._mm[offset : offset + self.slot_size] = self._encode(
+                key, record, self._clock()
+            )
+
+
+def create_session_store(
+    kind: str,
+    catalog: CatalogIndex,
+    path: str,
+    capacity: int = 100000,
+    text_bytes: int = 1024,
+    memory_budget_bytes: int = 0,
+    cold_path: str = "",
+) -> Union[LocalSessionStore, SharedSessionStore]:
+    """
+    設定に応じたセッションの保存先を作成します。
+
+    Args:
+        kind: "memory"（プロセス内の辞書）または "shared"（ワーカー間で共有する表）
+        catalog: カタログのインデックス
+        path: 共有する表のファイルパス
+        capacity: 共有する表のスロット数
+        text_bytes: 共有する表の1セッションあたりの自由記述の領域（バイト）
+        memory_budget_bytes: memory の場合のメモリ使用量の上限（0 は無制限）
+        cold_path: 上限を超えたセッションを移す SQLite のファイルパス
+
+    Returns:
+        LocalSessionStore | TieredSessionStore | SharedSessionStore: セッションの保存先
+
+    Raises:
+        ValueError: 未対応の種類が指定された場合
+    """
+    if kind == "memory":
+        if memory_budget_bytes > 0:
+            from app.utils.tiered_store import TieredSessionStore
+
+            return TieredSessionStore(cold_path, memory_budget_bytes)
+        return LocalSessionStore()
+    if kind == "shared":
+        return SharedSessionStore(
+            path, catalog, capacity=capacity, text_bytes=text_bytes
+        )
+    raise ValueError(
+        f"SESSION_STORE は memory または shared を指定してください: {kind}"
+    )
@@ -0,0 +1,158 @@
+"""
+回答分布の集計カウンター
+"""
+
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# カウンターのキー
+# ("answer", 質問ID, 選択肢) / ("skip", 質問ID) / ("started",) / ("completed",)
+CounterKey = Tuple[str, ...]
+
+
+class AnswerStats:
+    """
+    質問・選択肢ごとの回答数、スキップ数、開始・完了数をインクリメンタルに集計するクラス
+
+    累計カウンターに加えて、一定秒数ごとのバケットをリングバッファで保持し、
+    直近1時間・直近1日などの時間窓での集計にも対応します。
+    更新は常にO(1)で、個々のセッションを参照せずに集計結果を返せます。
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = 60,
+        retention_seconds: int = 24 * 60 * 60,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        集計カウンターを初期化します。
+
+        Args:
+            bucket_seconds: 時間窓集計のバケット幅（秒）
+            retention_seconds: 時間窓集計で保持する期間（秒）
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+        """
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_seconds
+        self._clock = clock
+        self._num_buckets = max(1, -(-retention_seconds // bucket_seconds))
+        self._lock = threading.Lock()
+        self._totals: Dict[CounterKey, int] = defaultdict(int)
+        # スロットごとに「どのバケット番号のデータか」と「そのバケットのカウンター」を保持
+        self._bucket_ids: List[int] = [-1] * self._num_buckets
+        self._buckets: List[Dict[CounterKey, int]] = [
+            defaultdict(int) for _ in range(self._num_buckets)
+        ]
+
+    def _incr(self, key: CounterKey) -> None:
+        """
+        累計と現在のバケットのカウンターを1つ進めます。
+        """
+        bucket_id = int(self._clock() // self.bucket_seconds)
+        slot = bucket_id % self._num_buckets
+        with self._lock:
+            self._totals[key] += 1
+            if self._bucket_ids[slot] != bucket_id:
+                # 一周前の古いバケットを再利用する
+                self._bucket_ids[slot] = bucket_id
+                self._buckets[slot] = defaultdict(int)
+            self._buckets[slot][key] += 1
+
+    def record_start(self) -> None:
+        """
+        面接の開始を記録します。
+        """
+        self._incr(("started",))
+
+    def record_answer(self, question_id: str, option: str) -> None:
+        """
+        回答を記録します。
+
+        Args:
+            question_id: 質問ID
+            option: 選択された選択肢
+        """
+        self._incr(("answer", question_id, option))
+
+    def record_skip(self, question_id: str) -> None:
+        """
+        質問のスキップを記録します。
+
+        Args:
+            question_id: スキップされた質問ID
+        """
+        self._incr(("skip", question_id))
+
+    def record_completion(self) -> None:
+        """
+        面接の完了を記録します。
+        """
+        self._incr(("completed",))
+
+    def _window_counts(self, window_seconds: int) -> Dict[CounterKey, int]:
+        """
+        直近 window_seconds 秒に含まれるバケットのカウンターを合算します。
+        """
+        current = int(self._clock() // self.bucket_seconds)
+        oldest = current - (-(-window_seconds // self.bucket_seconds)) + 1
+        counts: Dict[CounterKey, int] = defaultdict(int)
+        with self._lock:
+            for bucket_id, bucket in zip(self._bucket_ids, self._buckets):
+                if oldest <= bucket_id <= current:
+                    for key, value in bucket.items():
+                        counts[key] += value
+        return counts
+
+    def snapshot(self, window_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """
+        集計結果を返します。
+
+        Args:
+            window_seconds: 直近何秒を集計するか。Noneの場合は累計
+
+        Returns:
+            Dict: 開始数・完了数と、質問ごとの選択肢別回答数・割合・スキップ数
+
+        Raises:
+            ValueError: 保持期間を超える時間窓が指定された場合
+        """
+        if window_seconds is None:
+            with self._lock:
+                counts = dict(self._totals)
+        else:
+            if window_seconds <= 0 or window_seconds > self.retention_seconds:
+                raise ValueError(
+                    f"window_seconds は 1〜{self.retention_seconds} の範囲で指定してください"
+                )
+            counts = self._window_counts(window_seconds)
+
+        questions: Dict[str, Dict[str, Any]] = {}
+        for key, value in counts.items():
+            if key[0] == "answer":
+                entry = questions.setdefault(key[1], {"answers": {}, "skipped": 0})
+                entry["answers"][key[2]] = value
+            elif key[0] == "skip":
+                entry = questions.setdefault(key[1], {"answers": {}, "skipped": 0})
+                entry["skipped"] = value
+
+        for entry in questions.values():
+            answered = sum(entry["answers"].values())
+            entry["total"] = answered
+            entry["shares"] = (
+                {option: count / answered for option, count in entry["answers"].items()}
+                if answered
+                else {}
+            )
+
+        started = counts.get(("started",), 0)
+        completed = counts.get(("completed",), 0)
+        return {
+            "window_seconds": window_seconds,
+            "started": started,
+            "completed": completed,
+            "completion_rate": completed / started if started else 0.0,
+            "questions": questions,
+        }
@@ -0,0 +1,320 @@
+"""
+メモリ上限付きのセッションの保存先（ホット層とコールド層）
+
+ほとんどのセッションは数分で操作されなくなりますが、SESSION_EXPIRY_HOURS の間は再開できる
+必要があります。TieredSessionStore はメモリ上のセッション（ホット層）の推定バイト数を上限以下に
+保ち、上限を超えたら最も長く操作されていないセッションから SQLite のファイル（コールド層）へ
+移します。コールド層のセッションは再開や回答で操作されたときにメモリへ読み戻します。
+
+上限は実測ではなく record_bytes の推定値に対するものです。推定にはユーザーIDと最終アクティビティの
+インデックス（両方の層のセッションが対象で、1セッションあたり約260バイト）や、辞書の再確保で
+一時的に増える分は含まれないため、プロセスのメモリ使用量はその分だけ上限を上回ります。
+
+コールド層は再起動をまたぐ保存先ではありません（永続化はイベントログが担います）。
+起動時に空にし、書き込みも fsync しません。ユーザーIDと最終アクティビティの
+インデックスは、両方の層のセッションを対象にメモリ上に保持します。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.models.session_record import SessionRecord
+from app.utils.session_store import LocalSessionStore
+
+# ホット層の1セッションあたりの固定のメモリ使用量の目安（バイト）
+# SessionRecord と保存先の辞書のエントリの合計（bench_tiered_sessions.py で計測）。
+# インデックスは両方の層のセッションが対象のため含めない（1セッションあたり約260バイト）
+RECORD_OVERHEAD_BYTES = 280
+
+# コールド層から読み戻すのにかかった時間を保持する件数（パーセンタイルの計算用）
+LOAD_LATENCY_SAMPLES = 1024
+
+
+def record_bytes(record: SessionRecord) -> int:
+    """
+    ホット層のセッション1件のメモリ使用量を推定します。
+    インデックスの分は含みません（モジュールの説明を参照）。
+
+    Args:
+        record: セッション
+
+    Returns:
+        int: 推定バイト数
+    """
+    size = RECORD_OVERHEAD_BYTES + len(record.choices)
+    if record.user_id is not None:
+        size += len(record.user_id)
+    if record.texts:
+        # 自由記述はキーと値の文字列、辞書のエントリの分を加える
+        size += sum(100 + len(text.encode("utf-8")) for text in record.texts.values())
+    return size
+
+
+class ColdSessionTier:
+    """
+    SQLite のファイルにセッションのバイト列を保存するコールド層
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        コールド層を開きます。既存のファイルの内容は破棄します。
+
+        Args:
+            path: SQLite のファイルパス
+        """
+        self.path = path
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        # スナップショットの書き出しはワーカースレッドから読むため、接続をロックで共有する
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE sessions (session_id TEXT PRIMARY KEY, data BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self.count = 0
+        self.bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def put_many(self, items: List[Tuple[str, bytes]]) -> None:
+        """
+        セッションをまとめて書き込みます（1トランザクション）。
+
+        Args:
+            items: (セッションID, セッションのバイト列) のリスト
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO sessions VALUES (?, ?)", items)
+            self._db.execute("COMMIT")
+            self.count += len(items)
+            self.bytes += sum(len(data) for _, data in items)
+
+    def get(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        data: bytes = row[0]
+        return data
+
+    def pop(self, session_id: str) -> Optional[bytes]:
+        """
+        セッションを読み出して削除します。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Optional[bytes]: セッションのバイト列。存在しない場合はNone
+        """
+        with self._lock:
+            row = self._db.execute(
+                "DELETE FROM sessions WHERE session_id = ? RETURNING data",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            data: bytes = row[0]
+            self.count -= 1
+            self.bytes -= len(data)
+        return data
+
+
+class TieredSessionStore(LocalSessionStore):
+    """
+    ホット層の推定メモリ使用量を上限以下に保ち、あふれたセッションをコールド層へ移す保存先
+
+    ホット層のセッションは最終アクティビティの順に OrderedDict で保持し、上限を超えたら
+    先頭（最も長く操作されていないセッション）からまとめてコールド層へ移します。
+    """
+
+    def __init__(
+        self,
+        cold_path: str,
+        memory_budget_bytes: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        保存先を作成します。
+
+        Args:
+            cold_path: コールド層の SQLite のファイルパス
+            memory_budget_bytes: ホット層のメモリ使用量の上限（record_bytes による推定バイト数。インデックスの分は含まない）
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+        """
+        super().__init__(clock=clock)
+        self._records: "OrderedDict[str, SessionRecord]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.memory_budget_bytes = memory_budget_bytes
+        self.hot_bytes = 0
+        self.cold = ColdSessionTier(cold_path)
+        self.demoted_total = 0
+        self.loaded_total = 0
+        self._load_seconds: Deque[float] = deque(maxlen=LOAD_LATENCY_SAMPLES)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.index))
+
+    def close(self) -> None:
+        self.cold.close()
+
+    def _account(self, session_id: str, record: SessionRecord) -> None:
+        size = record_bytes(record)
+        self.hot_bytes += size - self._sizes.get(session_id, 0)
+        self._sizes[session_id] = size
+
+    def _demote(self) -> None:
+        """
+        ホット層が上限を超えている間、最も長く操作されていないセッションをコールド層へ移します。
+        """
+        items = []
+        while self.hot_bytes > self.memory_budget_bytes and len(self._records) > 1:
+            session_id, record = self._records.popitem(last=False)
+            self.hot_bytes -= self._sizes.pop(session_id)
+            items.append((session_id, record.to_bytes()))
+        if items:
+            self.cold.put_many(items)
+            self.demoted_total += len(items)
+
+    def _load(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        ホット層のセッションを返します。コールド層にある場合はホット層へ読み戻します。
+        """
+        record = self._records.get(session_id)
+        if record is not None:
+            self._records.move_to_end(session_id)
+            return record
+        if session_id not in self.index:
+            return None
+        started = time.perf_counter()
+        data = self.cold.pop(session_id)
+        if data is None:
+            return None
+        record, _ = SessionRecord.from_bytes(data)
+        self._records[session_id] = record
+        self._account(session_id, record)
+        self.loaded_total += 1
+        self._load_seconds.append(time.perf_counter() - started)
+        self._demote()
+        return record
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        セッションを返します。コールド層のセッションはホット層へ移さずに復元したコピーを返すため、
+        一覧やエクスポートで走査してもホット層の内容は変わりません。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        record = self._records.get(session_id)
+        if record is not None or session_id not in self.index:
+            return record
+        data = self.cold.get(session_id)
+        return None if data is None else SessionRecord.from_bytes(data)[0]
+
+    def create(self, session_id: str, record: SessionRecord) -> None:
+        if session_id not in self._records and session_id in self.index:
+            self.cold.pop(session_id)
+        super().create(session_id, record)
+        self._records.move_to_end(session_id)
+        self._account(session_id, record)
+        self._demote()
+
+    def delete(self, session_id: str) -> bool:
+        if session_id not in self.index:
+            return False
+        self.index.remove(session_id)
+        if self._records.pop(session_id, None) is not None:
+            self.hot_bytes -= self._sizes.pop(session_id)
+        else:
+            self.cold.pop(session_id)
+        return True
+
+    def touch(self, session_id: str) -> None:
+        if self._load(session_id) is not None:
+            self.index.touch(session_id, self._clock())
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """
+        再開するセッションを返し、最終アクティビティを更新します（コールド層の場合はホット層へ読み戻します）。
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        record = self._load(session_id)
+        if record is not None:
+            self.index.touch(session_id, self._clock())
+        return record
+
+    @contextmanager
+    def edit(self, session_id: str) -> Iterator[Optional[SessionRecord]]:
+        """
+        セッションを更新するためのコンテキストマネージャ。コールド層のセッションはホット層へ読み戻してから渡します。
+
+        Args:
+            session_id: セッションID
+
+        Yields:
+            Optional[SessionRecord]: セッション。存在しない場合はNone
+        """
+        record = self._load(session_id)
+        yield record
+        if record is not None and session_id in self._records:
+            self.index.touch(session_id, self._clock())
+            # 自由記述の回答が増えた分を反映する
+            self._account(session_id, record)
+            self._demote()
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        層ごとのセッション数・バイト数と、コールド層からの読み戻しの所要時間を返します。
+
+        Returns:
+            Dict[str, float]: メトリクス
+        """
+        samples = sorted(self._load_seconds)
+
+        def percentile(p: float) -> float:
+            return (
+                samples[min(len(samples) - 1, int(p * len(samples)))]
+                if samples
+                else 0.0
+            )
+
+        return {
+            "hot_sessions": len(self._records),
+            "hot_bytes": self.hot_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "cold_sessions": self.cold.count,
+            "cold_bytes": self.cold.bytes,
+            "demoted_total": self.demoted_total,
+            "cold_loads_total": self.loaded_total,
+            "cold_load_p50_ms": percentile(0.5) * 1000,
+            "cold_load_p99_ms": percentile(0.99) * 1000,
+            "cold_load_max_ms": (samples[-1] if samples else 0.0) * 1000,
+        }
@@ -0,0 +1,138 @@
+"""
+アクセス急増時のアドミッション制御のベンチマーク
+
+イベントループ上で CPU を使うリクエスト（1件あたり --work-ms のCPU時間を、細かく区切って
+他のリクエストと交互に実行する）を、処理能力を大きく超える頻度で到着させます。
+アドミッション制御なしの場合は処理中のリクエストがすべて同じように遅くなり、
+クライアントのタイムアウト（--timeout）を超えたリクエストは処理しても無駄になります。
+
+回答（/interview/answer 相当）と開始（/interview/start 相当）を混在させ、タイムアウト内に
+完了した件数（goodput）と、完了した回答のレイテンシを比較します。
+
+    python benchmarks/bench_admission.py --rate 2000 --seconds 2 --work-ms 2
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Optional
+
+from app.utils.admission import AdmissionController, RoutePolicy
+
+
+async def work(milliseconds: float) -> None:
+    # 0.2ms ずつ CPU を使い、他のリクエストに制御を渡す（処理中のリクエストで CPU を分け合う）
+    remaining = milliseconds / 1000
+    while remaining > 0:
+        step = min(remaining, 0.0002)
+        end = time.perf_counter() + step
+        while time.perf_counter() < end:
+            pass
+        remaining -= step
+        await asyncio.sleep(0)
+
+
+async def request(
+    route: str, controller: Optional[AdmissionController], work_ms: float, results: list
+) -> None:
+    started = time.perf_counter()
+    if controller is not None and not await controller.acquire(route):
+        results.append((route, "rejected", time.perf_counter() - started))
+        return
+    try:
+        await work(work_ms)
+    finally:
+        if controller is not None:
+            controller.release(route)
+    results.append((route, "done", time.perf_counter() - started))
+
+
+async def run(
+    rate: float,
+    seconds: float,
+    work_ms: float,
+    answer_share: float,
+    controller: Optional[AdmissionController],
+) -> list:
+    rng = random.Random(0)
+    results: list = []
+    tasks = []
+    started = time.perf_counter()
+    count = int(rate * seconds)
+    for i in range(count):
+        # 到着時刻まで待つ（まとめて到着させる）
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        route = "answer" if rng.random() < answer_share else "start"
+        tasks.append(asyncio.create_task(request(route, controller, work_ms, results)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def report(name: str, results: list, timeout: float) -> None:
+    def percentile(values: list, p: float) -> float:
+        return (
+            sorted(values)[min(len(values) - 1, int(p * len(values)))] * 1000
+            if values
+            else 0.0
+        )
+
+    answers = [
+        latency
+        for route, status, latency in results
+        if route == "answer" and status == "done"
+    ]
+    good = sum(
+        1 for _, status, latency in results if status == "done" and latency <= timeout
+    )
+    good_answers = sum(1 for latency in answers if latency <= timeout)
+    rejected = sum(1 for _, status, _ in results if status == "rejected")
+    total_answers = sum(1 for route, _, _ in results if route == "answer")
+    print(
+        f"{name:>10}: goodput {good}/{len(results)}  answers within timeout {good_answers}/{total_answers}  "
+        f"rejected {rejected}  answer p50 {percentile(answers, 0.5):.0f} ms  p99 {percentile(answers, 0.99):.0f} ms"
+    )
+    if answers:
+        print(f"{'':>10}  answer mean {statistics.mean(answers) * 1000:.0f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rate", type=float, default=2000, help="到着頻度（件/秒）")
+    parser.add_argument("--seconds", type=float, default=2)
+    parser.add_argument(
+        "--work-ms", type=float, default=2, help="1件あたりのCPU時間（ミリ秒）"
+    )
+    parser.add_argument("--answer-share", type=float, default=0.7)
+    parser.add_argument(
+        "--timeout", type=float, default=1.0, help="クライアントのタイムアウト（秒）"
+    )
+    parser.add_argument("--capacity", type=int, default=16)
+    args = parser.parse_args()
+
+    baseline = asyncio.run(
+        run(args.rate, args.seconds, args.work_ms, args.answer_share, None)
+    )
+    report("none", baseline, args.timeout)
+
+    controller = AdmissionController(
+        args.capacity,
+        {
+            "answer": RoutePolicy(args.capacity, 0, args.timeout / 2),
+            "start": RoutePolicy(max(1, args.capacity // 4), 1, args.timeout / 8),
+        },
+    )
+    admitted = asyncio.run(
+        run(args.rate, args.seconds, args.work_ms, args.answer_share, controller)
+    )
+    report("admission", admitted, args.timeout)
+    print(controller.metrics())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+固定質問サンプルの回答永続化のベンチマーク
+
+接続を毎回開いて1件ずつコミットする従来方式と、AnswerStore（長寿命接続・WAL・executemany）の
+挿入スループットを比較し、指定件数まで投入したテーブルで回答履歴取得のレイテンシを
+インデックスあり・なし（NOT INDEXED）で計測します。
+
+    python benchmarks/bench_answer_store.py --rows 10000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from app.sample.langgraph_fixed_questions import AnswerStore, current_timestamp
+
+USERS = 1_000_000
+
+
+def bench_legacy_inserts(db_path: str, rows: int) -> float:
+    """従来方式: 1件ごとに接続を開いてコミットする"""
+    AnswerStore(db_path).close()
+    started = time.perf_counter()
+    for i in range(rows):
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO answers (user_id, question_id, question, answer) VALUES (?, ?, ?, ?)",
+            (f"user-{i % USERS}", i % 3 + 1, "質問", "回答"),
+        )
+        conn.commit()
+        conn.close()
+    return rows / (time.perf_counter() - started)
+
+
+def bench_store_inserts(store: AnswerStore, rows: int) -> float:
+    """AnswerStore: バッファリングして executemany でまとめて書き込む"""
+    started = time.perf_counter()
+    timestamp = current_timestamp()
+    for i in range(rows):
+        store.add(
+            f"user-{random.randrange(USERS)}", i % 3 + 1, "質問", "回答", timestamp
+        )
+    store.flush()
+    return rows / (time.perf_counter() - started)
+
+
+def bench_lookups(store: AnswerStore, samples: int, indexed: bool) -> float:
+    """ランダムなユーザーの回答履歴取得のレイテンシ中央値（ミリ秒）"""
+    hint = "" if indexed else "NOT INDEXED"
+    latencies = []
+    for _ in range(samples):
+        user_id = f"user-{random.randrange(USERS)}"
+        started = time.perf_counter()
+        store.conn.execute(
+            f"SELECT question_id, question, answer, timestamp FROM answers {hint} "
+            "WHERE user_id = ? ORDER BY timestamp, id LIMIT 100",
+            (user_id,),
+        ).fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=2_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = bench_legacy_inserts(os.path.join(tmp, "legacy.db"), args.legacy_rows)
+        print(f"legacy inserts:      {legacy:,.0f} rows/s ({args.legacy_rows:,} rows)")
+
+        store = AnswerStore(os.path.join(tmp, "store.db"), batch_size=args.batch_size)
+        batched = bench_store_inserts(store, args.rows)
+        print(f"AnswerStore inserts: {batched:,.0f} rows/s ({args.rows:,} rows)")
+
+        indexed = bench_lookups(store, args.lookups, indexed=True)
+        print(f"lookup with index:   {indexed:.3f} ms (median)")
+        scan = bench_lookups(store, max(1, args.lookups // 20), indexed=False)
+        print(f"lookup full scan:    {scan:.3f} ms (median)")
+        store.close()
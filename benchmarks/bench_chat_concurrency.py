@@ -0,0 +1,115 @@
+"""
+/chat を多数同時に実行しているときの、他のエンドポイントの応答性のベンチマーク
+
+--chats 個のクライアントが /chat で面接（全質問への回答）を繰り返す間、GET /interview/questions を
+一定間隔で送り、予定した送信時刻からのレイテンシ（p50 / p99 / 最大）を計測します。
+グラフをスレッドプールで実行する場合（pool）と、イベントループ上で直接実行した場合（inline）を比較します。
+
+スレッド数は CHAT_WORKERS で変更できます。
+
+    python benchmarks/bench_chat_concurrency.py --chats 64 --seconds 5
+    CHAT_WORKERS=4 python benchmarks/bench_chat_concurrency.py --mode pool
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from typing import Callable, List, ParamSpec, TypeVar
+
+import httpx
+
+import app.main as main
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class InlineExecutor(Executor):
+    """呼び出したスレッド（イベントループ）でそのまま実行する比較用の Executor"""
+
+    def submit(
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> "Future[T]":
+        future: "Future[T]" = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000.0
+
+
+async def run(mode: str, chats: int, seconds: float, interval: float) -> None:
+    if mode == "inline":
+        main.chat_executor = InlineExecutor()
+    answers = [
+        (question.options or ["Python"])[0]
+        for question in main.INTERVIEW_QUESTIONS.values()
+    ]
+    transport = httpx.ASGITransport(app=main.app)
+    turns = rejected = 0
+    probes = []
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def chatter() -> None:
+            nonlocal turns, rejected
+            while time.perf_counter() < deadline:
+                session_id = str(uuid.uuid4())
+                for answer in answers:
+                    response = await client.post(
+                        "/chat", json={"session_id": session_id, "message": answer}
+                    )
+                    if response.status_code == 503:
+                        rejected += 1
+                        await asyncio.sleep(0.01)
+                    else:
+                        turns += 1
+
+        async def probe(scheduled: float) -> None:
+            await client.get("/interview/questions")
+            probes.append(time.perf_counter() - scheduled)
+
+        workers = [asyncio.create_task(chatter()) for _ in range(chats)]
+        started = time.perf_counter()
+        pending = []
+        tick = 0
+        while time.perf_counter() < deadline:
+            pending.append(asyncio.create_task(probe(started + tick * interval)))
+            tick += 1
+            await asyncio.sleep(
+                max(0.0, started + tick * interval - time.perf_counter())
+            )
+        await asyncio.gather(*workers, *pending)
+        elapsed = time.perf_counter() - started
+
+    probes.sort()
+    print(
+        f"{mode:>6}: /chat {turns / elapsed:,.0f} turns/s ({rejected} rejected) | "
+        f"/interview/questions p50 {statistics.median(probes) * 1000:.1f} ms, "
+        f"p99 {percentile(probes, 0.99):.1f} ms, max {probes[-1] * 1000:.1f} ms ({len(probes)} requests)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--chats", type=int, default=64, help="同時に /chat を送るクライアント数"
+    )
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument(
+        "--interval-ms",
+        type=float,
+        default=10.0,
+        help="他のエンドポイントへの送信間隔（ミリ秒）",
+    )
+    parser.add_argument("--mode", choices=["pool", "inline"], action="append")
+    args = parser.parse_args()
+
+    for mode in args.mode or ["pool", "inline"]:
+        asyncio.run(run(mode, args.chats, args.seconds, args.interval_ms / 1000))
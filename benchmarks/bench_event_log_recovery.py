@@ -0,0 +1,93 @@
+"""
+イベントログからの復元時間のベンチマーク
+
+指定数のセッションの開始と全質問への回答をイベントログに書き、次の2通りで復元時間を計測します。
+- ログのみ: すべてのセグメントを先頭から再生
+- スナップショット + 末尾: スナップショットを読み込み、その後の --tail セッション分のイベントだけを再生
+
+    python benchmarks/bench_event_log_recovery.py --sessions 1000000 --tail 50000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from app.main import CATALOG_INDEX
+from app.models.session_record import SessionRecord
+from app.utils.event_log import EventLog
+
+
+def write_sessions(log: EventLog, sessions: dict, count: int) -> None:
+    for i in range(count):
+        session_id = str(uuid.uuid4())
+        record = SessionRecord(len(CATALOG_INDEX), user_id=f"user-{i}")
+        sessions[session_id] = record
+        log.log_start(session_id, record)
+        for question_index, options in enumerate(CATALOG_INDEX.options):
+            record.set_answer(
+                CATALOG_INDEX,
+                question_index,
+                options[i % len(options)] if options else "Python, FastAPI",
+            )
+            if question_index + 1 < len(CATALOG_INDEX):
+                record.current = question_index + 1
+            else:
+                record.completed = True
+            log.log_step(session_id, record, question_index)
+
+
+def directory_mb(path: str) -> float:
+    return (
+        sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        / 1024
+        / 1024
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument(
+        "--tail", type=int, default=50_000, help="スナップショット後に書くセッション数"
+    )
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        log = EventLog(directory)
+        sessions: dict = {}
+        started = time.perf_counter()
+        write_sessions(log, sessions, args.sessions)
+        print(
+            f"append: {args.sessions:,} sessions in {time.perf_counter() - started:.1f} s, "
+            f"log {directory_mb(directory):.0f} MB"
+        )
+
+        recovered, result = EventLog(directory).recover(len(CATALOG_INDEX))
+        assert len(recovered) == args.sessions
+        del recovered
+        print(
+            f"log only:          {result['seconds']:.1f} s ({result['replayed_events']:,} events)"
+        )
+
+        seq = log.roll()
+        started = time.perf_counter()
+        log.write_snapshot(seq, sessions.items())
+        log.compact(seq)
+        print(
+            f"snapshot: {time.perf_counter() - started:.1f} s, dir {directory_mb(directory):.0f} MB"
+        )
+
+        write_sessions(log, sessions, args.tail)
+        log.close()
+        recovered, result = EventLog(directory).recover(len(CATALOG_INDEX))
+        assert len(recovered) == len(sessions)
+        print(
+            f"snapshot + tail:   {result['seconds']:.1f} s "
+            f"({result['snapshot_sessions']:,} from snapshot, {result['replayed_events']:,} events)"
+        )
+    finally:
+        shutil.rmtree(directory)
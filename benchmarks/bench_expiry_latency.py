@@ -0,0 +1,98 @@
+"""
+大量のセッションが同時に期限切れになったときの /interview/answer のレイテンシのベンチマーク
+
+--sessions 件のセッションを作成して時計を有効期間の先へ進め、期限切れの削除を実行しながら
+/interview/answer を一定間隔で送り、予定した送信時刻からのレイテンシ（p50 / p99 / 最大）を計測します。
+1回の削除件数（--slice）を変えて、一度にすべて削除する場合と比較します。
+
+    python benchmarks/bench_expiry_latency.py --sessions 200000 --slice 200 --slice 200000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+import app.main as main
+from app.models.session_record import SessionRecord
+from app.utils.expiry import SessionSweeper
+from app.utils.session_store import LocalSessionStore
+
+TTL_SECONDS = 24 * 60 * 60
+
+
+async def run(sessions: int, slice_size: int, interval: float) -> None:
+    now = [0.0]
+    store = LocalSessionStore(clock=lambda: now[0])
+    main.session_states = store
+    for i in range(sessions):
+        session_id = f"idle-{i}"
+        store.create(session_id, SessionRecord(len(main.CATALOG_INDEX)))
+        main.cohort_index.add_session(session_id)
+        # 期限切れのセッションにもグラフのチェックポイントがある状態にする
+        main.conversation_graph.memory_saver.storage[session_id][""] = {}
+    now[0] = TTL_SECONDS + 1
+
+    sweeper = SessionSweeper(
+        store, TTL_SECONDS, main.expire_session, slice_size=slice_size
+    )
+    options = main.INTERVIEW_QUESTIONS["q1"].options
+    assert options
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def answer(scheduled: float) -> None:
+            session_id = (await client.post("/interview/start")).json()["session_id"]
+            await client.post(
+                "/interview/answer",
+                json={
+                    "session_id": session_id,
+                    "question_id": "q1",
+                    "answer_type": "choice",
+                    "answer": options[0],
+                },
+            )
+            # 予定した送信時刻からの遅れを含める（削除がイベントループを止めると送信自体が遅れる）
+            latencies.append(time.perf_counter() - scheduled)
+
+        started = time.perf_counter()
+        sweep = asyncio.create_task(sweeper.sweep())
+        requests = []
+        tick = 0
+        while not sweep.done() or tick == 0:
+            scheduled = started + tick * interval
+            requests.append(asyncio.create_task(answer(scheduled)))
+            tick += 1
+            await asyncio.sleep(
+                max(0.0, started + tick * interval - time.perf_counter())
+            )
+        expired = await sweep
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*requests)
+
+    latencies.sort()
+    print(
+        f"slice={slice_size:>7}: expired {expired:,} in {elapsed:.2f} s, "
+        f"max slice {sweeper.max_slice_seconds * 1000:.1f} ms | answer latency "
+        f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, "
+        f"max {latencies[-1] * 1000:.1f} ms ({len(latencies)} requests)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200_000)
+    parser.add_argument("--slice", type=int, action="append")
+    parser.add_argument(
+        "--interval-ms", type=float, default=5.0, help="リクエストの送信間隔（ミリ秒）"
+    )
+    args = parser.parse_args()
+
+    for slice_size in args.slice or [200, args.sessions]:
+        asyncio.run(run(args.sessions, slice_size, args.interval_ms / 1000))
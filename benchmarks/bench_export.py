@@ -0,0 +1,76 @@
+"""
+完了済みセッションのストリーミングエクスポートのベンチマーク
+
+セッションは読み出し時に生成するため、計測されるのはエクスポート処理そのもののスループットです。
+--trace-memory を指定すると tracemalloc のピークも計測します（計測中はスループットが落ちます）。
+
+    python benchmarks/bench_export.py --sessions 1000000
+    python benchmarks/bench_export.py --sessions 1000000 --trace-memory
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Iterator, List, Optional, Tuple
+
+from app.graph.flow import QUESTIONS
+from app.models.schemas import ConversationState
+from app.utils.export import (
+    EXPORT_FORMATS,
+    SessionChunk,
+    iter_session_chunks,
+    stream_export,
+)
+
+COLUMNS = [(q.id, q.options) for q in QUESTIONS]
+
+
+def make_chunks(total: int, chunk_size: int) -> Iterator[SessionChunk]:
+    def page(limit: int, cursor: int) -> Tuple[List[str], Optional[int]]:
+        end = min(cursor + limit, total)
+        return [str(i) for i in range(cursor, end)], end if end < total else None
+
+    def lookup(session_id: str) -> ConversationState:
+        i = int(session_id)
+        return ConversationState(
+            user_id=f"user-{i}",
+            answers={
+                q.id: q.options[(i + n) % len(q.options)]
+                for n, q in enumerate(QUESTIONS)
+            },
+            completed=True,
+        )
+
+    return iter_session_chunks(page, lookup, chunk_size=chunk_size)
+
+
+def run(export_format: str, total: int, chunk_size: int, trace_memory: bool) -> None:
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    for piece in stream_export(export_format, make_chunks(total, chunk_size), COLUMNS):
+        size += len(piece)
+    elapsed = time.perf_counter() - started
+    line = (
+        f"{export_format:7s} sessions={total:,} time={elapsed:.1f}s "
+        f"throughput={total / elapsed:,.0f} sessions/s output={size / 1e6:.1f}MB"
+    )
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f" peak_mem={peak / 1e6:.1f}MB"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, action="append")
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+    # pyarrow の遅延 import による確保をピークに含めないよう、事前に1回実行しておく
+    list(stream_export("arrow", make_chunks(1, 1), COLUMNS))
+    for export_format in args.format or EXPORT_FORMATS:
+        run(export_format, args.sessions, args.chunk_size, args.trace_memory)
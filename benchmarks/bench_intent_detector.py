@@ -0,0 +1,124 @@
+"""
+制御フレーズの検出と、制御フレーズのターンのレイテンシのベンチマーク
+
+1. 検出: Aho-Corasick オートマトン（IntentDetector）と、フレーズごとに部分文字列を探す素朴な
+   方法を、フレーズ数を増やしながら比較します（メッセージは回答と制御フレーズの混在）。
+2. ターン: 制御フレーズをワークフローで処理した場合（変更前と同じくグラフを実行）と、
+   グラフを実行せずに処理した場合の1ターンあたりの時間を比較します。
+
+    python benchmarks/bench_intent_detector.py --phrases 0 100 1000 --repeat 20000
+"""
+
+import argparse
+import random
+import time
+from typing import List, Optional, Tuple
+
+from app.graph.flow import ConversationGraph
+from app.utils.intent_detector import DEFAULT_PHRASES, IntentDetector
+from app.utils.option_matcher import normalize
+
+MESSAGES = [
+    "スキップ",
+    "あとでやります",
+    "やめます",
+    "会社員",
+    "会社員です",
+    "技術スキル向上",
+    "途中でやめることが多いです",
+    "わからない",
+    "ｽｷｯﾌﾟ",
+    "メンターが欲しいです",
+    "スキップしないで",
+    "会社を辞める予定",
+    "スキップでお願いします",
+]
+
+
+def phrase_table(count: int) -> dict:
+    """
+    既定の表に、ランダムな3〜6文字のフレーズを加えて count 件にします（既定の表より少ない場合は既定の表のまま）。
+    """
+    rng = random.Random(0)
+    alphabet = [chr(code) for code in range(ord("ぁ"), ord("ゖ"))]
+    table = {intent: list(phrases) for intent, phrases in DEFAULT_PHRASES.items()}
+    intents = list(table)
+    total = sum(len(phrases) for phrases in table.values())
+    while total < count:
+        phrase = "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 6)))
+        table[intents[total % len(intents)]].append(phrase)
+        total += 1
+    return table
+
+
+def naive_detect(
+    phrases: List[Tuple[str, str]], detector: IntentDetector, message: str
+) -> Optional[str]:
+    text = normalize(message)
+    best: Optional[Tuple[int, str]] = None
+    for phrase, intent in phrases:
+        start = text.find(phrase)
+        while start >= 0:
+            end = start + len(phrase)
+            if (
+                text[:start] in detector.prefixes
+                and text[end:] in detector.suffixes
+                and (best is None or len(phrase) > best[0])
+            ):
+                best = (len(phrase), intent)
+            start = text.find(phrase, start + 1)
+    return best[1] if best else None
+
+
+def bench_detection(counts: list, repeat: int) -> None:
+    print(f"{'phrases':>8} {'automaton us/msg':>17} {'naive us/msg':>13}")
+    for count in counts:
+        table = phrase_table(count)
+        detector = IntentDetector(table)
+        phrases = [
+            (normalize(p), intent) for intent, items in table.items() for p in items
+        ]
+        messages = [MESSAGES[i % len(MESSAGES)] for i in range(repeat)]
+        for message in MESSAGES:
+            assert detector.detect(message) == naive_detect(phrases, detector, message)
+
+        started = time.perf_counter()
+        for message in messages:
+            detector.detect(message)
+        automaton = (time.perf_counter() - started) / repeat * 1e6
+
+        started = time.perf_counter()
+        for message in messages:
+            naive_detect(phrases, detector, message)
+        naive = (time.perf_counter() - started) / repeat * 1e6
+        print(f"{len(phrases):>8} {automaton:>17.2f} {naive:>13.2f}")
+
+
+def bench_turns(turns: int) -> None:
+    graph = ConversationGraph()
+    # 変更前の経路: 制御フレーズもワークフローで処理する（検出を無効にする）
+    baseline = ConversationGraph()
+    baseline.intents = IntentDetector({})
+
+    for name, target in (("workflow", baseline), ("control", graph)):
+        started = time.perf_counter()
+        for i in range(turns):
+            target.process_message(f"s{i}", "あとで")
+        elapsed = time.perf_counter() - started
+        print(f"{name:>9}: {elapsed / turns * 1000:.3f} ms/turn")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--phrases", type=int, nargs="+", default=[0, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    bench_detection(args.phrases, args.repeat)
+    bench_turns(args.turns)
+
+
+if __name__ == "__main__":
+    main()
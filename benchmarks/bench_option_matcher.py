@@ -0,0 +1,149 @@
+"""
+自由記述の回答を選択肢に対応付けるマッチャーの精度とレイテンシのベンチマーク
+
+カタログの選択肢から、ボタンを押さずに入力されがちな表記ゆれ（文末表現、全角・半角、
+ひらがな・カタカナ、空白、一部の語だけ、1文字の脱落）を作り、正しい選択肢に対応付けられる
+割合を測ります。無関係な回答と、選択肢を否定する回答（「会社員ではありません」など）は
+誤って対応付けてはいけないため、その誤対応率も測ります。
+比較として、完全一致のみ（変更前の process_answer）の正解率も表示します。
+
+    python benchmarks/bench_option_matcher.py --repeat 20000
+"""
+
+import argparse
+import statistics
+import time
+import unicodedata
+from typing import List, Tuple
+
+from app.graph.flow import QUESTIONS
+from app.models.schemas import FixedQuestion
+from app.utils.option_matcher import OptionMatcher
+
+SUFFIXES = ["", "です", "です。", "かな", "がいいです", "  ", "！"]
+
+NEGATIVES = [
+    "こんにちは",
+    "わかりません",
+    "特にない",
+    "まだ決めていない",
+    "はい",
+    "いいえ",
+    "？？？",
+    "天気がいいですね",
+    "おすすめは？",
+    "次の質問へ",
+    "1",
+    "ok",
+]
+
+# 選択肢を否定する言い回し（選択肢の後ろに付ける）
+NEGATIONS = [
+    "ではありません",
+    "じゃない",
+    "ではないです",
+    "じゃありません",
+    "ではなかった",
+    "以外",
+    "じゃないかな",
+]
+
+
+def to_halfwidth_katakana(text: str) -> str:
+    hiragana_to_katakana = {
+        code: code + 0x60 for code in range(ord("ぁ"), ord("ゖ") + 1)
+    }
+    katakana = text.translate(hiragana_to_katakana)
+    # 半角カナへの変換表（NFKC の逆）を全角カナ1文字ずつ作る
+    table = {}
+    for code in range(0xFF66, 0xFF9E):
+        table[unicodedata.normalize("NFKC", chr(code))] = chr(code)
+    return "".join(table.get(ch, ch) for ch in katakana)
+
+
+def variants(question: FixedQuestion) -> List[Tuple[str, str]]:
+    cases = []
+    for option in question.options:
+        words = [option, *question.aliases.get(option, [])]
+        for word in words:
+            for suffix in SUFFIXES:
+                cases.append((word + suffix, option))
+            cases.append((to_halfwidth_katakana(word), option))
+            cases.append((" ".join(word), option))
+            if len(word) >= 5:
+                # 1文字の脱落（入力ミス）
+                cases.append((word[:2] + word[3:], option))
+    return cases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repeat", type=int, default=20_000, help="レイテンシを測る回数"
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    matcher = OptionMatcher(QUESTIONS)
+    print(f"index built in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    positives = [
+        (q.id, text, option) for q in QUESTIONS for text, option in variants(q)
+    ]
+    negatives = [(q.id, text) for q in QUESTIONS for text in NEGATIVES]
+    negated = [
+        (q.id, option + suffix)
+        for q in QUESTIONS
+        for option in q.options
+        for suffix in NEGATIONS
+    ]
+
+    exact = sum(
+        text in next(q for q in QUESTIONS if q.id == qid).options
+        for qid, text, _ in positives
+    )
+    correct = wrong = ambiguous = 0
+    for qid, text, option in positives:
+        result = matcher.match(qid, text)
+        if result.option == option:
+            correct += 1
+        elif result.option is not None:
+            wrong += 1
+            print(f"  wrong: {qid} {text!r} -> {result.option} ({result.score:.2f})")
+        elif result.ambiguous:
+            ambiguous += 1
+    false_positives = [
+        (qid, text)
+        for qid, text in negatives
+        if matcher.match(qid, text).option is not None
+    ]
+    for qid, text in false_positives:
+        print(f"  false positive: {qid} {text!r} -> {matcher.match(qid, text).option}")
+
+    print(
+        f"positives: {len(positives)} | exact match only {exact / len(positives):.1%} | "
+        f"matcher correct {correct / len(positives):.1%}, wrong {wrong}, ambiguous {ambiguous}, "
+        f"unmatched {len(positives) - correct - wrong - ambiguous}"
+    )
+    print(f"negatives: {len(negatives)} | false positives {len(false_positives)}")
+    negated_matches = [
+        (qid, text)
+        for qid, text in negated
+        if matcher.match(qid, text).option is not None
+    ]
+    for qid, text in negated_matches:
+        print(f"  negated match: {qid} {text!r} -> {matcher.match(qid, text).option}")
+    print(f"negated: {len(negated)} | matched {len(negated_matches)}")
+
+    inputs = [(qid, text) for qid, text, _ in positives] + negatives + negated
+    latencies = []
+    for i in range(args.repeat):
+        qid, text = inputs[i % len(inputs)]
+        t = time.perf_counter()
+        matcher.match(qid, text)
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    print(
+        f"latency: p50 {statistics.median(latencies) * 1e6:.1f} us, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us, max {latencies[-1] * 1e6:.1f} us"
+    )
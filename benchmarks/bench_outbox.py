@@ -0,0 +1,150 @@
+"""
+下流システムへの完了イベントの配信のベンチマーク
+
+ローカルのスタブの HTTP サーバー（1リクエストあたり --latency-ms の遅延）に対して、
+完了のたびに同期で POST する場合と、アウトボックスに書き込んでバッチで配信する場合を比較します。
+
+- inline: 完了の処理で1件ずつ POST する（完了の処理のレイテンシ = 下流システムのレイテンシ）
+- outbox: 完了の処理ではアウトボックスに書き込むだけにし、配信タスクが --batch-size 件ずつ送る
+
+完了の処理のレイテンシと、すべてのイベントを配信し終えるまでの時間（スループット）を表示します。
+
+    PYTHONPATH=. python benchmarks/bench_outbox.py --events 2000 --latency-ms 20 --batch-size 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List
+
+import httpx
+
+from app.utils.outbox import Outbox
+
+
+class StubServer(ThreadingHTTPServer):
+    """1リクエストごとに latency 秒待ち、受け取ったイベント数を数えるスタブ"""
+
+    def __init__(self, latency: float) -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.received = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubServer
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.received += len(body["events"])
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_stub(latency: float) -> StubServer:
+    server = StubServer(latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values: List[float], p: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(p * len(values)))] * 1000.0
+
+
+def event(i: int) -> dict:
+    return {
+        "session_id": f"s{i}",
+        "answers": {"q1": "学生", "q2": "はい", "q3": "エンジニア"},
+    }
+
+
+async def run_inline(url: str, events: int) -> tuple:
+    latencies = []
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        for i in range(events):
+            t0 = time.perf_counter()
+            response = await client.post(
+                url, json={"events": [{"id": i, "payload": event(i)}]}
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - started
+
+
+async def run_outbox(path: str, url: str, events: int, batch_size: int) -> tuple:
+    outbox = Outbox(path, url, batch_size=batch_size)
+    await outbox.start()
+    latencies = []
+    started = time.perf_counter()
+    for i in range(events):
+        t0 = time.perf_counter()
+        outbox.add("interview.completed", f"s{i}", event(i))
+        latencies.append(time.perf_counter() - t0)
+        # 完了のリクエストの間に配信タスクが動けるようにする
+        await asyncio.sleep(0)
+    while outbox.metrics()["backlog"]:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    metrics = outbox.metrics()
+    await outbox.stop()
+    outbox.close()
+    return latencies, elapsed, metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=20,
+        help="スタブのサーバーの1リクエストあたりの遅延（ミリ秒）",
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    server = start_stub(args.latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_address[1]}/events"
+
+    inline_events = min(args.events, 200)
+    latencies, elapsed = asyncio.run(run_inline(url, inline_events))
+    print(
+        f"{'inline':>8}: {inline_events} events  completion p50 {percentile(latencies, 0.5):.2f} ms  "
+        f"p99 {percentile(latencies, 0.99):.2f} ms  throughput {inline_events / elapsed:.0f} events/s"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        latencies, elapsed, metrics = asyncio.run(
+            run_outbox(
+                os.path.join(directory, "outbox.sqlite3"),
+                url,
+                args.events,
+                args.batch_size,
+            )
+        )
+    print(
+        f"{'outbox':>8}: {args.events} events  completion p50 {percentile(latencies, 0.5):.2f} ms  "
+        f"p99 {percentile(latencies, 0.99):.2f} ms  throughput {args.events / elapsed:.0f} events/s  "
+        f"batches {metrics['batches_total']}"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
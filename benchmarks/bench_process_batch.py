@@ -0,0 +1,51 @@
+"""
+ConversationGraph.process_batch のスループットのベンチマーク
+
+--sessions 件の会話（各セッションで全質問に回答）を、process_message を1件ずつ呼ぶループと、
+process_batch（ワーカー数を変えて）で処理し、ターン/秒を比較します。
+入力はセッションをまたいで交互に並べ、取り込んだ会話の再生と同じ順序にします。
+
+    python benchmarks/bench_process_batch.py --sessions 2000 --workers 1,4
+"""
+
+import argparse
+import time
+
+from app.graph.flow import QUESTIONS, ConversationGraph
+
+
+def build_items(sessions: int) -> list:
+    items = []
+    for turn, question in enumerate(QUESTIONS):
+        for i in range(sessions):
+            items.append(
+                (f"replay-{i}", question.options[(i + turn) % len(question.options)])
+            )
+    return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--workers", default="1,4", help="カンマ区切りのワーカー数")
+    args = parser.parse_args()
+
+    items = build_items(args.sessions)
+
+    graph = ConversationGraph()
+    started = time.perf_counter()
+    expected = [
+        graph.process_message(session_id, message) for session_id, message in items
+    ]
+    baseline = len(items) / (time.perf_counter() - started)
+    print(f"loop:              {baseline:8,.0f} turns/s")
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        graph = ConversationGraph()
+        started = time.perf_counter()
+        results = graph.process_batch(items, max_workers=workers)
+        throughput = len(items) / (time.perf_counter() - started)
+        assert results == expected
+        print(
+            f"batch workers={workers:<3}  {throughput:8,.0f} turns/s  ({throughput / baseline:.1f}x)"
+        )
@@ -0,0 +1,92 @@
+"""
+LLM 用のプロンプトのトークン数のベンチマーク
+
+1セッションで turns 回のターン（選択肢の回答と聞き直しの混在）を行い、毎ターン LLM に送る
+プロンプトのトークン数を比較します。
+
+    naive:   システムプロンプトと会話履歴のすべて（変更前に想定していた送り方）
+    builder: PromptBuilder（固定の接頭辞 + 要約 + 直近 MAX_HISTORY_LENGTH 件）
+
+builder の接頭辞は全ターンで同じ文字列のため、プロンプトキャッシュの対象になるトークン数も表示します。
+
+    python benchmarks/bench_prompt_builder.py --turns 10 50 200
+"""
+
+import argparse
+import random
+import time
+
+from app.graph.flow import ConversationGraph
+from app.graph.prompt import MESSAGE_OVERHEAD_TOKENS, SYSTEM_PROMPT, estimate_tokens
+
+REPLIES = [
+    "わからない",
+    "もう少し考えます",
+    "会社員です",
+    "技術",
+    "メンター",
+    "どれも違う気がします",
+]
+
+
+def run(turns: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    graph = ConversationGraph()
+    naive_total = builder_total = cached_total = 0
+    build_seconds = 0.0
+    prefixes = set()
+    for turn in range(turns):
+        # 40ターンごとに新しいセッションにする（完了後のターンは履歴が増えないため）
+        session_id = f"s{turn // 40}"
+        message = rng.choice(REPLIES)
+
+        state = graph.get_state(session_id)
+        catalog = graph._catalog_for(state) if state else graph.catalog
+        history = state.messages if state else []
+        naive = estimate_tokens(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS
+        naive += sum(
+            estimate_tokens(catalog.text(entry)) + MESSAGE_OVERHEAD_TOKENS
+            for entry in history
+        )
+        naive += estimate_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+        naive_total += naive
+
+        if state is not None:
+            started = time.perf_counter()
+            prompt = graph.build_prompt(session_id, message)
+            build_seconds += time.perf_counter() - started
+            assert prompt is not None
+            builder_total += prompt.total_tokens
+            cached_total += prompt.prefix_tokens
+            prefixes.add(prompt.prefix_hash)
+        else:
+            builder_total += naive
+        graph.process_message(session_id, message)
+    return {
+        "naive": naive_total / turns,
+        "builder": builder_total / turns,
+        "cached": cached_total / turns,
+        "prefixes": len(prefixes),
+        "build_us": build_seconds / max(1, turns) * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 40, 200])
+    args = parser.parse_args()
+    print(
+        f"{'turns':>6} {'naive tok/turn':>15} {'builder tok/turn':>17} {'cacheable':>10} {'prefixes':>9} {'build us':>9}"
+    )
+    for turns in args.turns:
+        result = run(turns)
+        print(
+            f"{turns:>6} {result['naive']:>15.0f} {result['builder']:>17.0f} {result['cached']:>10.0f} "
+            f"{result['prefixes']:>9} {result['build_us']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+セッションの二次インデックスの検索時間のベンチマーク
+
+指定数のセッションを登録し、ユーザーの最新セッションの検索と、操作のないセッションの
+ページング（1ページ100件）を、全セッションの走査と比較します。
+
+    python benchmarks/bench_session_index.py --sessions 1000000
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.utils.session_index import SessionIndex
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=300_000)
+    args = parser.parse_args()
+
+    index = SessionIndex()
+    owners: Dict[str, str] = {}
+    now = 0.0
+    for i in range(args.sessions):
+        now += 0.01
+        user_id = f"user-{random.randrange(args.users)}"
+        owners[f"s{i}"] = user_id
+        index.touch(f"s{i}", now, user_id=user_id)
+    # 一部のセッションに後から回答があった状態にする
+    for i in random.sample(range(args.sessions), args.sessions // 5):
+        now += 0.01
+        index.touch(f"s{i}", now)
+
+    user_id = owners["s0"]
+    cutoff = now / 2
+    _, cursor = index.idle_before(cutoff, 100)
+
+    def scan_latest() -> Tuple[Optional[float], str]:
+        return max(
+            (index.last_activity(s), s) for s, u in owners.items() if u == user_id
+        )
+
+    print(
+        f"latest_for_user: {timed(lambda: index.latest_for_user(user_id), 10000):8.1f} us  "
+        f"(scan {timed(scan_latest, 3) / 1000:,.0f} ms)"
+    )
+    print(
+        f"idle page (100): {timed(lambda: index.idle_before(cutoff, 100, cursor), 1000):8.1f} us"
+    )
@@ -0,0 +1,75 @@
+"""
+セッション1件あたりのメモリ使用量のベンチマーク
+
+ConversationState（Pydanticモデル）と SessionRecord（__slots__ とインデックス表現）で
+同じ回答状態のセッションを保持し、tracemalloc で1件あたりのバイト数を比較します。
+回答文字列はリクエストのJSONから毎回デコードされるため、セッションごとに別の文字列として作ります。
+
+    python benchmarks/bench_session_memory.py --sessions 100000
+"""
+
+import argparse
+import json
+import tracemalloc
+import uuid
+from typing import Callable, Dict
+
+from app.main import CATALOG_INDEX, INTERVIEW_QUESTIONS
+from app.models.schemas import ConversationState
+from app.models.session_record import SessionRecord
+
+
+def decoded_answers(i: int) -> Dict[str, str]:
+    """リクエストからデコードされた回答と同じく、毎回新しい文字列を作る"""
+    answers = {}
+    for n, question in enumerate(INTERVIEW_QUESTIONS.values()):
+        options = question.options or [f"自由記述 {i}"]
+        answers[question.question_id] = options[(i + n) % len(options)]
+    decoded: Dict[str, str] = json.loads(json.dumps(answers, ensure_ascii=False))
+    return decoded
+
+
+def measure(build: Callable[[int], object], count: int) -> float:
+    session_ids = [str(uuid.uuid4()) for _ in range(count)]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    sessions = {session_id: build(i) for i, session_id in enumerate(session_ids)}
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(sessions) == count
+    return (after - before) / count
+
+
+def build_state(i: int) -> ConversationState:
+    return ConversationState(
+        user_id=f"user-{i}",
+        current_question_id="q3",
+        answers=decoded_answers(i),
+        completed=True,
+    )
+
+
+def build_record(i: int) -> SessionRecord:
+    record = SessionRecord(len(CATALOG_INDEX), user_id=f"user-{i}")
+    for question_id, answer in decoded_answers(i).items():
+        record.set_answer(
+            CATALOG_INDEX, CATALOG_INDEX.question_index(question_id), answer
+        )
+    record.current = CATALOG_INDEX.question_index("q3")
+    record.completed = True
+    return record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100_000)
+    args = parser.parse_args()
+
+    state_bytes = measure(build_state, args.sessions)
+    record_bytes = measure(build_record, args.sessions)
+    print(f"ConversationState: {state_bytes:,.0f} bytes/session")
+    print(f"SessionRecord:     {record_bytes:,.0f} bytes/session")
+    print(
+        f"reduction:         {state_bytes / record_bytes:.1f}x "
+        "(dict entry for the session id included in both)"
+    )
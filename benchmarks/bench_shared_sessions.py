@@ -0,0 +1,222 @@
+"""
+ワーカー間で共有するセッション表のスケーリングのベンチマーク
+
+--mode http:  SESSION_STORE=shared で uvicorn を --workers 1..N で起動し、別プロセスの負荷生成器から
+              面接（開始と全質問への回答）を繰り返してリクエスト/秒を計測します。
+              どのワーカーに振り分けられてもセッションが見つかることも同時に確認します（404 は失敗として数える）。
+--mode table: HTTP を介さず、N プロセスから同じ表に create / edit を行い、表そのもののスケーリングを計測します。
+
+スケーリングはコア数が上限です。負荷生成器も同じホストで動くため、http モードでは
+ワーカー数 + 負荷生成プロセス数がコア数を超えないようにしてください。
+
+    python benchmarks/bench_shared_sessions.py --mode http --workers 1,2,4 --clients 4 --seconds 10
+    python benchmarks/bench_shared_sessions.py --mode table --workers 1,2,4 --sessions 20000
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Tuple
+
+import httpx
+
+from app.main import CATALOG_INDEX
+from app.models.session_record import SessionRecord
+from app.utils.session_store import SharedSessionStore
+
+CAPACITY = 200_000
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port: int = s.getsockname()[1]
+        return port
+
+
+def start_server(workers: int, table_path: str, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SESSION_STORE="shared",
+        SESSION_TABLE_PATH=table_path,
+        SESSION_TABLE_CAPACITY=str(CAPACITY),
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn が起動しませんでした")
+
+
+async def interview_loop(
+    base_url: str, answers: list, seconds: float, concurrency: int
+) -> tuple:
+    requests = errors = 0
+    deadline = time.perf_counter() + seconds
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+
+        async def one_user() -> None:
+            nonlocal requests, errors
+            while time.perf_counter() < deadline:
+                session_id = (await client.post("/interview/start")).json()[
+                    "session_id"
+                ]
+                requests += 1
+                for question_id, answer in answers:
+                    response = await client.post(
+                        "/interview/answer",
+                        json={
+                            "session_id": session_id,
+                            "question_id": question_id,
+                            "answer_type": "choice",
+                            "answer": answer,
+                        },
+                    )
+                    requests += 1
+                    if response.status_code != 200:
+                        errors += 1
+
+        await asyncio.gather(*(one_user() for _ in range(concurrency)))
+    return requests, errors
+
+
+def client_process(
+    base_url: str,
+    answers: list,
+    seconds: float,
+    concurrency: int,
+    queue: "multiprocessing.Queue[Tuple[int, int]]",
+) -> None:
+    queue.put(asyncio.run(interview_loop(base_url, answers, seconds, concurrency)))
+
+
+def run_http(workers: int, clients: int, seconds: float, concurrency: int) -> tuple:
+    table_path = os.path.join(tempfile.mkdtemp(), "sessions.tbl")
+    port = free_port()
+    server = start_server(workers, table_path, port)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        catalog = httpx.get(f"{base_url}/interview/questions").json()["questions"]
+        answers = [
+            (q["question_id"], q["options"][0] if q["options"] else "Python")
+            for q in catalog
+        ]
+        queue: "multiprocessing.Queue[Tuple[int, int]]" = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=client_process,
+                args=(base_url, answers, seconds, concurrency, queue),
+            )
+            for _ in range(clients)
+        ]
+        for p in processes:
+            p.start()
+        results = [queue.get() for _ in processes]
+        for p in processes:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return sum(r for r, _ in results) / seconds, sum(e for _, e in results)
+
+
+def table_worker(
+    path: str, sessions: int, queue: "multiprocessing.Queue[Tuple[int, float]]"
+) -> None:
+    store = SharedSessionStore(path, CATALOG_INDEX, capacity=CAPACITY)
+    started = time.perf_counter()
+    for _ in range(sessions):
+        session_id = str(uuid.uuid4())
+        store.create(session_id, SessionRecord(len(CATALOG_INDEX)))
+        for i, options in enumerate(CATALOG_INDEX.options):
+            with store.edit(session_id) as record:
+                assert record is not None
+                record.set_answer(CATALOG_INDEX, i, options[0] if options else "Python")
+                record.current = i
+    queue.put((sessions * (1 + len(CATALOG_INDEX)), time.perf_counter() - started))
+    store.close()
+
+
+def run_table(workers: int, sessions: int) -> tuple:
+    path = os.path.join(tempfile.mkdtemp(), "sessions.tbl")
+    SharedSessionStore(path, CATALOG_INDEX, capacity=CAPACITY).close()
+    queue: "multiprocessing.Queue[Tuple[int, float]]" = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=table_worker, args=(path, sessions // workers, queue)
+        )
+        for _ in range(workers)
+    ]
+    started = time.perf_counter()
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - started
+    return sum(ops for ops, _ in results) / elapsed, 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["http", "table"], default="http")
+    parser.add_argument("--workers", default="1,2,4", help="カンマ区切りのワーカー数")
+    parser.add_argument(
+        "--clients", type=int, default=4, help="http モードの負荷生成プロセス数"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="負荷生成プロセスあたりの同時ユーザー数",
+    )
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument(
+        "--sessions", type=int, default=20_000, help="table モードのセッション数"
+    )
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        if args.mode == "http":
+            throughput, errors = run_http(
+                workers, args.clients, args.seconds, args.concurrency
+            )
+        else:
+            throughput, errors = run_table(workers, args.sessions)
+        baseline = baseline or throughput
+        print(
+            f"workers={workers}: {throughput:,.0f} ops/s  "
+            f"scaling={throughput / baseline:.2f}x  efficiency={throughput / baseline / workers:.0%}  "
+            f"errors={errors}"
+        )
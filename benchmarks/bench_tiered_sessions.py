@@ -0,0 +1,93 @@
+"""
+メモリ上限付きのセッションの保存先（ホット層とコールド層）のベンチマーク
+
+同じ数のセッションを LocalSessionStore（すべてメモリ）と TieredSessionStore（上限付き）に作成し、
+tracemalloc で計測したメモリ使用量と、ホット層の推定バイト数を比較します。
+続いてコールド層のセッションを再開（load）し、ホット層のセッションとの所要時間の差を計測します。
+
+    python benchmarks/bench_tiered_sessions.py --sessions 200000 --budget-mb 16
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from app.main import CATALOG_INDEX
+from app.models.session_record import SessionRecord
+from app.utils.session_store import LocalSessionStore
+from app.utils.tiered_store import TieredSessionStore
+
+
+def fill(store: LocalSessionStore, session_ids: list) -> float:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i, session_id in enumerate(session_ids):
+        record = SessionRecord(len(CATALOG_INDEX), user_id=f"user-{i}")
+        for q, options in enumerate(CATALOG_INDEX.options):
+            record.set_answer(
+                CATALOG_INDEX, q, options[i % len(options)] if options else "Python"
+            )
+        store.create(session_id, record)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return after - before
+
+
+def time_loads(store: LocalSessionStore, session_ids: list) -> list:
+    latencies = []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        assert store.load(session_id) is not None
+        latencies.append(time.perf_counter() - started)
+    return sorted(latencies)
+
+
+def summary(latencies: list) -> str:
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e6
+    return f"p50 {p(0.5):.1f} us, p99 {p(0.99):.1f} us"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200_000)
+    parser.add_argument("--budget-mb", type=float, default=16)
+    parser.add_argument("--loads", type=int, default=5_000)
+    args = parser.parse_args()
+
+    session_ids = [str(uuid.uuid4()) for _ in range(args.sessions)]
+
+    local = LocalSessionStore()
+    local_bytes = fill(local, session_ids)
+    print(
+        f"memory:  {local_bytes / 2**20:8.1f} MiB for {args.sessions:,} sessions "
+        f"({local_bytes / args.sessions:.0f} B/session)"
+    )
+    del local
+
+    path = os.path.join(tempfile.mkdtemp(), "cold.db")
+    tiered = TieredSessionStore(path, int(args.budget_mb * 2**20))
+    tiered_bytes = fill(tiered, session_ids)
+    metrics = tiered.metrics()
+    print(
+        f"tiered:  {tiered_bytes / 2**20:8.1f} MiB measured, {metrics['hot_bytes'] / 2**20:.1f} MiB estimated "
+        f"(budget {args.budget_mb} MiB) | hot {metrics['hot_sessions']:,}, cold {metrics['cold_sessions']:,} "
+        f"({metrics['cold_bytes'] / 2**20:.1f} MiB, file {os.path.getsize(path) / 2**20:.1f} MiB)"
+    )
+
+    hot_sessions = int(metrics["hot_sessions"])
+    cold_sessions = int(metrics["cold_sessions"])
+    hot = random.sample(
+        session_ids[-hot_sessions // 2 :], min(args.loads, hot_sessions // 2)
+    )
+    cold = random.sample(session_ids[:cold_sessions], min(args.loads, cold_sessions))
+    print(f"load hot:  {summary(time_loads(tiered, hot))}")
+    print(f"load cold: {summary(time_loads(tiered, cold))}")
+    metrics = tiered.metrics()
+    print(
+        f"metrics: cold_load p50 {metrics['cold_load_p50_ms']:.3f} ms, p99 {metrics['cold_load_p99_ms']:.3f} ms"
+    )
+    tiered.close()
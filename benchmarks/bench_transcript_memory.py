@@ -0,0 +1,118 @@
+"""
+1セッションあたりのメモリ使用量のベンチマーク（会話グラフとチェックポインター経由）
+
+ConversationGraph.process_message で固定質問フローを最後まで進め、セッション数あたりの
+メモリの増加を tracemalloc で計測します。会話履歴はチェックポインター（MemorySaver）に
+ステップごとのチェックポイントとして直列化されて残るため、内訳として次も表示します。
+
+- checkpoints: 1セッションあたりのチェックポイント数（ノードの実行ごとに1つ）
+- checkpoint bytes: チェックポイント・チャネル値・書き込みの直列化済みバイト数の合計
+- messages bytes: そのうち会話履歴（messages チャネル）の直列化済みバイト数
+- transcript: 最終状態の会話履歴1件分を、参照のまま保持した場合とメッセージの辞書に
+  展開した場合のサイズ（履歴の表現がセッション全体のどれだけを占めるかの目安）
+
+    PYTHONPATH=. python benchmarks/bench_transcript_memory.py --sessions 2000
+"""
+
+import argparse
+import sys
+import tracemalloc
+from typing import Any, Set
+
+from app.graph.flow import QUESTIONS, ConversationGraph
+
+
+def answers_for(i: int) -> list:
+    return [q.options[(i + n) % len(q.options)] for n, q in enumerate(QUESTIONS)]
+
+
+def run_sessions(graph: ConversationGraph, count: int) -> None:
+    for i in range(count):
+        for answer in answers_for(i):
+            graph.process_message(f"s{i}", answer)
+
+
+def serialized_bytes(value: Any) -> int:
+    """
+    チェックポインターの値に含まれる bytes の合計を返します。
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(serialized_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(serialized_bytes(item) for item in value.values())
+    return 0
+
+
+def checkpoint_breakdown(graph: ConversationGraph, session_id: str) -> tuple:
+    saver = graph.memory_saver
+    checkpoints = saver.storage.get(session_id, {})
+    count = sum(len(by_id) for by_id in checkpoints.values())
+    total = serialized_bytes(checkpoints)
+    messages = 0
+    for key in [key for key in saver.blobs if key[0] == session_id]:
+        size = serialized_bytes(saver.blobs[key])
+        total += size
+        if key[2] == "messages":
+            messages += size
+    for outer_key in [key for key in saver.writes if key[0] == session_id]:
+        for write in saver.writes[outer_key].values():
+            size = serialized_bytes(write)
+            total += size
+            if write[1] == "messages":
+                messages += size
+    return count, total, messages
+
+
+def deep_size(value: Any, seen: Set[int]) -> int:
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in value)
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    graph = ConversationGraph()
+    # カタログや遅延初期化されるものを計測から除くため、1セッション分を先に実行する
+    run_sessions(graph, 1)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    run_sessions(graph, args.sessions)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total = (after - before) / args.sessions
+
+    count, checkpoint_bytes, message_bytes = checkpoint_breakdown(graph, "s1")
+    state = graph.get_state("s1")
+    assert state is not None
+    # 参照のタプルはカタログで共有されるため、共有分を除いてリスト自体のサイズのみ数える
+    shared = {id(entry) for entry in state.messages if isinstance(entry, tuple)}
+    ref_bytes = deep_size(state.messages, set(shared))
+    rendered_bytes = deep_size(graph.catalog.render(state.messages), set())
+
+    print(f"sessions:          {args.sessions} ({len(QUESTIONS)} turns each)")
+    print(
+        f"total:             {total:,.0f} bytes/session (graph + checkpointer, tracemalloc)"
+    )
+    print(f"checkpoints:       {count} per session")
+    print(f"checkpoint bytes:  {checkpoint_bytes:,} bytes/session (serialized)")
+    print(f"  messages:        {message_bytes:,} bytes/session (serialized)")
+    print(
+        f"transcript:        {ref_bytes:,} bytes as refs, {rendered_bytes:,} bytes as message dicts"
+    )
+
+
+if __name__ == "__main__":
+    main()
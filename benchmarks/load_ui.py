@@ -0,0 +1,127 @@
+"""
+Gradio UI 層の負荷スクリプト
+
+スタブの /chat と /chat/stream API をローカルで起動し、UI のハンドラー（handle_message）から指定回数の
+ターンを送ります。handle_message は /chat/stream の NDJSON を受け取りながら表示を更新する
+非同期ジェネレーターのため、最後まで読み切ったものを1ターンとします。
+1000ターンごとに UI 層のレイテンシ（選択肢を表示するまでの first と、返信を表示し終えるまでの p50 / p99）、
+tracemalloc による Python ヒープ使用量、Blocks に登録されたイベントハンドラー数、
+API 側から見た TCP 接続数を出力します。
+
+    python benchmarks/load_ui.py --turns 10000
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import threading
+from typing import Any, Dict, List, Optional, Set
+import time
+import tracemalloc
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.frontend import ui
+
+stub = FastAPI()
+client_ports: Set[int] = set()
+
+
+OPTIONS = ["会社員", "自営業", "学生", "その他"]
+
+
+@stub.post("/chat")
+async def chat(request: Request) -> Dict[str, Any]:
+    if request.client is not None:
+        client_ports.add(request.client.port)
+    payload = await request.json()
+    return {
+        "message": f"受け付けました: {payload['message']}",
+        "progress": {"current": 1, "total": 3},
+        "options": OPTIONS,
+    }
+
+
+@stub.post("/chat/stream")
+async def chat_stream(request: Request) -> StreamingResponse:
+    if request.client is not None:
+        client_ports.add(request.client.port)
+    payload = await request.json()
+    events = [
+        {
+            "type": "turn",
+            "progress": {"current": 1, "total": 3},
+            "options": OPTIONS,
+            "question_id": "q1",
+            "completed": False,
+            "intent": None,
+        },
+        {"type": "delta", "text": f"受け付けました: {payload['message']}"},
+        {"type": "delta", "text": "\n\n次の質問です"},
+        {"type": "done"},
+    ]
+    return StreamingResponse(
+        (json.dumps(event, ensure_ascii=False) + "\n" for event in events),
+        media_type="application/x-ndjson",
+    )
+
+
+def start_stub() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port: int = s.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return port
+
+
+async def run(turns: int, window: int) -> None:
+    demo = ui.create_chat_interface()
+    handler_count = len(demo.fns)
+    history: List[Dict[str, str]] = []
+    latencies = []
+    first_latencies = []
+    tracemalloc.start()
+    for turn in range(1, turns + 1):
+        started = time.perf_counter()
+        first: Optional[float] = None
+        async for history, *_ in ui.handle_message("会社員", history, "load-session"):
+            if first is None:
+                first = time.perf_counter()
+        assert first is not None
+        latencies.append((time.perf_counter() - started) * 1000)
+        first_latencies.append((first - started) * 1000)
+        # 実際の UI と同様に、チャット履歴は表示用に直近分だけ保持する
+        history = history[-20:]
+        if turn % window == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            p99 = statistics.quantiles(latencies, n=100)[98]
+            print(
+                f"turns={turn:6d} first={statistics.median(first_latencies):6.2f}ms "
+                f"p50={statistics.median(latencies):6.2f}ms p99={p99:6.2f}ms "
+                f"heap={current / 1e6:6.2f}MB handlers={len(demo.fns)} "
+                f"tcp_connections={len(client_ports)}"
+            )
+            latencies = []
+            first_latencies = []
+    assert len(demo.fns) == handler_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--window", type=int, default=1000)
+    args = parser.parse_args()
+
+    port = start_stub()
+    ui.API_URL = f"http://127.0.0.1:{port}/chat"
+    ui.STREAM_URL = f"http://127.0.0.1:{port}/chat/stream"
+    asyncio.run(run(args.turns, args.window))
@@ -0,0 +1,143 @@
+"""
+Integration tests for session routing across several app instances on localhost.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_node(url: str, nodes: list, mode: str = "forward") -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        NODE_URL=url,
+        CLUSTER_NODES=",".join(nodes),
+        ROUTING_MODE=mode,
+        SESSION_STORE="memory",
+    )
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            url.rsplit(":", 1)[1],
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+
+
+def wait_ready(url: str) -> None:
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/").status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start")
+
+
+@pytest.fixture
+def cluster():
+    urls = [f"http://127.0.0.1:{free_port()}" for _ in range(4)]
+    nodes = urls[:3]
+    processes = [
+        start_node(url, nodes, mode="redirect" if i == 2 else "forward")
+        for i, url in enumerate(nodes)
+    ]
+    # The fourth node starts later to join the cluster
+    processes.append(start_node(urls[3], urls))
+    try:
+        for url in urls:
+            wait_ready(url)
+        yield urls
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def owner_of(session_id: str, nodes: list) -> str:
+    from app.utils.cluster import HashRing
+
+    return HashRing(nodes).owner(session_id)
+
+
+def test_requests_reach_the_owner_and_sessions_move_on_join(cluster):
+    """Test forwarding, redirects, and handoff when a node joins and leaves."""
+    nodes = cluster[:3]
+    session_ids = []
+    for i in range(12):
+        session_id = httpx.post(f"{nodes[i % 3]}/interview/start").json()["session_id"]
+        assert owner_of(session_id, nodes) == nodes[i % 3]
+        session_ids.append(session_id)
+
+    # Answer through the other forwarding node, not the owner
+    for i, session_id in enumerate(session_ids):
+        via = nodes[1] if i % 3 == 0 else nodes[0]
+        question = httpx.get(f"{via}/interview/resume/{session_id}").json()["question"]
+        response = httpx.post(
+            f"{via}/interview/answer",
+            json={
+                "session_id": session_id,
+                "question_id": question["question_id"],
+                "answer_type": "choice",
+                "answer": question["options"][0],
+            },
+        )
+        assert response.status_code == 200
+
+    # The redirecting node sends clients to the owner instead
+    foreign = next(s for s in session_ids if owner_of(s, nodes) != nodes[2])
+    response = httpx.get(f"{nodes[2]}/interview/resume/{foreign}")
+    assert response.status_code == 307
+    assert response.headers["location"].startswith(owner_of(foreign, nodes))
+    assert (
+        httpx.get(
+            f"{nodes[2]}/interview/resume/{foreign}", follow_redirects=True
+        ).status_code
+        == 200
+    )
+
+    # A fourth node joins: each node hands off only the sessions it no longer owns
+    handed_off = 0
+    for url in nodes:
+        response = httpx.put(f"{url}/cluster/nodes", json={"nodes": cluster})
+        assert response.status_code == 200
+        handed_off += sum(response.json()["handed_off"].values())
+    moved = [s for s in session_ids if owner_of(s, cluster) != owner_of(s, nodes)]
+    assert handed_off == len(moved)
+    assert all(owner_of(s, cluster) == cluster[3] for s in moved)
+
+    for session_id in session_ids:
+        response = httpx.get(
+            f"{cluster[3]}/interview/resume/{session_id}", follow_redirects=True
+        )
+        assert response.status_code == 200
+        assert response.json()["progress"]["answered_questions"] == 1
+
+    # The fourth node leaves again and hands its sessions back
+    for url in nodes:
+        httpx.put(f"{url}/cluster/nodes", json={"nodes": nodes})
+    response = httpx.put(f"{cluster[3]}/cluster/nodes", json={"nodes": nodes})
+    assert sum(response.json()["handed_off"].values()) == len(moved)
+    for session_id in session_ids:
+        assert httpx.get(f"{nodes[0]}/interview/resume/{session_id}").status_code == 200
@@ -1,6 +1,8 @@
 """
 FastAPIエンドポイントのE2Eテスト
 """
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -82,6 +84,20 @@ def test_invalid_session():
     assert response.status_code == 404
 
 
+def test_start_rejects_too_long_user_id():
+    """
+    保存できない長さのユーザーIDで開始した場合に400を返すテスト
+    """
+    import asyncio
+    from fastapi import HTTPException
+    import app.main as main
+    
+    # HTTP クライアントは長すぎるクエリを送れないため、ルートの関数を直接呼ぶ
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.start_interview(user_id="a" * 70000))
+    assert e.value.status_code == 400
+
+
 def test_invalid_answer():
     """
     無効な回答のテスト
@@ -109,3 +125,755 @@ def test_question_list():
     assert response.status_code == 200
     assert "questions" in response.json()
     assert len(response.json()["questions"]) > 0
+
+
+def test_interview_stats():
+    """
+    回答分布の集計エンドポイントのテスト
+    """
+    before = client.get("/interview/stats").json()
+    before_q1 = before["questions"].get("q1", {"answers": {}, "skipped": 0})
+    
+    start_response = client.post("/interview/start")
+    session_id = start_response.json()["session_id"]
+    option = start_response.json()["question"]["options"][0]
+    
+    client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": option
+    })
+    
+    # スキップは回答として記録されず、スキップ数として集計される
+    skip_response = client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q2",
+        "answer_type": "choice",
+        "answer": "スキップ"
+    })
+    assert skip_response.status_code == 200
+    assert skip_response.json()["next_question"]["question_id"] == "q3"
+    
+    after = client.get("/interview/stats").json()
+    assert after["started"] == before["started"] + 1
+    assert after["questions"]["q1"]["answers"][option] == before_q1["answers"].get(option, 0) + 1
+    assert after["questions"]["q2"]["skipped"] >= 1
+    
+    windowed = client.get("/interview/stats", params={"window": 3600})
+    assert windowed.status_code == 200
+    assert windowed.json()["window_seconds"] == 3600
+    
+    assert client.get("/interview/stats", params={"window": 10 ** 9}).status_code == 400
+
+
+def test_cohort_query():
+    """
+    コホート検索エンドポイントのテスト
+    """
+    start_response = client.post("/interview/start")
+    session_id = start_response.json()["session_id"]
+    
+    client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": "学生"
+    })
+    
+    response = client.post("/interview/cohorts", json={
+        "query": {
+            "and": [
+                {"question_id": "q1", "option": "学生"},
+                {"not": {"completed": True}}
+            ]
+        },
+        "limit": 10000
+    })
+    assert response.status_code == 200
+    assert session_id in response.json()["session_ids"]
+    
+    invalid = client.post("/interview/cohorts", json={"query": {"foo": "bar"}})
+    assert invalid.status_code == 400
+    
+    # 0件のページはカーソルが進まないため受け付けない
+    invalid = client.post("/interview/cohorts", json={"query": {"completed": True}, "limit": 0})
+    assert invalid.status_code == 422
+    
+    # 入れ子が深すぎる検索式は500ではなく400を返す
+    query = {"completed": True}
+    for _ in range(100):
+        query = {"not": query}
+    invalid = client.post("/interview/cohorts", json={"query": query})
+    assert invalid.status_code == 400
+
+
+def test_export_results():
+    """
+    完了済みセッションのエクスポートのテスト
+    """
+    start_response = client.post("/interview/start")
+    session_id = start_response.json()["session_id"]
+    for question_id in ["q1", "q2", "q3"]:
+        question = next(
+            q for q in client.get("/interview/questions").json()["questions"]
+            if q["question_id"] == question_id
+        )
+        client.post("/interview/answer", json={
+            "session_id": session_id,
+            "question_id": question_id,
+            "answer_type": "choice",
+            "answer": question["options"][0]
+        })
+    
+    csv_response = client.get("/interview/export", params={"format": "csv", "chunk_size": 2})
+    assert csv_response.status_code == 200
+    assert csv_response.text.startswith("session_id,user_id,q1,q2,q3")
+    assert session_id in csv_response.text
+    
+    ndjson_response = client.get("/interview/export", params={"format": "ndjson"})
+    assert ndjson_response.status_code == 200
+    assert session_id in ndjson_response.text
+    
+    assert client.get("/interview/export", params={"format": "xml"}).status_code == 400
+
+
+def test_question_catalog_etag():
+    """
+    質問カタログの条件付きリクエストのテスト
+    """
+    response = client.get("/interview/questions")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.json()["version"] in etag
+    
+    cached = client.get("/interview/questions", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_resume_interview():
+    """
+    面接再開のテスト
+    """
+    start_response = client.post("/interview/start", params={"user_id": "resume-user"})
+    session_id = start_response.json()["session_id"]
+    option = start_response.json()["question"]["options"][1]
+    
+    client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": option
+    })
+    
+    response = client.get(f"/interview/resume/{session_id}")
+    assert response.status_code == 200
+    assert response.json()["question"]["question_id"] == "q2"
+    assert response.json()["progress"]["answered_questions"] == 1
+    
+    assert client.get("/interview/resume/unknown-session").status_code == 404
+
+
+def test_shared_session_store(monkeypatch, tmp_path):
+    """
+    ワーカー間で共有するセッション表を使った面接のテスト
+    """
+    import app.main as main
+    from app.utils.session_store import SharedSessionStore
+    
+    path = str(tmp_path / "sessions.tbl")
+    monkeypatch.setattr(main, "session_states", SharedSessionStore(path, main.CATALOG_INDEX, capacity=64))
+    
+    session_id = client.post("/interview/start").json()["session_id"]
+    option = main.INTERVIEW_QUESTIONS["q1"].options[0]
+    response = client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": option
+    })
+    assert response.status_code == 200
+    
+    # 別のワーカーが同じファイルを開いた場合も、同じセッションを再開できる
+    monkeypatch.setattr(main, "session_states", SharedSessionStore(path, main.CATALOG_INDEX, capacity=64))
+    response = client.get(f"/interview/resume/{session_id}")
+    assert response.status_code == 200
+    assert response.json()["question"]["question_id"] == "q2"
+    
+    # 集計とコホートのインデックスはワーカーごとのため、共有する場合は使えない
+    assert client.get("/interview/stats").status_code == 501
+    assert client.post("/interview/cohorts", json={"query": {"completed": True}}).status_code == 501
+    assert client.get("/interview/export").status_code == 501
+    response = client.get("/interview/sessions/stalled", params={"idle_minutes": 0})
+    assert response.status_code == 200
+    assert [session["session_id"] for session in response.json()["sessions"]] == [session_id]
+
+
+def test_event_log_recovery(monkeypatch, tmp_path):
+    """
+    イベントログからのセッション復元のテスト
+    """
+    import app.main as main
+    from app.utils.event_log import EventLog
+    from app.utils.session_store import LocalSessionStore
+    
+    monkeypatch.setattr(main, "event_log", EventLog(str(tmp_path)))
+    monkeypatch.setattr(main, "session_states", LocalSessionStore())
+    
+    session_id = client.post("/interview/start", params={"user_id": "log-user"}).json()["session_id"]
+    client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": main.INTERVIEW_QUESTIONS["q1"].options[0]
+    })
+    main.event_log.close()
+    
+    # 再起動を想定し、空のセッションからログを再生する
+    monkeypatch.setattr(main, "event_log", EventLog(str(tmp_path)))
+    monkeypatch.setattr(main, "session_states", LocalSessionStore())
+    result = main.recover_sessions()
+    assert result["replayed_events"] == 2
+    
+    response = client.get(f"/interview/resume/{session_id}")
+    assert response.status_code == 200
+    assert response.json()["question"]["question_id"] == "q2"
+    main.event_log.close()
+
+
+def test_resume_by_user_and_stalled_sessions(monkeypatch):
+    """
+    ユーザーIDでの再開と、操作のないセッションの検索のテスト
+    """
+    import app.main as main
+    from app.utils.session_store import LocalSessionStore
+    
+    now = [1000.0]
+    monkeypatch.setattr(main, "session_states", LocalSessionStore(clock=lambda: now[0]))
+    
+    first = client.post("/interview/start", params={"user_id": "index-user"}).json()["session_id"]
+    now[0] += 60
+    second = client.post("/interview/start", params={"user_id": "index-user"}).json()["session_id"]
+    now[0] += 60
+    other = client.post("/interview/start", params={"user_id": "other-user"}).json()["session_id"]
+    
+    response = client.get("/interview/resume/by-user/index-user")
+    assert response.status_code == 200
+    assert response.json()["session_id"] == second
+    assert client.get("/interview/resume/by-user/nobody").status_code == 404
+    
+    # 最初のセッションに回答すると、そのセッションが最新になる
+    client.post("/interview/answer", json={
+        "session_id": first,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": main.INTERVIEW_QUESTIONS["q1"].options[0]
+    })
+    assert client.get("/interview/resume/by-user/index-user").json()["session_id"] == first
+    
+    # 再開や回答も操作に含まれるため、古い順は other, second, first になる
+    now[0] += 30 * 60 + 1
+    response = client.get("/interview/sessions/stalled", params={"idle_minutes": 30, "limit": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert [s["session_id"] for s in body["sessions"]] == [other, second]
+    
+    response = client.get("/interview/sessions/stalled", params={
+        "idle_minutes": 30, "limit": 2, "cursor": body["next_cursor"]
+    })
+    assert [s["session_id"] for s in response.json()["sessions"]] == [first]
+    assert response.json()["next_cursor"] is None
+    
+    assert client.get("/interview/sessions/stalled", params={"cursor": "broken"}).status_code == 400
+
+
+def test_tiered_session_store(monkeypatch, tmp_path):
+    """
+    メモリ上限を超えたセッションをディスクへ移し、再開時に読み戻すテスト
+    """
+    import app.main as main
+    from app.utils.tiered_store import TieredSessionStore
+    
+    store = TieredSessionStore(str(tmp_path / "cold.db"), memory_budget_bytes=1)
+    monkeypatch.setattr(main, "session_states", store)
+    
+    first = client.post("/interview/start").json()["session_id"]
+    client.post("/interview/start")
+    assert store.metrics()["cold_sessions"] == 1
+    
+    response = client.get(f"/interview/resume/{first}")
+    assert response.status_code == 200
+    assert response.json()["question"]["question_id"] == "q1"
+    
+    metrics = client.get("/metrics").json()["sessions"]
+    assert metrics["hot_sessions"] == 1
+    assert metrics["cold_sessions"] == 1
+    assert metrics["cold_loads_total"] == 1
+    store.close()
+
+
+def test_chat_endpoint(monkeypatch):
+    """
+    会話グラフによる /chat のテスト
+    """
+    import uuid
+    import app.main as main
+    
+    session_id = str(uuid.uuid4())
+    q1, q2 = main.INTERVIEW_QUESTIONS["q1"], main.INTERVIEW_QUESTIONS["q2"]
+    
+    # 選択肢にない回答は記録せず、同じ質問を聞き直す
+    response = client.post("/chat", json={"session_id": session_id, "message": "わからない"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["question_id"] == "q1"
+    assert data["options"] == q1.options
+    assert data["progress"] == {"current": 0, "total": 3}
+    
+    response = client.post("/chat", json={"session_id": session_id, "message": q1.options[0]})
+    data = response.json()
+    assert data["question_id"] == "q2"
+    assert data["options"] == q2.options
+    assert data["message"].startswith(q1.reactions[q1.options[0]])
+    assert data["completed"] is False
+    
+    # 回答は面接APIのセッションにも記録される
+    resume = client.get(f"/interview/resume/{session_id}").json()
+    assert resume["question"]["question_id"] == "q2"
+    
+    # 処理待ちが上限に達している場合は503を返す
+    monkeypatch.setattr(main, "chat_pending", main.CHAT_MAX_PENDING)
+    response = client.post("/chat", json={"session_id": session_id, "message": q2.options[0]})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_chat_control_phrases():
+    """
+    /chat の制御フレーズ（あとで・スキップ・やめる）のテスト
+    """
+    import uuid
+    import app.main as main
+    
+    session_id = str(uuid.uuid4())
+    
+    # あとでの場合は同じ質問に留まる
+    data = client.post("/chat", json={"session_id": session_id, "message": "あとで"}).json()
+    assert data["intent"] == "defer"
+    assert data["question_id"] == "q1"
+    
+    # スキップの言い換えも、面接APIのセッションにスキップとして記録される
+    skipped_before = main.answer_stats.snapshot()["questions"].get("q1", {}).get("skipped", 0)
+    data = client.post("/chat", json={"session_id": session_id, "message": "ｽｷｯﾌﾟします"}).json()
+    assert data["intent"] == "skip"
+    assert data["question_id"] == "q2"
+    assert main.answer_stats.snapshot()["questions"]["q1"]["skipped"] == skipped_before + 1
+    resume = client.get(f"/interview/resume/{session_id}").json()
+    assert resume["question"]["question_id"] == "q2"
+    
+    data = client.post("/chat", json={"session_id": session_id, "message": "やめます"}).json()
+    assert data["intent"] == "quit"
+    assert data["completed"] is False
+    
+    # 通常の回答では intent は返らない
+    data = client.post("/chat", json={"session_id": session_id, "message": main.INTERVIEW_QUESTIONS["q2"].options[0]}).json()
+    assert data["intent"] is None
+    assert data["question_id"] == "q3"
+
+
+def test_control_phrase_does_not_wait_for_graph_workers(monkeypatch):
+    """
+    グラフのスレッドプールがふさがっていても、制御フレーズはイベントループの外ですぐに処理するテスト
+    """
+    import threading
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+    import app.main as main
+    
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(main, "chat_executor", executor)
+    release = threading.Event()
+    busy = executor.submit(release.wait, 10)
+    try:
+        data = client.post("/chat", json={"session_id": str(uuid.uuid4()), "message": "スキップ"}).json()
+        assert data["intent"] == "skip"
+        assert data["question_id"] == "q2"
+        assert not busy.done()
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_free_text_answer_is_matched_to_option():
+    """
+    選択肢と完全に一致しない自由記述の回答を選択肢に対応付けるテスト
+    """
+    session_id = client.post("/interview/start").json()["session_id"]
+    response = client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q1",
+        "answer_type": "choice",
+        "answer": "会社員です"
+    })
+    assert response.status_code == 200
+    assert response.json()["next_question"]["question_id"] == "q2"
+    
+    response = client.post("/interview/answer", json={
+        "session_id": session_id,
+        "question_id": "q2",
+        "answer_type": "choice",
+        "answer": "よくわからない"
+    })
+    assert response.status_code == 400
+
+
+
+def test_concurrent_conflicting_requests_are_serialized_per_session(monkeypatch):
+    """
+    同じセッションへの大量の同時リクエスト（ダブルクリック・再送）のストレステスト
+    """
+    import asyncio
+    import uuid
+    import httpx
+    import app.main as main
+    
+    # 同時に送ったリクエストをすべて処理させる（アドミッション制御は test_admission_control で確認する）
+    monkeypatch.setattr(main, "CHAT_MAX_PENDING", 10000)
+    monkeypatch.setattr(main, "admission", None)
+    q1, q2, q3 = (main.INTERVIEW_QUESTIONS[q] for q in ("q1", "q2", "q3"))
+    
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            # 面接API: 50セッションに、q1 と q2 への回答を20件ずつ同時に送る（計2000件）
+            sessions = [(await http.post("/interview/start")).json()["session_id"] for _ in range(50)]
+            before = main.answer_stats.snapshot()["questions"].get("q1", {}).get("total", 0)
+            requests = []
+            for session_id in sessions:
+                for i in range(20):
+                    for question in (q1, q2):
+                        requests.append((session_id, question.question_id, http.post("/interview/answer", json={
+                            "session_id": session_id,
+                            "question_id": question.question_id,
+                            "answer_type": "choice",
+                            "answer": question.options[i % len(question.options)]
+                        })))
+            responses = await asyncio.gather(*(request for _, _, request in requests))
+            
+            for session_id in sessions:
+                codes = {"q1": [], "q2": []}
+                for (sid, question_id, _), response in zip(requests, responses):
+                    if sid == session_id:
+                        codes[question_id].append(response.status_code)
+                # 各質問への回答は1件だけ記録され、残りは409になる
+                assert codes["q1"].count(200) == 1
+                assert codes["q2"].count(200) <= 1
+                assert set(codes["q1"] + codes["q2"]) <= {200, 409}
+                resume = (await http.get(f"/interview/resume/{session_id}")).json()
+                assert resume["question"]["question_id"] == ("q3" if 200 in codes["q2"] else "q2")
+            assert main.answer_stats.snapshot()["questions"]["q1"]["total"] == before + len(sessions)
+            
+            # /chat: 200セッションに「回答・スキップ・回答」を同時に送り、到着順に処理されることを確認する
+            chat_sessions = [str(uuid.uuid4()) for _ in range(200)]
+            messages = [q1.options[0], "スキップ", q3.options[0]]
+            await asyncio.gather(*(
+                http.post("/chat", json={"session_id": session_id, "message": message})
+                for session_id in chat_sessions for message in messages
+            ))
+            for session_id in chat_sessions:
+                state = main.conversation_graph.get_state(session_id)
+                assert state.completed
+                assert state.answers == {"q1": q1.options[0], "q3": q3.options[0]}
+                record = main.session_states.get(session_id)
+                assert record.completed
+    
+    asyncio.run(run())
+
+
+def test_admission_control(monkeypatch):
+    """
+    同時実行数の上限に達したルートのリクエストを503で拒否するアドミッション制御のテスト
+    """
+    import asyncio
+    import app.main as main
+    from app.utils.admission import AdmissionController, RoutePolicy
+    
+    controller = AdmissionController(1, {
+        "/interview/answer": RoutePolicy(1, 0, 0.05),
+        "/interview/start": RoutePolicy(1, 1, 0.0),
+    })
+    monkeypatch.setattr(main, "admission", controller)
+    
+    response = client.post("/interview/start")
+    assert response.status_code == 200
+    session_id = response.json()["session_id"]
+    
+    # 処理中のリクエストで枠が埋まっている間は、待ち時間の上限を超えたリクエストを拒否する
+    assert asyncio.run(controller.acquire("/interview/answer"))
+    response = client.post("/interview/start")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    response = client.post("/interview/answer", json={
+        "session_id": session_id, "question_id": "q1", "answer_type": "choice", "answer": "学生"
+    })
+    assert response.status_code == 503
+    controller.release("/interview/answer")
+    
+    response = client.post("/interview/answer", json={
+        "session_id": session_id, "question_id": "q1", "answer_type": "choice", "answer": "学生"
+    })
+    assert response.status_code == 200
+    
+    metrics = client.get("/metrics").json()["admission"]
+    assert metrics["/interview/start"]["rejected_total"] == 1
+    assert metrics["/interview/answer"]["queued_total"] == 1
+    assert metrics["/interview/answer"]["rejected_total"] == 1
+    assert metrics["/interview/answer"]["in_flight"] == 0
+
+
+def test_completion_analysis_job(monkeypatch, tmp_path):
+    """
+    完了時の分析をジョブとして実行し、ポーリングとストリームで結果を取得するテスト
+    """
+    import app.main as main
+    from app.utils.job_queue import JobQueue
+    
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), {main.ANALYSIS_JOB: main.run_completion_analysis})
+    monkeypatch.setattr(main, "job_queue", queue)
+    
+    with TestClient(app) as c:
+        session_id = c.post("/interview/start").json()["session_id"]
+        response = c.get(f"/interview/analysis/{session_id}")
+        assert response.status_code == 404
+        
+        answer_data = {"next_question": {"question_id": "q1", "question_type": "choice", "options": ["学生"]}}
+        while answer_data.get("next_question"):
+            question = answer_data["next_question"]
+            answer_data = c.post("/interview/answer", json={
+                "session_id": session_id,
+                "question_id": question["question_id"],
+                "answer_type": question["question_type"],
+                "answer": question["options"][0] if question["options"] else "テスト"
+            }).json()
+        assert answer_data["status"] == "completed"
+        assert answer_data["analysis_url"] == f"/interview/analysis/{session_id}"
+        
+        # ストリームは完了の状態を送って終了する
+        with c.stream("GET", f"{answer_data['analysis_url']}/stream") as stream:
+            assert stream.headers["content-type"].startswith("text/event-stream")
+            events = [line for line in stream.iter_lines() if line.startswith("data: ")]
+        assert json.loads(events[-1][len("data: "):])["status"] == "succeeded"
+        
+        job = c.get(answer_data["analysis_url"]).json()
+        assert job["status"] == "succeeded"
+        assert job["result"]["answered"] == len(main.INTERVIEW_QUESTIONS)
+        assert job["result"]["skipped"] == []
+        assert c.get("/metrics").json()["jobs"]["succeeded_total"] == 1
+
+
+def test_completed_interview_is_written_to_outbox(monkeypatch, tmp_path):
+    """
+    完了したインタビューを応答の前にアウトボックスへ書き込むテスト（配信は lifespan の配信タスクが行う）
+    """
+    import app.main as main
+    from app.utils.outbox import Outbox
+    
+    monkeypatch.setattr(main, "outbox", None)
+    assert client.get("/outbox/dead-letters").status_code == 404
+    
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), "http://127.0.0.1:9/events")
+    monkeypatch.setattr(main, "outbox", outbox)
+    
+    session_id = client.post("/interview/start").json()["session_id"]
+    for question_id, question in main.INTERVIEW_QUESTIONS.items():
+        response = client.post("/interview/answer", json={
+            "session_id": session_id,
+            "question_id": question_id,
+            "answer_type": question.question_type,
+            "answer": question.options[0] if question.options else "テスト"
+        })
+        assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    
+    metrics = client.get("/metrics").json()["outbox"]
+    assert metrics["backlog"] == 1
+    assert metrics["delivered_total"] == 0
+    assert client.get("/outbox/dead-letters").json() == {"events": [], "count": 0}
+    
+    # 完了をイベントログに記録できなかった場合は、アウトボックスにも書き込まない
+    class FailingEventLog:
+        def log_start(self, session_id, record):
+            pass
+        
+        def log_step(self, session_id, record, answered_index):
+            if record.completed:
+                raise OSError("disk full")
+    
+    monkeypatch.setattr(main, "event_log", FailingEventLog())
+    session_id = client.post("/interview/start").json()["session_id"]
+    for question_id, question in main.INTERVIEW_QUESTIONS.items():
+        response = client.post("/interview/answer", json={
+            "session_id": session_id,
+            "question_id": question_id,
+            "answer_type": question.question_type,
+            "answer": question.options[0] if question.options else "テスト"
+        })
+    assert response.status_code == 500
+    assert client.get("/metrics").json()["outbox"]["backlog"] == 1
+
+
+def test_completion_is_republished_on_recovery(monkeypatch, tmp_path):
+    """
+    状態の保存の後、アウトボックスへの書き込みの前に落ちた完了を、イベントログからの復元時に登録し直すテスト
+    """
+    import app.main as main
+    from app.utils.event_log import EventLog
+    from app.utils.job_queue import JobQueue
+    from app.utils.outbox import Outbox
+    from app.utils.session_store import LocalSessionStore
+    
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), {main.ANALYSIS_JOB: main.run_completion_analysis})
+    monkeypatch.setattr(main, "job_queue", queue)
+    monkeypatch.setattr(main, "event_log", EventLog(str(tmp_path / "log")))
+    monkeypatch.setattr(main, "session_states", LocalSessionStore())
+    monkeypatch.setattr(main, "outbox", None)
+    
+    session_id = client.post("/interview/start").json()["session_id"]
+    for question_id, question in main.INTERVIEW_QUESTIONS.items():
+        response = client.post("/interview/answer", json={
+            "session_id": session_id,
+            "question_id": question_id,
+            "answer_type": question.question_type,
+            "answer": question.options[0] if question.options else "テスト"
+        })
+    assert response.json()["status"] == "completed"
+    main.event_log.close()
+    
+    # 再起動を想定し、アウトボックスに書き込まれていない完了をログから登録し直す
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), "http://127.0.0.1:9/events")
+    monkeypatch.setattr(main, "outbox", outbox)
+    for _ in range(2):
+        monkeypatch.setattr(main, "event_log", EventLog(str(tmp_path / "log")))
+        monkeypatch.setattr(main, "session_states", LocalSessionStore())
+        main.recover_sessions()
+        main.event_log.close()
+        assert outbox.metrics()["backlog"] == 1
+    assert queue.find(main.ANALYSIS_JOB, session_id) is not None
+
+
+def test_chat_stream(monkeypatch):
+    """
+    /chat/stream が次の質問を本文より先に送り、本文を段落ごとに送るテスト
+    """
+    import uuid
+    import app.main as main
+    
+    session_id = str(uuid.uuid4())
+    q1, q2 = main.INTERVIEW_QUESTIONS["q1"], main.INTERVIEW_QUESTIONS["q2"]
+    
+    response = client.post("/chat/stream", json={"session_id": session_id, "message": q1.options[0]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["type"] for event in events] == ["turn"] + ["delta"] * (len(events) - 2) + ["done"]
+    assert events[0]["question_id"] == "q2"
+    assert events[0]["options"] == q2.options
+    assert "message" not in events[0]
+    
+    # delta をつなげると /chat の message と同じになる
+    message = "".join(event["text"] for event in events if event["type"] == "delta")
+    assert message.startswith(q1.reactions[q1.options[0]])
+    assert len(events) > 3
+    resume = client.get(f"/interview/resume/{session_id}").json()
+    assert resume["question"]["question_id"] == "q2"
+    
+    # 混雑している場合はストリームを始める前に503を返す
+    monkeypatch.setattr(main, "chat_pending", main.CHAT_MAX_PENDING)
+    response = client.post("/chat/stream", json={"session_id": session_id, "message": q2.options[0]})
+    assert response.status_code == 503
+
+
+def test_forwarded_response_keeps_headers_and_streams(monkeypatch):
+    """
+    担当ノードへ転送したレスポンスのヘッダー（Retry-After・ETag など）とボディを引き継ぐテスト
+    """
+    import uuid
+    import httpx
+    import app.main as main
+    from app.utils.cluster import ClusterRouter
+    
+    router = ClusterRouter("http://node-a", ["http://node-a", "http://node-b"])
+    session_id = next(
+        sid for sid in (str(uuid.uuid4()) for _ in range(100)) if router.owner(sid) == "http://node-b"
+    )
+    
+    def owner(request: httpx.Request) -> httpx.Response:
+        assert request.headers["x-routed-by"] == "http://node-a"
+        return httpx.Response(
+            503,
+            headers=[("Retry-After", "1"), ("ETag", '"v1"'), ("Set-Cookie", "a=1"), ("Set-Cookie", "b=2"),
+                     ("Content-Type", "application/x-ndjson")],
+            content=b'{"type": "turn"}\n{"type": "done"}\n',
+        )
+    
+    router._client = httpx.AsyncClient(transport=httpx.MockTransport(owner))
+    monkeypatch.setattr(main, "cluster_router", router)
+    
+    response = client.post("/chat/stream", json={"session_id": session_id, "message": "はい"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.headers["etag"] == '"v1"'
+    assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["type"] for line in response.text.splitlines()] == ["turn", "done"]
+
+
+def test_chat_does_not_overwrite_diverged_session(tmp_path, monkeypatch):
+    """
+    会話グラフと面接APIのセッションの質問が食い違う場合や、記録できない場合の /chat のテスト
+    """
+    import uuid
+    import app.main as main
+    from app.models.session_record import SessionRecord
+    from app.utils.session_store import SharedSessionStore
+    
+    # /interview/answer で q1 に回答したセッションに、/chat（会話グラフは q1 から）で回答する
+    session_id = client.post("/interview/start").json()["session_id"]
+    client.post("/interview/answer", json={
+        "session_id": session_id, "question_id": "q1", "answer_type": "choice", "answer": "学生"
+    })
+    completions = main.answer_stats.snapshot()["completed"]
+    response = client.post("/chat", json={"session_id": session_id, "message": "会社員"})
+    assert response.status_code == 409
+    record = main.session_states.get(session_id)
+    assert record.answer(main.CATALOG_INDEX, 0) == "学生"
+    assert record.current == main.CATALOG_INDEX.question_index("q2")
+    assert main.answer_stats.snapshot()["completed"] == completions
+    # 会話グラフも進めない
+    assert main.conversation_graph.get_state(session_id) is None
+    
+    # 共有セッション表が満杯の場合は503、セッションIDが長すぎる場合は400（どちらもグラフを実行しない）
+    store = SharedSessionStore(str(tmp_path / "sessions.tbl"), main.CATALOG_INDEX, capacity=1)
+    store.create("other", SessionRecord(len(main.CATALOG_INDEX)))
+    monkeypatch.setattr(main, "session_states", store)
+    full_session_id = str(uuid.uuid4())
+    response = client.post("/chat", json={"session_id": full_session_id, "message": "会社員"})
+    assert response.status_code == 503
+    assert main.conversation_graph.get_state(full_session_id) is None
+    response = client.post("/chat", json={"session_id": "x" * 100, "message": "会社員"})
+    assert response.status_code == 400
+    assert main.conversation_graph.get_state("x" * 100) is None
+    
+    # 回答を記録できなかった場合は、会話グラフをターンの前の状態に戻す
+    store.delete("other")
+    
+    def reject_answer(*args):
+        raise ValueError("自由記述の回答が長すぎます")
+    
+    monkeypatch.setattr(main, "apply_answer", reject_answer)
+    session_id = str(uuid.uuid4())
+    response = client.post("/chat", json={"session_id": session_id, "message": "会社員"})
+    assert response.status_code == 400
+    assert main.conversation_graph.get_state(session_id).current_question_id == "q1"
+    assert store.get(session_id).current == main.CATALOG_INDEX.question_index("q1")
@@ -0,0 +1,97 @@
+"""
+Unit tests for the admission controller.
+"""
+
+import asyncio
+
+from app.utils.admission import AdmissionController, RoutePolicy
+
+
+def make_controller(capacity: int = 1) -> AdmissionController:
+    return AdmissionController(
+        capacity,
+        {
+            "answer": RoutePolicy(limit=capacity, priority=0, queue_budget_seconds=1.0),
+            "start": RoutePolicy(limit=1, priority=1, queue_budget_seconds=1.0),
+        },
+    )
+
+
+def test_answers_are_dispatched_before_starts():
+    """Test that a freed slot goes to the higher-priority queue first."""
+
+    async def run():
+        controller = make_controller()
+        assert await controller.acquire("answer")
+        order = []
+
+        async def request(route):
+            assert await controller.acquire(route)
+            order.append(route)
+            controller.release(route)
+
+        tasks = [
+            asyncio.create_task(request("start")),
+            asyncio.create_task(request("answer")),
+        ]
+        await asyncio.sleep(0)
+        controller.release("answer")
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["answer", "start"]
+
+
+def test_per_route_limit_leaves_room_for_other_routes():
+    """Test that a route at its own cap does not block other routes."""
+
+    async def run():
+        controller = make_controller(capacity=3)
+        assert await controller.acquire("start")
+        assert await controller.acquire("answer")
+        assert await controller.acquire("answer")
+        return controller.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics["start"]["in_flight"] == 1
+    assert metrics["answer"]["in_flight"] == 2
+
+
+def test_requests_are_shed_after_the_queue_budget():
+    """Test that a request waiting longer than its budget is rejected."""
+
+    async def run():
+        controller = AdmissionController(1, {"answer": RoutePolicy(1, 0, 0.01)})
+        assert await controller.acquire("answer")
+        assert not await controller.acquire("answer")
+        return controller.metrics()["answer"]
+
+    metrics = asyncio.run(run())
+    assert metrics["queued_total"] == 1
+    assert metrics["rejected_total"] == 1
+    assert metrics["waiting"] == 0
+    assert metrics["max_queue_seconds"] >= 0.01
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    """Test that cancelling a queued or just-admitted waiter leaves no slot taken."""
+
+    async def cancel_waiter(admit_first: bool):
+        controller = make_controller()
+        assert await controller.acquire("answer")
+        waiting = asyncio.create_task(controller.acquire("answer"))
+        await asyncio.sleep(0)
+        if admit_first:
+            controller.release("answer")
+        waiting.cancel()
+        try:
+            if await waiting:
+                controller.release("answer")
+        except asyncio.CancelledError:
+            pass
+        if not admit_first:
+            controller.release("answer")
+        return controller.in_flight, controller.metrics()["answer"]["waiting"]
+
+    assert asyncio.run(cancel_waiter(admit_first=True)) == (0, 0)
+    assert asyncio.run(cancel_waiter(admit_first=False)) == (0, 0)
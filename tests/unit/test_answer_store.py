@@ -0,0 +1,59 @@
+"""
+Unit tests for the batched answer persistence of the fixed question sample.
+"""
+
+from app.sample.langgraph_fixed_questions import AnswerStore, get_user_answers
+
+
+def test_buffered_inserts_are_flushed(tmp_path):
+    """Test that inserts are buffered until the batch size is reached."""
+    db_path = str(tmp_path / "answers.db")
+    store = AnswerStore(db_path, batch_size=3)
+
+    store.add("u1", 1, "質問1", "春")
+    store.add("u1", 2, "質問2", "水")
+    assert store.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 0
+
+    store.add("u1", 3, "質問3", "家でゆっくり")
+    assert store.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 3
+
+    store.add("u1", 1, "質問1", "夏")
+    store.close()
+
+    history = list(get_user_answers(db_path, "u1"))
+    assert [record["answer"] for record in history] == [
+        "春",
+        "水",
+        "家でゆっくり",
+        "夏",
+    ]
+
+
+def test_paginated_history(tmp_path):
+    """Test keyset pagination over a user's history."""
+    store = AnswerStore(str(tmp_path / "answers.db"))
+    for i in range(5):
+        store.add("u1", i, f"質問{i}", f"回答{i}")
+        store.add("u2", i, f"質問{i}", "other")
+
+    first, after = store.get_user_answers_page("u1", page_size=2)
+    second, after = store.get_user_answers_page("u1", page_size=2, after=after)
+    third, after = store.get_user_answers_page("u1", page_size=2, after=after)
+
+    assert [r["answer"] for r in first + second + third] == [
+        f"回答{i}" for i in range(5)
+    ]
+    assert after is None
+    assert len(list(store.iter_user_answers("u2", page_size=2))) == 5
+
+
+def test_wal_mode_and_index(tmp_path):
+    """Test that the connection uses WAL and lookups use the index."""
+    store = AnswerStore(str(tmp_path / "answers.db"))
+    assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    plan = store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM answers WHERE user_id = ? ORDER BY timestamp, id",
+        ("u1",),
+    ).fetchall()
+    assert "idx_answers_user_timestamp" in plan[0][3]
@@ -0,0 +1,121 @@
+"""
+Unit tests for the bitmap index and cohort queries.
+"""
+
+import pytest
+
+from app.utils.bitmap_index import Bitmap, CohortIndex
+
+
+def test_bitmap_set_operations():
+    """Test set operations across chunk boundaries."""
+    a = Bitmap([1, 5, 70000, 200000])
+    b = Bitmap([5, 70000, 300000])
+
+    assert sorted(a & b) == [5, 70000]
+    assert sorted(a | b) == [1, 5, 70000, 200000, 300000]
+    assert sorted(a - b) == [1, 200000]
+    assert len(a) == 4
+    assert 70000 in a and 70001 not in a
+    assert list(a.iter_from(6)) == [70000, 200000]
+
+    a.discard(70000)
+    assert 70000 not in a
+    assert len(a) == 3
+
+
+def build_index() -> CohortIndex:
+    index = CohortIndex()
+    index.record_answer("s1", "q1", ["会社員"])
+    index.record_answer("s1", "q2", ["技術スキル向上"])
+    index.record_answer("s2", "q1", ["会社員"])
+    index.record_answer("s2", "q2", ["技術スキル向上"])
+    index.mark_completed("s2")
+    index.record_answer("s3", "q1", ["学生"])
+    index.record_answer("s3", "q2", ["技術スキル向上", "マネジメント能力"])
+    return index
+
+
+def test_boolean_query():
+    """Test a cohort query combining options and completion."""
+    index = build_index()
+    query = {
+        "and": [
+            {"question_id": "q1", "option": "会社員"},
+            {"question_id": "q2", "option": "技術スキル向上"},
+            {"not": {"completed": True}},
+        ]
+    }
+
+    assert index.count(query) == 1
+    assert index.page(query) == (1, ["s1"], None)
+    assert index.count({"question_id": "q2", "option": "マネジメント能力"}) == 1
+    assert (
+        index.count(
+            {"or": [{"question_id": "q1", "option": "学生"}, {"completed": True}]}
+        )
+        == 2
+    )
+
+
+def test_reanswer_replaces_previous_options():
+    """Test that re-answering a question moves the session between bitmaps."""
+    index = build_index()
+    index.record_answer("s1", "q1", ["自営業"])
+
+    assert index.page({"question_id": "q1", "option": "会社員"})[1] == ["s2"]
+    assert index.page({"question_id": "q1", "option": "自営業"})[1] == ["s1"]
+
+
+def test_paging_and_removal():
+    """Test cursor paging and removing a session."""
+    index = CohortIndex()
+    for i in range(5):
+        index.record_answer(f"s{i}", "q1", ["会社員"])
+    query = {"question_id": "q1", "option": "会社員"}
+
+    count, first, cursor = index.page(query, limit=2)
+    assert count == 5 and first == ["s0", "s1"]
+    _, second, cursor = index.page(query, limit=2, cursor=cursor)
+    assert second == ["s2", "s3"]
+    _, last, cursor = index.page(query, limit=2, cursor=cursor)
+    assert last == ["s4"] and cursor is None
+
+    index.remove_session("s2")
+    assert index.count(query) == 4
+    assert index.count({"not": query}) == 0
+
+
+def test_invalid_query():
+    """Test that malformed queries raise ValueError."""
+    index = build_index()
+    with pytest.raises(ValueError):
+        index.count({"unknown": 1})
+    with pytest.raises(ValueError):
+        index.count({"and": []})
+
+
+def test_removed_ordinals_are_reused():
+    """Test that removing sessions frees their ordinals for new sessions."""
+    index = CohortIndex()
+    for i in range(3):
+        index.add_session(f"s{i}")
+    index.record_answer("s1", "q1", ["会社員"])
+    index.remove_session("s1")
+
+    assert index.add_session("s3") == 1
+    assert index.count({"question_id": "q1", "option": "会社員"}) == 0
+    assert index.page({"not": {"completed": True}})[1] == ["s0", "s3", "s2"]
+    assert len(index._session_ids) == 3
+
+
+def test_query_depth_and_limit_are_bounded():
+    """Test that deeply nested queries and empty pages are rejected."""
+    index = build_index()
+    query = {"completed": True}
+    for _ in range(5000):
+        query = {"not": query}
+    with pytest.raises(ValueError):
+        index.count(query)
+    with pytest.raises(ValueError):
+        index.page({"completed": True}, limit=0)
@@ -0,0 +1,113 @@
+"""
+Unit tests for non-interactive ingestion of the fixed question sample.
+"""
+
+import json
+
+from app.sample.bulk_ingest import ingest, read_records
+from app.sample.langgraph_fixed_questions import (
+    FixedQuestionFlow,
+    QuestionState,
+    get_user_answers,
+)
+
+
+def test_graph_runs_non_interactively(tmp_path):
+    """Test that the compiled graph consumes pending answers without input()."""
+    flow = FixedQuestionFlow(db_path=None)
+    state = flow.graph.invoke(
+        QuestionState(
+            user_id="u1", pending_answers=["春", "2", "家でゆっくり"], interactive=False
+        )
+    )
+
+    assert [a["answer"] for a in state.answers] == ["春", "紅茶", "家でゆっくり"]
+    assert state.is_complete is True
+
+
+def test_run_batch_validates_and_saves(tmp_path):
+    """Test that run_batch saves valid records and rejects invalid ones."""
+    db_path = str(tmp_path / "answers.db")
+    flow = FixedQuestionFlow(db_path=db_path)
+
+    result = flow.run_batch(
+        [
+            ("u1", ["夏", "水", "4"]),
+            ("u2", ["夏", "ビール", "友人と会う"]),
+            ("u3", ["秋"]),
+            ("u4", ["冬", "水", "4", "夏"]),
+        ]
+    )
+
+    assert result["users"] == 1
+    assert [r["user_id"] for r in result["rejected"]] == ["u2", "u3", "u4"]
+    assert [r["answer"] for r in get_user_answers(db_path, "u1")] == [
+        "夏",
+        "水",
+        "友人と会う",
+    ]
+    assert list(get_user_answers(db_path, "u2")) == []
+    assert list(get_user_answers(db_path, "u4")) == []
+
+
+def test_ingest_files(tmp_path):
+    """Test ingesting CSV and JSONL files, with and without a process pool."""
+    csv_path = tmp_path / "answers.csv"
+    csv_path.write_text("user_id,q1,q2,q3\nu1,春,紅茶,1\nu2,冬,x,1\n", encoding="utf-8")
+    jsonl_path = tmp_path / "answers.jsonl"
+    jsonl_path.write_text(
+        json.dumps({"user_id": "u3", "answers": ["1", "1", "1"]}, ensure_ascii=False)
+        + "\n",
+        encoding="utf-8",
+    )
+    db_path = str(tmp_path / "answers.db")
+
+    result = ingest(read_records(str(csv_path)), db_path, chunk_size=1)
+    assert result["rows"] == 3
+    assert result["rejected"][0]["user_id"] == "u2"
+
+    result = ingest(read_records(str(jsonl_path)), db_path, workers=2)
+    assert result["rows"] == 3
+    assert [r["answer"] for r in get_user_answers(db_path, "u3")] == [
+        "春",
+        "コーヒー",
+        "家でゆっくり",
+    ]
+
+
+def test_malformed_lines_are_skipped_with_line_numbers(tmp_path):
+    """Test that unreadable JSONL lines are reported by line number instead of aborting the ingest."""
+    jsonl_path = tmp_path / "answers.jsonl"
+    lines = [
+        json.dumps({"user_id": "u1", "answers": ["1", "1", "1"]}),
+        '{"user_id": "u2", "answers": [',
+        json.dumps({"answers": ["1", "1", "1"]}),
+        json.dumps({"user_id": "u4"}),
+        json.dumps({"user_id": "u5", "answers": ["2", "2", "2"]}),
+    ]
+    jsonl_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    csv_path = tmp_path / "answers.csv"
+    csv_path.write_text(
+        "user_id,q1,q2,q3\n,春,紅茶,1\nu6,春,紅茶,1\n", encoding="utf-8"
+    )
+    skipped = []
+
+    records = list(read_records(str(jsonl_path), skipped)) + list(
+        read_records(str(csv_path), skipped)
+    )
+
+    assert [user_id for user_id, _ in records] == ["u1", "u5", "u6"]
+    assert [item["line"] for item in skipped] == ["2", "3", "4", "2"]
+    assert "JSON" in skipped[0]["reason"]
+    result = ingest(iter(records), str(tmp_path / "answers.db"))
+    assert result["rows"] == 9
+
+
+def test_run_survey_without_store(monkeypatch, capsys):
+    """Test that an interactive survey works when answers are not saved."""
+    replies = iter(["1", "2", "1"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(replies))
+
+    state = FixedQuestionFlow(db_path=None).run_survey("u1")
+
+    assert [a["answer"] for a in state.answers] == ["春", "紅茶", "家でゆっくり"]
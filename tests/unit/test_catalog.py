@@ -0,0 +1,56 @@
+"""
+Unit tests for the client-side question catalog cache.
+"""
+
+import asyncio
+
+import httpx
+
+from app.frontend.catalog import QuestionCatalog
+
+PAYLOAD = {
+    "version": "abc",
+    "questions": [
+        {
+            "question_id": "q1",
+            "question_text": "Q1",
+            "options": ["A", "B"],
+            "reactions": {"A": "RA"},
+        },
+        {"question_id": "q2", "question_text": "Q2", "options": ["C"], "reactions": {}},
+    ],
+}
+
+
+def test_refresh_revalidates_with_etag():
+    """Test that the catalog is fetched once and then revalidated."""
+    seen_headers = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_headers.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"abc"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=PAYLOAD)
+
+    catalog = QuestionCatalog("http://api/interview/questions")
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert asyncio.run(catalog.refresh(client)) is True
+    assert asyncio.run(catalog.refresh(client)) is False
+    assert seen_headers == [None, '"abc"']
+    assert len(catalog) == 2
+
+
+def test_navigation_helpers():
+    """Test next question, progress, reactions and rendering."""
+    catalog = QuestionCatalog("http://api/interview/questions")
+    catalog.load(PAYLOAD)
+
+    assert catalog.first()["question_id"] == "q1"
+    assert catalog.next_of("q1")["question_id"] == "q2"
+    assert catalog.next_of("q2") is None
+    assert catalog.find_by_options(["C"])["question_id"] == "q2"
+    assert catalog.progress("q2") == {"current": 1, "total": 2}
+    assert catalog.progress(None) == {"current": 2, "total": 2}
+    assert catalog.reaction("q1", "A") == "RA"
+    assert catalog.render(catalog.first()) == "Q1\n\n- A\n- B"
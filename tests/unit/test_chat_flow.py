@@ -0,0 +1,101 @@
+"""
+Unit tests for the message-per-turn conversation graph behind /chat.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from app.graph.flow import QUESTIONS, ConversationGraph
+
+
+def test_valid_answer_advances_to_next_question():
+    """Test that an option is recorded and the next question is asked."""
+    graph = ConversationGraph()
+    result = graph.process_message("s1", "学生")
+
+    assert result["answered_question_id"] == "q1"
+    assert result["question_id"] == "q2"
+    assert result["options"] == QUESTIONS[1].options
+    assert result["progress"] == {"current": 1, "total": 3}
+    assert result["message"].startswith(QUESTIONS[0].reactions["学生"])
+    assert QUESTIONS[1].question in result["message"]
+    assert graph.get_state("s1").answers == {"q1": "学生"}
+
+
+def test_invalid_answer_repeats_question():
+    """Test that text outside the options is not recorded and the question is asked again."""
+    graph = ConversationGraph()
+    result = graph.process_message("s1", "よくわからない")
+
+    assert result["answered_question_id"] is None
+    assert result["question_id"] == "q1"
+    assert QUESTIONS[0].question in result["message"]
+    assert graph.get_state("s1").answers == {}
+
+
+def test_skip_and_completion():
+    """Test skipping a question and finishing the interview."""
+    graph = ConversationGraph()
+    graph.process_message("s1", "会社員")
+    assert graph.process_message("s1", "スキップ")["answered_question_id"] == "q2"
+    result = graph.process_message("s1", "メンタリング")
+
+    assert result["completed"] is True
+    assert result["question_id"] is None and result["options"] == []
+    assert result["progress"] == {"current": 3, "total": 3}
+    assert graph.get_state("s1").answers == {"q1": "会社員", "q3": "メンタリング"}
+
+    # Messages after completion do not restart the flow
+    again = graph.process_message("s1", "会社員")
+    assert again["completed"] is True and again["answered_question_id"] is None
+
+
+def test_transcript_refs_are_shared_after_checkpointing():
+    """Test that catalog references come back as the shared tuples."""
+    graph = ConversationGraph()
+    graph.process_message("s1", "学生")
+    graph.process_message("s2", "学生")
+
+    first, second = graph.get_state("s1").messages, graph.get_state("s2").messages
+    assert first[0] is second[0]
+
+
+def test_concurrent_messages_for_one_session_are_serialised():
+    """Test that parallel turns of the same session do not lose answers."""
+    graph = ConversationGraph()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(
+            pool.map(lambda _: graph.process_message("s1", "スキップ"), range(3))
+        )
+
+    # Every turn saw the state left by the previous one, so each skip moved one question on
+    assert sorted(r["progress"]["current"] for r in results) == [1, 2, 3]
+    assert graph.get_state("s1").completed is True
+
+
+def test_process_batch_matches_one_message_at_a_time():
+    """Test that a batch gives the same responses and final state as a loop, in input order."""
+    items = [
+        ("a", "会社員"),
+        ("b", "わからない"),
+        ("a", "スキップ"),
+        ("b", "学生"),
+        ("c", "その他"),
+        ("a", QUESTIONS[2].options[1]),
+        ("b", QUESTIONS[1].options[0]),
+    ]
+    looped = ConversationGraph()
+    expected = [
+        looped.process_message(session_id, message) for session_id, message in items
+    ]
+
+    for max_workers in (1, 4):
+        batched = ConversationGraph()
+        assert batched.process_batch(items, max_workers=max_workers) == expected
+        for session_id in "abc":
+            assert (
+                batched.get_state(session_id).answers
+                == looped.get_state(session_id).answers
+            )
+
+    # A later turn continues from the state the batch wrote
+    assert batched.process_message("b", QUESTIONS[2].options[0])["completed"] is True
@@ -0,0 +1,65 @@
+"""
+Unit tests for consistent-hash session routing.
+"""
+
+import uuid
+
+import pytest
+
+from app.utils.cluster import ClusterRouter, HashRing
+
+NODES = [f"http://127.0.0.1:{8001 + i}" for i in range(3)]
+KEYS = [str(uuid.UUID(int=i)) for i in range(20000)]
+
+
+def test_owner_is_deterministic_and_balanced():
+    """Test that every ring built from the same nodes agrees, and load is spread."""
+    ring = HashRing(NODES)
+    other = HashRing(reversed(NODES))
+
+    counts = {node: 0 for node in NODES}
+    for key in KEYS:
+        owner = ring.owner(key)
+        assert owner == other.owner(key)
+        counts[owner] += 1
+    assert min(counts.values()) > len(KEYS) / len(NODES) * 0.7
+    assert HashRing().owner("s1") is None
+
+
+def test_adding_a_node_moves_only_its_share():
+    """Test that a joining node takes keys only from others, about 1/N of them."""
+    ring = HashRing(NODES)
+    before = {key: ring.owner(key) for key in KEYS}
+    ring.add_node("http://127.0.0.1:8004")
+
+    moved = [key for key in KEYS if ring.owner(key) != before[key]]
+    assert all(ring.owner(key) == "http://127.0.0.1:8004" for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_removing_a_node_moves_only_its_keys():
+    """Test that only the keys of a leaving node change owner."""
+    ring = HashRing(NODES)
+    before = {key: ring.owner(key) for key in KEYS}
+    ring.remove_node(NODES[0])
+
+    for key in KEYS:
+        if before[key] != NODES[0]:
+            assert ring.owner(key) == before[key]
+        else:
+            assert ring.owner(key) in NODES[1:]
+    assert ring.nodes == NODES[1:]
+
+
+def test_router_generates_local_session_ids():
+    """Test that new session IDs are owned by the node that created them."""
+    router = ClusterRouter(NODES[1] + "/", NODES)
+
+    for _ in range(50):
+        assert router.is_local(router.new_session_id())
+
+    router.set_nodes(NODES[:1])
+    assert router.ring.nodes == NODES[:1]
+    assert not router.is_local(router.new_session_id())
+    with pytest.raises(ValueError):
+        ClusterRouter(NODES[0], NODES, mode="proxy")
@@ -0,0 +1,141 @@
+"""
+Unit tests for the event log and snapshots.
+"""
+
+import os
+
+from app.models.schemas import InterviewQuestion
+from app.models.session_record import CatalogIndex, SessionRecord
+from app.utils.event_log import EventLog
+
+CATALOG = CatalogIndex(
+    [
+        InterviewQuestion(
+            question_id="q1",
+            question_type="choice",
+            question_text="職業",
+            options=["会社員", "学生"],
+            reactions={},
+        ),
+        InterviewQuestion(
+            question_id="q2",
+            question_type="text",
+            question_text="スキル",
+            options=None,
+            reactions=None,
+        ),
+        InterviewQuestion(
+            question_id="q3",
+            question_type="choice",
+            question_text="働き方",
+            options=["オフィス", "リモート"],
+            reactions={},
+        ),
+    ]
+)
+
+
+def answer(log, sessions, session_id, question_index, value):
+    """Apply an answer the way process_answer does and log it."""
+    record = sessions[session_id]
+    if value is not None:
+        record.set_answer(CATALOG, question_index, value)
+    if question_index + 1 < len(CATALOG):
+        record.current = question_index + 1
+    else:
+        record.completed = True
+    log.log_step(session_id, record, question_index if value is not None else None)
+
+
+def start(log, sessions, session_id, user_id=None):
+    sessions[session_id] = SessionRecord(len(CATALOG), user_id=user_id)
+    log.log_start(session_id, sessions[session_id])
+
+
+def states(sessions):
+    return {
+        session_id: record.to_state(CATALOG) for session_id, record in sessions.items()
+    }
+
+
+def test_replay_restores_sessions(tmp_path):
+    """Test that replaying the log rebuilds every change."""
+    log = EventLog(str(tmp_path))
+    sessions = {}
+    start(log, sessions, "s1", user_id="u1")
+    start(log, sessions, "s2")
+    start(log, sessions, "s3")
+    answer(log, sessions, "s1", 0, "学生")
+    answer(log, sessions, "s1", 1, "Python, FastAPI")
+    answer(log, sessions, "s1", 2, None)
+    answer(log, sessions, "s2", 0, "会社員")
+    log.log_delete("s3")
+    del sessions["s3"]
+    handed = SessionRecord(len(CATALOG), user_id="u4", current=2)
+    handed.set_answer(CATALOG, 1, "Go")
+    sessions["s4"] = handed
+    log.log_put("s4", handed)
+    log.close()
+
+    recovered, result = EventLog(str(tmp_path)).recover(len(CATALOG))
+    assert states(recovered) == states(sessions)
+    assert result["replayed_events"] == 9
+    assert result["snapshot_sessions"] == 0
+
+
+def test_snapshot_replays_only_the_tail_and_compacts(tmp_path):
+    """Test that recovery starts from the snapshot and old segments are removed."""
+    log = EventLog(str(tmp_path))
+    sessions = {}
+    for i in range(5):
+        start(log, sessions, f"s{i}")
+        answer(log, sessions, f"s{i}", 0, "学生")
+
+    seq = log.roll()
+    # A change that lands after the roll but before the snapshot is written
+    answer(log, sessions, "s0", 1, "Rust")
+    log.write_snapshot(seq, sessions.items())
+    assert log.compact(seq) == 1
+    assert log.segments() == [seq]
+
+    start(log, sessions, "s5")
+    answer(log, sessions, "s0", 2, "リモート")
+    log.close()
+
+    recovered, result = EventLog(str(tmp_path)).recover(len(CATALOG))
+    assert states(recovered) == states(sessions)
+    assert result["snapshot_sessions"] == 5
+    assert result["replayed_events"] == 3
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    """Test that a half-written last record is dropped and appends continue."""
+    log = EventLog(str(tmp_path))
+    sessions = {}
+    start(log, sessions, "s1")
+    log.close()
+    path = os.path.join(str(tmp_path), "segment-00000001.log")
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    log = EventLog(str(tmp_path))
+    recovered, _ = log.recover(len(CATALOG))
+    assert list(recovered) == ["s1"]
+    start(log, sessions, "s2")
+    log.close()
+
+    recovered, _ = EventLog(str(tmp_path)).recover(len(CATALOG))
+    assert sorted(recovered) == ["s1", "s2"]
+
+
+def test_segments_roll_by_size(tmp_path):
+    """Test that appends move to a new segment once the size limit is reached."""
+    log = EventLog(str(tmp_path), segment_bytes=256)
+    sessions = {}
+    for i in range(20):
+        start(log, sessions, f"session-{i}")
+    log.close()
+
+    assert len(log.segments()) > 1
+    recovered, _ = EventLog(str(tmp_path)).recover(len(CATALOG))
+    assert len(recovered) == 20
@@ -0,0 +1,96 @@
+"""
+Unit tests for session expiry.
+"""
+
+import asyncio
+from typing import TypedDict
+
+from langgraph.graph import StateGraph
+
+from app.graph.checkpoint import ThreadIndexedMemorySaver
+from app.models.session_record import CatalogIndex, SessionRecord
+from app.utils.expiry import SessionSweeper
+from app.utils.session_store import LocalSessionStore, SharedSessionStore
+
+
+def make_store(count, now):
+    store = LocalSessionStore(clock=lambda: now[0])
+    for i in range(count):
+        store.create(f"s{i}", SessionRecord(3, user_id=f"u{i}"))
+        now[0] += 1
+    return store
+
+
+def test_sweeper_expires_in_slices():
+    """Test that expired sessions are removed oldest first, one slice at a time."""
+    now = [0.0]
+    store = make_store(1200, now)
+    expired = []
+
+    def expire(session_id):
+        expired.append(session_id)
+        store.delete(session_id)
+
+    sweeper = SessionSweeper(store, ttl_seconds=3600, expire=expire, slice_size=500)
+    assert sweeper.sweep_slice() == 0
+
+    # Keep one old session alive, then let everything else pass the TTL
+    with store.edit("s0") as record:
+        now[0] = 3600 + 1200
+        record.current = 1
+    now[0] = 3600 + 1199.5
+
+    assert sweeper.sweep_slice() == 500
+    assert expired[:2] == ["s1", "s2"]
+    assert asyncio.run(sweeper.sweep()) == 699
+    assert list(store) == ["s0"]
+    assert sweeper.metrics()["expired_total"] == 1199
+    assert store.latest_for_user("u5") is None
+
+
+def test_sweeper_scans_shared_store_in_slot_ranges(tmp_path):
+    """Test that the shared table is swept a bounded number of slots at a time until the scan wraps."""
+    now = [0.0]
+    store = SharedSessionStore(
+        str(tmp_path / "sessions.tbl"),
+        CatalogIndex([]),
+        capacity=256,
+        clock=lambda: now[0],
+    )
+    for i in range(100):
+        store.create(f"s{i}", SessionRecord(0))
+    now[0] = 3600 + 1
+
+    sweeper = SessionSweeper(
+        store, ttl_seconds=3600, expire=store.delete, scan_slots=64
+    )
+    first = sweeper.sweep_slice()
+    assert 0 < first < 100
+    assert asyncio.run(sweeper.sweep()) == 100 - first
+    assert len(store) == 0
+    assert sweeper.metrics()["expired_total"] == 100
+    store.close()
+
+
+def test_checkpoints_are_deleted_per_thread():
+    """Test that deleting a thread removes only that thread's checkpoints."""
+
+    class State(TypedDict):
+        count: int
+
+    builder = StateGraph(State)
+    builder.add_node("step", lambda state: {"count": state["count"] + 1})
+    builder.set_entry_point("step")
+    builder.set_finish_point("step")
+    saver = ThreadIndexedMemorySaver()
+    graph = builder.compile(checkpointer=saver)
+
+    for thread_id in ("a", "b"):
+        graph.invoke({"count": 0}, {"configurable": {"thread_id": thread_id}})
+    assert "a" in saver.blobs.keys_by_thread
+
+    saver.delete_thread("a")
+    assert "a" not in saver.storage
+    assert saver.get_tuple({"configurable": {"thread_id": "a"}}) is None
+    assert all(key[0] != "a" for key in list(saver.blobs) + list(saver.writes))
+    assert graph.get_state({"configurable": {"thread_id": "b"}}).values == {"count": 1}
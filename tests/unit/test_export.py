@@ -0,0 +1,91 @@
+"""
+Unit tests for the streaming export writers.
+"""
+
+import csv
+import io
+import json
+
+import pytest
+
+from app.models.schemas import ConversationState
+from app.utils.export import (
+    iter_session_chunks,
+    stream_csv,
+    stream_export,
+    stream_ndjson,
+)
+
+COLUMNS = [("q1", ["会社員", "学生"]), ("q2", None)]
+
+
+def make_sessions(n: int):
+    return {
+        f"s{i}": ConversationState(
+            user_id=f"u{i}",
+            answers={"q1": "会社員" if i % 2 == 0 else "学生", "q2": f"text {i}"},
+            completed=True,
+        )
+        for i in range(n)
+    }
+
+
+def make_chunks(sessions, chunk_size: int):
+    ids = list(sessions)
+
+    def page(limit: int, cursor: int):
+        next_cursor = cursor + limit if cursor + limit < len(ids) else None
+        return ids[cursor : cursor + limit], next_cursor
+
+    return iter_session_chunks(page, sessions.get, chunk_size=chunk_size)
+
+
+def test_chunks_are_bounded():
+    """Test that sessions are read in bounded chunks."""
+    chunks = list(make_chunks(make_sessions(7), chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+
+
+def test_csv_stream():
+    """Test CSV output."""
+    pieces = list(stream_csv(make_chunks(make_sessions(5), 2), COLUMNS))
+    assert len(pieces) == 4  # header + 3 chunks
+    rows = list(csv.reader(io.StringIO("".join(pieces))))
+    assert rows[0] == ["session_id", "user_id", "q1", "q2"]
+    assert rows[1] == ["s0", "u0", "会社員", "text 0"]
+    assert len(rows) == 6
+
+
+def test_ndjson_stream():
+    """Test NDJSON output."""
+    text = "".join(stream_ndjson(make_chunks(make_sessions(3), 2), COLUMNS))
+    records = [json.loads(line) for line in text.splitlines()]
+    assert records[1] == {
+        "session_id": "s1",
+        "user_id": "u1",
+        "answers": {"q1": "学生", "q2": "text 1"},
+    }
+
+
+def test_arrow_stream_is_dictionary_encoded():
+    """Test that choice columns are dictionary-encoded in the Arrow stream."""
+    pa = pytest.importorskip("pyarrow")
+    data = b"".join(stream_export("arrow", make_chunks(make_sessions(5), 2), COLUMNS))
+    table = pa.ipc.open_stream(data).read_all()
+
+    assert table.num_rows == 5
+    assert pa.types.is_dictionary(table.schema.field("q1").type)
+    assert table.column("q1").to_pylist() == [
+        "会社員",
+        "学生",
+        "会社員",
+        "学生",
+        "会社員",
+    ]
+    assert table.column("q2").to_pylist()[4] == "text 4"
+
+
+def test_unknown_format():
+    """Test that an unknown format is rejected."""
+    with pytest.raises(ValueError):
+        stream_export("xml", [], COLUMNS)
@@ -0,0 +1,82 @@
+"""
+Unit tests for the control-phrase intent detector.
+"""
+
+from app.graph.flow import ConversationGraph
+from app.utils.intent_detector import (
+    DEFAULT_PHRASES,
+    INTENT_DEFER,
+    INTENT_QUIT,
+    INTENT_SKIP,
+    IntentDetector,
+)
+
+DETECTOR = IntentDetector(DEFAULT_PHRASES)
+
+
+def test_detect_control_phrases():
+    """Test that short control messages are classified regardless of width and kana."""
+    assert DETECTOR.detect("スキップ") == INTENT_SKIP
+    assert DETECTOR.detect("ｽｷｯﾌﾟします") == INTENT_SKIP
+    assert DETECTOR.detect("SKIP") == INTENT_SKIP
+    assert DETECTOR.detect("あとでやります") == INTENT_DEFER
+    assert DETECTOR.detect("後で") == INTENT_DEFER
+    assert DETECTOR.detect("やめます") == INTENT_QUIT
+    assert DETECTOR.detect("もう終わりです！") == INTENT_QUIT
+
+
+def test_ordinary_messages_are_not_classified():
+    """Test that answers and long sentences containing a phrase are left alone."""
+    assert DETECTOR.detect("会社員") is None
+    assert DETECTOR.detect("") is None
+    assert DETECTOR.detect("途中でやめることが多いです") is None
+
+
+def test_negated_and_contextual_phrases_are_not_classified():
+    """Test that only a phrase with an allowed polite prefix or suffix is a control message."""
+    assert DETECTOR.detect("スキップでお願いします") == INTENT_SKIP
+    assert DETECTOR.detect("飛ばしてください") == INTENT_SKIP
+    assert DETECTOR.detect("スキップしないで") is None
+    assert DETECTOR.detect("スキップはしない") is None
+    assert DETECTOR.detect("会社を辞める予定") is None
+    assert DETECTOR.detect("前職を辞めるため") is None
+
+
+def test_overlapping_phrases_prefer_the_longest_match():
+    """Test failure links across phrases and the longest-match rule."""
+    detector = IntentDetector({"a": ["あと"], "b": ["とで"], "c": ["あとでね"]})
+    assert sorted(intent for _, _, intent in detector.matches("あとでね")) == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert detector.detect("あとでね") == "c"
+    assert detector.detect("あとで") in ("a", "b")
+
+
+def test_control_turns_do_not_invoke_the_workflow(monkeypatch):
+    """Test that skip, defer and quit are handled without running the graph."""
+    graph = ConversationGraph()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("workflow invoked")
+
+    monkeypatch.setattr(graph.compiled_workflow, "invoke", fail)
+
+    deferred = graph.process_message("s1", "あとで")
+    assert deferred["intent"] == INTENT_DEFER
+    assert deferred["question_id"] == "q1"
+    assert deferred["answered_question_id"] is None
+
+    skipped = graph.process_message("s1", "飛ばして")
+    assert skipped["intent"] == INTENT_SKIP
+    assert skipped["question_id"] == "q2"
+    assert skipped["answered_question_id"] == "q1"
+
+    quit_response = graph.process_message("s1", "やめる")
+    assert quit_response["intent"] == INTENT_QUIT
+    assert quit_response["completed"] is False
+
+    state = graph.get_state("s1")
+    assert state.current_question_id == "q2"
+    assert state.answers == {}
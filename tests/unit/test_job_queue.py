@@ -0,0 +1,253 @@
+"""
+Unit tests for the SQLite-backed background job queue.
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.utils.analysis import analyze_completion
+from app.utils.job_queue import (
+    JOB_FAILED,
+    JOB_PENDING,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JobQueue,
+)
+from app.utils.stats import AnswerStats
+
+
+async def wait_until_finished(queue: JobQueue, job_id: str) -> dict:
+    while queue.get(job_id)["status"] not in (JOB_SUCCEEDED, JOB_FAILED):
+        await queue.wait_for_change(job_id, 1.0)
+    return queue.get(job_id)
+
+
+def test_job_runs_after_enqueue(tmp_path):
+    """Test that a worker runs the handler and stores its result."""
+
+    async def run():
+        queue = JobQueue(
+            str(tmp_path / "jobs.sqlite3"),
+            {"double": lambda payload: {"value": payload["value"] * 2}},
+        )
+        await queue.start()
+        job_id = queue.enqueue("double", "a", {"value": 21})
+        job = await wait_until_finished(queue, job_id)
+        await queue.stop()
+        return job, queue.metrics()
+
+    job, metrics = asyncio.run(run())
+    assert job["status"] == JOB_SUCCEEDED
+    assert job["result"] == {"value": 42}
+    assert job["attempts"] == 1
+    assert metrics["unfinished"] == 0
+    assert metrics["succeeded_total"] == 1
+
+
+def test_failed_job_is_retried_then_marked_failed(tmp_path):
+    """Test that a failing handler is retried with backoff up to max_attempts."""
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) < 2:
+            raise RuntimeError("temporary")
+        return {"ok": True}
+
+    def broken(payload):
+        raise RuntimeError("permanent")
+
+    async def run():
+        queue = JobQueue(
+            str(tmp_path / "jobs.sqlite3"),
+            {"flaky": flaky, "broken": broken},
+            max_attempts=3,
+            retry_base_seconds=0.01,
+        )
+        await queue.start()
+        flaky_job = await wait_until_finished(queue, queue.enqueue("flaky", "a", {}))
+        broken_job = await wait_until_finished(queue, queue.enqueue("broken", "a", {}))
+        await queue.stop()
+        return flaky_job, broken_job, queue.metrics()
+
+    flaky_job, broken_job, metrics = asyncio.run(run())
+    assert flaky_job["status"] == JOB_SUCCEEDED
+    assert flaky_job["attempts"] == 2
+    assert broken_job["status"] == JOB_FAILED
+    assert broken_job["attempts"] == 3
+    assert broken_job["error"] == "permanent"
+    assert metrics["retried_total"] == 3
+    assert metrics["failed_total"] == 1
+
+
+def test_pending_jobs_survive_restart(tmp_path):
+    """Test that jobs enqueued before a restart run once workers start again."""
+    path = str(tmp_path / "jobs.sqlite3")
+    handlers = {"echo": lambda payload: payload}
+
+    first = JobQueue(path, handlers)
+    job_id = first.enqueue("echo", "a", {"answer": "学生"})
+    first.close()
+
+    async def run():
+        queue = JobQueue(path, handlers)
+        assert queue.metrics()["unfinished"] == 1
+        await queue.start()
+        job = await wait_until_finished(queue, job_id)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job["status"] == JOB_SUCCEEDED
+    assert job["result"] == {"answer": "学生"}
+
+
+def test_enqueue_deduplicates_and_enforces_capacity(tmp_path):
+    """Test that the same key returns the same job and a full queue rejects new jobs."""
+    queue = JobQueue(
+        str(tmp_path / "jobs.sqlite3"), {"echo": lambda payload: payload}, capacity=2
+    )
+    job_id = queue.enqueue("echo", "a", {})
+    assert queue.enqueue("echo", "a", {}) == job_id
+    queue.enqueue("echo", "b", {})
+    with pytest.raises(RuntimeError):
+        queue.enqueue("echo", "c", {})
+    with pytest.raises(ValueError):
+        queue.enqueue("unknown", "a", {})
+    assert queue.find("echo", "a")["status"] == JOB_PENDING
+    assert queue.find("echo", "c") is None
+    assert queue.metrics()["rejected_total"] == 1
+
+
+def test_workers_sharing_a_file_run_each_job_once(tmp_path):
+    """Test that two queues on the same file never run the same job twice."""
+    path = str(tmp_path / "jobs.sqlite3")
+    runs = []
+    handlers = {"echo": lambda payload: runs.append(payload["i"]) or payload}
+
+    async def run():
+        first = JobQueue(path, handlers, poll_seconds=0.01)
+        second = JobQueue(path, handlers, poll_seconds=0.01)
+        await first.start()
+        await second.start()
+        job_ids = [
+            (first if i % 2 else second).enqueue("echo", str(i), {"i": i})
+            for i in range(20)
+        ]
+        for job_id in job_ids:
+            await wait_until_finished(first, job_id)
+        await first.stop()
+        await second.stop()
+        return first.metrics(), second.metrics()
+
+    first, second = asyncio.run(run())
+    assert sorted(runs) == list(range(20))
+    assert first["succeeded_total"] + second["succeeded_total"] == 20
+    assert first["unfinished"] == second["unfinished"] == 0
+
+
+def test_only_expired_leases_are_reclaimed(tmp_path):
+    """Test that a running job of another worker is left alone until its lease expires."""
+    path = str(tmp_path / "jobs.sqlite3")
+    now = [1000.0]
+    runs = []
+    handlers = {"echo": lambda payload: runs.append(payload) or payload}
+
+    # a worker that claimed the job and then stopped responding
+    crashed = JobQueue(path, handlers, lease_seconds=10, clock=lambda: now[0])
+    job_id = crashed.enqueue("echo", "a", {})
+    assert crashed._claim()[0] == job_id
+
+    async def run():
+        queue = JobQueue(
+            path, handlers, lease_seconds=10, poll_seconds=0.01, clock=lambda: now[0]
+        )
+        await queue.start()
+        await asyncio.sleep(0.05)
+        before = (queue.get(job_id)["status"], list(runs))
+        now[0] += 11
+        job = await wait_until_finished(queue, job_id)
+        await queue.stop()
+        return before, job, queue.metrics()
+
+    before, job, metrics = asyncio.run(run())
+    assert before == (JOB_RUNNING, [])
+    assert job["status"] == JOB_SUCCEEDED and job["attempts"] == 2
+    assert metrics["reclaimed_total"] == 1
+    # the stale worker can no longer overwrite the job
+    assert not crashed._set_status(job_id, JOB_FAILED, error="late")
+    assert crashed.get(job_id)["status"] == JOB_SUCCEEDED
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    """Test that finished jobs older than the retention period are deleted."""
+    now = [1000.0]
+    queue = JobQueue(
+        str(tmp_path / "jobs.sqlite3"),
+        {"echo": lambda payload: payload},
+        retention_seconds=60,
+        clock=lambda: now[0],
+    )
+    old = queue.enqueue("echo", "old", {})
+    queue._claim()
+    queue._set_status(old, JOB_SUCCEEDED, result="{}")
+    now[0] += 30
+    pending = queue.enqueue("echo", "pending", {})
+
+    assert queue.purge_finished() == 0
+    now[0] += 31
+    assert queue.purge_finished() == 1
+    assert queue.get(old) is None
+    assert queue.get(pending)["status"] == JOB_PENDING
+    assert queue.metrics()["purged_total"] == 1
+
+
+def test_worker_survives_a_locked_database(tmp_path):
+    """Test that a worker backs off on 'database is locked' instead of dying."""
+
+    async def run():
+        queue = JobQueue(
+            str(tmp_path / "jobs.sqlite3"),
+            {"echo": lambda payload: payload},
+            workers=1,
+            poll_seconds=0.01,
+        )
+        claim = queue._claim
+        failures = [sqlite3.OperationalError("database is locked")]
+
+        def flaky_claim():
+            if failures:
+                raise failures.pop()
+            return claim()
+
+        queue._claim = flaky_claim
+        await queue.start()
+        job = await wait_until_finished(queue, queue.enqueue("echo", "a", {"value": 1}))
+        await queue.stop()
+        return job, queue.metrics()
+
+    job, metrics = asyncio.run(run())
+    assert job["status"] == JOB_SUCCEEDED
+    assert metrics["database_errors_total"] == 1
+    assert metrics["last_error"] == "database is locked"
+
+
+def test_analyze_completion():
+    """Test the completion analysis against peer answer shares."""
+    stats = AnswerStats()
+    for option in ["学生"] * 9 + ["社会人"]:
+        stats.record_answer("q1", option)
+    for option in ["はい", "いいえ"]:
+        stats.record_answer("q2", option)
+    stats.record_completion()
+
+    result = analyze_completion(
+        {"q1": "社会人", "q2": "はい"}, ["q1", "q2", "q3"], stats.snapshot()
+    )
+    assert result["answered"] == 2
+    assert result["skipped"] == ["q3"]
+    assert result["peer_share"] == {"q1": pytest.approx(0.1), "q2": pytest.approx(0.5)}
+    assert result["minority_answers"] == ["q1"]
+    assert result["respondents"] == 1
@@ -0,0 +1,66 @@
+"""
+Unit tests for the free-text option matcher.
+"""
+
+from app.graph.flow import QUESTIONS, ConversationGraph
+from app.graph.transcript import KIND_ANSWER, TranscriptCatalog
+from app.utils.option_matcher import OptionMatcher, normalize
+
+MATCHER = OptionMatcher(QUESTIONS)
+
+
+def test_normalize_folds_width_kana_and_politeness():
+    """Test that width, kana, spacing and sentence endings are folded away."""
+    assert normalize("ｶｲｼｬｲﾝ") == normalize("かいしゃいん") == "かいしゃいん"
+    assert normalize(" 会社員です。") == "会社員"
+    assert normalize("ＯＬ") == "ol"
+    assert normalize("學生") == "学生"
+
+
+def test_match_free_text_to_options():
+    """Test typical free-text replies."""
+    assert MATCHER.match("q1", "会社員です").option == "会社員"
+    assert MATCHER.match("q1", "ｶｲｼｬｲﾝ").option == "会社員"
+    assert MATCHER.match("q1", "大学生です").option == "学生"
+    assert MATCHER.match("q2", "技術系のスキル向上かな").option == "技術スキル向上"
+    assert MATCHER.match("q3", "メンターが欲しいです").option == "メンタリング"
+
+
+def test_unrelated_and_ambiguous_replies_are_not_matched():
+    """Test that only confident matches are returned."""
+    assert MATCHER.match("q1", "こんにちは").option is None
+    assert MATCHER.match("q1", "").option is None
+    assert MATCHER.match("unknown", "会社員").option is None
+
+    ambiguous = MATCHER.match("q1", "会社員と学生")
+    assert ambiguous.option is None and ambiguous.ambiguous
+
+
+def test_negated_replies_are_not_matched():
+    """Test that a reply negating an option is left to the slow path."""
+    for text in [
+        "会社員ではありません",
+        "学生じゃない",
+        "学生じゃないです",
+        "会社員以外",
+        "自営業ではなかった",
+    ]:
+        assert MATCHER.match("q1", text).option is None, text
+    assert MATCHER.match("q1", "会社員です").option == "会社員"
+
+
+def test_transcript_keeps_matched_text_and_state_holds_the_option():
+    """Test that a matched reply stays verbatim in the transcript while the answer records the option."""
+    catalog = TranscriptCatalog(QUESTIONS)
+    assert catalog.user_entry("q1", "がくせいです") == "がくせいです"
+    ref = catalog.match_answer("q1", "がくせいです")
+    assert ref[0] == KIND_ANSWER and catalog.text(ref) == "学生"
+    assert catalog.match_answer("q1", "わからない") is None
+
+    graph = ConversationGraph()
+    response = graph.process_message("s1", "がくせいです")
+    state = graph.get_state("s1")
+    assert response["answered_question_id"] == "q1"
+    assert state.answers == {"q1": "学生"}
+    assert "がくせいです" in state.messages
+    assert graph.catalog.reaction_ref("q1", "学生") in state.messages
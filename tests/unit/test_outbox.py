@@ -0,0 +1,315 @@
+"""
+Unit tests for the outbox dispatcher, run against a local stub HTTP server.
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.utils.outbox import Outbox
+
+
+class StubReceiver(ThreadingHTTPServer):
+    """A downstream endpoint that records batches, can fail the first requests and rejects some events."""
+
+    def __init__(self, fail_first: int = 0, status: int = 503, reject=None) -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.fail_first = fail_first
+        self.status = status
+        self.reject = reject
+        self.requests = 0
+        self.batches = []
+        self.connections = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/events"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        server.requests += 1
+        server.connections.add(self.client_address)
+        if server.requests <= server.fail_first:
+            status = server.status
+        elif server.reject is not None and any(
+            server.reject(event) for event in body["events"]
+        ):
+            status = 422
+        else:
+            status = 200
+            server.batches.append(body["events"])
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    servers = []
+
+    def create(**kwargs) -> StubReceiver:
+        server = StubReceiver(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield create
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+async def wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_events_are_delivered_in_batches_over_one_connection(tmp_path, receiver):
+    """Test that a backlog is sent in batch_size chunks reusing a keep-alive connection."""
+    server = receiver()
+
+    async def run():
+        outbox = Outbox(
+            str(tmp_path / "outbox.sqlite3"),
+            server.url,
+            batch_size=100,
+            max_connections=1,
+        )
+        for i in range(250):
+            outbox.add("interview.completed", f"s{i}", {"session_id": f"s{i}"})
+        await outbox.start()
+        await wait_until(lambda: outbox.metrics()["backlog"] == 0)
+        await outbox.stop()
+        return outbox.metrics()
+
+    metrics = asyncio.run(run())
+    assert [len(batch) for batch in server.batches] == [100, 100, 50]
+    assert [event["key"] for batch in server.batches for event in batch] == [
+        f"s{i}" for i in range(250)
+    ]
+    assert len(server.connections) == 1
+    assert metrics["delivered_total"] == 250
+    assert metrics["batches_total"] == 3
+    assert metrics["delivered_per_second"] > 0
+
+
+def test_failed_batches_are_retried_with_backoff(tmp_path, receiver):
+    """Test that a failing endpoint is retried until it accepts the batch."""
+    server = receiver(fail_first=2)
+
+    async def run():
+        outbox = Outbox(
+            str(tmp_path / "outbox.sqlite3"), server.url, retry_base_seconds=0.01
+        )
+        await outbox.start()
+        assert outbox.add("interview.completed", "s1", {"session_id": "s1"})
+        assert not outbox.add("interview.completed", "s1", {"session_id": "s1"})
+        await wait_until(lambda: outbox.metrics()["delivered_total"] == 1)
+        await outbox.stop()
+        return outbox.metrics()
+
+    metrics = asyncio.run(run())
+    assert server.requests == 3
+    assert len(server.batches) == 1
+    assert metrics["failed_batches_total"] == 2
+    assert metrics["backlog"] == 0
+    assert "503" in metrics["last_error"]
+
+
+def test_events_are_dead_lettered_and_requeued(tmp_path, receiver):
+    """Test that events exceeding max_attempts move to dead letters and can be requeued."""
+    server = receiver(fail_first=2, status=500)
+
+    async def run():
+        outbox = Outbox(
+            str(tmp_path / "outbox.sqlite3"),
+            server.url,
+            max_attempts=2,
+            retry_base_seconds=0.01,
+        )
+        outbox.add("interview.completed", "s1", {"session_id": "s1"})
+        await outbox.start()
+        await wait_until(lambda: outbox.metrics()["dead"] == 1)
+        dead = outbox.dead_letters()
+        assert outbox.requeue_dead() == 1
+        await wait_until(lambda: outbox.metrics()["delivered_total"] == 1)
+        await outbox.stop()
+        return dead, outbox.metrics()
+
+    dead, metrics = asyncio.run(run())
+    assert dead[0]["key"] == "s1"
+    assert dead[0]["attempts"] == 2
+    assert metrics["dead"] == 0
+    assert metrics["dead_total"] == 1
+
+
+def test_pending_events_survive_restart(tmp_path, receiver):
+    """Test that events written before a restart are delivered once dispatching starts."""
+    server = receiver()
+    path = str(tmp_path / "outbox.sqlite3")
+    first = Outbox(path, server.url)
+    first.add("interview.completed", "s1", {"answers": {"q1": "学生"}})
+    first.close()
+
+    async def run():
+        outbox = Outbox(path, server.url)
+        assert outbox.metrics()["backlog"] == 1
+        await outbox.start()
+        await wait_until(lambda: outbox.metrics()["backlog"] == 0)
+        await outbox.stop()
+
+    asyncio.run(run())
+    assert server.batches[0][0]["payload"] == {"answers": {"q1": "学生"}}
+
+
+def test_rejected_event_does_not_dead_letter_its_batch(tmp_path, receiver):
+    """Test that a batch refused with a 4xx is split so only the refused event is dead-lettered."""
+    server = receiver(reject=lambda event: event["key"] == "s37")
+
+    async def run():
+        outbox = Outbox(str(tmp_path / "outbox.sqlite3"), server.url, batch_size=100)
+        for i in range(100):
+            outbox.add("interview.completed", f"s{i}", {"session_id": f"s{i}"})
+        await outbox.start()
+        await wait_until(lambda: outbox.metrics()["backlog"] == 0)
+        await outbox.stop()
+        return outbox.dead_letters(), outbox.metrics()
+
+    dead, metrics = asyncio.run(run())
+    assert [event["key"] for event in dead] == ["s37"]
+    assert "422" in dead[0]["error"]
+    assert sorted(
+        event["key"] for batch in server.batches for event in batch
+    ) == sorted(f"s{i}" for i in range(100) if i != 37)
+    assert metrics["delivered_total"] == 99
+    assert metrics["rejected_total"] == 1
+    assert metrics["failed_batches_total"] == 0
+
+
+def test_batch_refused_for_every_event_is_retried(tmp_path, receiver):
+    """Test that a batch whose events are all refused counts as a failed batch instead of dead letters."""
+    server = receiver(reject=lambda event: True)
+
+    async def run():
+        outbox = Outbox(str(tmp_path / "outbox.sqlite3"), server.url, batch_size=4)
+        outbox._client = httpx.AsyncClient()
+        for i in range(4):
+            outbox.add("interview.completed", f"s{i}", {"session_id": f"s{i}"})
+        assert await outbox.dispatch_once() == 0
+        await outbox._client.aclose()
+        return outbox.metrics()
+
+    metrics = asyncio.run(run())
+    assert server.requests == 7
+    assert metrics["backlog"] == 4
+    assert metrics["dead"] == 0
+    assert metrics["rejected_total"] == 0
+    assert metrics["failed_batches_total"] == 1
+
+
+def test_unauthorized_batch_is_retried_without_splitting(tmp_path, receiver):
+    """Test that a 4xx that is not about the events (401) retries the whole batch."""
+    server = receiver(fail_first=1, status=401)
+
+    async def run():
+        outbox = Outbox(
+            str(tmp_path / "outbox.sqlite3"),
+            server.url,
+            batch_size=100,
+            retry_base_seconds=0.01,
+        )
+        for i in range(100):
+            outbox.add("interview.completed", f"s{i}", {"session_id": f"s{i}"})
+        await outbox.start()
+        await wait_until(lambda: outbox.metrics()["backlog"] == 0)
+        await outbox.stop()
+        return outbox.metrics()
+
+    metrics = asyncio.run(run())
+    assert server.requests == 2
+    assert metrics["delivered_total"] == 100
+    assert metrics["dead"] == 0
+    assert metrics["failed_batches_total"] == 1
+    assert "401" in metrics["last_error"]
+
+
+def test_dispatchers_sharing_a_file_deliver_each_event_once(tmp_path, receiver):
+    """Test that two dispatchers on one database claim disjoint batches."""
+    server = receiver()
+    path = str(tmp_path / "outbox.sqlite3")
+
+    async def run():
+        outboxes = [Outbox(path, server.url, batch_size=3) for _ in range(2)]
+        for outbox in outboxes:
+            await outbox.start()
+        for i in range(10):
+            outboxes[i % 2].add("interview.completed", f"s{i}", {"session_id": f"s{i}"})
+        await wait_until(lambda: outboxes[0].metrics()["backlog"] == 0)
+        for outbox in outboxes:
+            await outbox.stop()
+        return [outbox.metrics()["delivered_total"] for outbox in outboxes]
+
+    delivered = asyncio.run(run())
+    keys = [event["key"] for batch in server.batches for event in batch]
+    assert sorted(keys) == sorted(f"s{i}" for i in range(10))
+    assert sum(delivered) == 10
+
+
+def test_expired_lease_is_claimed_by_another_dispatcher(tmp_path):
+    """Test that events leased by a dispatcher that stopped responding are claimed after the lease expires."""
+    now = [1000.0]
+    path = str(tmp_path / "outbox.sqlite3")
+    first = Outbox(
+        path, "http://127.0.0.1/events", lease_seconds=30, clock=lambda: now[0]
+    )
+    second = Outbox(
+        path, "http://127.0.0.1/events", lease_seconds=30, clock=lambda: now[0]
+    )
+    first.add("interview.completed", "s1", {"session_id": "s1"})
+
+    assert [row[2] for row in first._claim()] == ["s1"]
+    assert second._claim() == []
+    now[0] += 31
+    assert [row[2] for row in second._claim()] == ["s1"]
+
+
+def test_delivered_events_are_pruned_after_retention(tmp_path, receiver):
+    """Test that delivered events older than the retention period are deleted."""
+    server = receiver()
+    now = [1000.0]
+
+    async def run():
+        outbox = Outbox(
+            str(tmp_path / "outbox.sqlite3"),
+            server.url,
+            retention_seconds=60,
+            clock=lambda: now[0],
+        )
+        outbox._client = httpx.AsyncClient()
+        outbox.add("interview.completed", "s1", {"session_id": "s1"})
+        assert await outbox.dispatch_once() == 1
+        outbox.add("interview.completed", "s2", {"session_id": "s2"})
+        await outbox._client.aclose()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert outbox.prune_delivered() == 0
+    now[0] += 61
+    assert outbox.prune_delivered() == 1
+    assert not outbox.add("interview.completed", "s2", {"session_id": "s2"})
+    assert outbox.metrics()["backlog"] == 1
+    assert outbox.metrics()["pruned_total"] == 1
@@ -0,0 +1,118 @@
+"""
+Unit tests for the LLM prompt builder.
+"""
+
+from app.graph.flow import QUESTIONS, ConversationGraph
+from app.graph.prompt import PromptBuilder, estimate_tokens, extractive_summary
+from app.graph.transcript import TranscriptCatalog
+from app.models.schemas import ConversationState
+
+CATALOG = TranscriptCatalog(QUESTIONS)
+
+
+def make_state(user_messages: int) -> ConversationState:
+    """Build a state with a question followed by alternating user and assistant turns."""
+    messages = [CATALOG.question_ref("q1")]
+    for i in range(user_messages):
+        messages += [f"message {i}", CATALOG.question_ref("q1")]
+    return ConversationState(
+        current_question_id="q1", messages=messages, catalog_version=CATALOG.version
+    )
+
+
+def test_prefix_is_identical_across_sessions_and_turns():
+    """Test that the system prompt and catalog form a byte-identical first message."""
+    builder = PromptBuilder(max_history=4)
+    first, _ = builder.build(CATALOG, make_state(1), "hello")
+    later, _ = builder.build(CATALOG, make_state(20), "world")
+    assert first.messages[0] == later.messages[0]
+    assert first.prefix_hash == later.prefix_hash
+    assert "q3" in first.messages[0]["content"]
+
+
+def test_old_history_is_folded_in_chunks():
+    """Test that at most max_history messages are sent and older ones move in half-size chunks."""
+    builder = PromptBuilder(max_history=4)
+    state = make_state(3)  # 7 messages
+
+    prompt, update = builder.build(CATALOG, state)
+    assert update["summarized_messages"] == 4  # overflow of 3 rounded up to chunks of 2
+    assert len(prompt.messages) == 1 + 1 + 3
+    assert prompt.messages[1]["content"].endswith("ユーザー: message 1")
+
+    state.summary, state.summarized_messages = (
+        update["summary"],
+        update["summarized_messages"],
+    )
+    state.messages.append("message 3")
+    _, update = builder.build(CATALOG, state)
+    assert update == {}
+
+
+def test_summary_is_updated_incrementally():
+    """Test that the summarizer only sees the newly folded turns."""
+    seen = []
+
+    def summarize(previous, turns):
+        seen.append(len(turns))
+        return previous + "+" * len(turns)
+
+    builder = PromptBuilder(max_history=4, summarize=summarize)
+    state = make_state(3)
+    _, update = builder.build(CATALOG, state)
+    state.summary, state.summarized_messages = (
+        update["summary"],
+        update["summarized_messages"],
+    )
+    state.messages += ["a", "b"]
+    _, update = builder.build(CATALOG, state)
+    assert seen == [4, 2]
+    assert update["summary"] == "++++++"
+
+
+def test_extractive_summary_collapses_repeats():
+    """Test that repeated user lines are counted instead of duplicated."""
+    summary = extractive_summary(
+        "", [("user", "わからない"), ("assistant", "q"), ("user", "わからない")]
+    )
+    assert summary == "ユーザー: わからない（×2）"
+    summary = extractive_summary(summary, [("user", "わからない"), ("user", "会社員")])
+    assert summary == "ユーザー: わからない（×3）\nユーザー: 会社員"
+
+
+def test_token_counts():
+    """Test the estimator and the per-part breakdown."""
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("会社員") == 3
+
+    builder = PromptBuilder(max_history=10, count_tokens=len)
+    prompt, _ = builder.build(CATALOG, make_state(1), "hi")
+    assert prompt.message_tokens == len("hi") + 4
+    assert prompt.total_tokens == sum(
+        prompt.usage()[key]
+        for key in (
+            "prefix_tokens",
+            "summary_tokens",
+            "history_tokens",
+            "message_tokens",
+        )
+    )
+
+
+def test_graph_build_prompt_persists_summary_and_usage():
+    """Test that the graph stores the rolling summary and accumulates prompt tokens."""
+    graph = ConversationGraph()
+    assert graph.build_prompt("missing") is None
+
+    for _ in range(graph.prompts.max_history):
+        graph.process_message("s1", "わからない")
+    first = graph.build_prompt("s1")
+    state = graph.get_state("s1")
+    assert state.summarized_messages > 0
+    assert "わからない" in state.summary
+    assert state.prompt_tokens == first.total_tokens
+
+    second = graph.build_prompt("s1", "こんにちは")
+    assert (
+        graph.get_state("s1").prompt_tokens == first.total_tokens + second.total_tokens
+    )
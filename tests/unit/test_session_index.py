@@ -0,0 +1,59 @@
+"""
+Unit tests for the session secondary indexes.
+"""
+
+from app.utils.session_index import SessionIndex
+
+
+def test_latest_session_per_user():
+    """Test that the most recently touched session of a user is returned."""
+    index = SessionIndex()
+    index.touch("s1", 100.0, user_id="u1")
+    index.touch("s2", 101.0, user_id="u1")
+    index.touch("s3", 102.0, user_id="u2")
+    index.touch("s4", 103.0)
+
+    assert index.latest_for_user("u1") == "s2"
+    index.touch("s1", 104.0)
+    assert index.latest_for_user("u1") == "s1"
+    assert index.sessions_for_user("u1") == ["s1", "s2"]
+
+    index.remove("s1")
+    assert index.latest_for_user("u1") == "s2"
+    index.remove("s2")
+    assert index.latest_for_user("u1") is None
+    assert index.latest_for_user("unknown") is None
+
+
+def test_idle_sessions_are_paged_oldest_first():
+    """Test paging through idle sessions while skipping touched and removed ones."""
+    index = SessionIndex()
+    for i in range(10):
+        index.touch(f"s{i}", 100.0 + i)
+    index.touch("s0", 200.0)
+    index.remove("s1")
+
+    page, cursor = index.idle_before(150.0, limit=3)
+    assert [session_id for _, session_id in page] == ["s2", "s3", "s4"]
+    page, cursor = index.idle_before(150.0, limit=3, cursor=cursor)
+    assert [session_id for _, session_id in page] == ["s5", "s6", "s7"]
+    page, cursor = index.idle_before(150.0, limit=3, cursor=cursor)
+    assert [session_id for _, session_id in page] == ["s8", "s9"]
+    assert cursor is None
+
+    page, cursor = index.idle_before(104.5, limit=10)
+    assert [session_id for _, session_id in page] == ["s2", "s3", "s4"]
+    assert cursor is None
+
+
+def test_order_survives_clock_going_back_and_compaction():
+    """Test that activity order stays sorted and stale entries are dropped."""
+    index = SessionIndex()
+    index.touch("a", 100.0)
+    assert index.touch("b", 90.0) > 100.0
+
+    for i in range(5000):
+        index.touch("a" if i % 2 else "b", 100.0 + i)
+    assert len(index._log) - index._head <= 2 * len(index) + 1024
+    assert [session_id for _, session_id in index.iter_oldest()] == ["b", "a"]
+    assert len(index) == 2
@@ -0,0 +1,113 @@
+"""
+Unit tests for the compact session record.
+"""
+
+import pytest
+
+from app.models.schemas import ConversationState, InterviewQuestion
+from app.models.session_record import CatalogIndex, SessionRecord
+
+CATALOG = CatalogIndex(
+    [
+        InterviewQuestion(
+            question_id="q1",
+            question_type="choice",
+            question_text="職業",
+            options=["会社員", "学生"],
+            reactions={},
+        ),
+        InterviewQuestion(
+            question_id="q2",
+            question_type="text",
+            question_text="スキル",
+            options=None,
+            reactions=None,
+        ),
+        InterviewQuestion(
+            question_id="q3",
+            question_type="choice",
+            question_text="働き方",
+            options=["オフィス", "リモート"],
+            reactions={},
+        ),
+    ]
+)
+
+
+def test_answers_are_stored_as_indices():
+    """Test that choice answers are stored as option indices."""
+    record = SessionRecord(len(CATALOG), user_id="u1")
+    record.set_answer(CATALOG, 0, "学生")
+    record.set_answer(CATALOG, 1, "Python, FastAPI")
+
+    assert record.choices[0] == 1
+    assert record.texts == {1: "Python, FastAPI"}
+    assert record.answered_count == 2
+    assert not record.is_answered(2)
+    assert record.answer(CATALOG, 0) == "学生"
+    assert record.answer(CATALOG, 2) is None
+
+    # An answer outside the options is kept as text until replaced by an option
+    record.set_answer(CATALOG, 2, "週3出社")
+    assert record.answer(CATALOG, 2) == "週3出社"
+    record.set_answer(CATALOG, 2, "リモート")
+    assert record.texts == {1: "Python, FastAPI"}
+    assert record.answer(CATALOG, 2) == "リモート"
+
+
+def test_round_trip_with_conversation_state():
+    """Test conversion to and from the public model."""
+    state = ConversationState(
+        user_id="u1",
+        current_question_id="q3",
+        answers={"q1": "会社員", "q2": "Go"},
+        completed=False,
+    )
+    record = SessionRecord.from_state(state, CATALOG)
+
+    assert record.current == 2
+    assert record.to_state(CATALOG) == state
+
+
+def test_slots_prevent_instance_dict():
+    """Test that the record has no per-instance __dict__."""
+    record = SessionRecord(len(CATALOG))
+    with pytest.raises(AttributeError):
+        record.extra = 1
+
+
+def test_bytes_round_trip():
+    """Test that the byte encoding used by the event log restores the record."""
+    record = SessionRecord(len(CATALOG), user_id="ユーザー", current=2)
+    record.set_answer(CATALOG, 0, "学生")
+    record.set_answer(CATALOG, 1, "Python, FastAPI")
+    data = record.to_bytes() + SessionRecord(len(CATALOG)).to_bytes()
+
+    restored, offset = SessionRecord.from_bytes(data)
+    empty, end = SessionRecord.from_bytes(data, offset)
+    assert restored.to_state(CATALOG) == record.to_state(CATALOG)
+    assert empty.user_id is None and empty.texts is None and empty.answered_count == 0
+    assert end == len(data)
+
+
+def test_catalog_and_user_id_limits():
+    """Test that sizes the byte format cannot hold are rejected up front."""
+    questions = [
+        InterviewQuestion(
+            question_id=f"q{i}",
+            question_type="text",
+            question_text="",
+            options=None,
+            reactions=None,
+        )
+        for i in range(65)
+    ]
+    with pytest.raises(ValueError):
+        CatalogIndex(questions)
+    assert len(CatalogIndex(questions[:64])) == 64
+
+    with pytest.raises(ValueError):
+        SessionRecord(len(CATALOG), user_id="あ" * 30000)
+    record = SessionRecord(len(CATALOG), user_id="a" * 65534)
+    restored, _ = SessionRecord.from_bytes(record.to_bytes())
+    assert restored.user_id == record.user_id
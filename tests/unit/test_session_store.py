@@ -0,0 +1,236 @@
+"""
+Unit tests for the session stores.
+"""
+
+import multiprocessing
+import zlib
+
+import pytest
+
+from app.models.schemas import InterviewQuestion
+from app.models.session_record import CatalogIndex, SessionRecord
+from app.utils.session_store import (
+    LocalSessionStore,
+    SharedSessionStore,
+    create_session_store,
+)
+
+CATALOG = CatalogIndex(
+    [
+        InterviewQuestion(
+            question_id="q1",
+            question_type="choice",
+            question_text="職業",
+            options=["会社員", "学生"],
+            reactions={},
+        ),
+        InterviewQuestion(
+            question_id="q2",
+            question_type="text",
+            question_text="スキル",
+            options=None,
+            reactions=None,
+        ),
+        InterviewQuestion(
+            question_id="q3",
+            question_type="choice",
+            question_text="働き方",
+            options=["オフィス", "リモート"],
+            reactions={},
+        ),
+    ]
+)
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    return str(tmp_path / "sessions.tbl")
+
+
+def answer_in_child(path: str, session_id: str) -> None:
+    """Answer a question from another process, like a second uvicorn worker."""
+    store = SharedSessionStore(path, CATALOG, capacity=64)
+    with store.edit(session_id) as record:
+        record.set_answer(CATALOG, 2, "リモート")
+        record.completed = True
+    store.close()
+
+
+def test_local_store_edits_in_place():
+    """Test that the in-process store hands out the stored record."""
+    store = LocalSessionStore()
+    store.create("s1", SessionRecord(len(CATALOG)))
+    with store.edit("s1") as record:
+        record.set_answer(CATALOG, 0, "学生")
+
+    assert store.get("s1").answer(CATALOG, 0) == "学生"
+    assert "s1" in store and len(store) == 1
+    with store.edit("missing") as record:
+        assert record is None
+
+
+def test_shared_store_round_trip(table_path):
+    """Test that a record survives encoding into a slot."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=64)
+    record = SessionRecord(len(CATALOG), user_id="ユーザー1", current=1)
+    record.set_answer(CATALOG, 0, "学生")
+    record.set_answer(CATALOG, 1, "Python, FastAPI")
+    store.create("s1", record)
+
+    restored = store.get("s1")
+    assert restored.to_state(CATALOG) == record.to_state(CATALOG)
+    assert store.get("missing") is None
+    assert "s1" in store and "missing" not in store
+    store.close()
+
+
+def test_shared_store_writes_back_only_on_success(table_path):
+    """Test that edit writes the record back unless the block raises."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=64)
+    store.create("s1", SessionRecord(len(CATALOG)))
+
+    with store.edit("s1") as record:
+        record.set_answer(CATALOG, 0, "会社員")
+        record.current = 1
+    with pytest.raises(KeyError):
+        with store.edit("s1") as record:
+            record.current = 2
+            raise KeyError("rejected")
+
+    restored = store.get("s1")
+    assert restored.answer(CATALOG, 0) == "会社員"
+    assert restored.current == 1
+    store.close()
+
+
+def test_sessions_are_shared_between_processes(table_path):
+    """Test that a session created in one process is visible and editable in another."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=64)
+    store.create("s1", SessionRecord(len(CATALOG), user_id="u1"))
+
+    process = multiprocessing.get_context("fork").Process(
+        target=answer_in_child, args=(table_path, "s1")
+    )
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+
+    restored = store.get("s1")
+    assert restored.completed
+    assert restored.answer(CATALOG, 2) == "リモート"
+    store.close()
+
+
+def test_delete_keeps_probe_chain(table_path):
+    """Test that deleting a colliding session does not hide the ones after it."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=4)
+    for i in range(4):
+        store.create(f"s{i}", SessionRecord(len(CATALOG)))
+    with pytest.raises(RuntimeError):
+        store.create("s4", SessionRecord(len(CATALOG)))
+
+    assert store.delete("s0")
+    assert not store.delete("s0")
+    assert all(f"s{i}" in store for i in range(1, 4))
+    store.create("s4", SessionRecord(len(CATALOG)))
+    assert sorted(store) == ["s1", "s2", "s3", "s4"]
+    store.close()
+
+
+def test_oversized_values_are_rejected(table_path):
+    """Test that values that do not fit in a slot raise ValueError."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=8, text_bytes=32)
+    store.create("s1", SessionRecord(len(CATALOG)))
+
+    with pytest.raises(ValueError):
+        with store.edit("s1") as record:
+            record.set_answer(CATALOG, 1, "Python" * 20)
+    with pytest.raises(ValueError):
+        store.create("x" * 100, SessionRecord(len(CATALOG)))
+    assert store.get("s1").answered_count == 0
+    store.close()
+
+
+def test_layout_mismatch_is_rejected(table_path):
+    """Test that a table created with another layout is not reused."""
+    SharedSessionStore(table_path, CATALOG, capacity=8).close()
+
+    with pytest.raises(ValueError):
+        SharedSessionStore(table_path, CATALOG, capacity=16)
+    with pytest.raises(ValueError):
+        create_session_store("redis", CATALOG, table_path)
+
+
+def test_create_replaces_key_after_tombstone(table_path):
+    """Test that re-creating a session behind a tombstone does not leave a duplicate."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=4)
+    home = {}
+    for i in range(64):
+        home.setdefault(zlib.crc32(f"s{i}".encode()) % 4, []).append(f"s{i}")
+    first, second = next(keys for keys in home.values() if len(keys) >= 2)[:2]
+    store.create(first, SessionRecord(len(CATALOG)))
+    store.create(second, SessionRecord(len(CATALOG)))
+    store.delete(first)
+    store.create(second, SessionRecord(len(CATALOG), current=2))
+
+    assert list(store) == [second]
+    assert len(store) == 1
+    assert store.get(second).current == 2
+    assert store.delete(second)
+    assert second not in store
+    assert len(store) == 0
+    store.close()
+
+
+def test_delete_compacts_trailing_tombstones(table_path):
+    """Test that tombstones at the end of a chain become empty slots again."""
+    store = SharedSessionStore(table_path, CATALOG, capacity=64)
+    for i in range(40):
+        store.create(f"s{i}", SessionRecord(len(CATALOG)))
+    for i in range(40):
+        store.delete(f"s{i}")
+
+    states = {store._state_and_key(slot)[0] for slot in range(store.capacity)}
+    assert states == {0}
+    store.close()
+
+
+def test_shared_store_expires_idle_sessions(table_path):
+    """Test that idle sessions are paged oldest first and touched sessions are kept."""
+    now = [1000.0]
+    store = SharedSessionStore(table_path, CATALOG, capacity=64, clock=lambda: now[0])
+    for i in range(3):
+        store.create(f"s{i}", SessionRecord(len(CATALOG)))
+        now[0] += 10
+    store.touch("s0")
+    with store.edit("s1") as record:
+        record.current = 1
+    now[0] = 1100.0
+
+    page, cursor = store.idle_sessions(60, 1)
+    assert page == [(1020.0, "s2")] and cursor == (1020.0, "s2")
+    page, cursor = store.idle_sessions(60, 1, cursor)
+    assert page == [(1030.0, "s0")] and cursor == (1030.0, "s0")
+    page, cursor = store.idle_sessions(60, 1, cursor)
+    assert page == [(1030.0, "s1")] and cursor is None
+    assert store.idle_sessions(75, 10) == ([(1020.0, "s2")], None)
+    store.close()
+
+
+def test_shared_store_scans_idle_sessions_by_slot_range(table_path):
+    """Test that idle sessions are found one slot range at a time and the scan wraps to slot 0."""
+    now = [1000.0]
+    store = SharedSessionStore(table_path, CATALOG, capacity=64, clock=lambda: now[0])
+    for i in range(20):
+        store.create(f"s{i}", SessionRecord(len(CATALOG)))
+    now[0] += 100
+    store.touch("s3")
+
+    found, start = [], 0
+    for expected_start in (16, 32, 48, 0):
+        session_ids, start = store.idle_in_slots(60, start, 16)
+        assert start == expected_start
+        found.extend(session_ids)
+    assert sorted(found) == sorted(f"s{i}" for i in range(20) if i != 3)
+    assert len(store) == 20
+    store.close()
@@ -0,0 +1,90 @@
+"""
+Unit tests for the answer distribution counters.
+"""
+
+import threading
+
+from app.utils.stats import AnswerStats
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_snapshot_counts_and_shares():
+    """Test that answers, skips and completions are aggregated."""
+    stats = AnswerStats()
+    stats.record_start()
+    stats.record_start()
+    stats.record_answer("q1", "会社員")
+    stats.record_answer("q1", "会社員")
+    stats.record_answer("q1", "学生")
+    stats.record_skip("q2")
+    stats.record_completion()
+
+    result = stats.snapshot()
+
+    assert result["started"] == 2
+    assert result["completed"] == 1
+    assert result["completion_rate"] == 0.5
+    assert result["questions"]["q1"]["answers"] == {"会社員": 2, "学生": 1}
+    assert result["questions"]["q1"]["total"] == 3
+    assert abs(result["questions"]["q1"]["shares"]["会社員"] - 2 / 3) < 1e-9
+    assert result["questions"]["q2"]["skipped"] == 1
+
+
+def test_time_window_excludes_old_buckets():
+    """Test that windowed snapshots only include recent buckets."""
+    clock = FakeClock(0.0)
+    stats = AnswerStats(bucket_seconds=60, retention_seconds=3600, clock=clock)
+    stats.record_answer("q1", "会社員")
+
+    clock.now = 30 * 60
+    stats.record_answer("q1", "学生")
+
+    assert stats.snapshot(window_seconds=600)["questions"]["q1"]["answers"] == {
+        "学生": 1
+    }
+    assert stats.snapshot(window_seconds=3600)["questions"]["q1"]["total"] == 2
+
+    # Buckets older than the retention period are recycled
+    clock.now = 2 * 3600
+    stats.record_answer("q1", "自営業")
+    assert stats.snapshot(window_seconds=3600)["questions"]["q1"]["answers"] == {
+        "自営業": 1
+    }
+    assert stats.snapshot()["questions"]["q1"]["total"] == 3
+
+
+def test_window_beyond_retention_is_rejected():
+    """Test that a window longer than the retention period is an error."""
+    stats = AnswerStats(bucket_seconds=60, retention_seconds=3600)
+    try:
+        stats.snapshot(window_seconds=7200)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError was not raised")
+
+
+def test_concurrent_updates():
+    """Test that concurrent updates are not lost."""
+    stats = AnswerStats()
+
+    def worker() -> None:
+        for _ in range(1000):
+            stats.record_answer("q1", "会社員")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.snapshot()["questions"]["q1"]["answers"]["会社員"] == 8000
@@ -0,0 +1,101 @@
+"""
+Unit tests for the tiered (hot/cold) session store.
+"""
+
+import pytest
+
+from app.models.schemas import InterviewQuestion
+from app.models.session_record import CatalogIndex, SessionRecord
+from app.utils.tiered_store import TieredSessionStore, record_bytes
+
+CATALOG = CatalogIndex(
+    [
+        InterviewQuestion(
+            question_id="q1",
+            question_type="choice",
+            question_text="職業",
+            options=["会社員", "学生"],
+            reactions={},
+        ),
+        InterviewQuestion(
+            question_id="q2",
+            question_type="text",
+            question_text="スキル",
+            options=None,
+            reactions=None,
+        ),
+    ]
+)
+
+SESSION_BYTES = record_bytes(SessionRecord(len(CATALOG), user_id="u"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    now = [1000.0]
+
+    def clock():
+        now[0] += 1
+        return now[0]
+
+    # Room for three sessions in memory
+    store = TieredSessionStore(
+        str(tmp_path / "cold.db"), 3 * SESSION_BYTES, clock=clock
+    )
+    yield store
+    store.close()
+
+
+def test_least_recently_active_sessions_spill_to_disk(store):
+    """Test that the hot tier stays under budget by demoting the idlest sessions."""
+    for i in range(5):
+        store.create(f"s{i}", SessionRecord(len(CATALOG), user_id="u"))
+
+    metrics = store.metrics()
+    assert metrics["hot_sessions"] == 3 and metrics["cold_sessions"] == 2
+    assert metrics["hot_bytes"] <= metrics["memory_budget_bytes"]
+    assert len(store) == 5 and "s0" in store
+    assert sorted(store) == ["s0", "s1", "s2", "s3", "s4"]
+
+
+def test_get_reads_cold_sessions_without_promoting(store):
+    """Test that scanning a cold session leaves the tiers unchanged."""
+    for i in range(4):
+        store.create(f"s{i}", SessionRecord(len(CATALOG), user_id="u"))
+
+    assert store.get("s0").user_id == "u"
+    assert store.metrics()["cold_sessions"] == 1
+    assert store.get("missing") is None
+
+
+def test_edit_and_load_bring_cold_sessions_back(store):
+    """Test that touching a cold session reloads it and demotes the next idlest one."""
+    for i in range(4):
+        store.create(f"s{i}", SessionRecord(len(CATALOG), user_id="u"))
+
+    with store.edit("s0") as record:
+        record.set_answer(CATALOG, 1, "Python")
+    assert store.get("s0").answer(CATALOG, 1) == "Python"
+
+    assert store.load("s1").user_id == "u"
+    metrics = store.metrics()
+    assert metrics["cold_loads_total"] == 2
+    # The free-text answer made s0 larger, so two sessions no longer fit in memory
+    assert metrics["cold_sessions"] == 2
+    assert metrics["hot_bytes"] <= metrics["memory_budget_bytes"]
+    assert store.latest_for_user("u") == "s1"
+
+
+def test_delete_and_expire_cold_sessions(store):
+    """Test that cold sessions are deleted from disk and found by the activity index."""
+    for i in range(4):
+        store.create(f"s{i}", SessionRecord(len(CATALOG)))
+
+    page, _ = store.idle_sessions(0, 10)
+    assert [session_id for _, session_id in page] == ["s0", "s1", "s2", "s3"]
+
+    assert store.delete("s0") is True
+    assert store.delete("s0") is False
+    assert "s0" not in store
+    assert store.metrics()["cold_sessions"] == 0
+    assert store.load("s0") is None
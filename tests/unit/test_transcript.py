@@ -0,0 +1,91 @@
+"""
+Unit tests for transcript references into the question catalog.
+"""
+
+from app.graph.flow import QUESTIONS, ConversationGraph
+from app.graph.transcript import (
+    KIND_ANSWER,
+    KIND_QUESTION,
+    KIND_REACTION,
+    TranscriptCatalog,
+    get_catalog,
+    register_catalog,
+)
+from app.models.schemas import ConversationState
+
+
+def test_refs_are_shared_between_sessions():
+    """Test that the same catalog message is stored as one shared tuple."""
+    catalog = TranscriptCatalog(QUESTIONS)
+    first = catalog.question_ref("q1")
+    second = catalog.question_ref("q1")
+
+    assert first == (KIND_QUESTION, 0, -1)
+    assert first is second
+    assert catalog.reaction_ref("q1", "学生") is catalog.reaction_ref("q1", "学生")
+
+
+def test_user_entry_keeps_free_text():
+    """Test that option answers become refs and free text stays a string."""
+    catalog = TranscriptCatalog(QUESTIONS)
+
+    assert catalog.user_entry("q1", "学生") == (KIND_ANSWER, 0, 2)
+    assert catalog.user_entry("q1", "パート") == "パート"
+    assert catalog.role(catalog.user_entry("q1", "学生")) == "user"
+    assert catalog.role("パート") == "user"
+
+
+def test_render_matches_copied_text():
+    """Test that refs resolve to the same text the graph used to copy."""
+    catalog = TranscriptCatalog(QUESTIONS)
+    question = QUESTIONS[0]
+    entries = [
+        catalog.question_ref("q1"),
+        catalog.user_entry("q1", "学生"),
+        catalog.reaction_ref("q1", "学生"),
+        catalog.reaction_ref("q1", "パート"),
+    ]
+
+    assert catalog.render(entries) == [
+        {
+            "role": "assistant",
+            "content": f"{question.question}\n\n"
+            + "\n".join(f"- {o}" for o in question.options),
+        },
+        {"role": "user", "content": "学生"},
+        {"role": "assistant", "content": question.reactions["学生"]},
+        {"role": "assistant", "content": "ご回答ありがとうございます。"},
+    ]
+    assert entries[2][0] == KIND_REACTION
+
+
+def test_catalog_versions_are_registered():
+    """Test that sessions can resolve refs with the catalog version they started on."""
+    catalog = register_catalog(TranscriptCatalog(QUESTIONS))
+
+    assert register_catalog(TranscriptCatalog(QUESTIONS)) is catalog
+    assert get_catalog(catalog.version) is catalog
+
+    changed = TranscriptCatalog(QUESTIONS[:1])
+    assert changed.version != catalog.version
+
+
+def test_graph_nodes_store_refs():
+    """Test that the graph nodes append refs instead of copied strings."""
+    graph = ConversationGraph()
+    state = ConversationState(current_question_id="q1")
+
+    update = graph._ask_question_node(state)
+    assert update["messages"] == [graph.catalog.question_ref("q1")]
+    assert update["catalog_version"] == graph.catalog.version
+
+    state.messages = update["messages"] + [graph.catalog.user_entry("q1", "学生")]
+    state.catalog_version = update["catalog_version"]
+    graph._record_answer_node(state)
+    assert state.answers == {"q1": "学生"}
+    assert state.current_question_id == "q2"
+
+    state.current_question_id = "q1"
+    update = graph._fixed_reaction_node(state)
+    assert update["messages"][-1] is graph.catalog.reaction_ref("q1", "学生")
+    assert graph.catalog.text(update["messages"][-1]) == QUESTIONS[0].reactions["学生"]
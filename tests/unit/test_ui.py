@@ -0,0 +1,192 @@
+"""
+Unit tests for the Gradio UI handlers.
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from app.frontend import ui
+
+CATALOG = {
+    "version": "v1",
+    "questions": [
+        {
+            "question_id": "q1",
+            "question_type": "choice",
+            "question_text": "職業は？",
+            "options": ["会社員", "学生"],
+            "reactions": {"会社員": "お疲れ様です。"},
+        },
+        {
+            "question_id": "q2",
+            "question_type": "choice",
+            "question_text": "関心は？",
+            "options": ["技術", "管理"],
+            "reactions": {},
+        },
+    ],
+}
+
+
+def use_transport(handler) -> None:
+    """Replace the shared client with one backed by a mock transport."""
+    ui._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def ndjson(*events) -> httpx.Response:
+    """Build a streaming chat response from events."""
+    return httpx.Response(
+        200, content="".join(json.dumps(event) + "\n" for event in events)
+    )
+
+
+async def collect(generator):
+    return [item async for item in generator]
+
+
+def test_handle_message_updates_chat_and_options():
+    """Test that a turn appends messages and relabels the option buttons."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return ndjson(
+            {
+                "type": "turn",
+                "progress": {"current": 1, "total": 3},
+                "options": ["A", "B"],
+            },
+            {"type": "delta", "text": "次の質問です"},
+            {"type": "done"},
+        )
+
+    use_transport(handler)
+    updates = asyncio.run(collect(ui.handle_message("会社員", [], "session-1")))
+    _, text, progress, question_id, row, *buttons = updates[0]
+    history = updates[-1][0]
+
+    assert history[-2:] == [
+        {"role": "user", "content": "会社員"},
+        {"role": "assistant", "content": "次の質問です"},
+    ]
+    assert text == ""
+    assert str(requests[0].url) == ui.STREAM_URL
+    assert progress == "進捗: 1/3 質問"
+    assert row["visible"] is True
+    assert [b.get("value") for b in buttons[:2]] == ["A", "B"]
+    assert all(b["visible"] is False for b in buttons[2:])
+    assert len(buttons) == ui.MAX_OPTIONS
+    assert len(requests) == 1
+
+
+def test_handle_message_reports_errors():
+    """Test that API errors are shown in the chat without touching the options."""
+    use_transport(lambda request: httpx.Response(500))
+    updates = asyncio.run(collect(ui.handle_message("こんにちは", None, "session-1")))
+    assert len(updates) == 1
+    history, _, _, _, row, *_ = updates[0]
+
+    assert history[-1]["role"] == "assistant"
+    assert "エラーが発生しました" in history[-1]["content"]
+    assert "visible" not in row
+
+
+def test_handlers_are_wired_once():
+    """Test that turns do not register additional event handlers."""
+    demo = ui.create_chat_interface()
+    handler_count = len(demo.fns)
+
+    use_transport(
+        lambda request: ndjson(
+            {"type": "turn", "options": ["A"]},
+            {"type": "delta", "text": "ok"},
+            {"type": "done"},
+        )
+    )
+    for _ in range(3):
+        asyncio.run(collect(ui.handle_message("A", [], "session-1")))
+
+    assert len(demo.fns) == handler_count
+
+
+def test_handle_message_shows_options_before_reply_text():
+    """Test that the options render on the turn event and the reply streams in afterwards."""
+    use_transport(
+        lambda request: ndjson(
+            {
+                "type": "turn",
+                "question_id": "q2",
+                "options": ["技術", "管理"],
+                "progress": {"current": 1, "total": 2},
+            },
+            {"type": "delta", "text": "お疲れ様です。"},
+            {"type": "delta", "text": "\n\n関心は？"},
+            {"type": "done"},
+        )
+    )
+
+    updates = asyncio.run(collect(ui.handle_message("会社員", [], "session-1", "q1")))
+
+    assert len(updates) == 3
+    history, _, progress, question_id, row, *buttons = updates[0]
+    # The buttons are relabelled before any reply text has arrived
+    assert history[-1] == {"role": "user", "content": "会社員"}
+    assert question_id == "q2"
+    assert row["visible"] is True
+    assert [b.get("value") for b in buttons[:2]] == ["技術", "管理"]
+    assert [update[0][-1]["content"] for update in updates[1:]] == [
+        "お疲れ様です。",
+        "お疲れ様です。\n\n関心は？",
+    ]
+    assert all("visible" not in update[4] for update in updates[1:])
+    assert updates[-1][3] == "q2"
+
+
+def test_option_click_renders_from_catalog_before_response():
+    """Test that an option click is rendered locally and confirmed by the API."""
+    ui.catalog.load(CATALOG)
+    use_transport(
+        lambda request: httpx.Response(
+            200,
+            json={
+                "message": "お疲れ様です。\n\n関心は？",
+                "question_id": "q2",
+                "options": ["技術", "管理"],
+            },
+        )
+    )
+
+    updates = asyncio.run(collect(ui.handle_option("会社員", [], "session-1", "q1")))
+
+    # The prediction matched the server, so there is exactly one render
+    assert len(updates) == 1
+    history, _, progress, question_id, row, *buttons = updates[0]
+    assert history[-1]["content"].startswith("お疲れ様です。\n\n関心は？")
+    assert question_id == "q2"
+    assert progress == "進捗: 1/2 質問"
+    assert [b.get("value") for b in buttons[:2]] == ["技術", "管理"]
+
+
+def test_option_click_is_reconciled_on_mismatch():
+    """Test that the server response replaces a wrong prediction."""
+    ui.catalog.load(CATALOG)
+    use_transport(
+        lambda request: httpx.Response(
+            200,
+            json={
+                "message": "もう一度お願いします。",
+                "question_id": "q1",
+                "options": ["会社員", "学生"],
+            },
+        )
+    )
+
+    updates = asyncio.run(collect(ui.handle_option("会社員", [], "session-1", "q1")))
+
+    assert len(updates) == 2
+    history, _, _, question_id, _, *buttons = updates[-1]
+    assert history[-1]["content"] == "もう一度お願いします。"
+    assert question_id == "q1"
+    assert buttons[0]["value"] == "会社員"